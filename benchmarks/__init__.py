@@ -0,0 +1,4 @@
+"""
+Benchmarks for Car Rental System
+Run individual benchmarks with python -m benchmarks.<name>
+"""
@@ -0,0 +1,89 @@
+"""
+Billing benchmark for Car Rental System
+Returns every rented car of a large fleet (billing each rental at return
+time), then times the batch invoice run over the day's returns: rentals
+per second, round trips and peak Python memory
+
+Usage:
+    python -m benchmarks.billing [--size 100000] [--batch-size 500] [--latency-ms 1]
+
+About 30% of the synthetic fleet is rented and 10% of those rentals are
+overdue, so the run covers both on-time and late returns.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date
+import config
+from benchmarks.dataset import synthetic_cars, synthetic_rentals, load_dataset
+from database import fake_driver, local_backend
+from database.db_operations import DatabaseOperations
+
+# Cars per return_cars call, as the CLI uses
+RETURN_BATCH_SIZE = 500
+
+
+def main():
+    """Load a fleet, return the rented cars and run the invoice run"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=100000, help='number of cars')
+    parser.add_argument('--batch-size', type=int, default=500, help='rentals per invoice batch')
+    parser.add_argument('--latency-ms', type=float, default=0, help='delay per database round trip')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'billing.db')
+        cars = synthetic_cars(args.size)
+        rentals = synthetic_rentals(cars)
+        connection = local_backend.connect(path)
+        load_dataset(connection, cars, rentals)
+        connection.close()
+
+        config.DB_BACKEND = 'fake'
+        config.LOCAL_DB_PATH = path
+        config.LOCAL_READ_REPLICA_PATH = None
+        config.AUDIT_ENABLED = False
+        driver = fake_driver.configure(latency_ms=args.latency_ms)
+        db = DatabaseOperations()
+        db.connect()
+        try:
+            car_ids = [rental.car_id for rental in rentals]
+            start = time.perf_counter()
+            late = 0
+            for i in range(0, len(car_ids), RETURN_BATCH_SIZE):
+                if not db.return_cars(car_ids[i:i + RETURN_BATCH_SIZE]):
+                    print("return_cars failed")
+                    return 1
+                late += sum(1 for charge in db.last_charges.values() if charge.late_fee)
+            returned = time.perf_counter() - start
+            print(f"{args.size} cars, {len(car_ids)} returns ({late} late), latency {args.latency_ms} ms\n")
+            print(f"return_cars: {returned:.2f} s ({len(car_ids) / returned:.0f} returns/s, billed at return)")
+
+            today = date.today().isoformat()
+            driver.reset_stats()
+            tracemalloc.start()
+            start = time.perf_counter()
+            summary = db.generate_invoices(today, today, batch_size=args.batch_size)
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            if summary is None:
+                print("generate_invoices failed")
+                return 1
+            stats = driver.stats()
+            print(f"generate_invoices: {summary['invoices']} invoices in {elapsed:.2f} s "
+                  f"({summary['invoices'] / elapsed:.0f}/s), batch size {args.batch_size}")
+            print(f"  round trips: {stats['round_trips']} ({dict(stats['by_kind'])})")
+            print(f"  peak memory: {peak / 1024:.0f} KiB")
+            print(f"  total {summary['total']}, late fees {summary['late_fees']} on {summary['late']} invoice(s)")
+        finally:
+            db.disconnect()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,257 @@
+"""
+Synthetic dataset for Car Rental System benchmarks
+Generates fleet and rental rows in the shapes returned by DatabaseOperations
+"""
+
+import random
+from datetime import datetime, timedelta
+from database.records import Car, CarSummary, Rental, RentedCar
+
+MODELS = (
+    'Corolla', 'Civic', 'Model 3', 'Golf', 'Camry', 'Accord', 'Focus',
+    'Swift', 'i20', 'Polo', 'Octavia', 'Creta', 'City', 'Elantra',
+)
+TERMS = ('Standard', 'No smoking', 'Fuel full-to-full', 'Unlimited km', 'Max 300 km/day')
+BRANCH_COUNT = 40
+
+
+def synthetic_branches(count=BRANCH_COUNT, seed=42):
+    """
+    Generate branch rows spread over a region roughly 600 x 600 km
+
+    Args:
+        count: Number of branches
+        seed: Random seed
+
+    Returns:
+        list: List of (BRANCH_ID, BRANCH_NAME, LATITUDE, LONGITUDE)
+    """
+    rng = random.Random(seed)
+    return [
+        (branch_id, f'Branch {branch_id}', round(rng.uniform(17.0, 22.5), 6), round(rng.uniform(72.5, 78.5), 6))
+        for branch_id in range(1, count + 1)
+    ]
+
+
+def synthetic_cars(count, seed=42, rented_fraction=0.3, branch_count=BRANCH_COUNT):
+    """
+    Generate car rows in the shape of DatabaseOperations.get_all_car_details
+
+    Args:
+        count: Number of cars
+        seed: Random seed, so runs are repeatable
+        rented_fraction: Share of cars marked as rented
+        branch_count: Cars are spread over branch IDs 1..branch_count
+
+    Returns:
+        list: Car records
+    """
+    rng = random.Random(seed)
+    cars = []
+    for car_id in range(1, count + 1):
+        tariff = rng.randrange(1000, 10000, 50)
+        status = 'Rented' if rng.random() < rented_fraction else 'Available'
+        cars.append(Car(
+            car_id,
+            rng.randint(1, 50),
+            rng.choice(MODELS),
+            tariff,
+            tariff // 4,
+            rng.randint(2010, 2025),
+            rng.choice(TERMS),
+            status,
+            rng.randint(1, branch_count),
+        ))
+    return cars
+
+
+def synthetic_rentals(cars, customer_count=1000, seed=42, overdue_fraction=0.1):
+    """
+    Generate one pending rental per rented car
+
+    Args:
+        cars: Rows from synthetic_cars
+        customer_count: Number of distinct customers to spread rentals over
+        seed: Random seed
+        overdue_fraction: Share of rentals whose end date is in the past
+
+    Returns:
+        list: Rental records
+    """
+    rng = random.Random(seed)
+    now = datetime.now().replace(microsecond=0)
+    rentals = []
+    for car in cars:
+        if car.status != 'Rented':
+            continue
+        start = now - timedelta(days=rng.randint(1, 20))
+        if rng.random() < overdue_fraction:
+            end = now - timedelta(days=rng.randint(1, 5))
+        else:
+            end = now + timedelta(days=rng.randint(1, 14))
+        rentals.append(Rental(
+            len(rentals) + 1,
+            rng.randint(1, customer_count),
+            car.car_id,
+            start,
+            end,
+            car.tariff,
+        ))
+    return rentals
+
+
+class SyntheticDatabase:
+    """
+    Read-only stand-in for DatabaseOperations backed by synthetic rows
+
+    Implements just the reads the customer and agent views make, so they
+    can be rendered without a database.
+    """
+
+    # Not bound to a shard, like an unsharded DatabaseOperations
+    shard = None
+
+    def __init__(self, cars, rentals=(), branches=None):
+        """
+        Initialize synthetic database
+
+        Args:
+            cars: Rows from synthetic_cars
+            rentals: Rows from synthetic_rentals
+            branches: Rows from synthetic_branches (default: synthetic_branches())
+        """
+        self.cars = {car.car_id: car for car in cars}
+        self.rentals = list(rentals)
+        self.branches = synthetic_branches() if branches is None else list(branches)
+
+    def connect(self):
+        """No-op"""
+
+    def disconnect(self):
+        """No-op"""
+
+    def get_available_cars(self):
+        """Available cars"""
+        return [car for car in self.cars.values() if car.status == 'Available']
+
+    def iter_available_cars(self, batch_size=None):
+        """Available cars, streamed"""
+        return (car for car in self.cars.values() if car.status == 'Available')
+
+    def get_available_cars_at_branches(self, branch_ids):
+        """Available cars at the given branches"""
+        branch_ids = set(branch_ids)
+        return [car for car in self.get_available_cars() if car.branch_id in branch_ids]
+
+    def get_branches(self):
+        """Synthetic branches"""
+        return self.branches
+
+    def get_branches_with_available(self, car_model=None):
+        """Branches with an available car (of the model)"""
+        return {car.branch_id for car in self.get_available_cars() if not car_model or car.model == car_model}
+
+    @staticmethod
+    def _summary(car):
+        """Agent-view record of a car"""
+        return CarSummary(car.car_id, car.model, car.tariff, car.year, car.status)
+
+    def get_all_cars(self):
+        """All cars in agent-view shape"""
+        return [self._summary(car) for car in self.cars.values()]
+
+    def iter_all_cars(self, batch_size=None):
+        """All cars in agent-view shape, streamed"""
+        return map(self._summary, self.cars.values())
+
+    def get_cars_by_ids(self, car_ids):
+        """Specific cars in agent-view shape"""
+        return [self._summary(self.cars[car_id]) for car_id in car_ids if car_id in self.cars]
+
+    def get_customer_rented_cars(self, username):
+        """Every rental, as if all belonged to this customer"""
+        return [
+            RentedCar(r.car_id, self.cars[r.car_id].model, self.cars[r.car_id].year, r.end_date)
+            for r in self.rentals
+        ]
+
+    def get_overdue_cars(self, username):
+        """No overdue cars, so the normal home view is rendered"""
+        return []
+
+    def get_customer_id(self, username):
+        """The same customer for every username"""
+        return 1
+
+    def get_customer_waitlist(self, customer_id):
+        """Empty waitlist"""
+        return []
+
+    def get_counters(self):
+        """Counter rows computed from the synthetic fleet"""
+        counts = {}
+        for car in self.cars.values():
+            for key in (f'status.{car.status}', f'model.{car.model}.{car.status}'):
+                counts[key] = counts.get(key, 0) + 1
+        return list(counts.items())
+
+    def get_latest_change_id(self):
+        """Empty change log"""
+        return 0
+
+    def get_changes_since(self, change_id, limit=500):
+        """Empty change log"""
+        return []
+
+
+def load_dataset(connection, cars, rentals=(), customer_count=1000, branches=None):
+    """
+    Insert a synthetic dataset into an empty database
+
+    Creates customer<N> users/customers (password "password") for every
+    customer ID the rentals can reference, plus the branches, cars and rentals.
+
+    Args:
+        connection: Connection from get_connection or local_backend.connect
+        cars: Rows from synthetic_cars
+        rentals: Rows from synthetic_rentals
+        customer_count: Number of customers, as passed to synthetic_rentals
+        branches: Rows from synthetic_branches (default: synthetic_branches())
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.executemany(
+            "INSERT INTO Branches (BRANCH_ID, BRANCH_NAME, LATITUDE, LONGITUDE) VALUES (:1, :2, :3, :4)",
+            synthetic_branches() if branches is None else branches
+        )
+        customers = [
+            {'id': customer_id, 'name': f'customer{customer_id}'}
+            for customer_id in range(1, customer_count + 1)
+        ]
+        cursor.executemany(
+            "INSERT INTO Users (USER_ID, USERNAME, PASSWORD) VALUES (:id, :name, 'password')",
+            customers
+        )
+        cursor.executemany(
+            "INSERT INTO Customer (CUST_ID, CUST_NAME) VALUES (:id, :name)",
+            customers
+        )
+        cursor.executemany("""
+            INSERT INTO Cars (CARID, AGENTID, CARMODEL, TARIFF, ODAMOUNT, YEAR, TERMS, AVAILABILITYSTATUS, BRANCH_ID)
+            VALUES (:1, :2, :3, :4, :5, :6, :7, :8, :9)
+        """, cars)
+        if rentals:
+            cursor.executemany("""
+                INSERT INTO RentalTransactions
+                (TRANSACTIONID, CUSTOMERID, CARID, RENTALSTARTDATE, RENTALENDDATE, TOTALCOST, RENTALSTATUS)
+                VALUES (:1, :2, :3, :4, :5, :6, 'Pending')
+            """, list(rentals))
+            # Each rental belongs to its car's branch (the shard key)
+            cursor.execute("""
+                UPDATE RentalTransactions
+                SET BRANCH_ID = (SELECT C.BRANCH_ID FROM Cars C WHERE C.CARID = RentalTransactions.CARID)
+                WHERE BRANCH_ID IS NULL
+            """)
+        connection.commit()
+    finally:
+        cursor.close()
@@ -0,0 +1,204 @@
+"""
+Idempotency check for Car Rental System
+Sends rent, return, add-car and update-car requests twice with the same
+idempotency key, including after the reply to the commit was lost,
+through the fake driver, and checks that each takes effect exactly once
+
+Usage:
+    python -m benchmarks.idempotency [--latency-ms 5]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+import config
+from benchmarks.dataset import synthetic_cars, synthetic_rentals, load_dataset
+from database import fake_driver, local_backend
+from database.db_operations import DatabaseOperations
+from database.idempotency import new_key
+from database.reconnect import get_metrics
+
+
+def lose_commit_reply(db):
+    """Make the next commit go through but drop the connection before its reply"""
+    connection = db.connection
+    commit = connection.commit
+
+    def committed_then_dropped():
+        commit()
+        connection.drop()
+        raise fake_driver.Disconnected("DPI-4011: the database or network closed the connection")
+    connection.commit = committed_then_dropped
+
+
+def _purging_first_lookup(db, get_outcome):
+    """Wrap get_outcome so its first call finds the key purged, as the scheduler would"""
+    calls = []
+
+    def wrapper(idempotency_key):
+        if not calls:
+            calls.append(idempotency_key)
+            db.purge_idempotency_keys(0)
+        return get_outcome(idempotency_key)
+    return wrapper
+
+
+def run_checks(driver, cars):
+    """
+    Run the idempotency scenarios
+
+    Yields:
+        tuple: (description, expected result, actual result)
+    """
+    metrics = get_metrics()
+    start = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    end = (datetime.now() + timedelta(days=3)).strftime('%Y-%m-%d')
+    available = iter(car for car in cars if car.status == 'Available')
+    db = DatabaseOperations()
+    db.connect()
+    try:
+        def rentals():
+            return len(db.get_open_rentals())
+
+        before = rentals()
+        car = next(available)
+        key = new_key()
+        results = [db.create_rental(1, car.car_id, start, end, car.tariff, idempotency_key=key) for _ in range(2)]
+        yield "rent sent twice with one key succeeds twice", [True, True], results
+        yield "... but rents once", before + 1, rentals()
+
+        driver.reset_stats()
+        db.create_rental(1, car.car_id, start, end, car.tariff, idempotency_key=key)
+        yield "... a third time from memory, without writing", 0, driver.stats()['by_kind']['commit']
+        db.outcomes.clear()
+        yield "... and from the table once forgotten", True, \
+            db.create_rental(1, car.car_id, start, end, car.tariff, idempotency_key=key)
+        yield "... still renting once", before + 1, rentals()
+
+        # The rental commits but the session drops before the reply arrives
+        metrics.reset()
+        car = next(available)
+        lose_commit_reply(db)
+        yield "rent whose commit reply is lost is retried and succeeds", True, \
+            db.create_rental(1, car.car_id, start, end, car.tariff, idempotency_key=new_key())
+        yield "... renting once", before + 2, rentals()
+        yield "... after one reconnect and one retry", (1, 1), \
+            (metrics.stats().get('reconnects', 0), metrics.stats().get('retries', 0))
+
+        car = next(available)
+        lose_commit_reply(db)
+        yield "without a key the same loss is reported as a failure", False, \
+            db.create_rental(1, car.car_id, start, end, car.tariff)
+        yield "... although the rental went through", before + 3, rentals()
+
+        key = new_key()
+        lose_commit_reply(db)
+        rented = db.rent_by_criteria(2, start, end, idempotency_key=key)
+        yield "rent any car with a lost reply rents one car", before + 4, rentals()
+        yield "... and a repeat gets the same car", rented, db.rent_by_criteria(2, start, end, idempotency_key=key)
+
+        key = new_key()
+        lose_commit_reply(db)
+        returned = db.return_car(rented[0], idempotency_key=key)
+        charge = db.last_charges.get(rented[0])
+        yield "return with a lost reply succeeds and is billed", (True, True), (returned, charge is not None)
+        yield "... and a repeat returns the first charges", charge, \
+            db.return_car(rented[0], idempotency_key=key) and db.last_charges.get(rented[0])
+
+        key = new_key()
+        new_id = max(car.car_id for car in cars) + 1
+        yield "add car sent twice with one key succeeds twice", [True, True], [
+            db.add_car(new_id, 1, 'Civic', 5000, 2024, 'Standard', idempotency_key=key) for _ in range(2)
+        ]
+        try:
+            db.return_car(new_id, idempotency_key=key)
+            reused = None
+        except ValueError:
+            reused = 'ValueError'
+        yield "key reused for another operation is refused", 'ValueError', reused
+
+        # An update bumps the counters and writes the change log, so a blind
+        # retry after a lost reply would count it twice
+        def maintenance():
+            return dict(db.get_counters()).get('status.Maintenance', 0)
+
+        metrics.reset()
+        car = next(available)
+        before_count, since = maintenance(), db.get_latest_change_id()
+        lose_commit_reply(db)
+        yield "update with a lost reply is retried and succeeds", True, \
+            db.update_car(car.car_id, 'Availability', 'Maintenance', idempotency_key=new_key())
+        yield "... counting the car once", before_count + 1, maintenance()
+        yield "... logging one change", 1, len(db.get_changes_since(since))
+        yield "... after one retry", 1, metrics.stats().get('retries', 0)
+
+        metrics.reset()
+        car = next(available)
+        lose_commit_reply(db)
+        yield "without a key the update is not retried", (False, 0), \
+            (db.update_car(car.car_id, 'Availability', 'Maintenance'), metrics.stats().get('retries', 0))
+
+        yield "purge deletes every key recorded above", 6, db.purge_idempotency_keys(0)
+
+        # The key is purged between the failed claim and the outcome lookup
+        before = rentals()
+        car = next(available)
+        key = new_key()
+        db.cursor.execute("""
+            INSERT INTO IdempotencyKeys (IDEMPOTENCY_KEY, OPERATION, CREATED_AT)
+            VALUES (:idempotency_key, 'RENT', SYSTIMESTAMP)
+        """, {'idempotency_key': key})
+        db.commit()
+        db.get_outcome = _purging_first_lookup(db, db.get_outcome)
+        yield "rent whose key is purged while claiming claims it again and succeeds", True, \
+            db.create_rental(1, car.car_id, start, end, car.tariff, idempotency_key=key)
+        yield "... renting once", before + 1, rentals()
+        del db.get_outcome
+
+        car = next(available)
+        key = new_key()
+        db.cursor.execute("""
+            INSERT INTO IdempotencyKeys (IDEMPOTENCY_KEY, OPERATION, CREATED_AT)
+            VALUES (:idempotency_key, 'RENT', SYSTIMESTAMP)
+        """, {'idempotency_key': key})
+        db.commit()
+        yield "rent whose key has no recorded outcome fails", False, \
+            db.create_rental(1, car.car_id, start, end, car.tariff, idempotency_key=key)
+        yield "... without renting", before + 1, rentals()
+    finally:
+        db.disconnect()
+
+
+def main():
+    """Run the checks and print one line per scenario"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--latency-ms', type=float, default=5, help='delay per database round trip')
+    args = parser.parse_args()
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'idempotency.db')
+        cars = synthetic_cars(300)
+        connection = local_backend.connect(path)
+        load_dataset(connection, cars, synthetic_rentals(cars, customer_count=20), customer_count=20)
+        connection.close()
+
+        config.DB_BACKEND = 'fake'
+        config.LOCAL_DB_PATH = path
+        config.LOCAL_READ_REPLICA_PATH = None
+        config.AUDIT_ENABLED = False
+        driver = fake_driver.configure(latency_ms=args.latency_ms, seed=7)
+
+        for description, expected, actual in run_checks(driver, cars):
+            ok = expected == actual
+            failures += not ok
+            print(f"{'ok  ' if ok else 'FAIL'} {description}" + ('' if ok else f" (expected {expected}, got {actual})"))
+
+    print(f"\n{failures} failure(s)" if failures else "\nAll idempotency checks passed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
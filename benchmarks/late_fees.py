@@ -0,0 +1,63 @@
+"""
+Late fee check for Car Rental System
+Bills returns around the agreed end date and checks that a car is late
+only after the end of that day plus the grace period
+
+The agreed end date is stored as midnight (TO_DATE(:rental_end_date,
+'YYYY-MM-DD')), so the rows below carry it the same way.
+
+Usage:
+    python -m benchmarks.late_fees
+"""
+
+import sys
+from datetime import datetime
+from database.billing import BillingRules, compute_charges
+
+# Fixed rules, so the expected amounts do not depend on config.py
+RULES = BillingRules(late_fee_multiplier=1.5, grace_seconds=2 * 3600)
+
+START = datetime(2026, 10, 15, 10, 0)
+AGREED_END = datetime.strptime('2026-10-19', '%Y-%m-%d')
+QUOTED = 100.0
+
+
+def bill(returned_at):
+    """(late_days, late_fee, total) of the rental returned at a time"""
+    charge = compute_charges([(1, 1, 1, START, AGREED_END, returned_at, QUOTED)], rules=RULES)[0]
+    return charge.late_days, charge.late_fee, charge.total
+
+
+def run_checks():
+    """
+    Bill the same 15-19 October rental returned at different times
+
+    Yields:
+        tuple: (description, expected result, actual result)
+    """
+    yield "returned early is billed the quote", (0, 0.0, 100.0), bill(datetime(2026, 10, 18, 9, 0))
+    yield "returned on the agreed day is on time", (0, 0.0, 100.0), bill(datetime(2026, 10, 19, 14, 0))
+    yield "returned at the last minute of the agreed day is on time", (0, 0.0, 100.0), \
+        bill(datetime(2026, 10, 19, 23, 59))
+    yield "returned within the grace period is on time", (0, 0.0, 100.0), bill(datetime(2026, 10, 20, 1, 30))
+    yield "returned just after the grace period is one day late", (1, 37.5, 137.5), \
+        bill(datetime(2026, 10, 20, 2, 30))
+    yield "returned the next afternoon is one day late", (1, 37.5, 137.5), bill(datetime(2026, 10, 20, 14, 0))
+    yield "returned two days after the agreed day is two days late", (2, 75.0, 175.0), \
+        bill(datetime(2026, 10, 21, 14, 0))
+
+
+def main():
+    """Run the checks and print one line per scenario"""
+    failures = 0
+    for description, expected, actual in run_checks():
+        ok = expected == actual
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {description}" + ('' if ok else f" (expected {expected}, got {actual})"))
+
+    print(f"\n{failures} failure(s)" if failures else "\nAll late fee checks passed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+"""
+WAN latency and fault scenarios for Car Rental System
+Runs the database side of each customer and agent action through the
+fake driver and reports round trips and end-to-end time per action, so
+chatty flows stand out before they meet a slow link to Oracle
+
+Usage:
+    python -m benchmarks.latency_scenarios [--latency-ms 300] [--jitter-ms 50] [--size 1000]
+    python -m benchmarks.latency_scenarios --disconnect-rate 0.05 --seed 7
+
+Each action makes the same DatabaseOperations calls, in the same order,
+as the CustomerWindow / AgentWindow handler it is named after (the
+windows themselves need a display). The audit writer is disabled so
+only the round trips the user waits for are counted.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import config
+from benchmarks.dataset import synthetic_branches, synthetic_cars, synthetic_rentals, load_dataset
+from database import fake_driver, identity_map, local_backend
+from database.change_feed import ChangeFeedPoller
+from database.counters import FleetCounters
+from database.db_operations import DatabaseOperations
+
+CUSTOMER = 'customer1'
+AGENT = 'agent1'
+PASSWORD = 'password'
+
+
+class Session:
+    """State carried between the actions of one customer and one agent"""
+
+    def __init__(self):
+        self.customer_db = None
+        self.agent_db = None
+        self.change_feed = None
+        self.counters = FleetCounters()
+        self.available = []
+        self.rented_car = None
+        self.agent_cars = []
+
+
+def _home(db):
+    """CustomerWindow._display_home"""
+    if not db.get_overdue_cars(CUSTOMER):
+        db.get_customer_rented_cars(CUSTOMER)
+
+
+def _refresh(session):
+    """AgentWindow._refresh_changes without a local replica"""
+    changed_ids, deleted_ids = session.change_feed.poll()
+    if changed_ids or deleted_ids:
+        session.agent_db.get_cars_by_ids(changed_ids)
+        session.counters.load(session.agent_db)
+
+
+def customer_login(session):
+    """LoginWindow._authenticate, then CustomerWindow.__init__ on the same connection"""
+    db = DatabaseOperations()
+    db.connect()
+    session.customer_db = db
+    db.login_customer(CUSTOMER, PASSWORD)
+    _home(db)
+
+
+def customer_browse(session):
+    """CustomerWindow.rent_car"""
+    session.available = session.customer_db.get_available_cars()
+
+
+def customer_rent(session):
+    """CustomerWindow.finalize_rental for the first car in the rent list"""
+    if not session.available:
+        return
+    db = session.customer_db
+    car = session.available[0]
+    customer_id = db.get_customer_id(CUSTOMER)
+    tariff = db.get_car(car.car_id, fresh=True).tariff
+    today = time.strftime('%Y-%m-%d %H:%M:%S')
+    end = time.strftime('%Y-%m-%d', time.localtime(time.time() + 3 * 86400))
+    if db.create_rental(customer_id, car.car_id, today, end, tariff):
+        session.rented_car = car.car_id
+        _home(db)
+
+
+def customer_rent_any(session):
+    """CustomerWindow.finalize_rent_any"""
+    db = session.customer_db
+    customer_id = db.get_customer_id(CUSTOMER)
+    today = time.strftime('%Y-%m-%d %H:%M:%S')
+    end = time.strftime('%Y-%m-%d', time.localtime(time.time() + 3 * 86400))
+    if db.rent_by_criteria(customer_id, today, end, max_tariff=10000):
+        _home(db)
+
+
+def customer_return(session):
+    """CustomerWindow.return_car"""
+    if session.rented_car is not None and session.customer_db.return_car(session.rented_car):
+        _home(session.customer_db)
+
+
+def agent_login(session):
+    """LoginWindow._authenticate, then AgentWindow.__init__ on the same connection"""
+    db = DatabaseOperations()
+    db.connect()
+    session.agent_db = db
+    db.login_agent(AGENT, PASSWORD)
+    session.change_feed = ChangeFeedPoller(db)
+    session.agent_cars = [car.car_id for car in db.get_all_cars()]
+    session.counters.load(db)
+
+
+def agent_poll(session):
+    """AgentWindow._on_poll_timer"""
+    _refresh(session)
+
+
+def agent_update(session):
+    """AgentWindow.update_car"""
+    if session.agent_cars and session.agent_db.update_car(session.agent_cars[0], 'Tariff', 2600):
+        _refresh(session)
+
+
+def agent_return_selected(session):
+    """AgentWindow.return_selected with ten cars selected"""
+    if session.agent_db.return_cars(session.agent_cars[:10]):
+        _refresh(session)
+
+
+def agent_adjust_tariffs(session):
+    """AgentWindow.adjust_tariffs for one model"""
+    if session.agent_db.adjust_tariffs(percent=5, car_model='Civic') is not None:
+        _refresh(session)
+
+
+# (name, action, session attribute that must be set for the window to be open)
+ACTIONS = (
+    ("customer: login + home", customer_login, None),
+    ("customer: browse available", customer_browse, 'customer_db'),
+    ("customer: rent a car", customer_rent, 'customer_db'),
+    ("customer: rent any car", customer_rent_any, 'customer_db'),
+    ("customer: return car", customer_return, 'customer_db'),
+    ("agent: login + table", agent_login, None),
+    ("agent: poll tick", agent_poll, 'change_feed'),
+    ("agent: update car", agent_update, 'change_feed'),
+    ("agent: return 10 selected", agent_return_selected, 'change_feed'),
+    ("agent: adjust tariffs", agent_adjust_tariffs, 'change_feed'),
+)
+
+
+def run(driver):
+    """
+    Run every action once against the fake driver
+
+    Yields:
+        tuple: (action name, driver stats for the action, elapsed seconds, result)
+    """
+    session = Session()
+    try:
+        for name, action, needs in ACTIONS:
+            driver.reset_stats()
+            start = time.perf_counter()
+            try:
+                if needs and getattr(session, needs) is None:
+                    result = "skipped (login failed)"
+                else:
+                    action(session)
+                    result = "ok"
+            except Exception as e:
+                # DatabaseOperations handles most faults itself; anything
+                # that gets here would reach the Tk callback
+                result = f"raised {type(e).__name__}: {e}"
+            elapsed = time.perf_counter() - start
+            stats = driver.stats()
+            if stats['faults']:
+                result += " (" + ", ".join(f"{count} {kind}" for kind, count in stats['faults'].items()) + ")"
+            yield name, stats, elapsed, result
+    finally:
+        for db in (session.customer_db, session.agent_db):
+            if db is not None:
+                db.disconnect()
+
+
+def main():
+    """Load a dataset, run the actions and print one line per action"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--latency-ms', type=float, default=300, help='delay per round trip')
+    parser.add_argument('--jitter-ms', type=float, default=50, help='extra random delay per round trip')
+    parser.add_argument('--call-timeout-ms', type=float, default=None, help='fail calls slower than this')
+    parser.add_argument('--timeout-rate', type=float, default=0.0, help='probability a round trip times out')
+    parser.add_argument('--disconnect-rate', type=float, default=0.0, help='probability a round trip drops the connection')
+    parser.add_argument('--seed', type=int, default=None, help='random seed for repeatable faults')
+    parser.add_argument('--size', type=int, default=1000, help='number of cars')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'latency.db')
+        cars = synthetic_cars(args.size)
+        connection = local_backend.connect(path)
+        load_dataset(connection, cars, synthetic_rentals(cars, customer_count=100),
+                     customer_count=100, branches=synthetic_branches())
+        connection.close()
+
+        config.DB_BACKEND = 'fake'
+        config.LOCAL_DB_PATH = path
+        config.LOCAL_READ_REPLICA_PATH = None
+        config.AUDIT_ENABLED = False
+        driver = fake_driver.configure(
+            latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, call_timeout_ms=args.call_timeout_ms,
+            timeout_rate=args.timeout_rate, disconnect_rate=args.disconnect_rate, seed=args.seed
+        )
+
+        print(f"{args.size} cars, {args.latency_ms:.0f} ms + up to {args.jitter_ms:.0f} ms per round trip\n")
+        print(f"{'Action':<30} {'Trips':>5} {'exec':>5} {'fetch':>5} {'commit':>6} {'Time (ms)':>10}  Result")
+        total_trips = 0
+        failures = 0
+        for name, stats, elapsed, result in run(driver):
+            by_kind = stats['by_kind']
+            total_trips += stats['round_trips']
+            failures += result != "ok"
+            print(f"{name:<30} {stats['round_trips']:>5} {by_kind['execute']:>5} {by_kind['fetch']:>5} "
+                  f"{by_kind['commit'] + by_kind['rollback']:>6} {elapsed * 1000:>10.0f}  {result}")
+
+    print(f"\n{total_trips} round trips in {len(ACTIONS)} actions, {failures} with faults or errors")
+    entities = identity_map.get_map().stats()
+    if entities['hit_ratio'] is not None:
+        print(f"Identity map: {entities['hits']} hits, {entities['misses']} misses "
+              f"({entities['hit_ratio']:.0%}), {entities['evictions']} evictions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,457 @@
+"""
+Query plan regression check for Car Rental System
+Captures every statement DatabaseOperations issues, explains each one
+against a database loaded with the benchmark dataset, and compares the
+plans with stored baselines
+
+Fails (exit status 1) when
+    - a statement newly does a full table scan on a watched table
+    - the plan of a guarded method changes shape at all
+    - a DatabaseOperations method that runs SQL is not exercised here
+
+Usage:
+    python -m benchmarks.query_plans [--backend sqlite|oracle] [--size 20000] [--update]
+
+The statements are always captured by running the workload below against
+a throwaway local database. With --backend oracle they are then explained
+(EXPLAIN PLAN, nothing is executed) on the database in config.py, which
+should hold a representative dataset and fresh optimizer statistics.
+"""
+
+import argparse
+import contextlib
+import hashlib
+import inspect
+import io
+import json
+import os
+import re
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from benchmarks.dataset import synthetic_cars, synthetic_rentals, load_dataset
+from database import local_backend
+from database.db_operations import DatabaseOperations
+from database.identity_map import IdentityMap
+from database.waitlist import WaitlistQueue
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), 'plan_baselines')
+
+# A full scan of any of these is a regression unless the baseline has it
+WATCHED_TABLES = ('CARS', 'RENTALTRANSACTIONS', 'USERS', 'CUSTOMER', 'IDEMPOTENCYKEYS')
+
+# Methods whose join/subquery shapes must not change at all
+GUARDED_METHODS = ('get_customer_rented_cars', 'get_overdue_cars', 'create_rental')
+
+CUSTOMER_COUNT = 1000
+NEW_CAR_ID = 10 ** 9
+
+
+# ============ Capture ============
+
+class RecordingCursor:
+    """
+    Cursor wrapper that records every statement before running it
+    """
+
+    def __init__(self, cursor, recorder):
+        self._cursor = cursor
+        self._recorder = recorder
+
+    def execute(self, sql, params=None):
+        self._recorder.record(sql, params or {})
+        return self._cursor.execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        seq_of_params = list(seq_of_params)
+        if seq_of_params:
+            self._recorder.record(sql, seq_of_params[0])
+        return self._cursor.executemany(sql, seq_of_params)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        if name.startswith('_'):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._cursor, name, value)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+
+class RecordingConnection:
+    """
+    Connection wrapper whose cursors record statements into a recorder
+    """
+
+    def __init__(self, connection, recorder):
+        self._connection = connection
+        self._recorder = recorder
+
+    def cursor(self):
+        return RecordingCursor(self._connection.cursor(), self._recorder)
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+class Recorder:
+    """
+    Collects distinct statements, keyed by the public method that issued them
+    """
+
+    def __init__(self):
+        self.method = None
+        self.statements = {}
+
+    def record(self, sql, params):
+        normalized = normalize_sql(sql)
+        key = f"{self.method}:{hashlib.sha1(normalized.encode()).hexdigest()[:10]}"
+        if key not in self.statements:
+            self.statements[key] = {'method': self.method, 'sql': normalized, 'text': sql, 'params': params}
+
+
+def normalize_sql(sql):
+    """
+    Collapse whitespace and variable-length IN lists, so the same statement
+    always gets the same key
+
+    Args:
+        sql: Statement text
+
+    Returns:
+        str: Normalized statement
+    """
+    sql = ' '.join(sql.split())
+    return re.sub(r':([a-z_]+)\d+(?:, :\1\d+)*', r':\1*', sql)
+
+
+def _workload(db, cars, raw):
+    """
+    Call every DatabaseOperations method that runs SQL, covering its branches
+
+    Args:
+        db: DatabaseOperations on a recording connection
+        cars: Rows the database was loaded with
+        raw: Cursor that bypasses the recorder, for setting up preconditions
+
+    Yields:
+        tuple: (method name, zero-argument call)
+    """
+    available = [car.car_id for car in cars if car.status == 'Available']
+    rented = [car.car_id for car in cars if car.status == 'Rented']
+    models = {car.car_id: car.model for car in cars}
+    start = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    end = (datetime.now() + timedelta(days=3)).strftime('%Y-%m-%d')
+
+    # Users without a Customer row, for the "create it from Users" branches
+    orphans = (CUSTOMER_COUNT + 1, CUSTOMER_COUNT + 2)
+    for user_id in orphans:
+        raw.execute(
+            "INSERT INTO Users (USER_ID, USERNAME, PASSWORD) VALUES (:id, :name, 'password')",
+            {'id': user_id, 'name': f'orphan{user_id}'}
+        )
+
+    yield 'login_customer', lambda: db.login_customer('customer1', 'password')
+    yield 'register_customer', lambda: db.register_customer(CUSTOMER_COUNT + 10, 'plan_new', 'password')
+    yield 'get_customer_id', lambda: db.get_customer_id('customer1')
+    yield 'get_customer_id', lambda: db.get_customer_id(f'orphan{orphans[0]}')
+    yield 'get_customer_rented_cars', lambda: db.get_customer_rented_cars('customer1')
+    yield 'get_overdue_cars', lambda: db.get_overdue_cars('customer1')
+    yield 'get_overdue_rentals', db.get_overdue_rentals
+    yield 'login_agent', lambda: db.login_agent('agent1', 'password')
+    yield 'register_agent', lambda: db.register_agent(1, 'agent1', 'password')
+    yield 'get_available_cars', db.get_available_cars
+    yield 'get_all_cars', db.get_all_cars
+    yield 'get_cars_by_ids', lambda: db.get_cars_by_ids(available[:3])
+    yield 'get_all_car_details', db.get_all_car_details
+    yield 'get_car_details_by_ids', lambda: db.get_car_details_by_ids(available[:3])
+    yield 'get_car', lambda: db.get_car(available[0])
+    yield 'add_car', lambda: db.add_car(NEW_CAR_ID, 1, 'Civic', 2500, 2022, 'Standard')
+    for field, value in (('Tariff', 2600), ('Year', 2023), ('Terms', 'No smoking'),
+                         ('CarModel', 'Golf'), ('Availability', 'Available')):
+        yield 'update_car', lambda field=field, value=value: db.update_car(NEW_CAR_ID, field, value)
+    yield 'adjust_tariffs', lambda: db.adjust_tariffs(percent=5, car_model='Civic')
+    yield 'adjust_tariffs', lambda: db.adjust_tariffs(amount=-100, year=2020, agent_id=3)
+    yield 'adjust_tariffs', lambda: db.adjust_tariffs(percent=-2, car_ids=available[:3])
+    yield 'create_rental', lambda: db.create_rental(1, available[0], start, end, 2500)
+    yield 'create_rental', lambda: db.create_rental(orphans[1], available[1], start, end, 2500)
+    yield 'create_rental', lambda: db.create_rental(CUSTOMER_COUNT + 99, available[2], start, end, 2500)
+    yield 'create_rental', lambda: db.create_rental(1, NEW_CAR_ID + 1, start, end, 2500)
+    # The same key twice: claimed and recorded, then found already taken
+    for _ in range(2):
+        yield 'create_rental', lambda: db.create_rental(1, available[8], start, end, 2500, idempotency_key='plan-rent')
+    yield 'get_outcome', lambda: db.get_outcome('plan-rent')
+    yield 'rent_by_criteria', lambda: db.rent_by_criteria(1, start, end)
+    yield 'rent_by_criteria', lambda: db.rent_by_criteria(
+        1, start, end, car_model='Civic', min_year=2012, max_year=2024, max_tariff=9000)
+    yield 'rent_by_criteria', lambda: db.rent_by_criteria(1, start, end, car_model='Golf', branch_ids=[3, 1, 2])
+    yield 'get_branches', db.get_branches
+    yield 'add_branch', lambda: db.add_branch(NEW_CAR_ID, 'Plan Branch', 18.5, 73.8)
+    yield 'set_agent_branch', lambda: db.set_agent_branch(1, NEW_CAR_ID)
+    yield 'get_agent_branch', lambda: db.get_agent_branch(1)
+    yield 'get_available_cars_at_branches', lambda: db.get_available_cars_at_branches([1, 2, 3])
+    yield 'get_branches_with_available', db.get_branches_with_available
+    yield 'get_branches_with_available', lambda: db.get_branches_with_available('Civic')
+    # Two customers wait, so the returns below hand cars to the waitlist
+    yield 'join_waitlist', lambda: db.join_waitlist(1, models[rented[0]])
+    yield 'join_waitlist', lambda: db.join_waitlist(2, max_tariff=10000)
+    yield 'get_waiting_entries', db.get_waiting_entries
+    yield 'return_car', lambda: db.return_car(rented[0])
+    yield 'return_cars', lambda: db.return_cars(rented[1:4])
+    yield 'get_customer_waitlist', lambda: db.get_customer_waitlist(1)
+    yield 'rent_waitlist_offer', lambda: db.rent_waitlist_offer(1, 1, start, end)
+    yield 'join_waitlist', lambda: db.join_waitlist(3, 'Golf')
+    yield 'cancel_waitlist', lambda: db.cancel_waitlist(3, 3)
+    yield 'expire_waitlist_offers', lambda: db.expire_waitlist_offers(hold_minutes=-1)
+    yield 'generate_invoices', lambda: db.generate_invoices(start[:10], start[:10])
+    yield 'get_invoices', lambda: db.get_invoices(start[:10], start[:10])
+    yield 'update_car_availability', lambda: db.update_car_availability(available[3], 'Maintenance')
+    yield 'set_cars_availability', lambda: db.set_cars_availability(available[4:7], 'Maintenance')
+    yield 'get_open_rentals', db.get_open_rentals
+    yield 'get_open_rentals', lambda: db.get_open_rentals(rented[4:7])
+    yield 'get_latest_change_id', db.get_latest_change_id
+    yield 'get_changes_since', lambda: db.get_changes_since(0)
+    yield 'get_counters', db.get_counters
+    yield 'reconcile_counters', db.reconcile_counters
+    yield 'delete_car', lambda: db.delete_car(NEW_CAR_ID)
+    yield 'purge_idempotency_keys', lambda: db.purge_idempotency_keys(0)
+
+
+def _sql_methods():
+    """Names of the public DatabaseOperations methods that run SQL"""
+    return {
+        name for name, method in inspect.getmembers(DatabaseOperations, inspect.isfunction)
+        if not name.startswith('_') and '.execute' in inspect.getsource(method)
+    }
+
+
+def capture_statements(path, size):
+    """
+    Load the benchmark dataset into a local database and record the
+    statements DatabaseOperations issues against it
+
+    Args:
+        path: Local database file to create
+        size: Number of cars in the dataset
+
+    Returns:
+        tuple: (statements keyed by method:hash, set of methods exercised)
+    """
+    cars = synthetic_cars(size)
+    connection = local_backend.connect(path)
+    load_dataset(connection, cars, synthetic_rentals(cars, customer_count=CUSTOMER_COUNT),
+                 customer_count=CUSTOMER_COUNT)
+
+    recorder = Recorder()
+    db = DatabaseOperations()
+    db.connection = RecordingConnection(connection, recorder)
+    db.cursor = db.connection.cursor()
+    db.main_connection, db.main_cursor = db.connection, db.cursor
+    # The database doubles as an always-current read replica, so the
+    # routing checks are captured too; checking before every routed read
+    # keeps the captured statements the same from run to run
+    db.replica_connection = db.connection
+    db.replica_cursor = db.connection.cursor()
+    db.max_replica_lag = 3600
+    db.REPLICA_CHECK_SECONDS = -1
+    # A disabled identity map and outcome cache, so every lookup reaches the database
+    db.entities = IdentityMap(0)
+    db.outcomes = IdentityMap(0)
+    # A private waitlist queue that reloads before every use
+    db.waitlist = WaitlistQueue(refresh_seconds=0)
+    raw = connection.cursor()
+
+    exercised = set()
+    # The error branches print diagnostics; they are expected here
+    with contextlib.redirect_stdout(io.StringIO()):
+        for method, call in _workload(db, cars, raw):
+            recorder.method = method
+            call()
+            exercised.add(method)
+
+    # Planner statistics, as a production database would have
+    connection.raw.execute("ANALYZE")
+    return connection, recorder.statements, exercised
+
+
+# ============ Explain ============
+
+_ALIAS = re.compile(
+    r'\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(?!(?:WHERE|SET|INNER|LEFT|JOIN|ON|GROUP|ORDER|VALUES|SELECT)\b)(\w+))?',
+    re.IGNORECASE
+)
+
+
+def _table_aliases(sql):
+    """Map every table name and alias in a statement to its upper-case table name"""
+    aliases = {}
+    for table, alias in _ALIAS.findall(sql):
+        aliases[table.upper()] = table.upper()
+        if alias:
+            aliases[alias.upper()] = table.upper()
+    return aliases
+
+
+def explain_sqlite(connection, statement):
+    """
+    Explain a statement on the local backend
+
+    Args:
+        connection: LocalConnection
+        statement: Recorded statement
+
+    Returns:
+        tuple: (plan lines, sorted watched tables that are fully scanned)
+    """
+    rows = connection.raw.execute(
+        "EXPLAIN QUERY PLAN " + local_backend.translate(statement['text']), statement['params']
+    ).fetchall()
+    aliases = _table_aliases(statement['sql'])
+    depth = {0: -1}
+    plan, scans = [], set()
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        plan.append('  ' * depth[node_id] + detail)
+        match = re.match(r'SCAN (?:TABLE )?(\w+)', detail)
+        if match:
+            table = aliases.get(match.group(1).upper(), match.group(1).upper())
+            if table in WATCHED_TABLES:
+                scans.add(table)
+    return plan, sorted(scans)
+
+
+def explain_oracle(connection, statement, statement_id):
+    """
+    Explain a statement with EXPLAIN PLAN (nothing is executed)
+
+    Args:
+        connection: oracledb connection
+        statement: Recorded statement
+        statement_id: PLAN_TABLE statement ID to use
+
+    Returns:
+        tuple: (plan lines, sorted watched tables that are fully scanned)
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"EXPLAIN PLAN SET STATEMENT_ID = '{statement_id}' FOR {statement['text']}")
+        cursor.execute("""
+            SELECT DEPTH, OPERATION, OPTIONS, OBJECT_NAME FROM PLAN_TABLE
+            WHERE STATEMENT_ID = :statement_id
+            ORDER BY ID
+        """, {'statement_id': statement_id})
+        plan, scans = [], set()
+        for depth, operation, options, object_name in cursor.fetchall():
+            plan.append('  ' * depth + ' '.join(filter(None, (operation, options, object_name))))
+            if operation == 'TABLE ACCESS' and options == 'FULL' and object_name in WATCHED_TABLES:
+                scans.add(object_name)
+        return plan, sorted(scans)
+    finally:
+        connection.rollback()
+        cursor.close()
+
+
+# ============ Compare ============
+
+def compare(statements, baseline):
+    """
+    Compare explained statements with a baseline
+
+    Args:
+        statements: Explained statements keyed by method:hash
+        baseline: Baseline statements keyed the same way
+
+    Returns:
+        list: Failure messages
+    """
+    failures = []
+    for key, statement in sorted(statements.items()):
+        expected = baseline.get(key)
+        known_scans = set(expected['full_scans']) if expected else set()
+        new_scans = set(statement['full_scans']) - known_scans
+        if new_scans:
+            failures.append(
+                f"{key}: new full scan of {', '.join(sorted(new_scans))}\n"
+                f"    {statement['sql']}\n" + '\n'.join('    | ' + line for line in statement['plan'])
+            )
+        elif statement['method'] in GUARDED_METHODS and (not expected or expected['plan'] != statement['plan']):
+            failures.append(
+                f"{key}: plan of guarded method changed\n"
+                f"    {statement['sql']}\n"
+                + '\n'.join('    - ' + line for line in (expected['plan'] if expected else []))
+                + '\n' + '\n'.join('    + ' + line for line in statement['plan'])
+            )
+    return failures
+
+
+def main(argv=None):
+    """Capture, explain and compare; print a report"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--backend', choices=('sqlite', 'oracle'), default='sqlite')
+    parser.add_argument('--size', type=int, default=20000, help='cars in the benchmark dataset')
+    parser.add_argument('--update', action='store_true', help='accept the current plans as the baseline')
+    args = parser.parse_args(argv)
+
+    baseline_path = os.path.join(BASELINE_DIR, f'{args.backend}.json')
+    with tempfile.TemporaryDirectory() as directory:
+        local, statements, exercised = capture_statements(os.path.join(directory, 'plans.db'), args.size)
+        try:
+            if args.backend == 'oracle':
+                from database.db_connection import get_connection, close_connection
+                oracle = get_connection()
+                try:
+                    for n, statement in enumerate(statements.values()):
+                        statement['plan'], statement['full_scans'] = \
+                            explain_oracle(oracle, statement, f'carrental_{n}')
+                finally:
+                    close_connection(oracle)
+            else:
+                for statement in statements.values():
+                    statement['plan'], statement['full_scans'] = explain_sqlite(local, statement)
+        finally:
+            local.close()
+
+    for statement in statements.values():
+        del statement['text'], statement['params']
+
+    print(f"{'statement':<40} {'plan lines':>10}  full scans")
+    for key, statement in sorted(statements.items()):
+        print(f"{key:<40} {len(statement['plan']):>10}  {', '.join(statement['full_scans']) or '-'}")
+
+    failures = [
+        f"{method}: runs SQL but is not exercised by benchmarks/query_plans.py"
+        for method in sorted(_sql_methods() - exercised)
+    ]
+
+    if args.update:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(baseline_path, 'w') as f:
+            json.dump(statements, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"\nBaseline written to {baseline_path}")
+    else:
+        try:
+            with open(baseline_path) as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            print(f"\nNo baseline at {baseline_path}; run with --update first", file=sys.stderr)
+            return 2
+        failures += compare(statements, baseline)
+        stale = sorted(set(baseline) - set(statements))
+        if stale:
+            print(f"\n{len(stale)} baseline statement(s) no longer issued: {', '.join(stale)}")
+
+    if failures:
+        print(f"\n{len(failures)} plan regression(s):", file=sys.stderr)
+        for failure in failures:
+            print(f"\n{failure}", file=sys.stderr)
+        return 1
+    print("\nAll plans match the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
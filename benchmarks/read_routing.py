@@ -0,0 +1,118 @@
+"""
+Read/write routing check for Car Rental System
+Uses two local database files as primary and read replica and checks
+which one serves each read as the replica falls behind and catches up
+
+Usage:
+    python -m benchmarks.read_routing
+
+"Replication" is a file copy made with the SQLite backup API, so the
+replica only changes when the check says so.
+"""
+
+import os
+import sys
+import tempfile
+import time
+import config
+from benchmarks.dataset import synthetic_cars, synthetic_rentals, load_dataset
+from database import local_backend
+from database.db_operations import DatabaseOperations
+
+
+def replicate(primary_path, replica_path):
+    """Copy the primary database over the replica"""
+    source = local_backend.connect(primary_path)
+    target = local_backend.connect(replica_path)
+    try:
+        source.raw.backup(target.raw)
+    finally:
+        source.close()
+        target.close()
+
+
+def _session(max_lag):
+    """Open a DatabaseOperations that re-checks the replica on every read"""
+    config.READ_REPLICA_MAX_LAG_SECONDS = max_lag
+    db = DatabaseOperations()
+    db.REPLICA_CHECK_SECONDS = -1
+    db.connect()
+    return db
+
+
+def _served_by(db):
+    """Which database the next routed read goes to"""
+    return 'replica' if db._read_cursor() is db.replica_cursor else 'primary'
+
+
+def run_checks(primary_path, replica_path):
+    """
+    Run the routing scenarios
+
+    Yields:
+        tuple: (description, expected result, actual result)
+    """
+    cars = synthetic_cars(200)
+    connection = local_backend.connect(primary_path)
+    load_dataset(connection, cars, synthetic_rentals(cars, customer_count=20), customer_count=20)
+    connection.close()
+    replicate(primary_path, replica_path)
+
+    db = _session(max_lag=None)
+    other = _session(max_lag=None)
+    try:
+        yield "fresh replica serves browsing", 'replica', _served_by(db)
+
+        db.add_car(5001, 1, 'Civic', 2500, 2022, 'Standard')
+        yield "own write pins reads to the primary", 'primary', _served_by(db)
+        yield "own write is visible", True, any(car.car_id == 5001 for car in db.get_all_cars())
+        yield "other sessions keep using the replica", 'replica', _served_by(other)
+
+        replicate(primary_path, replica_path)
+        yield "caught-up replica serves the writer again", 'replica', _served_by(db)
+
+        other.add_car(5002, 1, 'Golf', 2700, 2023, 'Standard')
+        time.sleep(1.1)
+        db.max_replica_lag = None
+        yield "unbounded staleness allows a lagging replica", 'replica', _served_by(db)
+        db.max_replica_lag = 60
+        yield "lag within the bound allows the replica", 'replica', _served_by(db)
+        db.max_replica_lag = 1
+        yield "lag beyond the bound falls back to the primary", 'primary', _served_by(db)
+        db.max_replica_lag = None
+        yield "browsing reads the lagging replica", False, any(car.car_id == 5002 for car in db.get_all_cars())
+        yield "targeted lookups of changed cars read the primary", 1, len(db.get_car_details_by_ids([5002]))
+        yield "change-log high-water mark comes from the replica", True, \
+            db.get_latest_change_id() < other.cursor.execute(
+                "SELECT MAX(CHANGE_ID) FROM CarChangeLog").fetchone()[0]
+
+        db.replica_connection.close()
+        yield "broken replica falls back to the primary", 'primary', _served_by(db)
+        yield "broken replica connection is reopened", 'replica', _served_by(db)
+        yield "reads still work (from the lagging replica)", 201, len(db.get_all_cars())
+    finally:
+        other.disconnect()
+        db.disconnect()
+
+
+def main():
+    """Run the checks and print one line per scenario"""
+    failures = 0
+    with tempfile.TemporaryDirectory() as directory:
+        primary_path = os.path.join(directory, 'primary.db')
+        replica_path = os.path.join(directory, 'replica.db')
+        config.DB_BACKEND = 'sqlite'
+        config.LOCAL_DB_PATH = primary_path
+        config.LOCAL_READ_REPLICA_PATH = replica_path
+
+        for description, expected, actual in run_checks(primary_path, replica_path):
+            ok = expected == actual
+            failures += not ok
+            print(f"{'ok  ' if ok else 'FAIL'} {description}" + ('' if ok else f" (expected {expected}, got {actual})"))
+
+    print(f"\n{failures} failure(s)" if failures else "\nAll routing checks passed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
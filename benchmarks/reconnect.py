@@ -0,0 +1,159 @@
+"""
+Reconnect check for Car Rental System
+Runs a session through the fault-injecting fake driver, drops its
+connection in the ways a WAN link to Oracle does and checks that it
+recovers on its own: how long it takes, what is retried and what is not
+
+Usage:
+    python -m benchmarks.reconnect [--latency-ms 5] [--disconnect-rate 0.02]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import config
+from benchmarks.dataset import synthetic_cars, synthetic_rentals, load_dataset
+from database import fake_driver, local_backend
+from database.db_operations import DatabaseOperations
+from database.reconnect import get_metrics
+
+# Longest a terminal may take to get going again after its session drops
+RECOVERY_SECONDS = 1.0
+
+
+def timed(call):
+    """Run a call, returning (result, seconds)"""
+    start = time.perf_counter()
+    result = call()
+    return result, time.perf_counter() - start
+
+
+def run_checks(driver, car_count, disconnect_rate):
+    """
+    Run the reconnect scenarios
+
+    Yields:
+        tuple: (description, expected result, actual result)
+    """
+    metrics = get_metrics()
+    db = DatabaseOperations()
+    db.connect()
+    try:
+        driver.drop_connections()
+        cars, seconds = timed(db.get_all_cars)
+        yield "read after an idle timeout succeeds", car_count, len(cars)
+        yield f"... within {RECOVERY_SECONDS:.0f} s", True, seconds < RECOVERY_SECONDS
+
+        driver.outage(0.3)
+        cars, seconds = timed(db.get_available_cars)
+        yield "read through a 300 ms outage succeeds", True, len(cars) > 0
+        yield f"... within {RECOVERY_SECONDS:.0f} s", True, seconds < RECOVERY_SECONDS
+
+        metrics.reset()
+        driver.drop_connections()
+        car = cars[0]
+        yield "write after a drop runs once on a new connection", True, \
+            db.update_car_availability(car.car_id, 'Rented')
+        yield "... reconnected once, nothing retried", (1, 0), \
+            (metrics.stats().get('reconnects', 0), metrics.stats().get('retries', 0))
+
+        # The session drops during the write: a rental is not idempotent, so
+        # the caller sees the failure instead of a silent second attempt
+        metrics.reset()
+        rentals_before = db.get_open_rentals()
+        db.cursor.execute = _dropping(db, db.cursor.execute)
+        result = db.rent_by_criteria(1, '2030-01-01 10:00:00', '2030-01-05')
+        yield "rental interrupted by a drop fails instead of repeating", None, result
+        yield "... and is not retried", 0, metrics.stats().get('retries', 0)
+        yield "... leaving no rental behind", len(rentals_before), len(db.get_open_rentals())
+        yield "next call works again", True, len(db.get_all_cars()) == car_count
+
+        # Streaming reads run their SQL as they are iterated, not when called
+        metrics.reset()
+        rows = db.iter_all_cars(batch_size=50)
+        driver.drop_connections()
+        yield "stream dropped before its first row is retried", car_count, sum(1 for _ in rows)
+        yield "... once", 1, metrics.stats().get('retries', 0)
+
+        metrics.reset()
+        rows = db.iter_all_cars(batch_size=50)
+        seen = [next(rows) for _ in range(60)]
+        driver.drop_connections()
+        failed = False
+        try:
+            seen.extend(rows)  # the rows already fetched, then the error
+        except fake_driver.InjectedFault:
+            failed = True
+        yield "stream dropped after its first rows fails instead of repeating them", (True, len(seen)), \
+            (failed, len({car.car_id for car in seen}))
+        yield "... and the next call reconnects", (True, 1), \
+            (len(db.get_all_cars()) == car_count, metrics.stats().get('reconnects', 0))
+
+        metrics.reset()
+        db.health_check_seconds = 0
+        time.sleep(0.01)
+        db.get_counters()
+        db.health_check_seconds = getattr(config, 'HEALTH_CHECK_IDLE_SECONDS', 30)
+        yield "idle connection is pinged before use", 1, metrics.stats().get('health_checks', 0)
+
+        metrics.reset()
+        driver.disconnect_rate = disconnect_rate
+        failures = 0
+        for _ in range(200):
+            try:
+                if len(db.get_all_cars()) != car_count:
+                    failures += 1
+            except fake_driver.InjectedFault:
+                failures += 1
+        driver.disconnect_rate = 0.0
+        stats = metrics.stats()
+        yield f"200 reads at {disconnect_rate:.0%} drops per round trip all succeed", 0, failures
+        print(f"     connection metrics: {stats}")
+    finally:
+        db.disconnect()
+
+
+def _dropping(db, execute):
+    """Wrap a cursor's execute so the connection drops at the first INSERT"""
+    def wrapper(sql, params=None):
+        if sql.lstrip().upper().startswith('INSERT'):
+            db.connection.drop()
+        return execute(sql, params)
+    return wrapper
+
+
+def main():
+    """Run the checks and print one line per scenario"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--latency-ms', type=float, default=5, help='delay per database round trip')
+    parser.add_argument('--disconnect-rate', type=float, default=0.02,
+                        help='probability per round trip of a dropped connection in the last scenario')
+    args = parser.parse_args()
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'reconnect.db')
+        cars = synthetic_cars(300)
+        connection = local_backend.connect(path)
+        load_dataset(connection, cars, synthetic_rentals(cars, customer_count=20), customer_count=20)
+        connection.close()
+
+        config.DB_BACKEND = 'fake'
+        config.LOCAL_DB_PATH = path
+        config.LOCAL_READ_REPLICA_PATH = None
+        config.AUDIT_ENABLED = False
+        driver = fake_driver.configure(latency_ms=args.latency_ms, seed=7)
+
+        for description, expected, actual in run_checks(driver, len(cars), args.disconnect_rate):
+            ok = expected == actual
+            failures += not ok
+            print(f"{'ok  ' if ok else 'FAIL'} {description}" + ('' if ok else f" (expected {expected}, got {actual})"))
+
+    print(f"\n{failures} failure(s)" if failures else "\nAll reconnect checks passed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""
+Row memory benchmark for Car Rental System
+Memory held per car by a whole-fleet load as plain driver tuples, as Car
+records and as a CarColumns container
+
+Usage:
+    python -m benchmarks.row_memory [--size 200000]
+
+Each figure is the memory still allocated once the load has finished
+(the loaded rows kept alive), divided by the number of cars.
+"""
+
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import config
+from benchmarks.dataset import synthetic_cars, load_dataset
+from database import local_backend
+from database.db_operations import DatabaseOperations
+from database.records import Car
+
+
+def measure(load):
+    """
+    Run a load and keep its result alive while measuring
+
+    Args:
+        load: Zero-argument call returning the loaded cars
+
+    Returns:
+        tuple: (cars, bytes held, seconds)
+    """
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    fleet = load()
+    elapsed = time.perf_counter() - start
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(fleet), held, elapsed
+
+
+def main():
+    """Load a fleet three ways and print the memory per car"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=200000, help='number of cars')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'rows.db')
+        connection = local_backend.connect(path)
+        load_dataset(connection, synthetic_cars(args.size), [], customer_count=0)
+        connection.close()
+
+        config.DB_BACKEND = 'sqlite'
+        config.LOCAL_DB_PATH = path
+        config.LOCAL_READ_REPLICA_PATH = None
+        db = DatabaseOperations()
+        db.connect()
+        try:
+            def plain_tuples():
+                cursor = db.connection.cursor()
+                cursor.execute(f"SELECT {Car.COLUMNS} FROM Cars")
+                return cursor.fetchall()
+
+            loads = (
+                ("driver tuples", plain_tuples),
+                ("Car records", db.get_all_car_details),
+                ("CarColumns", db.load_car_columns),
+            )
+            print(f"{args.size} cars\n")
+            print(f"{'Load':<15} {'Cars':>8} {'Held (MiB)':>11} {'Bytes/car':>10} {'Time (ms)':>10}")
+            for name, load in loads:
+                count, held, elapsed = measure(load)
+                print(f"{name:<15} {count:>8} {held / 2 ** 20:>11.1f} {held / count:>10.0f} {elapsed * 1000:>10.0f}")
+        finally:
+            db.disconnect()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
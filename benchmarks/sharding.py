@@ -0,0 +1,160 @@
+"""
+Sharding check for Car Rental System
+Splits a synthetic fleet over a main database and two branch shards (local
+database files) and checks where each read and write goes: a branch
+terminal sees only its shard, head office sees every shard merged, and
+writes land on the shard of their car's branch
+
+Usage:
+    python -m benchmarks.sharding [--size 3000]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+from collections import Counter
+from datetime import datetime, timedelta
+import config
+from benchmarks.dataset import synthetic_branches, synthetic_cars, synthetic_rentals, load_dataset
+from database import local_backend
+from database.sharding import MAIN, ShardMap, ShardedChangeFeed, ShardedOperations, create_operations
+
+SHARDS = {'north': [1, 2], 'south': [3, 4]}
+# Branches 5 and 6 are in no shard and stay in the main database
+BRANCH_COUNT = 6
+CUSTOMERS = 20
+
+
+def build_databases(directory, size):
+    """
+    Write the main and shard databases, each with its branches' cars and rentals
+
+    Returns:
+        tuple: (cars, rentals) across every database
+    """
+    shard_map = ShardMap({name: {'branches': branches} for name, branches in SHARDS.items()})
+    cars = synthetic_cars(size, branch_count=BRANCH_COUNT)
+    rentals = synthetic_rentals(cars, customer_count=CUSTOMERS)
+    branch_of = {car.car_id: car.branch_id for car in cars}
+    for name in shard_map.names():
+        path = os.path.join(directory, f"{name or 'main'}.db")
+        connection = local_backend.connect(path)
+        # Users, customers and branches only exist in the main database
+        load_dataset(
+            connection,
+            [car for car in cars if shard_map.shard_for(car.branch_id) == name],
+            [rental for rental in rentals if shard_map.shard_for(branch_of[rental.car_id]) == name],
+            customer_count=CUSTOMERS if name is MAIN else 0,
+            branches=synthetic_branches(BRANCH_COUNT) if name is MAIN else [],
+        )
+        connection.close()
+    config.LOCAL_DB_PATH = os.path.join(directory, 'main.db')
+    config.SHARDS = {
+        name: {'branches': branches, 'path': os.path.join(directory, f'{name}.db')}
+        for name, branches in SHARDS.items()
+    }
+    return cars, rentals
+
+
+def rental_branches(path, car_id):
+    """Branch IDs of a car's pending rentals in one database file (read directly)"""
+    connection = local_backend.connect(path)
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SELECT BRANCH_ID FROM RentalTransactions WHERE CARID = :1 AND RENTALSTATUS = 'Pending'",
+                       [car_id])
+        return [row[0] for row in cursor.fetchall()]
+    finally:
+        connection.close()
+
+
+def run_checks(cars, rentals):
+    """
+    Run the routing scenarios
+
+    Yields:
+        tuple: (description, expected result, actual result)
+    """
+    now = datetime.now()
+    branch_of = {car.car_id: car.branch_id for car in cars}
+    north_cars = sorted(car.car_id for car in cars if car.branch_id in SHARDS['north'])
+
+    terminal = create_operations(branch_id=1)
+    terminal.connect()
+    head_office = create_operations()
+    head_office.connect()
+    try:
+        yield "branch terminal is bound to its shard", 'north', terminal.shard
+        yield "... and lists only that shard's cars", north_cars, sorted(car.car_id for car in terminal.get_all_cars())
+        customer = terminal.login_customer('customer1', 'password')
+        yield "... logs customers in against the main database", True, customer is not None
+        overdue = terminal.get_overdue_rentals()
+        yield "... names the customers of its overdue rentals", True, \
+            bool(overdue) and all(row[2] is not None for row in overdue)
+
+        yield "head office fans out to every database", True, isinstance(head_office, ShardedOperations)
+        yield "... and lists every car", len(cars), len(head_office.get_all_cars())
+        overdue = head_office.get_overdue_rentals()
+        yield "... merges overdue rentals, oldest first", \
+            sum(rental.end_date < now for rental in rentals), len(overdue)
+        yield "... keeping their order", sorted(row[5] for row in overdue), [row[5] for row in overdue]
+        yield "... sums the fleet counters", True, head_office.reconcile_counters()
+        counters = dict(head_office.get_counters())
+        statuses = Counter(car.status for car in cars)
+        yield "... to the whole fleet", (statuses['Available'], statuses['Rented']), \
+            (counters.get('status.Available'), counters.get('status.Rented'))
+
+        new_id = max(branch_of) + 1
+        head_office.add_car(new_id, 1, 'Civic', 5000, 2024, 'Standard', branch_id=3)
+        yield "added car lands on its branch's shard", (None, None, True), tuple(
+            head_office.shards[name].get_car(new_id) is not None or None for name in (MAIN, 'north', 'south'))
+
+        # Forget every car, so the shard holding one has to be looked up
+        for db in head_office.shards.values():
+            db.entities.clear()
+        car = next(car for car in cars if car.branch_id == 2 and car.status == 'Available')
+        feed = ShardedChangeFeed(head_office)
+        feed.prime()
+        start = now.strftime('%Y-%m-%d %H:%M:%S')
+        end = (now + timedelta(days=3)).strftime('%Y-%m-%d')
+        yield "rental of an unknown car is routed to its shard", True, \
+            head_office.create_rental(1, car.car_id, start, end, car.tariff * 3)
+        yield "... and carries the car's branch", [2], rental_branches(config.SHARDS['north']['path'], car.car_id)
+        yield "... which the terminal of that shard sees", True, \
+            any(rental.car_id == car.car_id for rental in terminal.get_open_rentals([car.car_id]))
+        yield "change feed across shards reports it", True, car.car_id in feed.poll()[0]
+        yield "return is routed the same way", True, head_office.return_car(car.car_id)
+        yield "... and bills the rental", True, car.car_id in head_office.last_charges
+
+        rented = head_office.rent_by_criteria(2, start, end, branch_ids=[4, 5])
+        yield "rent by criteria takes the preferred branch first", 4, rented and branch_of.get(rented[0])
+    finally:
+        terminal.disconnect()
+        head_office.disconnect()
+
+
+def main():
+    """Run the checks and print one line per scenario"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=3000, help='number of cars across every database')
+    args = parser.parse_args()
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as directory:
+        config.DB_BACKEND = 'sqlite'
+        config.LOCAL_READ_REPLICA_PATH = None
+        config.AUDIT_ENABLED = False
+        cars, rentals = build_databases(directory, args.size)
+
+        for description, expected, actual in run_checks(cars, rentals):
+            ok = expected == actual
+            failures += not ok
+            print(f"{'ok  ' if ok else 'FAIL'} {description}" + ('' if ok else f" (expected {expected}, got {actual})"))
+
+    print(f"\n{failures} failure(s)" if failures else "\nAll sharding checks passed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
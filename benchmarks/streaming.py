@@ -0,0 +1,92 @@
+"""
+Streaming read benchmark for Car Rental System
+Compares the list reads (get_*) with their streaming variants (iter_*) on
+a large fleet: time to the first row, total time, fetch round trips and
+peak Python memory while the rows are consumed
+
+Usage:
+    python -m benchmarks.streaming [--size 200000] [--batch-size 500]
+
+Rows are consumed one at a time and dropped, as an export or a table
+fill would, so the streaming peak should stay near one fetch batch.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import config
+from benchmarks.dataset import synthetic_cars, load_dataset
+from database import fake_driver, local_backend
+from database.db_operations import DatabaseOperations
+
+
+def measure(driver, read):
+    """
+    Consume every row of a read
+
+    Args:
+        driver: FakeDriver, for counting fetch round trips
+        read: Zero-argument call returning an iterable of rows
+
+    Returns:
+        tuple: (rows, seconds to first row, total seconds, fetch trips, peak bytes)
+    """
+    driver.reset_stats()
+    tracemalloc.start()
+    start = time.perf_counter()
+    first = None
+    count = 0
+    for _ in read():
+        if first is None:
+            first = time.perf_counter() - start
+        count += 1
+    total = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return count, first or total, total, driver.stats()['by_kind']['fetch'], peak
+
+
+def main():
+    """Load a fleet and print one line per read"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=200000, help='number of cars')
+    parser.add_argument('--batch-size', type=int, default=500, help='rows per fetch for the iter_* reads')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'streaming.db')
+        connection = local_backend.connect(path)
+        load_dataset(connection, synthetic_cars(args.size), [], customer_count=0)
+        connection.close()
+
+        config.DB_BACKEND = 'fake'
+        config.LOCAL_DB_PATH = path
+        config.LOCAL_READ_REPLICA_PATH = None
+        config.AUDIT_ENABLED = False
+        driver = fake_driver.configure()
+        db = DatabaseOperations()
+        db.stream_batch_size = args.batch_size
+        db.connect()
+        try:
+            reads = (
+                ("get_all_car_details", db.get_all_car_details),
+                ("iter_all_car_details", db.iter_all_car_details),
+                ("get_available_cars", db.get_available_cars),
+                ("iter_available_cars", db.iter_available_cars),
+            )
+            print(f"{args.size} cars, batch size {args.batch_size}\n")
+            print(f"{'Read':<22} {'Rows':>8} {'First row (ms)':>15} {'Total (ms)':>11} {'Fetches':>8} {'Peak (KiB)':>11}")
+            for name, read in reads:
+                count, first, total, fetches, peak = measure(driver, read)
+                print(f"{name:<22} {count:>8} {first * 1000:>15.1f} {total * 1000:>11.0f} "
+                      f"{fetches:>8} {peak / 1024:>11.0f}")
+        finally:
+            db.disconnect()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+UI rendering benchmark for Car Rental System
+Renders the agent table, customer home and rent list with synthetic data
+and reports how long each blocks the Tk loop
+
+Usage:
+    python -m benchmarks.ui_render_bench [--sizes 10,1000,100000]
+
+Needs a display; on a server run it under xvfb-run. Windows stay
+withdrawn, so timings cover widget creation and layout.
+"""
+
+import argparse
+import sys
+import time
+import tkinter as tk
+from benchmarks.dataset import synthetic_cars, synthetic_rentals, SyntheticDatabase
+
+
+def _timed(root, action):
+    """
+    Run an action, then flush pending layout work
+
+    Returns:
+        tuple: (action seconds, layout seconds)
+    """
+    start = time.perf_counter()
+    action()
+    built = time.perf_counter()
+    root.update_idletasks()
+    return built - start, time.perf_counter() - built
+
+
+def bench_agent_table(root, size):
+    """Time AgentWindow._display_all_cars for a fleet of the given size"""
+    from ui.agent_window import AgentWindow
+    db = SyntheticDatabase(synthetic_cars(size))
+    frame = tk.Frame(root)
+    window = AgentWindow(frame, agent_id=1, db=db)
+    try:
+        return _timed(root, window._display_all_cars)
+    finally:
+        window.cleanup()
+        frame.destroy()
+
+
+def bench_customer_home(root, size):
+    """Time CustomerWindow._display_home for a customer with the given number of rentals"""
+    from ui.customer_window import CustomerWindow
+    cars = synthetic_cars(size, rented_fraction=1.0)
+    db = SyntheticDatabase(cars, synthetic_rentals(cars, overdue_fraction=0))
+    frame = tk.Frame(root)
+    window = CustomerWindow(frame, 'benchmark', db=db)
+
+    def redisplay():
+        for widget in frame.winfo_children():
+            widget.destroy()
+        window._display_home()
+
+    try:
+        return _timed(root, redisplay)
+    finally:
+        window.cleanup()
+        frame.destroy()
+
+
+def bench_rent_list(root, size):
+    """Time CustomerWindow.rent_car for the given number of available cars"""
+    from ui.customer_window import CustomerWindow
+    db = SyntheticDatabase(synthetic_cars(size, rented_fraction=0.0))
+    frame = tk.Frame(root)
+    window = CustomerWindow(frame, 'benchmark', db=db)
+    try:
+        return _timed(root, window.rent_car)
+    finally:
+        window.cleanup()
+        frame.destroy()
+
+
+BENCHMARKS = (
+    ('AgentWindow._display_all_cars', bench_agent_table),
+    ('CustomerWindow._display_home', bench_customer_home),
+    ('CustomerWindow.rent_car', bench_rent_list),
+)
+
+
+def main(argv=None):
+    """Run the benchmarks and print a results table"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='10,1000,100000', help='comma-separated row counts')
+    args = parser.parse_args(argv)
+    sizes = [int(size) for size in args.sizes.split(',')]
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        print(f"Cannot open a display ({e}); run under xvfb-run", file=sys.stderr)
+        return 2
+    root.withdraw()
+
+    print(f"{'view':<34} {'rows':>8} {'handler ms':>12} {'layout ms':>10}")
+    for name, bench in BENCHMARKS:
+        for size in sizes:
+            handler, layout = bench(root, size)
+            print(f"{name:<34} {size:>8} {handler * 1000:>12.1f} {layout * 1000:>10.1f}")
+            sys.stdout.flush()
+
+    root.destroy()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
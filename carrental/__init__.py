@@ -0,0 +1,4 @@
+"""
+Command-line interface for Car Rental System
+Run with `python -m carrental --help`; nothing here imports Tk
+"""
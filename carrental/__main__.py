@@ -0,0 +1,8 @@
+"""
+Entry point for `python -m carrental`
+"""
+
+import sys
+from carrental.cli import main
+
+sys.exit(main())
@@ -0,0 +1,480 @@
+"""
+Headless command-line interface for Car Rental System
+Calls DatabaseOperations directly for batch jobs and cron
+
+Usage:
+    python -m carrental <command> [options]
+
+Commands:
+    cars             List cars (all, available, or at given branches)
+    import-cars      Add cars from JSON Lines or CSV input
+    set-tariffs      Set tariffs from input rows with car_id and tariff
+    adjust-tariffs   Change tariffs by a percentage or amount in one statement
+    return-cars      Return cars named on the command line or in the input
+    overdue          List overdue rentals (nightly sweep) and refresh counters
+    counters         Print the fleet counters
+    export-snapshot  Write a fleet snapshot file
+    expire-offers    Pass on cars held for waitlist offers nobody took up
+    invoices         Invoice the rentals returned in a period (default yesterday)
+    scheduler        Run the maintenance jobs on their schedules until stopped
+
+Input and output are streamed one record at a time, as JSON Lines
+(default) or CSV with a header row; "-" means stdin/stdout.
+
+import-cars records and return-cars runs can carry an idempotency key, so
+a run repeated after a failure skips what the first one already did.
+
+Exit codes:
+    0  success
+    1  some input rows failed (the rest were applied)
+    2  usage error
+    3  database unavailable or a database error
+    4  alert condition (e.g. overdue --fail-if-any found rentals)
+"""
+
+import argparse
+import contextlib
+import csv
+import getpass
+import json
+import signal
+import sys
+import threading
+from datetime import date, datetime, timedelta
+
+EXIT_OK = 0
+EXIT_PARTIAL = 1
+EXIT_USAGE = 2
+EXIT_DATABASE = 3
+EXIT_ALERT = 4
+
+CAR_COLUMNS = ('car_id', 'agent_id', 'model', 'tariff', 'odamount', 'year', 'terms', 'status', 'branch_id')
+OVERDUE_COLUMNS = ('transaction_id', 'customer_id', 'customer', 'car_id', 'model', 'end_date', 'total_cost')
+INVOICE_SUMMARY_COLUMNS = ('invoices', 'late', 'late_fees', 'total')
+INVOICE_COLUMNS = ('invoice_id', 'transaction_id', 'customer_id', 'car_id', 'returned_at',
+                   'billed_days', 'late_days', 'base_cost', 'late_fee', 'total')
+SCHEDULER_COLUMNS = ('name', 'runs', 'failures', 'skipped', 'avg_ms', 'max_ms', 'last_error')
+
+# Rows per return_cars call when returning from an input stream
+RETURN_BATCH_SIZE = 500
+
+
+# ============ Record I/O ============
+
+def _open_input(path):
+    """Open an input path, "-" meaning stdin"""
+    return sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+
+
+def read_records(path, fmt):
+    """
+    Stream records from JSON Lines or CSV input
+
+    Args:
+        path: File path or "-" for stdin
+        fmt: 'json' or 'csv'
+
+    Yields:
+        tuple: (line number, dict) for every record; dict is None for a malformed line
+    """
+    stream = _open_input(path)
+    try:
+        if fmt == 'csv':
+            reader = csv.DictReader(stream)
+            for record in reader:
+                yield reader.line_num, record
+        else:
+            for line_number, line in enumerate(stream, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                yield line_number, record if isinstance(record, dict) else None
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+class RecordWriter:
+    """
+    Writes records to stdout as JSON Lines or CSV, one at a time
+    """
+
+    def __init__(self, fmt, columns, stream=None):
+        """
+        Args:
+            fmt: 'json' or 'csv'
+            columns: Field names, in output order
+            stream: Output stream (default stdout)
+        """
+        self.fmt = fmt
+        self.columns = columns
+        self.stream = stream or sys.stdout
+        self.count = 0
+        self._csv = None
+        if fmt == 'csv':
+            self._csv = csv.writer(self.stream)
+            self._csv.writerow(columns)
+
+    def write(self, values):
+        """Write one record given its values in column order"""
+        values = [_plain(value) for value in values]
+        if self._csv is not None:
+            self._csv.writerow(values)
+        else:
+            self.stream.write(json.dumps(dict(zip(self.columns, values))) + "\n")
+        self.count += 1
+
+
+def _plain(value):
+    """Make a database value JSON/CSV friendly"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat(sep=' ') if isinstance(value, datetime) else value.isoformat()
+    return value
+
+
+def _field(record, name, convert=str, required=True):
+    """
+    Get a field from an input record
+
+    Raises:
+        ValueError: If a required field is missing or cannot be converted
+    """
+    value = record.get(name)
+    if value is None or value == '':
+        if required:
+            raise ValueError(f"missing {name}")
+        return None
+    return convert(value)
+
+
+def _warn(message):
+    print(message, file=sys.stderr)
+
+
+# ============ Commands ============
+
+def cmd_cars(db, args):
+    """List cars"""
+    writer = RecordWriter(args.format, CAR_COLUMNS, args.stdout)
+    if args.branch:
+        rows = db.get_available_cars_at_branches(args.branch)
+    elif args.available:
+        rows = db.iter_available_cars()
+    else:
+        rows = db.iter_all_car_details()
+    for car in rows:
+        writer.write(car)
+    return EXIT_OK
+
+
+def cmd_import_cars(db, args):
+    """Add cars from input records"""
+    imported = failed = 0
+    for line_number, record in read_records(args.input, args.input_format):
+        try:
+            if record is None:
+                raise ValueError("not a JSON object")
+            ok = db.add_car(
+                _field(record, 'car_id', int),
+                _field(record, 'agent_id', int),
+                _field(record, 'model'),
+                _field(record, 'tariff', int),
+                _field(record, 'year', int),
+                _field(record, 'terms', required=False) or '',
+                branch_id=_field(record, 'branch_id', int, required=False),
+                idempotency_key=_field(record, 'idempotency_key', required=False)
+            )
+        except ValueError as e:
+            _warn(f"line {line_number}: {e}")
+            ok = False
+        imported += ok
+        failed += not ok
+    _warn(f"imported {imported} car(s), {failed} failed")
+    return EXIT_PARTIAL if failed else EXIT_OK
+
+
+def cmd_set_tariffs(db, args):
+    """Set individual tariffs from input records"""
+    updated = failed = 0
+    for line_number, record in read_records(args.input, args.input_format):
+        try:
+            if record is None:
+                raise ValueError("not a JSON object")
+            ok = db.update_car(_field(record, 'car_id', int), 'Tariff', _field(record, 'tariff', int),
+                               idempotency_key=_field(record, 'idempotency_key', required=False))
+        except ValueError as e:
+            _warn(f"line {line_number}: {e}")
+            ok = False
+        updated += ok
+        failed += not ok
+    _warn(f"updated {updated} tariff(s), {failed} failed")
+    return EXIT_PARTIAL if failed else EXIT_OK
+
+
+def cmd_adjust_tariffs(db, args):
+    """Set-based tariff change"""
+    updated = db.adjust_tariffs(
+        percent=args.percent, amount=args.amount,
+        car_model=args.model, year=args.year, agent_id=args.agent
+    )
+    if updated is None:
+        return EXIT_DATABASE
+    RecordWriter(args.format, ('updated',), args.stdout).write((updated,))
+    return EXIT_OK
+
+
+def cmd_return_cars(db, args):
+    """Return cars from arguments and/or input records"""
+    def car_ids():
+        yield from args.car_ids
+        if args.input:
+            for line_number, record in read_records(args.input, args.input_format):
+                try:
+                    if record is None:
+                        raise ValueError("not a JSON object")
+                    yield _field(record, 'car_id', int)
+                except ValueError as e:
+                    _warn(f"line {line_number}: {e}")
+                    failures.append(line_number)
+
+    def batch_key():
+        # The same input gives the same batches, so batch N of a rerun
+        # with the same key is batch N of the first run
+        return args.idempotency_key and f"{args.idempotency_key}-{batches}"
+
+    failures = []
+    returned = 0
+    batch = []
+    batches = 0
+    for car_id in car_ids():
+        batch.append(car_id)
+        if len(batch) >= RETURN_BATCH_SIZE:
+            returned += _return_batch(db, batch, failures, batch_key())
+            batch = []
+            batches += 1
+    if batch:
+        returned += _return_batch(db, batch, failures, batch_key())
+    _warn(f"returned {returned} car(s), {len(failures)} failed")
+    return EXIT_PARTIAL if failures else EXIT_OK
+
+
+def _return_batch(db, batch, failures, idempotency_key=None):
+    """Return one batch of cars, recording it as failed if the batch fails"""
+    if db.return_cars(batch, idempotency_key=idempotency_key):
+        return len(batch)
+    failures.extend(batch)
+    return 0
+
+
+def cmd_overdue(db, args):
+    """Overdue sweep"""
+    writer = RecordWriter(args.format, OVERDUE_COLUMNS, args.stdout)
+    for row in db.iter_overdue_rentals():
+        writer.write(row)
+    if not args.no_reconcile and not db.reconcile_counters():
+        return EXIT_DATABASE
+    _warn(f"{writer.count} overdue rental(s)")
+    return EXIT_ALERT if args.fail_if_any and writer.count else EXIT_OK
+
+
+def cmd_counters(db, args):
+    """Print the fleet counters"""
+    if args.reconcile and not db.reconcile_counters():
+        return EXIT_DATABASE
+    writer = RecordWriter(args.format, ('key', 'value'), args.stdout)
+    for key, value in sorted(db.get_counters()):
+        writer.write((key, value))
+    return EXIT_OK
+
+
+def cmd_export_snapshot(db, args):
+    """Write a fleet snapshot (one per shard when shards are configured)"""
+    from database.sharding import each_database
+    from database.snapshot import export_snapshot, shard_directory
+    writer = RecordWriter(args.format, ('path',), args.stdout)
+    for shard, shard_db in each_database(db).items():
+        writer.write((export_snapshot(shard_db, shard_directory(args.directory, shard)),))
+    return EXIT_OK
+
+
+def cmd_expire_offers(db, args):
+    """Expire lapsed waitlist offers"""
+    expired = db.expire_waitlist_offers(args.hold_minutes)
+    if expired is None:
+        return EXIT_DATABASE
+    RecordWriter(args.format, ('expired',), args.stdout).write((expired,))
+    return EXIT_OK
+
+
+def cmd_invoices(db, args):
+    """Batch invoice run"""
+    yesterday = date.today() - timedelta(days=1)
+    period_start = (args.period_start or yesterday).isoformat()
+    period_end = (args.period_end or args.period_start or yesterday).isoformat()
+    if period_end < period_start:
+        _warn("--to is before --from")
+        return EXIT_USAGE
+    summary = db.generate_invoices(period_start, period_end)
+    if summary is None:
+        return EXIT_DATABASE
+    if args.list:
+        writer = RecordWriter(args.format, INVOICE_COLUMNS, args.stdout)
+        for row in db.iter_invoices(period_start, period_end):
+            writer.write(row)
+        _warn(f"{summary['invoices']} new invoice(s), total {summary['total']}")
+    else:
+        RecordWriter(args.format, INVOICE_SUMMARY_COLUMNS, args.stdout).write(
+            [summary[column] for column in INVOICE_SUMMARY_COLUMNS]
+        )
+    return EXIT_OK
+
+
+def cmd_scheduler(db, args):
+    """Run the maintenance jobs (the connection opened for the command only checks the database is up)"""
+    from carrental.jobs import build_scheduler
+    scheduler = build_scheduler()
+    if not scheduler.jobs:
+        _warn("No jobs enabled (see SCHEDULE_* in config.py)")
+        return EXIT_USAGE
+
+    if args.once:
+        ok = scheduler.run_once()
+    else:
+        stopped = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stopped.set())
+        _warn(f"Running {', '.join(scheduler.jobs)}; Ctrl+C or SIGTERM to stop")
+        scheduler.start()
+        try:
+            while not stopped.wait(1):
+                pass
+        except KeyboardInterrupt:
+            pass
+        ok = scheduler.stop()
+
+    writer = RecordWriter(args.format, SCHEDULER_COLUMNS, args.stdout)
+    for stats in scheduler.stats():
+        writer.write([stats[column] for column in SCHEDULER_COLUMNS])
+    return EXIT_OK if ok else EXIT_PARTIAL
+
+
+# ============ Argument Parsing ============
+
+def build_parser():
+    """Build the argument parser"""
+    parser = argparse.ArgumentParser(
+        prog='python -m carrental',
+        description=__doc__.strip().splitlines()[0],
+        epilog="exit codes: 0 ok, 1 some rows failed, 2 usage, 3 database error, 4 alert"
+    )
+    commands = parser.add_subparsers(dest='command', metavar='command', required=True)
+
+    def command(name, func, help_text, reads=False):
+        sub = commands.add_parser(name, help=help_text, description=help_text)
+        sub.set_defaults(func=func)
+        sub.add_argument('--format', choices=('json', 'csv'), default='json', help='output format')
+        if reads:
+            sub.add_argument('--input', default='-', help='input file, "-" for stdin (default)')
+            sub.add_argument('--input-format', choices=('json', 'csv'), default=None,
+                             help='input format (default: from the file extension, else json)')
+        return sub
+
+    sub = command('cars', cmd_cars, "List cars")
+    sub.add_argument('--available', action='store_true', help='only available cars')
+    sub.add_argument('--branch', type=int, action='append', help='only available cars at this branch (repeatable)')
+
+    command('import-cars', cmd_import_cars,
+            "Add cars from records with car_id, agent_id, model, tariff, year, terms, branch_id"
+            " and optionally idempotency_key", reads=True)
+    command('set-tariffs', cmd_set_tariffs,
+            "Set tariffs from records with car_id, tariff and optionally idempotency_key", reads=True)
+
+    sub = command('adjust-tariffs', cmd_adjust_tariffs, "Change matching tariffs by a percentage or amount")
+    change = sub.add_mutually_exclusive_group(required=True)
+    change.add_argument('--percent', type=float, help='e.g. 10 for +10%%, -5 for -5%%')
+    change.add_argument('--amount', type=int, help='added to each tariff, may be negative')
+    sub.add_argument('--model', help='only this car model')
+    sub.add_argument('--year', type=int, help='only cars of this year')
+    sub.add_argument('--agent', type=int, help='only cars managed by this agent')
+
+    sub = command('return-cars', cmd_return_cars, "Return cars (IDs as arguments and/or car_id records)", reads=True)
+    sub.add_argument('car_ids', type=int, nargs='*', metavar='CAR_ID')
+    sub.add_argument('--idempotency-key', help='key for this run (up to 50 characters); rerunning with the '
+                                               'same key and input does not return the cars again')
+    sub.set_defaults(input=None)
+
+    sub = command('overdue', cmd_overdue, "List overdue rentals and refresh the fleet counters")
+    sub.add_argument('--fail-if-any', action='store_true', help='exit with status 4 if any rental is overdue')
+    sub.add_argument('--no-reconcile', action='store_true', help='do not refresh the fleet counters')
+
+    sub = command('counters', cmd_counters, "Print the fleet counters")
+    sub.add_argument('--reconcile', action='store_true', help='recompute them from the base tables first')
+
+    sub = command('export-snapshot', cmd_export_snapshot, "Write a fleet snapshot file")
+    sub.add_argument('directory', help='directory to write the snapshot into')
+
+    sub = command('expire-offers', cmd_expire_offers, "Pass on cars held for waitlist offers nobody took up")
+    sub.add_argument('--hold-minutes', type=float, default=None,
+                     help='how long an offer is held (default WAITLIST_HOLD_MINUTES)')
+
+    sub = command('invoices', cmd_invoices, "Invoice the rentals returned in a period that have no invoice yet")
+    sub.add_argument('--from', dest='period_start', type=date.fromisoformat, default=None,
+                     help='first return date, YYYY-MM-DD (default yesterday)')
+    sub.add_argument('--to', dest='period_end', type=date.fromisoformat, default=None,
+                     help='last return date, YYYY-MM-DD (default the --from date)')
+    sub.add_argument('--list', action='store_true', help='write every invoice in the period instead of a summary')
+
+    sub = command('scheduler', cmd_scheduler, "Run the maintenance jobs until stopped, then print their statistics")
+    sub.add_argument('--once', action='store_true', help='run every job once and exit (for cron)')
+
+    return parser
+
+
+def main(argv=None):
+    """
+    Run one command
+
+    Returns:
+        int: Process exit code
+    """
+    args = build_parser().parse_args(argv)
+    if getattr(args, 'input', None) and args.input_format is None:
+        args.input_format = 'csv' if args.input.lower().endswith('.csv') else 'json'
+
+    # Imported here so --help does not load the database driver
+    try:
+        from database.sharding import create_operations
+        from database.db_connection import DB_ERRORS
+    except ImportError as e:
+        _warn(f"Cannot load the database layer ({e}); is config.py present?")
+        return EXIT_DATABASE
+
+    # DatabaseOperations reports progress and errors with print(); keep stdout for records
+    args.stdout = sys.stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        return _run(create_operations(), DB_ERRORS, args)
+
+
+def _run(db, db_errors, args):
+    """Connect, run the selected command and always disconnect"""
+    try:
+        db.connect()
+    except db_errors as e:
+        _warn(f"Cannot connect to the database: {e}")
+        return EXIT_DATABASE
+    db.actor = f"cli:{getpass.getuser()}"
+
+    try:
+        return args.func(db, args)
+    except db_errors as e:
+        _warn(f"Database Error: {e}")
+        return EXIT_DATABASE
+    except BrokenPipeError:
+        return EXIT_OK
+    except OSError as e:
+        _warn(str(e))
+        return EXIT_USAGE
+    finally:
+        db.disconnect()
@@ -0,0 +1,136 @@
+"""
+Maintenance jobs for Car Rental System
+The periodic work the scheduler runs, configured with the SCHEDULE_*
+settings in config.py:
+
+    reconcile-counters  Rebuild the fleet counters (and the overdue count)
+    expire-offers       Pass on cars held for waitlist offers nobody took up
+    refresh-waitlist    Load waitlist entries added by other terminals
+    export-snapshot     Write a fleet snapshot into SNAPSHOT_DIR
+    invoices            Invoice the rentals returned yesterday
+    purge-keys          Delete idempotency keys older than IDEMPOTENCY_KEY_DAYS
+
+Each job has its own database session, opened on first use and reopened
+after a database error, so jobs can run side by side without sharing a
+connection with each other or with the UI.
+"""
+
+from datetime import date, timedelta
+import config
+from database.db_connection import DB_ERRORS
+from database.sharding import create_operations, each_database
+from .scheduler import JobError, Scheduler
+
+
+class JobSession:
+    """
+    Callable that runs a job function with a dedicated DatabaseOperations
+
+    With shards configured the session is a ShardedOperations across all
+    of them (see sharding.py).
+    """
+
+    def __init__(self, name, func):
+        """
+        Args:
+            name: Job name, used as the audit actor ('scheduler:<name>')
+            func: Callable taking a connected DatabaseOperations
+        """
+        self.name = name
+        self.func = func
+        self.db = None
+
+    def __call__(self):
+        if self.db is None:
+            db = create_operations()
+            db.connect()
+            db.actor = f"scheduler:{self.name}"
+            self.db = db
+        try:
+            return self.func(self.db)
+        except DB_ERRORS:
+            # Start the next run on a fresh connection
+            self.close()
+            raise
+
+    def close(self):
+        """Disconnect the job's session"""
+        if self.db is not None:
+            try:
+                self.db.disconnect()
+            except DB_ERRORS as e:
+                print(f"Error closing {self.name} session: {e}")
+            self.db = None
+
+
+def reconcile_counters(db):
+    """Rebuild the fleet counters from the base tables"""
+    if not db.reconcile_counters():
+        raise JobError("reconcile_counters failed")
+
+
+def expire_offers(db):
+    """Expire lapsed waitlist offers"""
+    if db.expire_waitlist_offers() is None:
+        raise JobError("expire_waitlist_offers failed")
+
+
+def refresh_waitlist(db):
+    """Load waitlist entries added elsewhere into this process's queues (one per shard)"""
+    for shard_db in each_database(db).values():
+        shard_db.waitlist.refresh(shard_db, force=True)
+
+
+def export_snapshot(db):
+    """Write a fleet snapshot into SNAPSHOT_DIR (each shard's into its subdirectory)"""
+    from database.snapshot import export_snapshot, shard_directory
+    for shard, shard_db in each_database(db).items():
+        export_snapshot(shard_db, shard_directory(config.SNAPSHOT_DIR, shard))
+
+
+def generate_invoices(db):
+    """Invoice yesterday's returns (and any of them a failed run left behind)"""
+    yesterday = (date.today() - timedelta(days=1)).isoformat()
+    if db.generate_invoices(yesterday, yesterday) is None:
+        raise JobError("generate_invoices failed")
+
+
+def purge_idempotency_keys(db):
+    """Delete idempotency keys no client retries with any more"""
+    if db.purge_idempotency_keys() is None:
+        raise JobError("purge_idempotency_keys failed")
+
+
+def build_scheduler(in_app=False):
+    """
+    Create a scheduler with the maintenance jobs enabled in config
+
+    Args:
+        in_app: The scheduler runs inside the desktop app, where the
+            process's waitlist queue is also worth keeping fresh
+
+    Returns:
+        Scheduler: Scheduler with its jobs added (not started)
+    """
+    scheduler = Scheduler(max_workers=getattr(config, 'SCHEDULER_WORKERS', 2))
+    jitter = getattr(config, 'SCHEDULE_JITTER_SECONDS', 10)
+
+    intervals = [
+        ('reconcile-counters', reconcile_counters, getattr(config, 'SCHEDULE_RECONCILE_SECONDS', 600)),
+        ('expire-offers', expire_offers, getattr(config, 'SCHEDULE_EXPIRE_OFFERS_SECONDS', 60)),
+        ('purge-keys', purge_idempotency_keys, getattr(config, 'SCHEDULE_PURGE_KEYS_SECONDS', 3600)),
+    ]
+    if in_app:
+        intervals.append(('refresh-waitlist', refresh_waitlist, getattr(config, 'WAITLIST_REFRESH_SECONDS', 5)))
+    for name, func, seconds in intervals:
+        if seconds:
+            scheduler.every(name, JobSession(name, func), seconds, jitter=min(jitter, seconds / 2), run_now=True)
+
+    snapshot_cron = getattr(config, 'SCHEDULE_SNAPSHOT_CRON', None)
+    if snapshot_cron and getattr(config, 'SNAPSHOT_DIR', None):
+        scheduler.cron('export-snapshot', JobSession('export-snapshot', export_snapshot), snapshot_cron,
+                       jitter=jitter)
+    invoice_cron = getattr(config, 'SCHEDULE_INVOICE_CRON', None)
+    if invoice_cron:
+        scheduler.cron('invoices', JobSession('invoices', generate_invoices), invoice_cron, jitter=jitter)
+    return scheduler
@@ -0,0 +1,351 @@
+"""
+Job scheduler for Car Rental System
+Runs periodic maintenance work in-process, on interval or cron-like
+schedules, so it does not have to happen inline in user actions
+
+Jobs run on a small worker pool. A job that is still running when it
+comes due again is skipped for that turn (single flight), and every run
+is timed. stop() lets running jobs finish before returning.
+
+    scheduler = Scheduler()
+    scheduler.every('expire-offers', expire, seconds=60, jitter=5)
+    scheduler.cron('export-snapshot', export, '30 2 * * *')
+    scheduler.start()
+    ...
+    scheduler.stop()
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+
+
+class JobError(Exception):
+    """Raised by a job to report that its run failed"""
+
+
+class CronSchedule:
+    """
+    Five-field cron expression: minute hour day-of-month month day-of-week
+
+    Each field is '*', a number, a range 'a-b', a step '*/n' or 'a-b/n',
+    or a comma-separated list of these. Day of week runs 0-6 from Sunday
+    (7 is Sunday too). As in cron, when both day fields are restricted a
+    day matching either one qualifies.
+    """
+
+    FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expression):
+        """
+        Args:
+            expression: Cron expression, e.g. '*/15 * * * *'
+
+        Raises:
+            ValueError: If the expression is malformed
+        """
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError(f"cron expression needs 5 fields, got {expression!r}")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            self._parse(part, low, high) for part, (low, high) in zip(parts, self.FIELDS)
+        )
+        self.weekdays = {day % 7 for day in weekdays}
+        self._any_day = parts[2] == '*'
+        self._any_weekday = parts[4] == '*'
+
+    @staticmethod
+    def _parse(field, low, high):
+        """Expand one field into the set of values it allows"""
+        values = set()
+        for item in field.split(','):
+            spec, _, step = item.partition('/')
+            if spec == '*':
+                start, end = low, high
+            elif '-' in spec:
+                start, end = (int(value) for value in spec.split('-', 1))
+            else:
+                start = end = int(spec)
+            if start < low or end > high or start > end:
+                raise ValueError(f"cron field {field!r} is outside {low}-{high}")
+            values.update(range(start, end + 1, int(step) if step else 1))
+        return values
+
+    def _day_matches(self, moment):
+        """Check the day-of-month / day-of-week fields"""
+        in_days = moment.day in self.days
+        in_weekdays = (moment.weekday() + 1) % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return in_days and in_weekdays
+        return in_days or in_weekdays
+
+    def next_after(self, moment):
+        """
+        Next time the schedule fires, strictly after a moment
+
+        Args:
+            moment: datetime
+
+        Returns:
+            datetime: Next matching minute
+        """
+        moment = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        # Whole months, days and hours that cannot match are skipped at once
+        for _ in range(5 * 366 * 24):
+            if moment.month not in self.months:
+                moment = (moment.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(f"cron expression {self.expression!r} never fires")
+
+
+class Job:
+    """
+    A scheduled function with its trigger and run statistics
+    """
+
+    def __init__(self, name, func, interval=None, cron=None, jitter=0):
+        """
+        Args:
+            name: Job name, used in logs and statistics
+            func: Zero-argument callable; raise (e.g. JobError) to report a failed run
+            interval: Seconds between runs
+            cron: CronSchedule, instead of an interval
+            jitter: Up to this many seconds are added at random to each due time
+        """
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.cron = cron
+        self.jitter = jitter
+        self.next_run = None
+        self.running = False
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.last_seconds = None
+        self.last_started = None
+        self.last_error = None
+
+    def schedule_next(self, now, rng):
+        """
+        Set next_run from the trigger
+
+        Args:
+            now: Current time (epoch seconds)
+            rng: random.Random for the jitter
+        """
+        if self.cron is not None:
+            due = self.cron.next_after(datetime.fromtimestamp(now)).timestamp()
+        else:
+            due = now + self.interval
+        self.next_run = due + (rng.uniform(0, self.jitter) if self.jitter else 0)
+
+    def stats(self):
+        """
+        Run statistics
+
+        Returns:
+            dict: name, runs, failures, skipped, avg_ms, max_ms, last_ms, last_error, next_run
+        """
+        return {
+            'name': self.name,
+            'runs': self.runs,
+            'failures': self.failures,
+            'skipped': self.skipped,
+            'avg_ms': round(self.total_seconds / self.runs * 1000, 1) if self.runs else None,
+            'max_ms': round(self.max_seconds * 1000, 1),
+            'last_ms': round(self.last_seconds * 1000, 1) if self.last_seconds is not None else None,
+            'last_error': self.last_error,
+            'next_run': datetime.fromtimestamp(self.next_run) if self.next_run else None,
+        }
+
+
+class Scheduler:
+    """
+    In-process scheduler: one timer thread that submits due jobs to a worker pool
+    """
+
+    def __init__(self, max_workers=2, seed=None):
+        """
+        Args:
+            max_workers: Jobs that may run at the same time
+            seed: Random seed for the jitter
+        """
+        self.jobs = {}
+        self.max_workers = max_workers
+        self._rng = random.Random(seed)
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._thread = None
+        self._executor = None
+        self._futures = set()
+
+    def every(self, name, func, seconds, jitter=0, run_now=False):
+        """
+        Add a job that runs every so many seconds
+
+        Args:
+            name: Job name
+            func: Zero-argument callable
+            seconds: Interval between due times
+            jitter: Random extra delay of up to this many seconds per run
+            run_now: Run as soon as the scheduler starts instead of after one interval
+
+        Returns:
+            Job: The added job
+        """
+        job = Job(name, func, interval=seconds, jitter=jitter)
+        self._add(job, run_now)
+        return job
+
+    def cron(self, name, func, expression, jitter=0):
+        """
+        Add a job that runs on a cron schedule (local time)
+
+        Args:
+            name: Job name
+            func: Zero-argument callable
+            expression: Five-field cron expression (see CronSchedule)
+            jitter: Random extra delay of up to this many seconds per run
+
+        Returns:
+            Job: The added job
+        """
+        job = Job(name, func, cron=CronSchedule(expression), jitter=jitter)
+        self._add(job, False)
+        return job
+
+    def _add(self, job, run_now):
+        with self._condition:
+            if job.name in self.jobs:
+                raise ValueError(f"job {job.name!r} already exists")
+            self.jobs[job.name] = job
+            if run_now:
+                job.next_run = time.time()
+            else:
+                job.schedule_next(time.time(), self._rng)
+            self._condition.notify_all()
+
+    def start(self):
+        """Start the timer thread and worker pool"""
+        with self._condition:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job")
+            self._thread = threading.Thread(target=self._run, name="scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=30):
+        """
+        Stop scheduling, wait for running jobs and release job resources
+
+        Jobs whose func has a close() method (e.g. a database session)
+        have it called once nothing is running.
+
+        Args:
+            timeout: Maximum seconds to wait for running jobs
+
+        Returns:
+            bool: True if every running job finished in time
+        """
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+            thread, self._thread = self._thread, None
+            futures = set(self._futures)
+        if thread is not None:
+            thread.join(timeout)
+        done, pending = wait(futures, timeout=timeout)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        if pending:
+            print(f"Scheduler: {len(pending)} job(s) still running at shutdown")
+        else:
+            for job in self.jobs.values():
+                close = getattr(job.func, 'close', None)
+                if close is not None:
+                    close()
+        return not pending
+
+    def run_once(self):
+        """
+        Run every job once, one after another, on the calling thread
+
+        Returns:
+            bool: True if no run failed
+        """
+        ok = True
+        for job in list(self.jobs.values()):
+            job.running = True
+            ok = self._execute(job) and ok
+        return ok
+
+    def stats(self):
+        """
+        Run statistics of every job
+
+        Returns:
+            list: Job.stats() dictionaries, in the order the jobs were added
+        """
+        with self._condition:
+            return [job.stats() for job in self.jobs.values()]
+
+    def _run(self):
+        """Timer thread: wait for the next due job and hand it to the pool"""
+        with self._condition:
+            while not self._stopping:
+                now = time.time()
+                due = [job for job in self.jobs.values() if job.next_run <= now]
+                for job in due:
+                    if job.running:
+                        # Still busy from the last turn: single flight
+                        job.skipped += 1
+                    else:
+                        job.running = True
+                        future = self._executor.submit(self._execute, job)
+                        self._futures.add(future)
+                        future.add_done_callback(self._futures.discard)
+                    job.schedule_next(now, self._rng)
+                next_due = min((job.next_run for job in self.jobs.values()), default=None)
+                # Re-check at least every minute in case the wall clock jumps
+                self._condition.wait(60 if next_due is None else min(60, max(0, next_due - time.time())))
+
+    def _execute(self, job):
+        """
+        Run a job and record its timing and outcome
+
+        Returns:
+            bool: True if the run succeeded
+        """
+        job.last_started = time.time()
+        start = time.perf_counter()
+        try:
+            job.func()
+            return True
+        except Exception as e:
+            job.failures += 1
+            job.last_error = f"{type(e).__name__}: {e}"
+            print(f"Scheduled job {job.name} failed: {e}")
+            return False
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._condition:
+                job.runs += 1
+                job.total_seconds += elapsed
+                job.max_seconds = max(job.max_seconds, elapsed)
+                job.last_seconds = elapsed
+                job.running = False
@@ -19,3 +19,155 @@ ORACLE_CLIENT_LIB_DIR = r"C:/path/to/instantclient_21_12"
 APP_TITLE = "Car Rental System"
 APP_GEOMETRY = "400x300"
 
+# Login Security
+# PBKDF2 iterations for stored passwords; raising it rehashes each user's
+# password at their next login
+PASSWORD_HASH_ITERATIONS = 200000
+# Key that signs session tokens; None uses a random key per process, so a
+# token only lasts as long as the application that issued it
+SESSION_SECRET = None
+SESSION_TOKEN_TTL_SECONDS = 8 * 3600
+
+
+# Change Feed Settings
+# How often agent screens poll CarChangeLog for inventory changes (milliseconds)
+CHANGE_FEED_POLL_MS = 3000
+# Use Oracle continuous query notification so polls only run after a change
+# (requires thick mode and the CHANGE NOTIFICATION privilege)
+CHANGE_FEED_USE_CQN = False
+
+# Local Replica Settings
+# Path of an on-disk SQLite replica of Cars and open rentals used for
+# browsing at branch terminals (None reads everything from the primary)
+REPLICA_PATH = None  # e.g., "fleet_replica.db"
+# How often the replica pulls changes from the primary (milliseconds)
+REPLICA_SYNC_MS = 5000
+
+# Print a startup timing report (import, Tk init, first paint, first query).
+# Can also be enabled with the CARRENTAL_STARTUP_REPORT environment variable.
+STARTUP_REPORT = False
+
+# Event-loop Profiling
+# None (off), "timing", "cprofile" or "tracemalloc".
+# Can also be set with the CARRENTAL_PROFILE environment variable.
+UI_PROFILE = None
+# Handlers slower than this are counted as stalls and captured (milliseconds)
+UI_PROFILE_SLOW_MS = 100
+# Where cProfile / tracemalloc captures of the slowest handlers are written
+UI_PROFILE_DIR = "profiles"
+# Directory holding fleet snapshots (fleet-*.snap); a new replica warms
+# from the newest one and only replays the change log written after it
+SNAPSHOT_DIR = None  # e.g., "snapshots"
+
+# Database Backend
+# "oracle" (default) or "sqlite" to run against a local database file,
+# e.g. for development, tests and benchmarks without an Oracle server.
+# "fake" also uses the local file, but through a driver that adds the
+# FAKE_DB_* latency and faults to every round trip (responsiveness testing).
+DB_BACKEND = "oracle"
+LOCAL_DB_PATH = "car_rental_local.db"
+FAKE_DB_LATENCY_MS = 300
+FAKE_DB_JITTER_MS = 50
+FAKE_DB_CALL_TIMEOUT_MS = None  # e.g., 5000
+# Probability per round trip of a timeout / a dropped connection
+FAKE_DB_TIMEOUT_RATE = 0.0
+FAKE_DB_DISCONNECT_RATE = 0.0
+FAKE_DB_SEED = None
+
+# Lost sessions (idle timeout, failover, network blip) are replaced on the
+# next call: up to RECONNECT_ATTEMPTS connects, the first straight away and
+# then with the delay doubling from RECONNECT_BASE_DELAY_MS. Read-only and
+# idempotent calls are then run again, up to RETRY_ATTEMPTS times.
+RECONNECT_ATTEMPTS = 5
+RECONNECT_BASE_DELAY_MS = 50
+RECONNECT_MAX_DELAY_MS = 2000
+RETRY_ATTEMPTS = 2
+# Ping a connection idle for longer than this before using it; None never pings
+HEALTH_CHECK_IDLE_SECONDS = 30
+
+# Idempotency keys (see database/idempotency.py): a rent, return, add-car
+# or update-car request repeated with the same key returns the first
+# outcome. Outcomes are kept in the IdempotencyKeys table for
+# IDEMPOTENCY_KEY_DAYS, and the latest IDEMPOTENCY_CACHE_SIZE per database
+# also in memory.
+IDEMPOTENCY_KEY_DAYS = 7
+IDEMPOTENCY_CACHE_SIZE = 1000
+
+# Sharding by branch (see database/sharding.py): each shard is a database of
+# its own holding the cars, rentals, invoices, change log, counters and
+# waitlist of its branches. Users, customers, agents and branches stay in
+# the main database above, as do branches no shard lists. A shard gives a
+# "dsn" (and optionally "user"/"password", default the main database's) on
+# Oracle, or a "path" for the sqlite/fake backends.
+SHARDS = None  # e.g., {"north": {"branches": [1, 2], "dsn": "north-db:1521/XE", "path": "north.db"}}
+# Branch this terminal serves: its views then only touch that branch's
+# shard. None works across every shard (head office).
+TERMINAL_BRANCH_ID = None
+
+# Optional read replica for browsing queries (available/all cars, customer
+# rentals, open rentals). Writes, logins and read-your-writes stay on the
+# primary. On Oracle give a DSN (credentials default to the primary's); with
+# DB_BACKEND = "sqlite" give a second database file instead.
+READ_REPLICA_DSN = None  # e.g., "replica-host:1521/XE"
+# READ_REPLICA_USER = "your_username"
+# READ_REPLICA_PASSWORD = "your_password"
+LOCAL_READ_REPLICA_PATH = None  # e.g., "car_rental_replica.db"
+# Fall back to the primary when the replica is further behind than this
+# (seconds); None serves reads from the replica however stale it is
+READ_REPLICA_MAX_LAG_SECONDS = 30
+
+# Car and Customer entities held in memory per process and database (least
+# recently used ones are evicted beyond this); 0 disables the identity map
+IDENTITY_MAP_SIZE = 5000
+# Seconds an entity is held before it is read again. Only processes that
+# poll the change feed drop cars other terminals changed any sooner
+IDENTITY_MAP_TTL_SECONDS = 30
+
+# Rows fetched per round trip by the streaming reads (iter_* in
+# DatabaseOperations); also the most rows one of them holds in memory
+STREAM_BATCH_SIZE = 500
+
+# Waitlist: a returned car is held as 'Reserved' for the first matching
+# waiting customer (highest loyalty tier, then earliest) for this long
+WAITLIST_HOLD_MINUTES = 30
+# Completed rentals needed for each loyalty tier above the base tier
+LOYALTY_TIER_RENTALS = (5, 20)
+# How long a terminal trusts its in-memory queue before loading entries
+# added elsewhere (seconds), and how often a waiting customer's window
+# checks for an offer (milliseconds)
+WAITLIST_REFRESH_SECONDS = 5
+WAITLIST_CHECK_MS = 15000
+
+# Billing: each day (or part day) a car comes back after the agreed end
+# date, beyond the grace period, costs the quoted daily rate times this
+LATE_FEE_MULTIPLIER = 1.5
+LATE_GRACE_HOURS = 2
+
+# Maintenance jobs (`python -m carrental scheduler`); 0/None disables a job
+SCHEDULE_RECONCILE_SECONDS = 600      # fleet counters and overdue count
+SCHEDULE_EXPIRE_OFFERS_SECONDS = 60   # lapsed waitlist offers
+SCHEDULE_PURGE_KEYS_SECONDS = 3600    # idempotency keys past IDEMPOTENCY_KEY_DAYS
+SCHEDULE_SNAPSHOT_CRON = None         # e.g. "30 2 * * *" (needs SNAPSHOT_DIR)
+SCHEDULE_INVOICE_CRON = None          # e.g. "15 1 * * *": invoice yesterday's returns
+SCHEDULE_JITTER_SECONDS = 10          # spreads runs of many terminals/sites
+SCHEDULER_WORKERS = 2
+# Also run them on a background thread of the desktop app
+SCHEDULER_IN_APP = False
+
+# How often the agent dashboard reloads its counters (milliseconds). They
+# are maintained incrementally and rebuilt only by the reconcile job above
+COUNTERS_REFRESH_MS = 60000
+
+# Audit trail (AuditLog table): events are queued in memory and written in
+# batches of AUDIT_BATCH_SIZE, or after AUDIT_FLUSH_SECONDS, whichever is
+# first. Above AUDIT_MAX_PENDING queued events, callers wait for the writer.
+AUDIT_ENABLED = True
+AUDIT_BATCH_SIZE = 100
+AUDIT_FLUSH_SECONDS = 5
+AUDIT_MAX_PENDING = 10000
+
+# Location of this terminal (degrees). When set, customers only see cars at
+# branches within LOCAL_STOCK_RADIUS_KM, nearest first.
+TERMINAL_LATITUDE = None  # e.g., 18.5204
+TERMINAL_LONGITUDE = None  # e.g., 73.8567
+LOCAL_STOCK_RADIUS_KM = 25
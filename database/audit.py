@@ -0,0 +1,220 @@
+"""
+Audit trail module for Car Rental System
+Queues audit events (who rented, returned, added, updated or deleted
+which car) in memory and writes them to the AuditLog table in batches
+on a background thread, so auditing adds no commits to the operations
+being audited
+"""
+
+import atexit
+import threading
+import time
+from collections import deque
+from datetime import datetime
+import config
+from .db_connection import get_connection, close_connection, DB_ERRORS
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """
+    Get the process-wide audit writer, starting it on first use
+
+    Returns:
+        AuditWriter: Shared writer, configured from AUDIT_* settings in config
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = AuditWriter(
+                batch_size=getattr(config, 'AUDIT_BATCH_SIZE', 100),
+                flush_seconds=getattr(config, 'AUDIT_FLUSH_SECONDS', 5),
+                max_pending=getattr(config, 'AUDIT_MAX_PENDING', 10000)
+            )
+            atexit.register(_writer.close)
+        return _writer
+
+
+class AuditWriter:
+    """
+    Write-behind queue of audit events
+
+    A batch is written with one array insert and one commit when
+    batch_size events are pending or the oldest pending event is
+    flush_seconds old, whichever comes first. When max_pending events are
+    waiting (the database is slow or down), record() blocks the caller
+    until the writer catches up; if it cannot within BLOCK_SECONDS, the
+    oldest event is dropped and counted in `dropped`.
+    """
+
+    BLOCK_SECONDS = 2
+    RETRY_SECONDS = 5
+
+    INSERT = """
+        INSERT INTO AuditLog (AUDIT_ID, ACTOR, ACTION, CARID, DETAILS, CREATED_AT)
+        VALUES (audit_seq.NEXTVAL, :actor, :action, :car_id, :details, :created_at)
+    """
+
+    def __init__(self, batch_size=100, flush_seconds=5, max_pending=10000, connection_factory=get_connection):
+        """
+        Initialize and start the writer thread
+
+        Args:
+            batch_size: Pending events that trigger a flush
+            flush_seconds: Maximum age of a pending event before it is flushed
+            max_pending: Pending events above which record() applies back-pressure
+            connection_factory: Callable returning a new database connection
+        """
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        self.connection_factory = connection_factory
+        self.written = 0
+        self.dropped = 0
+
+        self._pending = deque()  # (enqueued at, event binds)
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        self._flush_requested = False
+        self._closing = False
+        self._connection = None
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def record(self, action, car_id=None, actor=None, details=None):
+        """
+        Queue an audit event
+
+        Args:
+            action: What happened, e.g. 'RENT', 'RETURN', 'ADD', 'UPDATE', 'DELETE'
+            car_id: Car the action applied to, if any
+            actor: Who did it, e.g. 'agent:3' or 'customer:alice'
+            details: Optional free text (truncated to 400 characters)
+        """
+        event = {
+            'actor': actor or 'system',
+            'action': action,
+            'car_id': car_id,
+            'details': details[:400] if details else None,
+            'created_at': datetime.now(),
+        }
+        with self._condition:
+            if len(self._pending) >= self.max_pending:
+                deadline = time.monotonic() + self.BLOCK_SECONDS
+                while len(self._pending) >= self.max_pending and not self._closing:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._pending.popleft()
+                        self.dropped += 1
+                        print(f"Audit queue full, dropped an event ({self.dropped} so far)")
+                        break
+                    self._condition.wait(remaining)
+            self._pending.append((time.monotonic(), event))
+            if len(self._pending) >= self.batch_size:
+                self._condition.notify_all()
+
+    def flush(self, timeout=10):
+        """
+        Write everything queued so far and wait for it
+
+        Args:
+            timeout: Maximum seconds to wait
+
+        Returns:
+            bool: True if nothing is left pending
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            self._flush_requested = True
+            self._condition.notify_all()
+            while (self._pending or self._in_flight) and self._thread.is_alive():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            return not self._pending and not self._in_flight
+
+    def close(self, timeout=10):
+        """Flush pending events, stop the writer thread and close its connection"""
+        with self._condition:
+            self._closing = True
+            self._condition.notify_all()
+        self._thread.join(timeout)
+        if self._pending:
+            print(f"Audit trail: {len(self._pending)} event(s) could not be written")
+
+    def _next_batch(self):
+        """
+        Wait until a flush is due and take up to batch_size events
+
+        Returns:
+            list: Events to write (empty when closing with nothing left)
+        """
+        with self._condition:
+            while not self._closing and not self._flush_requested and len(self._pending) < self.batch_size:
+                if self._pending:
+                    remaining = self._pending[0][0] + self.flush_seconds - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                else:
+                    self._condition.wait()
+            batch = [self._pending.popleft()[1] for _ in range(min(self.batch_size, len(self._pending)))]
+            if not self._pending:
+                self._flush_requested = False
+            self._in_flight = len(batch)
+            # Producers blocked on a full queue can continue
+            self._condition.notify_all()
+            return batch
+
+    def _run(self):
+        """Writer thread: flush batches until closed and drained"""
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                if self._closing:
+                    break
+                continue
+            if self._write(batch):
+                continue
+
+            # Keep the events (in order) and retry later
+            with self._condition:
+                self._pending.extendleft((time.monotonic(), event) for event in reversed(batch))
+                self._in_flight = 0
+                self._condition.notify_all()
+                if self._closing:
+                    break
+                self._condition.wait(self.RETRY_SECONDS)
+        close_connection(self._connection)
+        self._connection = None
+
+    def _write(self, batch):
+        """
+        Insert a batch with one array insert and commit it
+
+        Returns:
+            bool: True if the batch was written
+        """
+        cursor = None
+        try:
+            if self._connection is None:
+                self._connection = self.connection_factory()
+            cursor = self._connection.cursor()
+            cursor.executemany(self.INSERT, batch)
+            self._connection.commit()
+            with self._condition:
+                self.written += len(batch)
+                self._in_flight = 0
+                self._condition.notify_all()
+            return True
+        except DB_ERRORS as e:
+            print(f"Audit trail write failed, will retry: {e}")
+            close_connection(self._connection)
+            self._connection = None
+            return False
+        finally:
+            if cursor is not None and self._connection is not None:
+                cursor.close()
@@ -0,0 +1,87 @@
+"""
+Billing module for Car Rental System
+Computes the final charge of a returned rental from its actual duration,
+its lateness against the originally agreed end date and the tariff rules
+
+TOTALCOST is the price quoted for the agreed period. A car returned on
+time (or early) is billed that price; every day or part day it comes
+back after the agreed end date, beyond a grace period, is billed at the
+quoted daily rate times LATE_FEE_MULTIPLIER. The agreed end date is
+stored as midnight, but the car is due by the end of that day.
+
+Charges are computed a batch at a time, one column at a time, so the
+invoice run can stream a whole day's returns through in fetch-sized
+batches.
+"""
+
+import math
+from collections import namedtuple
+from datetime import timedelta
+import config
+
+SECONDS_PER_DAY = 86400
+
+# A rental agreed to end on a date may be returned any time that day
+DUE_AFTER_AGREED_END = timedelta(days=1)
+
+Charge = namedtuple('Charge', [
+    'transaction_id', 'customer_id', 'car_id', 'start', 'agreed_end', 'returned_at',
+    'billed_days', 'late_days', 'base_cost', 'late_fee', 'total'
+])
+
+BillingRules = namedtuple('BillingRules', ['late_fee_multiplier', 'grace_seconds'])
+
+
+def get_rules():
+    """
+    Billing rules from config
+
+    Returns:
+        BillingRules: LATE_FEE_MULTIPLIER and LATE_GRACE_HOURS
+    """
+    return BillingRules(
+        late_fee_multiplier=getattr(config, 'LATE_FEE_MULTIPLIER', 1.5),
+        grace_seconds=getattr(config, 'LATE_GRACE_HOURS', 2) * 3600
+    )
+
+
+def _whole_days(seconds):
+    """Days started, at least one"""
+    return max(1, math.ceil(seconds / SECONDS_PER_DAY))
+
+
+def compute_charges(rentals, returned_at=None, rules=None):
+    """
+    Compute the final charges of a batch of rentals
+
+    Args:
+        rentals: Rows of (TRANSACTIONID, CUSTOMERID, CARID, RENTALSTARTDATE,
+            AGREED_ENDDATE, RETURNED_AT, TOTALCOST); RETURNED_AT may be None
+            when returned_at is given
+        returned_at: Return time for rows without one (e.g. now, at return time)
+        rules: BillingRules (default get_rules())
+
+    Returns:
+        list: Charge for each rental, in input order
+    """
+    if not rentals:
+        return []
+    rules = rules or get_rules()
+    txids, customers, cars, starts, agreed_ends, returns, quoted = zip(*rentals)
+    returns = [returned or returned_at for returned in returns]
+
+    agreed_days = [_whole_days((end - start).total_seconds()) for start, end in zip(starts, agreed_ends)]
+    overrun = [(returned - end - DUE_AFTER_AGREED_END).total_seconds() for returned, end in zip(returns, agreed_ends)]
+    late_days = [_whole_days(seconds) if seconds > rules.grace_seconds else 0 for seconds in overrun]
+    base_costs = [float(cost or 0) for cost in quoted]
+    late_fees = [
+        round(cost / days * late * rules.late_fee_multiplier, 2)
+        for cost, days, late in zip(base_costs, agreed_days, late_days)
+    ]
+    billed_days = [days + late for days, late in zip(agreed_days, late_days)]
+    totals = [round(cost + fee, 2) for cost, fee in zip(base_costs, late_fees)]
+
+    return [Charge(*row) for row in zip(
+        txids, customers, cars, starts, agreed_ends, returns,
+        billed_days, late_days, base_costs, late_fees, totals
+    )]
@@ -0,0 +1,150 @@
+"""
+Change feed module for Car Rental System
+Polls the CarChangeLog table so screens can apply inventory deltas
+instead of reloading the whole Cars table
+"""
+
+import threading
+import time
+import oracledb
+from .db_connection import get_connection, close_connection
+
+
+class ChangeFeedPoller:
+    """
+    Incremental consumer of the CarChangeLog table
+
+    Keeps a high-water mark (the last CHANGE_ID applied) and on each poll
+    returns which cars changed since then. When nothing changed, a poll is
+    a single indexed range query that returns no rows. The changed cars are
+    also dropped from the database's identity map, so this process looks
+    them up afresh.
+    """
+
+    # Sequence values are handed out before commit, so a lower CHANGE_ID can
+    # become visible after a higher one. Gaps below the newest ID seen are
+    # re-read for this many seconds before being treated as rolled back.
+    GAP_TIMEOUT_SECONDS = 10
+
+    def __init__(self, db, last_change_id=None, batch_size=500):
+        """
+        Initialize change feed poller
+
+        Args:
+            db: Connected DatabaseOperations instance
+            last_change_id: High-water mark to resume from, or None to
+                start from the current end of the log
+            batch_size: Maximum number of log rows read per poll
+        """
+        self.db = db
+        self.batch_size = batch_size
+        self.last_change_id = last_change_id
+        self._gaps = {}
+        self._notified = threading.Event()
+        self._subscription = None
+        self._events_connection = None
+
+        if self.last_change_id is None:
+            self.prime()
+
+    def prime(self):
+        """Skip everything already in the log (call right after a full reload)"""
+        self.last_change_id = self.db.get_latest_change_id()
+        self._gaps.clear()
+
+    def poll(self):
+        """
+        Read new change-log rows and advance the high-water mark
+
+        Returns:
+            tuple: (changed_ids, deleted_ids) as sets of car IDs. A car
+            that was deleted is only reported in deleted_ids.
+        """
+        now = time.monotonic()
+        for change_id, first_seen in list(self._gaps.items()):
+            if now - first_seen > self.GAP_TIMEOUT_SECONDS:
+                del self._gaps[change_id]
+
+        since = min(self._gaps) - 1 if self._gaps else self.last_change_id
+        rows = self.db.get_changes_since(since, self.batch_size)
+
+        changed_ids = set()
+        deleted_ids = set()
+        expected = since + 1
+        for change_id, car_id, operation in rows:
+            if change_id <= self.last_change_id and change_id not in self._gaps:
+                expected = change_id + 1
+                continue  # already applied on an earlier poll
+
+            for missing in range(max(expected, self.last_change_id + 1), change_id):
+                self._gaps.setdefault(missing, now)
+            self._gaps.pop(change_id, None)
+            expected = change_id + 1
+
+            self.db.entities.discard('car', car_id)
+            if operation == 'DELETE':
+                changed_ids.discard(car_id)
+                deleted_ids.add(car_id)
+            else:
+                deleted_ids.discard(car_id)
+                changed_ids.add(car_id)
+            self.last_change_id = max(self.last_change_id, change_id)
+
+        return changed_ids, deleted_ids
+
+    def poll_if_notified(self):
+        """
+        Poll only if a change notification arrived since the last call
+
+        Without an active subscription this always polls.
+
+        Returns:
+            tuple: (changed_ids, deleted_ids), empty when nothing arrived
+        """
+        if self._subscription is not None and not self._gaps:
+            if not self._notified.is_set():
+                return set(), set()
+            self._notified.clear()
+        return self.poll()
+
+    # ============ Oracle Continuous Query Notification ============
+
+    def subscribe(self):
+        """
+        Register an Oracle continuous query notification on CarChangeLog
+
+        Notifications only set a flag; the actual rows are still read on
+        the caller's thread by poll_if_notified(). Requires thick mode and
+        a database with CHANGE NOTIFICATION granted.
+
+        Returns:
+            bool: True if the subscription was registered, False otherwise
+        """
+        try:
+            self._events_connection = get_connection(events=True, shard=self.db.shard)
+            self._subscription = self._events_connection.subscribe(
+                callback=self._on_notification,
+                operations=oracledb.OPCODE_INSERT,
+                qos=oracledb.SUBSCR_QOS_QUERY
+            )
+            self._subscription.registerquery("SELECT CHANGE_ID FROM CarChangeLog")
+            return True
+        except Exception as e:
+            print(f"Change notification unavailable, falling back to polling: {e}")
+            self.unsubscribe()
+            return False
+
+    def _on_notification(self, message):
+        """Callback invoked by the driver on its own thread"""
+        self._notified.set()
+
+    def unsubscribe(self):
+        """Drop the notification subscription and its connection"""
+        try:
+            if self._subscription is not None and self._events_connection is not None:
+                self._events_connection.unsubscribe(self._subscription)
+        except Exception as e:
+            print(f"Error removing change subscription: {e}")
+        close_connection(self._events_connection)
+        self._subscription = None
+        self._events_connection = None
@@ -0,0 +1,78 @@
+"""
+Fleet counters module for Car Rental System
+In-memory cache of the FleetCounters summary table that DatabaseOperations
+keeps up to date with deltas on every car and rental mutation
+"""
+
+import time
+from datetime import date
+
+
+class FleetCounters:
+    """
+    Cached fleet totals for dashboards
+
+    Values are read from memory in O(1); load() refreshes the cache from the
+    (small) summary table. The table itself is rebuilt from the base tables
+    (correcting drift and refreshing the time-dependent overdue count) only
+    by the scheduler's reconcile-counters job, never by the views, so
+    terminals do not rebuild it over each other.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.loaded_at = None
+
+    def load(self, db):
+        """
+        Refresh the cache from the FleetCounters table
+
+        Args:
+            db: Connected DatabaseOperations instance
+        """
+        self.values = {key: value for key, value in db.get_counters()}
+        self.loaded_at = time.time()
+
+    def get(self, key, default=0):
+        """
+        Get a single counter
+
+        Args:
+            key: Counter key, e.g. 'status.Available'
+            default: Value when the counter does not exist
+
+        Returns:
+            Number: Counter value
+        """
+        return self.values.get(key, default)
+
+    @property
+    def available(self):
+        return self.get('status.Available')
+
+    @property
+    def rented(self):
+        return self.get('status.Rented')
+
+    @property
+    def overdue(self):
+        """Overdue rentals as of the last reconcile"""
+        return self.get('rentals.overdue')
+
+    @property
+    def revenue_today(self):
+        return self.get(f'revenue.{date.today().isoformat()}')
+
+    def per_model(self):
+        """
+        Per-model breakdown
+
+        Returns:
+            dict: model -> {status: count}, omitting empty buckets
+        """
+        models = {}
+        for key, value in self.values.items():
+            if key.startswith('model.') and value:
+                model, status = key[len('model.'):].rsplit('.', 1)
+                models.setdefault(model, {})[status] = value
+        return models
@@ -0,0 +1,139 @@
+"""
+Credentials module for Car Rental System
+Salted PBKDF2 password hashes with a tunable cost, and signed session
+tokens that let a logged-in user open views or reconnect without
+authenticating again
+
+Stored hashes look like "pbkdf2_sha256$<iterations>$<salt>$<hash>".
+Passwords stored before hashing was introduced (plain text, or agent
+passwords cut or padded to 8 characters) are still accepted and are
+reported as needing a rehash, so they are upgraded at the next login.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import secrets
+import time
+import config
+
+ALGORITHM = 'pbkdf2_sha256'
+SALT_BYTES = 16
+DEFAULT_ITERATIONS = 200000
+
+# Per-process key when SESSION_SECRET is not configured: tokens then only
+# stay valid until the application exits
+_process_secret = secrets.token_bytes(32)
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def _iterations():
+    return int(getattr(config, 'PASSWORD_HASH_ITERATIONS', DEFAULT_ITERATIONS))
+
+
+def hash_password(password, iterations=None):
+    """
+    Hash a password with a new random salt
+
+    Args:
+        password: Plain text password
+        iterations: PBKDF2 iterations (default PASSWORD_HASH_ITERATIONS from config)
+
+    Returns:
+        str: Encoded hash to store in place of the password
+    """
+    iterations = iterations or _iterations()
+    salt = secrets.token_bytes(SALT_BYTES)
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, iterations)
+    return f"{ALGORITHM}${iterations}${_b64encode(salt)}${_b64encode(digest)}"
+
+
+def verify_password(password, stored, legacy_width=None):
+    """
+    Check a password against a stored hash (or legacy plain text value)
+
+    Hashing releases the GIL, so this can run on a worker thread while
+    the Tk loop keeps drawing.
+
+    Args:
+        password: Password as typed
+        stored: Value from the PASSWORD / A_PASSWORD column
+        legacy_width: Width legacy plain text values were cut or padded to (8 for agents)
+
+    Returns:
+        tuple: (matches, needs_rehash); needs_rehash is True for legacy
+        values and for hashes made with fewer iterations than configured
+    """
+    if stored is None:
+        return False, False
+    if not stored.startswith(ALGORITHM + '$'):
+        # Legacy plain text, possibly blank-padded by a CHAR column
+        candidate = password[:legacy_width] if legacy_width else password
+        matches = hmac.compare_digest(stored.rstrip().encode('utf-8'), candidate.rstrip().encode('utf-8'))
+        return matches, matches
+
+    try:
+        _, iterations, salt, expected = stored.rstrip().split('$')
+        iterations = int(iterations)
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), _b64decode(salt), iterations)
+    except ValueError:
+        return False, False
+    matches = hmac.compare_digest(digest, _b64decode(expected))
+    return matches, matches and iterations < _iterations()
+
+
+def _secret():
+    configured = getattr(config, 'SESSION_SECRET', None)
+    return configured.encode('utf-8') if configured else _process_secret
+
+
+def issue_token(role, subject_id, username, ttl_seconds=None):
+    """
+    Issue a signed session token
+
+    Args:
+        role: 'customer' or 'agent'
+        subject_id: USER_ID or AGENTID
+        username: Login name
+        ttl_seconds: Lifetime (default SESSION_TOKEN_TTL_SECONDS from config)
+
+    Returns:
+        str: Token of the form "<claims>.<signature>"
+    """
+    if ttl_seconds is None:
+        ttl_seconds = getattr(config, 'SESSION_TOKEN_TTL_SECONDS', 8 * 3600)
+    claims = {'role': role, 'id': subject_id, 'name': username, 'exp': int(time.time() + ttl_seconds)}
+    payload = _b64encode(json.dumps(claims, separators=(',', ':')).encode('utf-8'))
+    signature = hmac.new(_secret(), payload.encode('ascii'), hashlib.sha256).digest()
+    return f"{payload}.{_b64encode(signature)}"
+
+
+def verify_token(token):
+    """
+    Check a session token's signature and expiry
+
+    Args:
+        token: Token from issue_token
+
+    Returns:
+        dict: Claims (role, id, name, exp), or None if the token is invalid or expired
+    """
+    try:
+        payload, signature = token.split('.')
+        expected = hmac.new(_secret(), payload.encode('ascii'), hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, _b64decode(signature)):
+            return None
+        claims = json.loads(_b64decode(payload))
+    except (AttributeError, ValueError):
+        return None
+    if claims.get('exp', 0) < time.time():
+        return None
+    return claims
@@ -3,8 +3,13 @@ Database connection module for Car Rental System
 Handles Oracle Database connection setup and management
 """
 
+import sqlite3
 import oracledb
 import config
+from . import local_backend, fake_driver
+
+# Exceptions raised by either backend for database-level failures
+DB_ERRORS = (oracledb.DatabaseError, sqlite3.DatabaseError)
 
 
 def init_oracle_client():
@@ -18,9 +23,20 @@ def init_oracle_client():
         print("If Oracle client is already initialized, this warning can be ignored.")
 
 
-def get_connection():
+def get_connection(events=False, shard=None):
     """
-    Create and return a connection to the Oracle database
+    Create and return a connection to the configured database
+    
+    Uses Oracle unless config.DB_BACKEND is "sqlite", in which case the
+    local database at config.LOCAL_DB_PATH is opened instead, or "fake",
+    which opens it through the latency- and fault-injecting fake driver.
+    
+    Args:
+        events: Enable driver events (needed for change notifications)
+        shard: Name of a shard in config.SHARDS to connect to instead of
+            the main database: its "dsn" (with optional "user" and
+            "password", defaulting to the main database's) on Oracle, or
+            its "path" with the local backends
     
     Returns:
         connection: Oracle database connection object
@@ -28,6 +44,13 @@ def get_connection():
     Raises:
         oracledb.DatabaseError: If connection fails
     """
+    spec = config.SHARDS[shard] if shard is not None else {}
+    backend = getattr(config, 'DB_BACKEND', 'oracle')
+    if backend == 'sqlite':
+        return local_backend.connect(spec.get('path', config.LOCAL_DB_PATH))
+    if backend == 'fake':
+        return fake_driver.connect(spec.get('path', config.LOCAL_DB_PATH))
+    
     # Initialize Oracle client if not already done
     try:
         init_oracle_client()
@@ -35,18 +58,56 @@ def get_connection():
         pass  # Client may already be initialized
     
     # Create DSN (Data Source Name)
-    dsn = f"{config.DB_HOST}/{config.DB_SERVICE}"
+    dsn = spec.get('dsn') or f"{config.DB_HOST}/{config.DB_SERVICE}"
     
     # Create and return connection
     connection = oracledb.connect(
-        user=config.DB_USER,
-        password=config.DB_PASSWORD,
-        dsn=dsn
+        user=spec.get('user', config.DB_USER),
+        password=spec.get('password', config.DB_PASSWORD),
+        dsn=dsn,
+        events=events
     )
     
     return connection
 
 
+def get_read_replica_connection():
+    """
+    Create and return a connection to the configured read replica
+    
+    Uses READ_REPLICA_DSN (with READ_REPLICA_USER / READ_REPLICA_PASSWORD,
+    defaulting to the primary's credentials) on Oracle, or the database at
+    LOCAL_READ_REPLICA_PATH when DB_BACKEND is "sqlite" or "fake".
+    
+    Returns:
+        connection: Replica connection object, or None if no replica is configured
+        
+    Raises:
+        oracledb.DatabaseError: If connection fails
+    """
+    backend = getattr(config, 'DB_BACKEND', 'oracle')
+    if backend in ('sqlite', 'fake'):
+        path = getattr(config, 'LOCAL_READ_REPLICA_PATH', None)
+        if not path:
+            return None
+        return fake_driver.connect(path) if backend == 'fake' else local_backend.connect(path)
+    
+    dsn = getattr(config, 'READ_REPLICA_DSN', None)
+    if not dsn:
+        return None
+    
+    try:
+        init_oracle_client()
+    except:
+        pass  # Client may already be initialized
+    
+    return oracledb.connect(
+        user=getattr(config, 'READ_REPLICA_USER', config.DB_USER),
+        password=getattr(config, 'READ_REPLICA_PASSWORD', config.DB_PASSWORD),
+        dsn=dsn
+    )
+
+
 def close_connection(connection, cursor=None):
     """
     Close database connection and cursor
@@ -3,56 +3,405 @@ Database operations module for Car Rental System
 Contains all SQL queries and database operations
 """
 
-import oracledb
-from datetime import datetime
-from .db_connection import get_connection, close_connection
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from itertools import islice
+import config
+from . import audit, billing, credentials, idempotency, identity_map, reconnect, waitlist
+from .db_connection import get_connection, get_read_replica_connection, close_connection, DB_ERRORS
+from .reconnect import reconnecting, retrying, retrying_if_keyed
+from .records import Car, CarColumns, CarSummary, Customer, Rental, RentedCar
+from .waitlist import WaitlistEntry
 
 
 class DatabaseOperations:
     """
     Handles all database operations for the Car Rental System
+    
+    When a read replica is configured, the heavy browsing reads are served
+    by it as long as it is within READ_REPLICA_MAX_LAG_SECONDS of the
+    primary and already has everything this instance has committed. All
+    writes, logins and targeted lookups stay on the primary.
+    
+    Car and Customer entities looked up by ID are held in the process-wide
+    identity map; committed changes made here are written through to it.
+    
+    A dropped session is replaced on the next call (see reconnect.py):
+    read-only and idempotent methods (@retrying) reconnect and run again,
+    the others (@reconnecting) start on a fresh connection but are never
+    repeated behind the caller's back.
+    
+    An instance bound to a shard (see sharding.py) keeps its cars, rentals
+    and everything hanging off them in that shard's database, and uses a
+    second connection to the main database (main_connection) for users,
+    customers, agents and branches. Unbound, both are the same connection.
+    
+    Renting, returning, adding and updating a car accept an
+    idempotency_key (see idempotency.py): a request repeated with the same
+    key returns the first outcome instead of doing the work again, and
+    with a key these writes are retried after a dropped session like the
+    @retrying reads.
     """
     
-    def __init__(self):
+    # How long a replica freshness check is reused (seconds)
+    REPLICA_CHECK_SECONDS = 2
+    
+    # Most binds Oracle accepts in one IN (...) list (ORA-01795)
+    IN_LIST_LIMIT = 1000
+    
+    def __init__(self, shard=None):
+        """
+        Args:
+            shard: Name of the shard in config.SHARDS this instance works on,
+                or None for the main database
+        """
+        self.shard = shard
         self.connection = None
         self.cursor = None
+        self.main_connection = None
+        self.main_cursor = None
+        self.replica_connection = None
+        self.replica_cursor = None
+        self.max_replica_lag = getattr(config, 'READ_REPLICA_MAX_LAG_SECONDS', None)
+        self._replica_checked_at = None
+        self._replica_usable = False
+        self._pending_write = False
+        self._written_change_id = 0
+        # Who audit events are attributed to, e.g. 'agent:3' (set by the UI)
+        self.actor = None
+        self.audit = None
+        # Signed token and claims of the logged-in user (see credentials.py)
+        self.session_token = None
+        self.session = None
+        self.entities = identity_map.get_map(shard)
+        self.waitlist = waitlist.get_queue(shard)
+        # Outcomes of requests sent with an idempotency key, by key
+        self.outcomes = idempotency.get_cache(shard)
+        self.stream_batch_size = getattr(config, 'STREAM_BATCH_SIZE', 500)
+        # Charges of the rentals closed by the last return_cars(), by car ID
+        self.last_charges = {}
+        # Reconnect and retry settings and process-wide counts (see reconnect.py)
+        self.retry_policy = reconnect.get_policy()
+        self.health_check_seconds = getattr(config, 'HEALTH_CHECK_IDLE_SECONDS', 30)
+        self.metrics = reconnect.get_metrics()
+        self._last_used = 0.0
+        self._lost_at = None
+        self._guard_depth = 0
     
     def connect(self):
-        """Establish database connection"""
-        self.connection = get_connection()
+        """Establish database connection (and read replica connection, if configured)"""
+        self.connection = get_connection(shard=self.shard)
         self.cursor = self.connection.cursor()
+        if self.shard is None:
+            self.main_connection = self.connection
+            self.main_cursor = self.cursor
+            self._open_replica()
+        else:
+            # Users, customers, agents and branches stay in the main database
+            self.main_connection = get_connection()
+            self.main_cursor = self.main_connection.cursor()
+        if getattr(config, 'AUDIT_ENABLED', True):
+            self.audit = audit.get_writer()
+        if self.session_token is not None:
+            # Reconnecting: the session token stands in for the password
+            self.resume_session(self.session_token)
+        self._last_used = time.monotonic()
+        self._lost_at = None
+    
+    def _open_replica(self):
+        """Connect to the read replica, if one is configured and reachable"""
+        try:
+            self.replica_connection = get_read_replica_connection()
+        except DB_ERRORS as e:
+            print(f"Read replica unavailable, reading from primary: {e}")
+            self.replica_connection = None
+        self.replica_cursor = self.replica_connection.cursor() if self.replica_connection else None
+        self._replica_checked_at = None
     
     def disconnect(self):
-        """Close database connection"""
+        """Flush queued audit events and close database connection"""
+        if self.audit is not None:
+            self.audit.flush()
         close_connection(self.connection, self.cursor)
+        close_connection(self.replica_connection, self.replica_cursor)
+        if self.shard is not None:
+            close_connection(self.main_connection, self.main_cursor)
         self.connection = None
         self.cursor = None
+        self.main_connection = None
+        self.main_cursor = None
+        self.replica_connection = None
+        self.replica_cursor = None
+        self._lost_at = None
     
     def commit(self):
         """Commit current transaction"""
         if self.connection:
             self.connection.commit()
+            # Read our own writes: the replica has to catch up first
+            self._pending_write = True
+            self._replica_checked_at = None
+    
+    def _commit_main(self):
+        """Commit a change to users, customers, agents or branches (held in the main database)"""
+        if self.shard is None:
+            self.commit()
+        else:
+            self.main_connection.commit()
+    
+    def rollback(self):
+        """Roll back current transaction (a lost session has nothing left to roll back)"""
+        if not self.connection:
+            return
+        try:
+            self.connection.rollback()
+        except DB_ERRORS as e:
+            if not reconnect.is_disconnect(e):
+                raise
+            self._connection_lost()
+    
+    # ============ Connection Health ============
+    
+    def reconnect(self):
+        """
+        Replace a lost connection, backing off between attempts
+        
+        The old connections are closed (quietly: they are usually dead
+        already) and connect() opens new ones, resuming the logged-in
+        session from its token.
+        
+        Raises:
+            oracledb.DatabaseError: The last connect error, if every attempt failed
+        """
+        started = self._lost_at or time.monotonic()
+        self._close_quietly()
+        error = None
+        for delay in reconnect.backoff_delays(self.retry_policy):
+            if delay:
+                time.sleep(delay)
+            try:
+                self.connect()
+            except DB_ERRORS as e:
+                error = e
+                self.metrics.count('reconnect_failures')
+                self._close_quietly()
+                continue
+            self.metrics.count('reconnects')
+            self.metrics.add_outage(time.monotonic() - started)
+            return
+        # Still lost: the next call tries again
+        self._lost_at = started
+        print(f"Could not reconnect to the database: {error}")
+        raise error
+    
+    def _ensure_connected(self):
+        """
+        Check the connection before a call and replace it if it is gone
+        
+        A session known to be lost is replaced straight away; a connection
+        idle for more than HEALTH_CHECK_IDLE_SECONDS is pinged first, since
+        idle sessions are the ones firewalls and the server time out.
+        """
+        now = time.monotonic()
+        if self._lost_at is not None:
+            self.reconnect()
+        elif self.connection is None:
+            return  # never connected
+        elif not self._connection_alive():
+            self._connection_lost()
+            self.reconnect()
+        elif self.health_check_seconds is not None and now - self._last_used > self.health_check_seconds:
+            self.metrics.count('health_checks')
+            try:
+                self.connection.ping()
+            except DB_ERRORS:
+                self._connection_lost()
+                self.reconnect()
+        self._last_used = time.monotonic()
+    
+    def _connection_alive(self):
+        """
+        Check the primary connection without a round trip
+        
+        Returns:
+            bool: False if the driver knows the session (or the main database's) is gone
+        """
+        return (self.connection is not None and self.connection.is_healthy()
+                and self.main_connection is not None and self.main_connection.is_healthy())
+    
+    def _connection_lost(self):
+        """Note that the session is gone; the next guarded call reconnects"""
+        if self._lost_at is None:
+            self._lost_at = time.monotonic()
+            self.metrics.count('dead_connections')
+    
+    def _close_quietly(self):
+        """Close every connection and cursor, ignoring errors from dead ones"""
+        self._close_all(self.cursor, self.connection, self.replica_cursor, self.replica_connection)
+        if self.shard is not None:
+            self._close_all(self.main_cursor, self.main_connection)
+        self.connection = None
+        self.cursor = None
+        self.main_connection = None
+        self.main_cursor = None
+        self.replica_connection = None
+        self.replica_cursor = None
+    
+    @staticmethod
+    def _close_all(*resources):
+        """Close cursors and connections that may already be dead"""
+        for resource in resources:
+            if resource is not None:
+                try:
+                    resource.close()
+                except Exception:
+                    pass
+    
+    # ============ Read Routing ============
+    
+    def _read_cursor(self):
+        """
+        Get the cursor for a read that the replica may serve
+        
+        Returns:
+            cursor: Replica cursor if the replica is fresh enough, else the primary cursor
+        """
+        if self.replica_cursor is None:
+            return self.cursor
+        now = time.monotonic()
+        if self._replica_checked_at is None or now - self._replica_checked_at > self.REPLICA_CHECK_SECONDS:
+            self._replica_usable = self._check_replica()
+            self._replica_checked_at = now
+        return self.replica_cursor if self._replica_usable else self.cursor
+    
+    def _read_connection(self):
+        """
+        Get the connection for a read that the replica may serve
+        
+        Returns:
+            connection: Replica connection if the replica is fresh enough, else the primary connection
+        """
+        return self.replica_connection if self._read_cursor() is self.replica_cursor else self.connection
+    
+    def _stream(self, connection, query, binds=None, batch_size=None, record=None):
+        """
+        Run a query on its own cursor and yield its rows one fetchmany batch at a time
+        
+        The cursor is closed when the rows run out, when the consumer stops
+        early (generator close) or on error, so only one batch is held in
+        memory at a time and other operations can use the shared cursors
+        while the rows are being consumed.
+        
+        Args:
+            connection: Connection to run the query on
+            query: SELECT statement
+            binds: Bind values
+            batch_size: Rows per fetch (default STREAM_BATCH_SIZE from config)
+            record: Record type (see records.py) the rows are built as
+        
+        Yields:
+            tuple: One row
+        """
+        batch_size = batch_size or self.stream_batch_size
+        cursor = connection.cursor()
+        try:
+            # One fetch round trip per batch
+            cursor.arraysize = batch_size
+            cursor.execute(query, binds or {})
+            cursor.rowfactory = record
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield from rows
+        finally:
+            cursor.close()
+    
+    @staticmethod
+    def _fetch_records(cursor, record):
+        """
+        Fetch the rest of an executed query's rows as records
+        
+        Args:
+            cursor: Cursor the query was executed on
+            record: Record type (see records.py)
+            
+        Returns:
+            list: Records
+        """
+        cursor.rowfactory = record
+        try:
+            return cursor.fetchall()
+        finally:
+            cursor.rowfactory = None
+    
+    def _check_replica(self):
+        """
+        Decide whether the replica can serve reads, using CarChangeLog
+        
+        Returns:
+            bool: True if the replica has this instance's writes and is within the lag bound
+        """
+        query = "SELECT NVL(MAX(CHANGE_ID), 0) FROM CarChangeLog"
+        try:
+            self.replica_cursor.execute(query)
+            replica_change_id = self.replica_cursor.fetchone()[0]
+            if self._pending_write:
+                self.cursor.execute(query)
+                self._written_change_id = self.cursor.fetchone()[0]
+                self._pending_write = False
+            if replica_change_id < self._written_change_id:
+                return False
+            if self.max_replica_lag is None:
+                return True
+            
+            # Lag is the age of the oldest change the replica has not applied
+            self.cursor.execute("""
+                SELECT CHANGED_AT FROM CarChangeLog
+                WHERE CHANGE_ID > :change_id
+                ORDER BY CHANGE_ID
+                FETCH FIRST 1 ROWS ONLY
+            """, {'change_id': replica_change_id})
+            oldest_missing = self.cursor.fetchone()
+            return oldest_missing is None or \
+                (datetime.now() - oldest_missing[0]).total_seconds() <= self.max_replica_lag
+        except DB_ERRORS as e:
+            print(f"Read replica unavailable, reading from primary: {e}")
+            if reconnect.is_disconnect(e):
+                # Reads go to the primary until the next check uses the new connection
+                self._close_all(self.replica_cursor, self.replica_connection)
+                self._open_replica()
+            return False
     
     # ============ Customer Operations ============
     
+    @retrying
     def login_customer(self, username, password):
         """
-        Authenticate customer login
+        Authenticate customer login and start a session
+        
+        The password hash is checked here rather than in SQL; this takes
+        tens of milliseconds by design, so call it off the Tk thread.
         
         Args:
             username: Customer username
             password: Customer password
             
         Returns:
-            tuple: User record if found, None otherwise
-        """
-        query = """
-            SELECT * FROM Users 
-            WHERE USERNAME = :username AND PASSWORD = :password
+            tuple: (USER_ID, USERNAME) if the credentials match, None otherwise
         """
-        self.cursor.execute(query, {'username': username, 'password': password})
-        return self.cursor.fetchone()
+        query = "SELECT USER_ID, PASSWORD FROM Users WHERE USERNAME = :username"
+        self.main_cursor.execute(query, {'username': username})
+        row = self.main_cursor.fetchone()
+        if row is None:
+            return None
+        if not self._check_password(password, row[1], "UPDATE Users SET PASSWORD = :hash WHERE USER_ID = :id", row[0]):
+            return None
+        self._start_session('customer', row[0], username)
+        return row[0], username
     
+    @reconnecting
     def register_customer(self, customer_id, username, password):
         """
         Register a new customer
@@ -71,10 +420,10 @@ class DatabaseOperations:
                 INSERT INTO Users (USER_ID, USERNAME, PASSWORD) 
                 VALUES (:user_id, :username, :password)
             """
-            self.cursor.execute(query_users, {
+            self.main_cursor.execute(query_users, {
                 'user_id': customer_id,
                 'username': username,
-                'password': password
+                'password': credentials.hash_password(password)
             })
             
             # Insert into Customer table
@@ -82,17 +431,19 @@ class DatabaseOperations:
                 INSERT INTO Customer (CUST_ID, CUST_NAME) 
                 VALUES (:cust_id, :cust_name)
             """
-            self.cursor.execute(query_customer, {
+            self.main_cursor.execute(query_customer, {
                 'cust_id': customer_id,
                 'cust_name': username
             })
             
-            self.commit()
+            self._commit_main()
+            self._remember_customer(Customer(customer_id, username))
             return True
-        except oracledb.DatabaseError as e:
+        except DB_ERRORS as e:
             print(f"Database Error: {e}")
             return False
     
+    @retrying
     def get_customer_id(self, username):
         """
         Get customer ID (CUST_ID) by username for use in RentalTransactions
@@ -106,19 +457,24 @@ class DatabaseOperations:
         Returns:
             int: Customer ID (CUST_ID) or None
         """
+        customer = self.entities.get('customer_name', username)
+        if customer is not None:
+            return customer.customer_id
+        
         # Get CUST_ID from Customer table using CUST_NAME (which matches USERNAME)
         query = "SELECT CUST_ID FROM Customer WHERE CUST_NAME = :username"
-        self.cursor.execute(query, {'username': username})
-        result = self.cursor.fetchone()
+        self.main_cursor.execute(query, {'username': username})
+        result = self.main_cursor.fetchone()
         
         if result:
+            self._remember_customer(Customer(result[0], username))
             return result[0]
         
         # If not found in Customer table, check if user exists in Users table
         # and create corresponding Customer record
         query_user = "SELECT USER_ID FROM Users WHERE USERNAME = :username"
-        self.cursor.execute(query_user, {'username': username})
-        user_result = self.cursor.fetchone()
+        self.main_cursor.execute(query_user, {'username': username})
+        user_result = self.main_cursor.fetchone()
         
         if user_result:
             user_id = user_result[0]
@@ -126,38 +482,40 @@ class DatabaseOperations:
             try:
                 # Check if it already exists (in case of race condition)
                 check_existing = "SELECT CUST_ID FROM Customer WHERE CUST_ID = :cust_id"
-                self.cursor.execute(check_existing, {'cust_id': user_id})
-                if self.cursor.fetchone():
+                self.main_cursor.execute(check_existing, {'cust_id': user_id})
+                if self.main_cursor.fetchone():
                     return user_id
                 
                 insert_customer = """
                     INSERT INTO Customer (CUST_ID, CUST_NAME) 
                     VALUES (:cust_id, :cust_name)
                 """
-                self.cursor.execute(insert_customer, {
+                self.main_cursor.execute(insert_customer, {
                     'cust_id': user_id,
                     'cust_name': username
                 })
-                self.commit()
+                self._commit_main()
                 # Verify it was created
-                self.cursor.execute(check_existing, {'cust_id': user_id})
-                if self.cursor.fetchone():
+                self.main_cursor.execute(check_existing, {'cust_id': user_id})
+                if self.main_cursor.fetchone():
+                    self._remember_customer(Customer(user_id, username))
                     return user_id
                 else:
                     print(f"Warning: Customer record creation may have failed for USER_ID {user_id}")
                     return None
-            except oracledb.DatabaseError as e:
+            except DB_ERRORS as e:
                 print(f"Error creating Customer record: {e}")
                 # Try to get existing record in case of duplicate key error
                 check_existing = "SELECT CUST_ID FROM Customer WHERE CUST_ID = :cust_id"
-                self.cursor.execute(check_existing, {'cust_id': user_id})
-                existing = self.cursor.fetchone()
+                self.main_cursor.execute(check_existing, {'cust_id': user_id})
+                existing = self.main_cursor.fetchone()
                 if existing:
                     return existing[0]
                 return None
         
         return None
     
+    @retrying
     def get_customer_rented_cars(self, username):
         """
         Get all rented cars for a customer
@@ -166,8 +524,26 @@ class DatabaseOperations:
             username: Customer username
             
         Returns:
-            list: List of rented car records
+            list: RentedCar records
         """
+        return list(self.iter_customer_rented_cars(username))
+    
+    @retrying
+    def iter_customer_rented_cars(self, username, batch_size=None):
+        """
+        Stream the rented cars of a customer (see get_customer_rented_cars)
+        
+        Args:
+            username: Customer username
+            batch_size: Rows per fetch (default STREAM_BATCH_SIZE from config)
+            
+        Yields:
+            RentedCar: (car_id, model, year, end_date)
+        """
+        # Customers live in the main database, which a shard cannot join to
+        customer_id = self.get_customer_id(username)
+        if customer_id is None:
+            return iter(())
         query = """
             SELECT CARID, CARMODEL, YEAR, RENTALENDDATE
             FROM (
@@ -176,13 +552,13 @@ class DatabaseOperations:
                 FROM Cars C
                 INNER JOIN RentalTransactions RT ON C.CARID = RT.CARID
                 WHERE C.AVAILABILITYSTATUS = 'Rented'
-                AND RT.CUSTOMERID = (SELECT CUST_ID FROM Customer WHERE CUST_NAME = :username)
+                AND RT.CUSTOMERID = :customer_id
             )
             WHERE rnk = 1
         """
-        self.cursor.execute(query, {'username': username})
-        return self.cursor.fetchall()
+        return self._stream(self._read_connection(), query, {'customer_id': customer_id}, batch_size, RentedCar)
     
+    @retrying
     def get_overdue_cars(self, username):
         """
         Get overdue cars for a customer
@@ -191,40 +567,61 @@ class DatabaseOperations:
             username: Customer username
             
         Returns:
-            list: List of overdue car records
+            list: RentedCar records
         """
+        return list(self.iter_overdue_cars(username))
+    
+    @retrying
+    def iter_overdue_cars(self, username, batch_size=None):
+        """
+        Stream the overdue cars of a customer (see get_overdue_cars)
+        
+        Args:
+            username: Customer username
+            batch_size: Rows per fetch (default STREAM_BATCH_SIZE from config)
+            
+        Yields:
+            RentedCar: (car_id, model, year, end_date)
+        """
+        customer_id = self.get_customer_id(username)
+        if customer_id is None:
+            return iter(())
         query = """
-            SELECT C.CARID, C.CARMODEL, RT.RENTALENDDATE
+            SELECT C.CARID, C.CARMODEL, C.YEAR, RT.RENTALENDDATE
             FROM Cars C
             INNER JOIN RentalTransactions RT ON C.CARID = RT.CARID
             WHERE C.AVAILABILITYSTATUS = 'Rented'
-            AND RT.CUSTOMERID = (SELECT CUST_ID FROM Customer WHERE CUST_NAME = :username)
+            AND RT.CUSTOMERID = :customer_id
             AND RT.RENTALSTATUS = 'Pending'
             AND RT.RENTALENDDATE < SYSTIMESTAMP
         """
-        self.cursor.execute(query, {'username': username})
-        return self.cursor.fetchall()
+        return self._stream(self._read_connection(), query, {'customer_id': customer_id}, batch_size, RentedCar)
     
     # ============ Agent Operations ============
     
+    @retrying
     def login_agent(self, username, password):
         """
-        Authenticate agent login
+        Authenticate agent login and start a session (call off the Tk thread)
         
         Args:
             username: Agent username
             password: Agent password
             
         Returns:
-            tuple: Agent record if found, None otherwise
+            tuple: (AGENTID, AGENTNAME) if the credentials match, None otherwise
         """
-        query = """
-            SELECT * FROM Agent 
-            WHERE AGENTNAME = :username AND A_PASSWORD = :password
-        """
-        self.cursor.execute(query, {'username': username, 'password': password})
-        return self.cursor.fetchone()
+        query = "SELECT AGENTID, A_PASSWORD FROM Agent WHERE AGENTNAME = :username"
+        self.main_cursor.execute(query, {'username': username})
+        for agent_id, stored in self.main_cursor.fetchall():
+            # Passwords from before hashing were cut/padded to CHAR(8)
+            if self._check_password(password, stored, "UPDATE Agent SET A_PASSWORD = :hash WHERE AGENTID = :id",
+                                    agent_id, legacy_width=8):
+                self._start_session('agent', agent_id, username)
+                return agent_id, username
+        return None
     
+    @reconnecting
     def register_agent(self, agent_id, agentname, password):
         """
         Register a new agent
@@ -232,58 +629,249 @@ class DatabaseOperations:
         Args:
             agent_id: Unique agent ID
             agentname: Agent username
-            password: Agent password (must be 8 characters based on schema)
+            password: Agent password (stored hashed, any length)
             
         Returns:
             bool: True if successful, False otherwise
         """
         try:
-            # A_PASSWORD is CHAR(8) and CONTACT is CHAR(10), so we need to provide values
-            # Truncate password to 8 chars if longer, pad if shorter
-            password_8 = (password[:8] if len(password) >= 8 else password.ljust(8))[:8]
             contact = ''  # Empty contact, can be updated later
             
             query = """
                 INSERT INTO Agent (AGENTID, AGENTNAME, A_PASSWORD, CARHANDLING, CONTACT) 
                 VALUES (:agent_id, :agentname, :password, 0, :contact)
             """
-            self.cursor.execute(query, {
+            self.main_cursor.execute(query, {
                 'agent_id': agent_id,
                 'agentname': agentname,
-                'password': password_8,
+                'password': credentials.hash_password(password),
                 'contact': contact
             })
-            self.commit()
+            self._commit_main()
             return True
-        except oracledb.DatabaseError as e:
+        except DB_ERRORS as e:
             print(f"Database Error: {e}")
             return False
     
+    # ============ Sessions ============
+    
+    def _check_password(self, password, stored, rehash_query, key, legacy_width=None):
+        """
+        Verify a password, upgrading a legacy or weaker stored value on success
+        
+        Args:
+            password: Password as typed
+            stored: Stored hash or legacy value
+            rehash_query: UPDATE taking :hash and :id that stores a new hash
+            key: Value for :id
+            legacy_width: Width legacy plain text values were cut to
+            
+        Returns:
+            bool: True if the password matches
+        """
+        matches, needs_rehash = credentials.verify_password(password, stored, legacy_width)
+        if needs_rehash:
+            try:
+                self.main_cursor.execute(rehash_query, {'hash': credentials.hash_password(password), 'id': key})
+                self._commit_main()
+            except DB_ERRORS as e:
+                print(f"Could not upgrade stored password: {e}")
+        return matches
+    
+    def _start_session(self, role, subject_id, username):
+        """Issue a session token for a successful login"""
+        self.resume_session(credentials.issue_token(role, subject_id, username))
+    
+    def resume_session(self, token):
+        """
+        Adopt a session token instead of logging in again
+        
+        Used when a view takes over a connection, or after reconnecting.
+        
+        Args:
+            token: Token from a previous login
+            
+        Returns:
+            dict: Session claims (role, id, name, exp), or None if the token is invalid or expired
+        """
+        claims = credentials.verify_token(token)
+        self.session_token = token if claims else None
+        self.session = claims
+        if claims:
+            self.actor = f"{claims['role']}:{claims['name'] if claims['role'] == 'customer' else claims['id']}"
+        return claims
+    
     # ============ Car Operations ============
     
+    @retrying
     def get_available_cars(self):
         """
         Get all available cars for rent
         
         Returns:
-            list: List of available car records
+            list: Car records
         """
-        query = "SELECT * FROM Cars WHERE AVAILABILITYSTATUS = 'Available'"
-        self.cursor.execute(query)
-        return self.cursor.fetchall()
+        return list(self.iter_available_cars())
+    
+    @retrying
+    def iter_available_cars(self, batch_size=None):
+        """
+        Stream the available cars (see get_available_cars)
+        
+        Args:
+            batch_size: Rows per fetch (default STREAM_BATCH_SIZE from config)
+            
+        Yields:
+            Car: Available car
+        """
+        query = f"SELECT {Car.COLUMNS} FROM Cars WHERE AVAILABILITYSTATUS = 'Available'"
+        return self._stream(self._read_connection(), query, batch_size=batch_size, record=Car)
     
+    @retrying
     def get_all_cars(self):
         """
         Get all cars (for agent view)
         
         Returns:
-            list: List of all car records
+            list: CarSummary records
         """
-        query = "SELECT CARID, CARMODEL, TARIFF, YEAR, AVAILABILITYSTATUS FROM Cars"
-        self.cursor.execute(query)
-        return self.cursor.fetchall()
+        return list(self.iter_all_cars())
+    
+    @retrying
+    def iter_all_cars(self, batch_size=None):
+        """
+        Stream all cars (see get_all_cars)
+        
+        Args:
+            batch_size: Rows per fetch (default STREAM_BATCH_SIZE from config)
+            
+        Yields:
+            CarSummary: (car_id, model, tariff, year, status)
+        """
+        query = f"SELECT {CarSummary.COLUMNS} FROM Cars"
+        return self._stream(self._read_connection(), query, batch_size=batch_size, record=CarSummary)
+    
+    @retrying
+    def get_cars_by_ids(self, car_ids):
+        """
+        Get specific cars in the same shape as get_all_cars
+        
+        Args:
+            car_ids: Iterable of car IDs
+            
+        Returns:
+            list: CarSummary records for the IDs that still exist
+        """
+        cars = []
+        for placeholders, binds in self._in_clauses(car_ids):
+            query = f"""
+                SELECT {CarSummary.COLUMNS} FROM Cars
+                WHERE CARID IN ({placeholders})
+            """
+            self.cursor.execute(query, binds)
+            cars.extend(self._fetch_records(self.cursor, CarSummary))
+        return cars
+    
+    @retrying
+    def get_all_car_details(self):
+        """
+        Get every column of every car (for replicas and exports)
+        
+        Returns:
+            list: Car records
+        """
+        return list(self.iter_all_car_details())
+    
+    @retrying
+    def load_car_columns(self, batch_size=None):
+        """
+        Load every car into a CarColumns container (for whole-fleet loads)
+        
+        Rows are streamed straight into the column arrays, so memory grows
+        by about 60 bytes per car rather than by a record and its values.
+        
+        Args:
+            batch_size: Rows per fetch (default STREAM_BATCH_SIZE from config)
+            
+        Returns:
+            CarColumns: Every car
+        """
+        return CarColumns.from_rows(self.iter_all_car_details(batch_size))
+    
+    @retrying
+    def iter_all_car_details(self, batch_size=None):
+        """
+        Stream every column of every car (see get_all_car_details)
+        
+        Args:
+            batch_size: Rows per fetch (default STREAM_BATCH_SIZE from config)
+            
+        Yields:
+            Car: One car
+        """
+        query = f"SELECT {Car.COLUMNS} FROM Cars"
+        return self._stream(self._read_connection(), query, batch_size=batch_size, record=Car)
+    
+    @retrying
+    def get_car_details_by_ids(self, car_ids):
+        """
+        Get every column of specific cars
+        
+        Args:
+            car_ids: Iterable of car IDs
+            
+        Returns:
+            list: Car records
+        """
+        cars = []
+        for placeholders, binds in self._in_clauses(car_ids):
+            query = f"""
+                SELECT {Car.COLUMNS}
+                FROM Cars
+                WHERE CARID IN ({placeholders})
+            """
+            self.cursor.execute(query, binds)
+            cars.extend(self._fetch_records(self.cursor, Car))
+        # Fresh from the primary: refresh the identity map on the way out
+        for car in cars:
+            self.entities.put('car', car.car_id, car)
+        return cars
+    
+    @retrying
+    def get_car(self, car_id, fresh=False):
+        """
+        Get one car, from the identity map when it is held there
+        
+        The map may lag changes made by other processes (see
+        identity_map.py), so anything priced or decided from the car
+        passes fresh=True.
+        
+        Args:
+            car_id: Car ID
+            fresh: Read it from the primary even when it is held
+            
+        Returns:
+            Car: Car entity, or None if it does not exist
+        """
+        car = None if fresh else self.entities.get('car', car_id)
+        if car is not None:
+            return car
+        query = f"""
+            SELECT {Car.COLUMNS}
+            FROM Cars
+            WHERE CARID = :car_id
+        """
+        self.cursor.execute(query, {'car_id': car_id})
+        cars = self._fetch_records(self.cursor, Car)
+        if not cars:
+            self.entities.discard('car', car_id)
+            return None
+        self.entities.put('car', car_id, cars[0])
+        return cars[0]
     
-    def add_car(self, car_id, agent_id, car_model, tariff, year, terms):
+    @retrying_if_keyed
+    def add_car(self, car_id, agent_id, car_model, tariff, year, terms, branch_id=None, *,
+                idempotency_key=None):
         """
         Add a new car to the system
         
@@ -294,14 +882,23 @@ class DatabaseOperations:
             tariff: Rental tariff
             year: Car year
             terms: Rental terms
+            branch_id: Branch the car is kept at (defaults to the agent's branch)
+            idempotency_key: Key of this request (see idempotency.py), or None
             
         Returns:
             bool: True if successful, False otherwise
         """
         try:
+            if branch_id is None and self.shard is not None:
+                # The agent's branch is only known to the main database
+                branch_id = self.get_agent_branch(agent_id)
+            outcome = self._claim_key(idempotency_key, 'ADD')
+            if outcome is not None:
+                return outcome.result
             query = """
-                INSERT INTO Cars (CARID, AGENTID, CARMODEL, TARIFF, ODAMOUNT, YEAR, TERMS, AVAILABILITYSTATUS)
-                VALUES (:car_id, :agent_id, :car_model, :tariff, :odamount, :year, :terms, 'Available')
+                INSERT INTO Cars (CARID, AGENTID, CARMODEL, TARIFF, ODAMOUNT, YEAR, TERMS, AVAILABILITYSTATUS, BRANCH_ID)
+                VALUES (:car_id, :agent_id, :car_model, :tariff, :odamount, :year, :terms, 'Available',
+                        NVL(:branch_id, (SELECT BRANCH_ID FROM Agent WHERE AGENTID = :agent_id)))
             """
             self.cursor.execute(query, {
                 'car_id': car_id,
@@ -310,15 +907,26 @@ class DatabaseOperations:
                 'tariff': tariff,
                 'odamount': tariff // 4,
                 'year': year,
-                'terms': terms
+                'terms': terms,
+                'branch_id': branch_id
             })
+            self._count_car_transitions([], [(car_model, 'Available')])
+            self._log_car_change(car_id, 'ADD')
+            outcome = self._record_outcome(idempotency_key, 'ADD', True)
             self.commit()
+            self._remember_outcome(idempotency_key, outcome)
+            if branch_id is not None:
+                self.entities.put('car', car_id, Car(car_id, agent_id, car_model, tariff, tariff // 4,
+                                                     year, terms, 'Available', branch_id))
+            self._audit('ADD', car_id, f"{car_model} {year}, tariff {tariff}")
             return True
-        except oracledb.DatabaseError as e:
+        except DB_ERRORS as e:
             print(f"Database Error: {e}")
+            self.rollback()
             return False
     
-    def update_car(self, car_id, field, value):
+    @retrying_if_keyed
+    def update_car(self, car_id, field, value, *, idempotency_key=None):
         """
         Update a car field
         
@@ -326,42 +934,68 @@ class DatabaseOperations:
             car_id: Car ID to update
             field: Field name to update
             value: New value
+            idempotency_key: Key of this request (see idempotency.py), or None
             
         Returns:
             bool: True if successful, False otherwise
         """
-        try:
-            # Map field names to column names
-            field_mapping = {
-                'CarModel': 'CARMODEL',
-                'Tariff': 'TARIFF',
-                'Year': 'YEAR',
-                'Terms': 'TERMS',
-                'Availability': 'AVAILABILITYSTATUS'
-            }
-            
-            if field not in field_mapping:
+        # Map field names to column names (and Car entity fields)
+        field_mapping = {
+            'CarModel': 'CARMODEL',
+            'Tariff': 'TARIFF',
+            'Year': 'YEAR',
+            'Terms': 'TERMS',
+            'Availability': 'AVAILABILITYSTATUS'
+        }
+        entity_fields = {
+            'CarModel': 'model',
+            'Tariff': 'tariff',
+            'Year': 'year',
+            'Terms': 'terms',
+            'Availability': 'status'
+        }
+        
+        if field not in field_mapping:
+            return False
+        
+        column = field_mapping[field]
+        
+        # Handle different data types
+        if field in ('Tariff', 'Year'):
+            try:
+                value = int(value)
+            except ValueError as e:
+                print(f"Error updating car: {e}")
                 return False
+        
+        try:
+            outcome = self._claim_key(idempotency_key, 'UPDATE')
+            if outcome is not None:
+                return outcome.result
             
-            column = field_mapping[field]
+            # Only model and availability changes move the fleet counters
+            tracks_counters = field in ('CarModel', 'Availability')
+            if tracks_counters:
+                before = self._car_states([int(car_id)])
             
-            # Handle different data types
-            if field == 'Tariff':
-                query = f"UPDATE Cars SET {column} = :value WHERE CARID = :car_id"
-                self.cursor.execute(query, {'value': int(value), 'car_id': int(car_id)})
-            elif field == 'Year':
-                query = f"UPDATE Cars SET {column} = :value WHERE CARID = :car_id"
-                self.cursor.execute(query, {'value': int(value), 'car_id': int(car_id)})
-            else:
-                query = f"UPDATE Cars SET {column} = :value WHERE CARID = :car_id"
-                self.cursor.execute(query, {'value': value, 'car_id': int(car_id)})
+            query = f"UPDATE Cars SET {column} = :value WHERE CARID = :car_id"
+            self.cursor.execute(query, {'value': value, 'car_id': int(car_id)})
             
+            if tracks_counters:
+                self._count_car_transitions(before, self._car_states([int(car_id)]))
+            self._log_car_change(int(car_id), 'UPDATE')
+            outcome = self._record_outcome(idempotency_key, 'UPDATE', True)
             self.commit()
+            self._remember_outcome(idempotency_key, outcome)
+            self.entities.update('car', int(car_id), **{entity_fields[field]: value})
+            self._audit('UPDATE', int(car_id), f"{field} = {value}")
             return True
-        except Exception as e:
+        except DB_ERRORS as e:
             print(f"Error updating car: {e}")
+            self.rollback()
             return False
     
+    @reconnecting
     def delete_car(self, car_id):
         """
         Delete a car from the system
@@ -373,136 +1007,559 @@ class DatabaseOperations:
             bool: True if successful, False otherwise
         """
         try:
+            before = self._car_states([int(car_id)])
             query = "DELETE FROM Cars WHERE CARID = :car_id"
             self.cursor.execute(query, {'car_id': int(car_id)})
+            self._count_car_transitions(before, [])
+            self._log_car_change(int(car_id), 'DELETE')
             self.commit()
+            self.entities.discard('car', int(car_id))
+            self._audit('DELETE', int(car_id))
             return True
-        except Exception as e:
+        except DB_ERRORS as e:
             print(f"Error deleting car: {e}")
+            self.rollback()
             return False
     
-    # ============ Rental Operations ============
-    
-    def create_rental(self, customer_id, car_id, rental_start_date, rental_end_date, total_cost):
+    @reconnecting
+    def adjust_tariffs(self, percent=None, amount=None, car_model=None, year=None,
+                       agent_id=None, car_ids=None):
         """
-        Create a new rental transaction
+        Change the tariff of every matching car in one set-based UPDATE
+        
+        Exactly one of percent or amount must be given. Filters that are
+        None are ignored; with no filters every car is changed.
         
         Args:
-            customer_id: Customer ID (must be CUST_ID from Customer table)
-            car_id: Car ID
-            rental_start_date: Rental start date
-            rental_end_date: Rental end date
-            total_cost: Total rental cost
+            percent: Percentage change, e.g. 10 for +10% or -5 for -5%
+            amount: Absolute change added to the tariff, e.g. 500 or -200
+            car_model: Only cars of this model
+            year: Only cars of this year
+            agent_id: Only cars managed by this agent
+            car_ids: Only these car IDs
             
         Returns:
-            bool: True if successful, False otherwise
+            int: Number of cars changed, or None on error
         """
+        if (percent is None) == (amount is None):
+            raise ValueError("Give exactly one of percent or amount")
+        
+        conditions = []
+        binds = {}
+        if car_model is not None:
+            conditions.append("CARMODEL = :car_model")
+            binds['car_model'] = car_model
+        if year is not None:
+            conditions.append("YEAR = :year")
+            binds['year'] = int(year)
+        if agent_id is not None:
+            conditions.append("AGENTID = :agent_id")
+            binds['agent_id'] = int(agent_id)
+        # Long ID lists are split into IN lists Oracle accepts, one UPDATE each
+        if car_ids is not None:
+            id_chunks = list(self._in_clauses(car_ids))
+            if not id_chunks:
+                return 0
+        else:
+            id_chunks = [(None, {})]
+        
+        if percent is not None:
+            new_tariff = "ROUND(TARIFF * (100 + :change) / 100)"
+            change = float(percent)
+        else:
+            new_tariff = "TARIFF + :change"
+            change = int(amount)
+        
         try:
-            # First, verify that the customer exists in Customer table
-            check_customer = "SELECT CUST_ID FROM Customer WHERE CUST_ID = :customer_id"
-            self.cursor.execute(check_customer, {'customer_id': customer_id})
-            customer_exists = self.cursor.fetchone()
-            
-            if not customer_exists:
-                print(f"Error: Customer with CUST_ID {customer_id} does not exist in Customer table")
-                # Try to create it from Users table
-                check_user = "SELECT USER_ID, USERNAME FROM Users WHERE USER_ID = :user_id"
-                self.cursor.execute(check_user, {'user_id': customer_id})
-                user_record = self.cursor.fetchone()
+            updated = 0
+            for placeholders, id_binds in id_chunks:
+                chunk_conditions = conditions + ([f"CARID IN ({placeholders})"] if id_binds else [])
+                where = f"WHERE {' AND '.join(chunk_conditions)}" if chunk_conditions else ""
+                chunk_binds = dict(binds, **id_binds)
                 
-                if user_record:
-                    user_id, username = user_record
-                    try:
-                        insert_customer = """
-                            INSERT INTO Customer (CUST_ID, CUST_NAME) 
-                            VALUES (:cust_id, :cust_name)
-                        """
-                        self.cursor.execute(insert_customer, {
-                            'cust_id': user_id,
-                            'cust_name': username
-                        })
-                        self.commit()
-                        print(f"Created Customer record for USER_ID {user_id}")
-                    except oracledb.DatabaseError as e:
-                        print(f"Failed to create Customer record: {e}")
-                        return False
-                else:
-                    # Debug: Check what customers exist
-                    debug_query = "SELECT CUST_ID, CUST_NAME FROM Customer"
-                    self.cursor.execute(debug_query)
-                    existing_customers = self.cursor.fetchall()
-                    print(f"Existing customers in Customer table: {existing_customers}")
-                    # Also check Users table
-                    debug_users = "SELECT USER_ID, USERNAME FROM Users"
-                    self.cursor.execute(debug_users)
-                    existing_users = self.cursor.fetchall()
-                    print(f"Existing users in Users table: {existing_users}")
-                    return False
+                query = f"UPDATE Cars SET TARIFF = GREATEST({new_tariff}, 0) {where}"
+                self.cursor.execute(query, dict(chunk_binds, change=change))
+                updated += self.cursor.rowcount
+                
+                log_query = f"""
+                    INSERT INTO CarChangeLog (CHANGE_ID, CARID, OPERATION, CHANGED_AT)
+                    SELECT change_log_seq.NEXTVAL, CARID, 'UPDATE', SYSTIMESTAMP FROM Cars {where}
+                """
+                self.cursor.execute(log_query, chunk_binds)
             
-            # Verify that the car exists
-            check_car = "SELECT CARID FROM Cars WHERE CARID = :car_id"
-            self.cursor.execute(check_car, {'car_id': car_id})
-            if not self.cursor.fetchone():
-                print(f"Error: Car with CARID {car_id} does not exist")
-                return False
+            self.commit()
+            # ROUND is the database's; drop the affected cars rather than recompute
+            id_set = {car_id for _, id_binds in id_chunks for car_id in id_binds.values()} \
+                if car_ids is not None else None
+            self.entities.discard_where('car', lambda car: (
+                (car_model is None or car.model == car_model)
+                and (year is None or car.year == int(year))
+                and (agent_id is None or car.agent_id == int(agent_id))
+                and (id_set is None or car.car_id in id_set)
+            ))
+            filters = ", ".join([f"{name}={value}" for name, value in binds.items()]
+                                + ([f"{len(id_set)} listed car(s)"] if id_set is not None else []))
+            self._audit('TARIFF', None, f"{'percent' if percent is not None else 'amount'} {change:+g} "
+                                        f"on {updated} car(s) where {filters or 'all'}")
+            return updated
+        except DB_ERRORS as e:
+            print(f"Error adjusting tariffs: {e}")
+            self.rollback()
+            return None
+    
+    # ============ Branch Operations ============
+    
+    @retrying
+    def get_branches(self):
+        """
+        Get every branch location
+        
+        Returns:
+            list: List of (BRANCH_ID, BRANCH_NAME, LATITUDE, LONGITUDE)
+        """
+        query = "SELECT BRANCH_ID, BRANCH_NAME, LATITUDE, LONGITUDE FROM Branches"
+        self.main_cursor.execute(query)
+        return self.main_cursor.fetchall()
+    
+    @reconnecting
+    def add_branch(self, branch_id, name, latitude, longitude):
+        """
+        Add a branch location
+        
+        Args:
+            branch_id: Unique branch ID
+            name: Branch name
+            latitude: Latitude in degrees
+            longitude: Longitude in degrees
             
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
             query = """
-                INSERT INTO RentalTransactions 
-                (TRANSACTIONID, CUSTOMERID, CARID, RENTALSTARTDATE, RENTALENDDATE, TOTALCOST, RENTALSTATUS) 
-                VALUES ((SELECT NVL(MAX(TRANSACTIONID), 0) + 1 FROM RentalTransactions), :customer_id, :car_id, 
-                TO_DATE(:rental_start_date, 'YYYY-MM-DD HH24:MI:SS'), 
-                TO_DATE(:rental_end_date, 'YYYY-MM-DD'), :total_cost, 'Pending')
+                INSERT INTO Branches (BRANCH_ID, BRANCH_NAME, LATITUDE, LONGITUDE)
+                VALUES (:branch_id, :name, :latitude, :longitude)
             """
-            self.cursor.execute(query, {
-                'customer_id': customer_id,
-                'car_id': car_id,
-                'rental_start_date': rental_start_date,
-                'rental_end_date': rental_end_date,
-                'total_cost': total_cost
+            self.main_cursor.execute(query, {
+                'branch_id': branch_id,
+                'name': name,
+                'latitude': latitude,
+                'longitude': longitude
             })
-            self.commit()
+            self._commit_main()
             return True
-        except oracledb.DatabaseError as e:
+        except DB_ERRORS as e:
             print(f"Database Error: {e}")
-            print(f"Attempted to insert CUSTOMERID: {customer_id}, CARID: {car_id}")
             return False
     
-    def return_car(self, car_id):
+    @retrying
+    def set_agent_branch(self, agent_id, branch_id):
         """
-        Return a rented car
+        Assign an agent to a branch (new cars they add are placed there)
         
         Args:
-            car_id: Car ID to return
+            agent_id: Agent ID
+            branch_id: Branch ID
             
         Returns:
             bool: True if successful, False otherwise
         """
         try:
-            return_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            
-            # Update rental transaction
-            return_query = """
-                UPDATE RentalTransactions RT
-                SET RT.RENTALENDDATE = TO_DATE(:return_date, 'YYYY-MM-DD HH24:MI:SS'),
-                    RT.RENTALSTATUS = 'Returned'
-                WHERE RT.CARID = :car_id
-                AND RT.RENTALSTATUS = 'Pending'
+            query = "UPDATE Agent SET BRANCH_ID = :branch_id WHERE AGENTID = :agent_id"
+            self.main_cursor.execute(query, {'branch_id': branch_id, 'agent_id': agent_id})
+            self._commit_main()
+            return True
+        except DB_ERRORS as e:
+            print(f"Database Error: {e}")
+            return False
+    
+    @retrying
+    def get_agent_branch(self, agent_id):
+        """
+        Get the branch an agent works at
+        
+        Args:
+            agent_id: Agent ID
+            
+        Returns:
+            int: Branch ID, or None if the agent has none (or does not exist)
+        """
+        self.main_cursor.execute("SELECT BRANCH_ID FROM Agent WHERE AGENTID = :agent_id", {'agent_id': agent_id})
+        row = self.main_cursor.fetchone()
+        return row[0] if row else None
+    
+    @retrying
+    def get_available_cars_at_branches(self, branch_ids):
+        """
+        Get available cars kept at specific branches
+        
+        Args:
+            branch_ids: Iterable of branch IDs (e.g. from BranchIndex.within)
+            
+        Returns:
+            list: Car records
+        """
+        placeholders, binds = self._in_clause(branch_ids, prefix='branch')
+        if not binds:
+            return []
+        query = f"""
+            SELECT {Car.COLUMNS} FROM Cars
+            WHERE AVAILABILITYSTATUS = 'Available' AND BRANCH_ID IN ({placeholders})
+        """
+        cursor = self._read_cursor()
+        cursor.execute(query, binds)
+        return self._fetch_records(cursor, Car)
+    
+    @retrying
+    def get_branches_with_available(self, car_model=None):
+        """
+        Get the branches that have at least one available car
+        
+        Args:
+            car_model: Only count cars of this model, or None for any
+            
+        Returns:
+            set: Branch IDs
+        """
+        query = "SELECT DISTINCT BRANCH_ID FROM Cars WHERE AVAILABILITYSTATUS = 'Available'"
+        binds = {}
+        if car_model:
+            query += " AND CARMODEL = :car_model"
+            binds['car_model'] = car_model
+        cursor = self._read_cursor()
+        cursor.execute(query, binds)
+        return {row[0] for row in cursor.fetchall() if row[0] is not None}
+    
+    # ============ Rental Operations ============
+    
+    @retrying_if_keyed
+    def create_rental(self, customer_id, car_id, rental_start_date, rental_end_date, total_cost, *,
+                      idempotency_key=None):
+        """
+        Rent an available car: mark it Rented and create the rental transaction
+        
+        Args:
+            customer_id: Customer ID (must be CUST_ID from Customer table)
+            car_id: Car ID
+            rental_start_date: Rental start date
+            rental_end_date: Rental end date
+            total_cost: Total rental cost
+            idempotency_key: Key of this request (see idempotency.py), or None
+            
+        Returns:
+            bool: True if successful, False otherwise (including when the car is not available)
+        """
+        try:
+            # First, verify that the customer exists in Customer table
+            if not self._customer_exists(customer_id):
+                print(f"Error: Customer with CUST_ID {customer_id} does not exist in Customer table")
+                # Try to create it from Users table
+                check_user = "SELECT USER_ID, USERNAME FROM Users WHERE USER_ID = :user_id"
+                self.main_cursor.execute(check_user, {'user_id': customer_id})
+                user_record = self.main_cursor.fetchone()
+                
+                if user_record:
+                    user_id, username = user_record
+                    try:
+                        insert_customer = """
+                            INSERT INTO Customer (CUST_ID, CUST_NAME) 
+                            VALUES (:cust_id, :cust_name)
+                        """
+                        self.main_cursor.execute(insert_customer, {
+                            'cust_id': user_id,
+                            'cust_name': username
+                        })
+                        self._commit_main()
+                        self._remember_customer(Customer(user_id, username))
+                        print(f"Created Customer record for USER_ID {user_id}")
+                    except DB_ERRORS as e:
+                        print(f"Failed to create Customer record: {e}")
+                        return False
+                else:
+                    # Debug: Check what customers exist
+                    debug_query = "SELECT CUST_ID, CUST_NAME FROM Customer"
+                    self.main_cursor.execute(debug_query)
+                    existing_customers = self.main_cursor.fetchall()
+                    print(f"Existing customers in Customer table: {existing_customers}")
+                    # Also check Users table
+                    debug_users = "SELECT USER_ID, USERNAME FROM Users"
+                    self.main_cursor.execute(debug_users)
+                    existing_users = self.main_cursor.fetchall()
+                    print(f"Existing users in Users table: {existing_users}")
+                    return False
+            
+            # Verify that the car exists (now, not as last held in the identity map)
+            car = self.get_car(car_id, fresh=True)
+            if car is None:
+                print(f"Error: Car with CARID {car_id} does not exist")
+                return False
+            
+            outcome = self._claim_key(idempotency_key, 'RENT')
+            if outcome is not None:
+                return outcome.result
+            # Taking the car and recording the rental commit together, as in
+            # rent_by_criteria, so a retried request cannot do only one of them
+            self.cursor.execute("""
+                UPDATE Cars SET AVAILABILITYSTATUS = 'Rented'
+                WHERE CARID = :car_id AND AVAILABILITYSTATUS = 'Available'
+            """, {'car_id': car_id})
+            if self.cursor.rowcount != 1:
+                print(f"Error: Car with CARID {car_id} is not available")
+                self.rollback()
+                return False
+            self._count_car_transitions([(car.model, 'Available')], [(car.model, 'Rented')])
+            self._insert_rental(customer_id, car_id, rental_start_date, rental_end_date, total_cost)
+            outcome = self._record_outcome(idempotency_key, 'RENT', True)
+            self.commit()
+            self._remember_outcome(idempotency_key, outcome)
+            self.entities.update('car', car_id, status='Rented')
+            self._audit('RENT', car_id, f"customer {customer_id} until {rental_end_date}, cost {total_cost}")
+            return True
+        except DB_ERRORS as e:
+            print(f"Database Error: {e}")
+            print(f"Attempted to insert CUSTOMERID: {customer_id}, CARID: {car_id}")
+            self.rollback()
+            return False
+    
+    def _insert_rental(self, customer_id, car_id, rental_start_date, rental_end_date, total_cost):
+        """
+        Insert a Pending rental transaction in the current transaction
+        
+        Args:
+            customer_id: Customer ID (must be CUST_ID from Customer table)
+            car_id: Car ID
+            rental_start_date: Rental start date ('YYYY-MM-DD HH24:MI:SS')
+            rental_end_date: Rental end date ('YYYY-MM-DD')
+            total_cost: Total rental cost
+        """
+        query = """
+            INSERT INTO RentalTransactions 
+            (TRANSACTIONID, CUSTOMERID, CARID, RENTALSTARTDATE, RENTALENDDATE, AGREED_ENDDATE,
+             TOTALCOST, RENTALSTATUS, BRANCH_ID) 
+            VALUES ((SELECT NVL(MAX(TRANSACTIONID), 0) + 1 FROM RentalTransactions), :customer_id, :car_id, 
+            TO_DATE(:rental_start_date, 'YYYY-MM-DD HH24:MI:SS'), 
+            TO_DATE(:rental_end_date, 'YYYY-MM-DD'), TO_DATE(:rental_end_date, 'YYYY-MM-DD'),
+            :total_cost, 'Pending', (SELECT BRANCH_ID FROM Cars WHERE CARID = :car_id))
+        """
+        self.cursor.execute(query, {
+            'customer_id': customer_id,
+            'car_id': car_id,
+            'rental_start_date': rental_start_date,
+            'rental_end_date': rental_end_date,
+            'total_cost': total_cost
+        })
+        # Revenue is booked on the rental's start date, as reconcile_counters does
+        self._bump_counters({f'revenue.{rental_start_date[:10]}': total_cost})
+        self._log_car_change(car_id, 'RENT')
+    
+    @retrying_if_keyed
+    def rent_by_criteria(self, customer_id, rental_start_date, rental_end_date,
+                         car_model=None, min_year=None, max_year=None, max_tariff=None,
+                         branch_ids=None, *, idempotency_key=None):
+        """
+        Atomically pick and rent any available car matching the criteria
+        
+        Candidate rows are locked with FOR UPDATE SKIP LOCKED one at a time,
+        so concurrent requests for the same model skip cars another counter
+        is claiming instead of waiting on them, and each ends up with a
+        different car. The claim itself is a conditional UPDATE, which also
+        keeps the local backend (where the lock is the database write lock)
+        correct.
+        
+        Args:
+            customer_id: Customer ID (must be CUST_ID from Customer table)
+            rental_start_date: Rental start date ('YYYY-MM-DD HH24:MI:SS')
+            rental_end_date: Rental end date ('YYYY-MM-DD')
+            car_model: Required model, or None for any
+            min_year: Oldest acceptable year, or None
+            max_year: Newest acceptable year, or None
+            max_tariff: Highest acceptable tariff, or None
+            branch_ids: Only cars at these branches (nearest first), or None for any
+            idempotency_key: Key of this request (see idempotency.py), or None
+            
+        Returns:
+            tuple: (CARID, CARMODEL, TARIFF) of the rented car, or None if no car matched
+        """
+        conditions = ["AVAILABILITYSTATUS = 'Available'"]
+        binds = {}
+        if car_model:
+            conditions.append("CARMODEL = :car_model")
+            binds['car_model'] = car_model
+        if min_year is not None:
+            conditions.append("YEAR >= :min_year")
+            binds['min_year'] = int(min_year)
+        if max_year is not None:
+            conditions.append("YEAR <= :max_year")
+            binds['max_year'] = int(max_year)
+        if max_tariff is not None:
+            conditions.append("TARIFF <= :max_tariff")
+            binds['max_tariff'] = int(max_tariff)
+        order_by = ""
+        if branch_ids is not None:
+            branch_ids = list(branch_ids)
+            placeholders, branch_binds = self._in_clause(branch_ids, prefix='branch')
+            if not branch_binds:
+                return None
+            conditions.append(f"BRANCH_ID IN ({placeholders})")
+            binds.update(branch_binds)
+            # Prefer the nearest branch: rank by position in branch_ids
+            ranks = " ".join(f"WHEN :branch{i} THEN {i}" for i in range(len(branch_ids)))
+            order_by = f"ORDER BY CASE BRANCH_ID {ranks} END"
+        
+        select_query = f"""
+            SELECT CARID, CARMODEL, TARIFF FROM Cars
+            WHERE {' AND '.join(conditions)}
+            {order_by}
+            FOR UPDATE SKIP LOCKED
+        """
+        claim_query = """
+            UPDATE Cars SET AVAILABILITYSTATUS = 'Rented'
+            WHERE CARID = :car_id AND AVAILABILITYSTATUS = 'Available'
+        """
+        
+        candidates = self.connection.cursor()
+        try:
+            outcome = self._claim_key(idempotency_key, 'RENT')
+            if outcome is not None:
+                return outcome.result
+            # Rows are locked as they are fetched, so fetch one at a time
+            candidates.prefetchrows = 1
+            candidates.arraysize = 1
+            candidates.execute(select_query, binds)
+            
+            for car_id, car_model, tariff in iter(candidates.fetchone, None):
+                self.cursor.execute(claim_query, {'car_id': car_id})
+                if self.cursor.rowcount != 1:
+                    continue  # claimed elsewhere between SELECT and UPDATE
+                
+                self._count_car_transitions([(car_model, 'Available')], [(car_model, 'Rented')])
+                self._insert_rental(customer_id, car_id, rental_start_date, rental_end_date, tariff)
+                outcome = self._record_outcome(idempotency_key, 'RENT', (car_id, car_model, tariff))
+                self.commit()
+                self._remember_outcome(idempotency_key, outcome)
+                self.entities.update('car', car_id, status='Rented')
+                self._audit('RENT', car_id, f"customer {customer_id} until {rental_end_date}, cost {tariff}")
+                return car_id, car_model, tariff
+            
+            self.rollback()
+            return None
+        except DB_ERRORS as e:
+            print(f"Database Error: {e}")
+            self.rollback()
+            return None
+        finally:
+            candidates.close()
+    
+    @retrying_if_keyed
+    def return_car(self, car_id, *, idempotency_key=None):
+        """
+        Return a rented car
+        
+        Args:
+            car_id: Car ID to return
+            idempotency_key: Key of this request (see idempotency.py), or None
+            
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        return self.return_cars([car_id], idempotency_key=idempotency_key)
+    
+    @retrying_if_keyed
+    def return_cars(self, car_ids, *, idempotency_key=None):
+        """
+        Return several rented cars in one batch and one commit
+        
+        A returned car that someone on the waitlist accepts is offered to
+        the highest-priority such customer and held for them as 'Reserved'
+        instead of becoming 'Available'.
+        
+        Each closed rental is billed (see billing.py): late fees are added
+        for cars brought back after the agreed end date, and the charges
+        are left in self.last_charges for the caller to show.
+        
+        Args:
+            car_ids: Iterable of car IDs to return
+            idempotency_key: Key of this request (see idempotency.py), or None;
+                a repeat also gets the charges of the first return
+            
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        offers = {}
+        self.last_charges = {}
+        try:
+            returned_at = datetime.now().replace(microsecond=0)
+            return_date = returned_at.strftime('%Y-%m-%d %H:%M:%S')
+            rows = [{'car_id': car_id} for car_id in car_ids]
+            if not rows:
+                return True
+            outcome = self._claim_key(idempotency_key, 'RETURN')
+            if outcome is not None:
+                self.last_charges = {charge.car_id: charge for charge in outcome.charges}
+                return outcome.result
+            
+            # Bill and close the rental transactions; while a rental is
+            # pending RENTALENDDATE is still the agreed end date
+            charges = billing.compute_charges([
+                (rental.transaction_id, rental.customer_id, rental.car_id,
+                 rental.start_date, rental.end_date, None, rental.total_cost)
+                for rental in self.get_open_rentals(row['car_id'] for row in rows)
+            ], returned_at=returned_at)
+            return_query = """
+                UPDATE RentalTransactions
+                SET RENTALENDDATE = TO_DATE(:return_date, 'YYYY-MM-DD HH24:MI:SS'),
+                    AGREED_ENDDATE = NVL(AGREED_ENDDATE, RENTALENDDATE),
+                    LATEFEE = :late_fee,
+                    FINALCOST = :final_cost,
+                    RENTALSTATUS = 'Returned'
+                WHERE TRANSACTIONID = :transaction_id
+                AND RENTALSTATUS = 'Pending'
             """
-            self.cursor.execute(return_query, {
-                'return_date': return_date,
-                'car_id': car_id
-            })
+            self.cursor.executemany(return_query, [
+                {'return_date': return_date, 'late_fee': charge.late_fee, 'final_cost': charge.total,
+                 'transaction_id': charge.transaction_id}
+                for charge in charges
+            ])
             
-            # Update car availability
-            update_query = "UPDATE Cars SET AVAILABILITYSTATUS = 'Available' WHERE CARID = :car_id"
-            self.cursor.execute(update_query, {'car_id': car_id})
+            # Hand freed cars to the waitlist, then update car availability
+            cars = self.get_car_details_by_ids(row['car_id'] for row in rows)
+            self.waitlist.refresh(self)
+            for car in cars:
+                entry = self._offer_car(car) if car.status == 'Rented' else None
+                if entry is not None:
+                    offers[car.car_id] = entry
+            statuses = {car.car_id: 'Reserved' if car.car_id in offers else 'Available' for car in cars}
+            update_query = "UPDATE Cars SET AVAILABILITYSTATUS = :status WHERE CARID = :car_id"
+            self.cursor.executemany(update_query, [
+                {'status': status, 'car_id': car_id} for car_id, status in statuses.items()
+            ])
+            self._count_car_transitions(
+                [(car.model, car.status) for car in cars],
+                [(car.model, statuses[car.car_id]) for car in cars]
+            )
             
+            self._log_car_changes([row['car_id'] for row in rows], 'RETURN')
+            outcome = self._record_outcome(idempotency_key, 'RETURN', True, charges)
             self.commit()
+            self._remember_outcome(idempotency_key, outcome)
+            self.last_charges = {charge.car_id: charge for charge in charges}
+            for car_id, status in statuses.items():
+                self.entities.update('car', car_id, status=status)
+                charge = self.last_charges.get(car_id)
+                self._audit('RETURN', car_id, charge and
+                            f"charged {charge.total} ({charge.late_days} late day(s), fee {charge.late_fee})")
+            for car_id, entry in offers.items():
+                self._audit('OFFER', car_id, f"waitlist {entry.waitlist_id}, customer {entry.customer_id}")
             return True
-        except oracledb.DatabaseError as e:
+        except DB_ERRORS as e:
             print(f"Database Error: {e}")
+            self.rollback()
+            if offers:
+                # The offers were rolled back; reload the queue to get those customers back
+                self.waitlist.reset()
             return False
     
+    @reconnecting
     def update_car_availability(self, car_id, status):
         """
         Update car availability status
@@ -515,11 +1572,959 @@ class DatabaseOperations:
             bool: True if successful, False otherwise
         """
         try:
+            before = self._car_states([car_id])
             query = "UPDATE Cars SET AVAILABILITYSTATUS = :status WHERE CARID = :car_id"
             self.cursor.execute(query, {'status': status, 'car_id': car_id})
+            self._count_car_transitions(before, [(model, status) for model, _ in before])
+            self._log_car_change(car_id, 'UPDATE')
             self.commit()
+            self.entities.update('car', car_id, status=status)
+            self._audit('UPDATE', car_id, f"Availability = {status}")
             return True
-        except Exception as e:
+        except DB_ERRORS as e:
             print(f"Error updating availability: {e}")
+            self.rollback()
             return False
-
+    
+    @reconnecting
+    def set_cars_availability(self, car_ids, status):
+        """
+        Set the availability status of several cars in one batch
+        
+        Args:
+            car_ids: Iterable of car IDs
+            status: New availability status ('Available', 'Rented' or 'Returned')
+            
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            car_ids = list(car_ids)
+            if not car_ids:
+                return True
+            before = self._car_states(car_ids)
+            query = "UPDATE Cars SET AVAILABILITYSTATUS = :status WHERE CARID = :car_id"
+            self.cursor.executemany(query, [
+                {'status': status, 'car_id': car_id} for car_id in car_ids
+            ])
+            self._count_car_transitions(before, [(model, status) for model, _ in before])
+            self._log_car_changes(car_ids, 'UPDATE')
+            self.commit()
+            for car_id in car_ids:
+                self.entities.update('car', car_id, status=status)
+                self._audit('UPDATE', car_id, f"Availability = {status}")
+            return True
+        except DB_ERRORS as e:
+            print(f"Error updating availability: {e}")
+            self.rollback()
+            return False
+    
+    @retrying
+    def get_open_rentals(self, car_ids=None):
+        """
+        Get pending rental transactions
+        
+        All open rentals may come from the read replica; rentals of
+        specific (just changed) cars are always read from the primary.
+        
+        Args:
+            car_ids: Optional iterable of car IDs to restrict to
+            
+        Returns:
+            list: Rental records
+        """
+        query = f"""
+            SELECT {Rental.COLUMNS}
+            FROM RentalTransactions
+            WHERE RENTALSTATUS = 'Pending'
+        """
+        if car_ids is None:
+            cursor = self._read_cursor()
+            cursor.execute(query)
+            return self._fetch_records(cursor, Rental)
+        rentals = []
+        for placeholders, binds in self._in_clauses(car_ids):
+            self.cursor.execute(query + f" AND CARID IN ({placeholders})", binds)
+            rentals.extend(self._fetch_records(self.cursor, Rental))
+        return rentals
+    
+    @retrying
+    def get_overdue_rentals(self):
+        """
+        Get every pending rental past its end date (for the overdue sweep)
+        
+        Returns:
+            list: List of (TRANSACTIONID, CUSTOMERID, CUST_NAME, CARID, CARMODEL, RENTALENDDATE, TOTALCOST)
+        """
+        return list(self.iter_overdue_rentals())
+    
+    @retrying
+    def iter_overdue_rentals(self, batch_size=None):
+        """
+        Stream every overdue rental, oldest end date first (see get_overdue_rentals)
+        
+        Args:
+            batch_size: Rows per fetch (default STREAM_BATCH_SIZE from config)
+            
+        Yields:
+            tuple: (TRANSACTIONID, CUSTOMERID, CUST_NAME, CARID, CARMODEL, RENTALENDDATE, TOTALCOST)
+        """
+        query = """
+            SELECT RT.TRANSACTIONID, RT.CUSTOMERID, CU.CUST_NAME, RT.CARID, C.CARMODEL,
+                   RT.RENTALENDDATE, RT.TOTALCOST
+            FROM RentalTransactions RT
+            INNER JOIN Cars C ON C.CARID = RT.CARID
+            LEFT JOIN Customer CU ON CU.CUST_ID = RT.CUSTOMERID
+            WHERE RT.RENTALSTATUS = 'Pending'
+            AND RT.RENTALENDDATE < SYSTIMESTAMP
+            ORDER BY RT.RENTALENDDATE
+        """
+        rows = self._stream(self.connection, query, batch_size=batch_size)
+        # A shard has no customer names to join to
+        return rows if self.shard is None else self._with_customer_names(rows, 2)
+    
+    # ============ Billing Operations ============
+    
+    @retrying
+    def generate_invoices(self, period_start, period_end, batch_size=None):
+        """
+        Invoice every rental returned in a period that has no invoice yet
+        
+        Returned rentals are streamed from the primary and billed a batch
+        at a time (see billing.compute_charges); each batch is inserted
+        with one executemany and committed, so a large run holds one batch
+        in memory and an interrupted run resumes where it stopped. A late
+        fee fixed when the car was returned is kept as charged.
+        
+        Args:
+            period_start: First return date ('YYYY-MM-DD')
+            period_end: Last return date ('YYYY-MM-DD', inclusive)
+            batch_size: Rentals per batch (default STREAM_BATCH_SIZE from config)
+            
+        Returns:
+            dict: invoices, late (invoices with a late fee), late_fees and total,
+                or None on error
+        """
+        batch_size = batch_size or self.stream_batch_size
+        query = """
+            SELECT RT.TRANSACTIONID, RT.CUSTOMERID, RT.CARID, RT.RENTALSTARTDATE,
+                   RT.AGREED_ENDDATE, RT.RENTALENDDATE, RT.TOTALCOST, RT.LATEFEE
+            FROM RentalTransactions RT
+            WHERE RT.RENTALSTATUS = 'Returned'
+            AND RT.RENTALENDDATE >= TO_DATE(:period_start, 'YYYY-MM-DD')
+            AND RT.RENTALENDDATE < TO_DATE(:period_end, 'YYYY-MM-DD')
+            AND NOT EXISTS (SELECT 1 FROM Invoices I WHERE I.TRANSACTIONID = RT.TRANSACTIONID)
+            ORDER BY RT.TRANSACTIONID
+        """
+        insert_query = """
+            INSERT INTO Invoices
+            (INVOICE_ID, TRANSACTIONID, CUSTOMERID, CARID, RENTALSTARTDATE, AGREED_ENDDATE, RETURNED_AT,
+             BILLED_DAYS, LATE_DAYS, BASECOST, LATEFEE, TOTAL, CREATED_AT)
+            VALUES (invoice_seq.NEXTVAL, :transaction_id, :customer_id, :car_id, :start_date, :agreed_end,
+                    :returned_at, :billed_days, :late_days, :base_cost, :late_fee, :total, SYSTIMESTAMP)
+        """
+        summary = {'invoices': 0, 'late': 0, 'late_fees': 0.0, 'total': 0.0}
+        rules = billing.get_rules()
+        rentals = self._stream(self.connection, query, {
+            'period_start': period_start,
+            'period_end': (date.fromisoformat(period_end) + timedelta(days=1)).isoformat()
+        }, batch_size=batch_size)
+        try:
+            while True:
+                batch = list(islice(rentals, batch_size))
+                if not batch:
+                    break
+                # Rentals returned before AGREED_ENDDATE existed were not late
+                charges = billing.compute_charges([
+                    (txid, customer_id, car_id, start, agreed_end or returned, returned, cost)
+                    for txid, customer_id, car_id, start, agreed_end, returned, cost, _ in batch
+                ], rules=rules)
+                charges = [
+                    charge if row[7] is None else
+                    charge._replace(late_fee=row[7], total=round(charge.base_cost + row[7], 2))
+                    for charge, row in zip(charges, batch)
+                ]
+                self.cursor.executemany(insert_query, [
+                    {'transaction_id': charge.transaction_id, 'customer_id': charge.customer_id,
+                     'car_id': charge.car_id, 'start_date': charge.start, 'agreed_end': charge.agreed_end,
+                     'returned_at': charge.returned_at, 'billed_days': charge.billed_days,
+                     'late_days': charge.late_days, 'base_cost': charge.base_cost,
+                     'late_fee': charge.late_fee, 'total': charge.total}
+                    for charge in charges
+                ])
+                self.commit()
+                summary['invoices'] += len(charges)
+                summary['late'] += sum(1 for charge in charges if charge.late_fee)
+                summary['late_fees'] = round(summary['late_fees'] + sum(charge.late_fee for charge in charges), 2)
+                summary['total'] = round(summary['total'] + sum(charge.total for charge in charges), 2)
+            self._audit('INVOICE', details=f"{period_start}..{period_end}: {summary['invoices']} invoice(s), "
+                                           f"total {summary['total']}")
+            return summary
+        except DB_ERRORS as e:
+            print(f"Error generating invoices: {e}")
+            self.rollback()
+            return None
+        finally:
+            rentals.close()
+    
+    @retrying
+    def get_invoices(self, period_start, period_end):
+        """
+        Get the invoices for rentals returned in a period
+        
+        Args:
+            period_start: First return date ('YYYY-MM-DD')
+            period_end: Last return date ('YYYY-MM-DD', inclusive)
+            
+        Returns:
+            list: List of (INVOICE_ID, TRANSACTIONID, CUSTOMERID, CARID, RETURNED_AT,
+                BILLED_DAYS, LATE_DAYS, BASECOST, LATEFEE, TOTAL)
+        """
+        return list(self.iter_invoices(period_start, period_end))
+    
+    @retrying
+    def iter_invoices(self, period_start, period_end, batch_size=None):
+        """
+        Stream the invoices for rentals returned in a period, in return order (see get_invoices)
+        
+        Args:
+            period_start: First return date ('YYYY-MM-DD')
+            period_end: Last return date ('YYYY-MM-DD', inclusive)
+            batch_size: Rows per fetch (default STREAM_BATCH_SIZE from config)
+            
+        Yields:
+            tuple: (INVOICE_ID, TRANSACTIONID, CUSTOMERID, CARID, RETURNED_AT,
+                BILLED_DAYS, LATE_DAYS, BASECOST, LATEFEE, TOTAL)
+        """
+        query = """
+            SELECT INVOICE_ID, TRANSACTIONID, CUSTOMERID, CARID, RETURNED_AT,
+                   BILLED_DAYS, LATE_DAYS, BASECOST, LATEFEE, TOTAL
+            FROM Invoices
+            WHERE RETURNED_AT >= TO_DATE(:period_start, 'YYYY-MM-DD')
+            AND RETURNED_AT < TO_DATE(:period_end, 'YYYY-MM-DD')
+            ORDER BY RETURNED_AT, INVOICE_ID
+        """
+        return self._stream(self._read_connection(), query, {
+            'period_start': period_start,
+            'period_end': (date.fromisoformat(period_end) + timedelta(days=1)).isoformat()
+        }, batch_size=batch_size)
+    
+    # ============ Waitlist Operations ============
+    
+    @reconnecting
+    def join_waitlist(self, customer_id, car_model=None, min_year=None, max_year=None, max_tariff=None):
+        """
+        Queue a customer for the next returned car that matches
+        
+        Args:
+            customer_id: Customer ID (must be CUST_ID from Customer table)
+            car_model: Required model, or None for any
+            min_year: Oldest acceptable year, or None
+            max_year: Newest acceptable year, or None
+            max_tariff: Highest acceptable tariff, or None
+            
+        Returns:
+            WaitlistEntry: The new entry, or None on error
+        """
+        try:
+            # Loyalty tier from the customer's completed rentals
+            self.cursor.execute("""
+                SELECT COUNT(*) FROM RentalTransactions
+                WHERE CUSTOMERID = :customer_id AND RENTALSTATUS = 'Returned'
+            """, {'customer_id': customer_id})
+            tier = waitlist.loyalty_tier(self.cursor.fetchone()[0])
+            binds = {
+                'customer_id': customer_id,
+                'car_model': car_model,
+                'min_year': min_year,
+                'max_year': max_year,
+                'max_tariff': max_tariff,
+                'tier': tier,
+                'requested_at': datetime.now(),
+            }
+            # The ID comes from a sequence and is read back in the same round
+            # trip, so concurrent joins never compute or read the same one
+            id_var = self.cursor.var(int)
+            self.cursor.execute("""
+                INSERT INTO Waitlist
+                (WAITLIST_ID, CUSTOMERID, CARMODEL, MIN_YEAR, MAX_YEAR, MAX_TARIFF, TIER, REQUESTED_AT, STATUS)
+                VALUES (waitlist_seq.NEXTVAL, :customer_id, :car_model,
+                :min_year, :max_year, :max_tariff, :tier, :requested_at, 'Waiting')
+                RETURNING WAITLIST_ID INTO :waitlist_id
+            """, dict(binds, waitlist_id=id_var))
+            waitlist_id = id_var.getvalue()[0]
+            self.commit()
+        except DB_ERRORS as e:
+            print(f"Database Error: {e}")
+            self.rollback()
+            return None
+        
+        entry = WaitlistEntry(waitlist_id, customer_id, car_model, min_year, max_year, max_tariff,
+                              tier, binds['requested_at'])
+        self.waitlist.push(entry)
+        return entry
+    
+    @retrying
+    def get_waiting_entries(self, after_id=0):
+        """
+        Get waiting entries in ID order (for loading the waitlist queue)
+        
+        Args:
+            after_id: Only entries with a higher WAITLIST_ID
+            
+        Returns:
+            list: List of (WAITLIST_ID, CUSTOMERID, CARMODEL, MIN_YEAR, MAX_YEAR, MAX_TARIFF, TIER, REQUESTED_AT)
+        """
+        query = """
+            SELECT WAITLIST_ID, CUSTOMERID, CARMODEL, MIN_YEAR, MAX_YEAR, MAX_TARIFF, TIER, REQUESTED_AT
+            FROM Waitlist
+            WHERE STATUS = 'Waiting' AND WAITLIST_ID > :after_id
+            ORDER BY WAITLIST_ID
+        """
+        self.cursor.execute(query, {'after_id': after_id})
+        return self.cursor.fetchall()
+    
+    @retrying
+    def get_customer_waitlist(self, customer_id):
+        """
+        Get a customer's open waitlist entries
+        
+        Args:
+            customer_id: Customer ID
+            
+        Returns:
+            list: List of (WAITLIST_ID, CARMODEL, STATUS, CARID, OFFERED_AT), oldest first
+        """
+        query = """
+            SELECT WAITLIST_ID, CARMODEL, STATUS, CARID, OFFERED_AT
+            FROM Waitlist
+            WHERE CUSTOMERID = :customer_id AND STATUS IN ('Waiting', 'Offered')
+            ORDER BY WAITLIST_ID
+        """
+        self.cursor.execute(query, {'customer_id': customer_id})
+        return self.cursor.fetchall()
+    
+    @reconnecting
+    def cancel_waitlist(self, waitlist_id, customer_id):
+        """
+        Leave the waitlist, releasing a car held for the entry
+        
+        Args:
+            waitlist_id: Waitlist entry ID
+            customer_id: Customer the entry must belong to
+            
+        Returns:
+            bool: True if an open entry was cancelled, False otherwise
+        """
+        try:
+            self.cursor.execute("""
+                SELECT STATUS, CARID FROM Waitlist
+                WHERE WAITLIST_ID = :waitlist_id AND CUSTOMERID = :customer_id
+                AND STATUS IN ('Waiting', 'Offered')
+            """, {'waitlist_id': waitlist_id, 'customer_id': customer_id})
+            row = self.cursor.fetchone()
+            if row is None:
+                return False
+            status, car_id = row
+            self.cursor.execute("""
+                UPDATE Waitlist SET STATUS = 'Cancelled'
+                WHERE WAITLIST_ID = :waitlist_id AND STATUS = :status
+            """, {'waitlist_id': waitlist_id, 'status': status})
+            if self.cursor.rowcount != 1:
+                self.rollback()
+                return False
+            released = None
+            if status == 'Offered':
+                self.waitlist.refresh(self)
+                released = self._release_reserved_car(car_id)
+            self.commit()
+            self.waitlist.remove(waitlist_id)
+            self._after_release(released)
+            return True
+        except DB_ERRORS as e:
+            print(f"Database Error: {e}")
+            self.rollback()
+            # Offers made in the rolled back transaction are gone; reload the queue
+            self.waitlist.reset()
+            return False
+    
+    @reconnecting
+    def rent_waitlist_offer(self, waitlist_id, customer_id, rental_start_date, rental_end_date):
+        """
+        Rent the car held for a customer's waitlist entry
+        
+        Args:
+            waitlist_id: Waitlist entry ID (status 'Offered')
+            customer_id: Customer the entry must belong to
+            rental_start_date: Rental start date ('YYYY-MM-DD HH24:MI:SS')
+            rental_end_date: Rental end date ('YYYY-MM-DD')
+            
+        Returns:
+            tuple: (CARID, CARMODEL, TARIFF) of the rented car, or None if the offer is gone
+        """
+        try:
+            self.cursor.execute("""
+                SELECT CARID FROM Waitlist
+                WHERE WAITLIST_ID = :waitlist_id AND CUSTOMERID = :customer_id AND STATUS = 'Offered'
+            """, {'waitlist_id': waitlist_id, 'customer_id': customer_id})
+            row = self.cursor.fetchone()
+            car = self.get_car(row[0], fresh=True) if row else None
+            if car is None:
+                return None
+            self.cursor.execute("""
+                UPDATE Waitlist SET STATUS = 'Fulfilled'
+                WHERE WAITLIST_ID = :waitlist_id AND STATUS = 'Offered'
+            """, {'waitlist_id': waitlist_id})
+            fulfilled = self.cursor.rowcount == 1
+            self.cursor.execute("""
+                UPDATE Cars SET AVAILABILITYSTATUS = 'Rented'
+                WHERE CARID = :car_id AND AVAILABILITYSTATUS = 'Reserved'
+            """, {'car_id': car.car_id})
+            if not fulfilled or self.cursor.rowcount != 1:
+                # Expired or cancelled in the meantime
+                self.rollback()
+                return None
+            
+            self._count_car_transitions([(car.model, 'Reserved')], [(car.model, 'Rented')])
+            self._insert_rental(customer_id, car.car_id, rental_start_date, rental_end_date, car.tariff)
+            self.commit()
+            self.entities.update('car', car.car_id, status='Rented')
+            self._audit('RENT', car.car_id, f"customer {customer_id} until {rental_end_date}, cost {car.tariff} "
+                                            f"(waitlist {waitlist_id})")
+            return car.car_id, car.model, car.tariff
+        except DB_ERRORS as e:
+            print(f"Database Error: {e}")
+            self.rollback()
+            return None
+    
+    @retrying
+    def expire_waitlist_offers(self, hold_minutes=None):
+        """
+        Expire offers nobody took up in time and pass their cars on
+        
+        Each car goes to the next customer waiting for it, or back to
+        'Available'. The expired customer leaves the queue.
+        
+        Args:
+            hold_minutes: How long an offer is held (default WAITLIST_HOLD_MINUTES from config)
+            
+        Returns:
+            int: Number of offers expired, or None on error
+        """
+        if hold_minutes is None:
+            hold_minutes = getattr(config, 'WAITLIST_HOLD_MINUTES', 30)
+        cutoff = datetime.fromtimestamp(time.time() - hold_minutes * 60)
+        released = []
+        try:
+            self.cursor.execute("""
+                SELECT WAITLIST_ID, CARID FROM Waitlist
+                WHERE STATUS = 'Offered' AND OFFERED_AT < :cutoff
+            """, {'cutoff': cutoff})
+            expired = self.cursor.fetchall()
+            if not expired:
+                return 0
+            self.waitlist.refresh(self)
+            for waitlist_id, car_id in expired:
+                self.cursor.execute("""
+                    UPDATE Waitlist SET STATUS = 'Expired'
+                    WHERE WAITLIST_ID = :waitlist_id AND STATUS = 'Offered'
+                """, {'waitlist_id': waitlist_id})
+                if self.cursor.rowcount == 1:
+                    released.append(self._release_reserved_car(car_id))
+            self.commit()
+        except DB_ERRORS as e:
+            print(f"Database Error: {e}")
+            self.rollback()
+            # Offers made in the rolled back transaction are gone; reload the queue
+            self.waitlist.reset()
+            return None
+        for result in released:
+            self._after_release(result)
+        return len(released)
+    
+    def _offer_car(self, car):
+        """
+        Offer a car to the first waiting customer who accepts it, in the current transaction
+        
+        Args:
+            car: Car entity
+            
+        Returns:
+            WaitlistEntry: Entry the car is now offered to, or None if nobody is waiting for it
+        """
+        query = """
+            UPDATE Waitlist SET STATUS = 'Offered', CARID = :car_id, OFFERED_AT = :offered_at
+            WHERE WAITLIST_ID = :waitlist_id AND STATUS = 'Waiting'
+        """
+        while True:
+            entry = self.waitlist.pop_match(car.model, car.year, car.tariff)
+            if entry is None:
+                return None
+            self.cursor.execute(query, {
+                'car_id': car.car_id, 'offered_at': datetime.now(), 'waitlist_id': entry.waitlist_id
+            })
+            if self.cursor.rowcount == 1:
+                return entry
+            # Cancelled or served through another terminal since it was loaded
+    
+    def _release_reserved_car(self, car_id):
+        """
+        Pass a car held for a lapsed offer on, in the current transaction
+        
+        Args:
+            car_id: Car ID held as 'Reserved'
+            
+        Returns:
+            tuple: (car_id, WaitlistEntry it is now offered to or None), or None if the car is gone
+        """
+        car = self.get_car(car_id, fresh=True)
+        if car is None:
+            return None
+        entry = self._offer_car(car)
+        if entry is None:
+            self.cursor.execute("""
+                UPDATE Cars SET AVAILABILITYSTATUS = 'Available'
+                WHERE CARID = :car_id AND AVAILABILITYSTATUS = 'Reserved'
+            """, {'car_id': car_id})
+            if self.cursor.rowcount == 1:
+                self._count_car_transitions([(car.model, 'Reserved')], [(car.model, 'Available')])
+                self._log_car_change(car_id, 'UPDATE')
+        return car_id, entry
+    
+    def _after_release(self, released):
+        """Write through and audit a committed _release_reserved_car result"""
+        if released is None:
+            return
+        car_id, entry = released
+        if entry is None:
+            self.entities.update('car', car_id, status='Available')
+            self._audit('UPDATE', car_id, "Availability = Available (waitlist offer lapsed)")
+        else:
+            self._audit('OFFER', car_id, f"waitlist {entry.waitlist_id}, customer {entry.customer_id}")
+    
+    # ============ Change Feed Operations ============
+    
+    def _log_car_change(self, car_id, operation):
+        """
+        Append a change-log row for a car in the current transaction
+        
+        The row is committed together with the change it describes, so
+        consumers never see a log entry for a rolled back mutation.
+        
+        Args:
+            car_id: Car ID that changed
+            operation: One of 'ADD', 'UPDATE', 'DELETE', 'RENT', 'RETURN'
+        """
+        self._log_car_changes([car_id], operation)
+    
+    def _log_car_changes(self, car_ids, operation):
+        """
+        Append change-log rows for several cars in the current transaction
+        
+        Args:
+            car_ids: Car IDs that changed
+            operation: One of 'ADD', 'UPDATE', 'DELETE', 'RENT', 'RETURN'
+        """
+        query = """
+            INSERT INTO CarChangeLog (CHANGE_ID, CARID, OPERATION, CHANGED_AT)
+            VALUES (change_log_seq.NEXTVAL, :car_id, :operation, SYSTIMESTAMP)
+        """
+        self.cursor.executemany(query, [
+            {'car_id': car_id, 'operation': operation} for car_id in car_ids
+        ])
+    
+    @retrying
+    def get_latest_change_id(self):
+        """
+        Get the newest change-log ID
+        
+        With a read replica the replica's value is used even when it is
+        stale: it is never newer than rows read from either database, so
+        replaying the log from it cannot skip a change.
+        
+        Returns:
+            int: Highest CHANGE_ID, or 0 if the log is empty
+        """
+        query = "SELECT NVL(MAX(CHANGE_ID), 0) FROM CarChangeLog"
+        if self.replica_cursor is not None:
+            try:
+                self.replica_cursor.execute(query)
+                return self.replica_cursor.fetchone()[0]
+            except DB_ERRORS as e:
+                print(f"Read replica unavailable, reading from primary: {e}")
+        self.cursor.execute(query)
+        return self.cursor.fetchone()[0]
+    
+    @retrying
+    def get_changes_since(self, change_id, limit=500):
+        """
+        Get change-log rows newer than a given change ID
+        
+        Args:
+            change_id: Last change ID already seen
+            limit: Maximum number of rows to return
+            
+        Returns:
+            list: List of (CHANGE_ID, CARID, OPERATION) ordered by CHANGE_ID
+        """
+        query = """
+            SELECT CHANGE_ID, CARID, OPERATION FROM CarChangeLog
+            WHERE CHANGE_ID > :change_id
+            ORDER BY CHANGE_ID
+            FETCH FIRST :limit ROWS ONLY
+        """
+        self.cursor.execute(query, {'change_id': change_id, 'limit': limit})
+        rows = self.cursor.fetchall()
+        # Changes may come from other processes; held copies are stale
+        for _, car_id, _ in rows:
+            self.entities.discard('car', car_id)
+        return rows
+    
+    # ============ Fleet Counter Operations ============
+    
+    def _car_states(self, car_ids):
+        """
+        Get the (model, status) of cars, as counted by the fleet counters
+        
+        Args:
+            car_ids: Car IDs
+            
+        Returns:
+            list: List of (CARMODEL, AVAILABILITYSTATUS) for the cars that exist
+        """
+        states = []
+        for placeholders, binds in self._in_clauses(car_ids):
+            query = f"SELECT CARMODEL, AVAILABILITYSTATUS FROM Cars WHERE CARID IN ({placeholders})"
+            self.cursor.execute(query, binds)
+            states.extend(self.cursor.fetchall())
+        return states
+    
+    def _count_car_transitions(self, before, after):
+        """
+        Apply the counter deltas for cars moving between model/status buckets
+        
+        Args:
+            before: List of (model, status) for the affected cars before the change
+            after: List of (model, status) for the same cars after the change
+        """
+        deltas = defaultdict(int)
+        for states, sign in ((before, -1), (after, 1)):
+            for model, status in states:
+                deltas[f'status.{status}'] += sign
+                deltas[f'model.{model}.{status}'] += sign
+        self._bump_counters(deltas)
+    
+    def _bump_counters(self, deltas):
+        """
+        Add deltas to FleetCounters rows in the current transaction
+        
+        Args:
+            deltas: Dictionary of counter key -> amount to add
+        """
+        update_query = """
+            UPDATE FleetCounters SET COUNTER_VALUE = COUNTER_VALUE + :delta
+            WHERE COUNTER_KEY = :counter_key
+        """
+        insert_query = """
+            INSERT INTO FleetCounters (COUNTER_KEY, COUNTER_VALUE)
+            VALUES (:counter_key, :delta)
+        """
+        for key, delta in deltas.items():
+            if not delta:
+                continue
+            binds = {'counter_key': key, 'delta': delta}
+            self.cursor.execute(update_query, binds)
+            if self.cursor.rowcount:
+                continue
+            try:
+                self.cursor.execute(insert_query, binds)
+            except DB_ERRORS:
+                # Another session created the row first
+                self.cursor.execute(update_query, binds)
+    
+    @retrying
+    def get_counters(self):
+        """
+        Get every fleet counter
+        
+        Returns:
+            list: List of (COUNTER_KEY, COUNTER_VALUE)
+        """
+        query = "SELECT COUNTER_KEY, COUNTER_VALUE FROM FleetCounters"
+        self.cursor.execute(query)
+        return self.cursor.fetchall()
+    
+    @retrying
+    def reconcile_counters(self):
+        """
+        Recompute the fleet counters from the base tables
+        
+        Corrects any drift in the incremental counters and refreshes the
+        overdue count, which changes with time rather than with mutations.
+        Revenue for earlier days is left as recorded.
+        
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        today = date.today().isoformat()
+        try:
+            self.cursor.execute("""
+                DELETE FROM FleetCounters
+                WHERE COUNTER_KEY NOT LIKE 'revenue.%' OR COUNTER_KEY = :revenue_key
+            """, {'revenue_key': f'revenue.{today}'})
+            self.cursor.execute("""
+                INSERT INTO FleetCounters (COUNTER_KEY, COUNTER_VALUE)
+                SELECT 'status.' || AVAILABILITYSTATUS, COUNT(*) FROM Cars
+                GROUP BY AVAILABILITYSTATUS
+            """)
+            self.cursor.execute("""
+                INSERT INTO FleetCounters (COUNTER_KEY, COUNTER_VALUE)
+                SELECT 'model.' || CARMODEL || '.' || AVAILABILITYSTATUS, COUNT(*) FROM Cars
+                GROUP BY CARMODEL, AVAILABILITYSTATUS
+            """)
+            self.cursor.execute("""
+                INSERT INTO FleetCounters (COUNTER_KEY, COUNTER_VALUE)
+                SELECT 'rentals.overdue', COUNT(*) FROM RentalTransactions
+                WHERE RENTALSTATUS = 'Pending' AND RENTALENDDATE < SYSTIMESTAMP
+            """)
+            self.cursor.execute("""
+                INSERT INTO FleetCounters (COUNTER_KEY, COUNTER_VALUE)
+                SELECT :revenue_key, NVL(SUM(TOTALCOST), 0) FROM RentalTransactions
+                WHERE RENTALSTARTDATE >= TO_DATE(:today, 'YYYY-MM-DD')
+            """, {'revenue_key': f'revenue.{today}', 'today': today})
+            self.commit()
+            return True
+        except DB_ERRORS as e:
+            print(f"Database Error: {e}")
+            # Never leave the DELETE for the next commit to save
+            self.rollback()
+            return False
+    
+    # ============ Idempotency Operations ============
+    
+    @retrying
+    def get_outcome(self, idempotency_key):
+        """
+        Get the recorded outcome of a request sent with an idempotency key
+        
+        Args:
+            idempotency_key: Key of the request
+            
+        Returns:
+            Outcome: The outcome (see idempotency.py), or None if no request
+            with the key has been committed
+        """
+        outcome = self.outcomes.get('outcome', idempotency_key)
+        if outcome is not None:
+            return outcome
+        self.cursor.execute("""
+            SELECT OPERATION, OUTCOME FROM IdempotencyKeys
+            WHERE IDEMPOTENCY_KEY = :idempotency_key
+        """, {'idempotency_key': idempotency_key})
+        row = self.cursor.fetchone()
+        if row is None or row[1] is None:
+            return None
+        outcome = idempotency.decode_outcome(*row)
+        self.outcomes.put('outcome', idempotency_key, outcome)
+        return outcome
+    
+    @retrying
+    def purge_idempotency_keys(self, max_age_days=None):
+        """
+        Delete idempotency keys old enough that no client still retries with them
+        
+        Args:
+            max_age_days: Age of the keys to delete (default IDEMPOTENCY_KEY_DAYS from config)
+            
+        Returns:
+            int: Number of keys deleted, or None on error
+        """
+        if max_age_days is None:
+            max_age_days = getattr(config, 'IDEMPOTENCY_KEY_DAYS', 7)
+        cutoff = datetime.now() - timedelta(days=max_age_days)
+        try:
+            self.cursor.execute(
+                "DELETE FROM IdempotencyKeys WHERE CREATED_AT < :cutoff", {'cutoff': cutoff}
+            )
+            deleted = self.cursor.rowcount
+            self.commit()
+            return deleted
+        except DB_ERRORS as e:
+            print(f"Database Error: {e}")
+            self.rollback()
+            return None
+    
+    def _claim_key(self, idempotency_key, operation):
+        """
+        Claim an idempotency key in the current transaction, or find the outcome it already has
+        
+        Claim before the request's first write, so the key is committed
+        (with the outcome from _record_outcome) or rolled back with it.
+        
+        Args:
+            idempotency_key: Key of the request, or None
+            operation: 'RENT', 'RETURN', 'ADD' or 'UPDATE'
+            
+        Returns:
+            Outcome: Outcome of the earlier request with the key (the
+            current transaction is rolled back), or None to go ahead
+            
+        Raises:
+            ValueError: The key was used for a different operation
+            OutcomeMissing: The key is taken but has no outcome, even after claiming it again
+        """
+        if idempotency_key is None:
+            return None
+        outcome = self.outcomes.get('outcome', idempotency_key)
+        attempts = 2
+        while outcome is None:
+            try:
+                self.cursor.execute("""
+                    INSERT INTO IdempotencyKeys (IDEMPOTENCY_KEY, OPERATION, CREATED_AT)
+                    VALUES (:idempotency_key, :operation, SYSTIMESTAMP)
+                """, {'idempotency_key': idempotency_key, 'operation': operation})
+                return None
+            except idempotency.DUPLICATE_KEY_ERRORS:
+                # Committed by an earlier request; on Oracle the INSERT first
+                # waits for one still in progress to commit or roll back
+                self.rollback()
+            outcome = self.get_outcome(idempotency_key)
+            attempts -= 1
+            # No outcome: the key was purged since the INSERT (claim it
+            # again) or was stored without one (give up)
+            if outcome is None and not attempts:
+                raise idempotency.OutcomeMissing(f"Idempotency key {idempotency_key} has no recorded outcome")
+        if outcome.operation != operation:
+            raise ValueError(f"Idempotency key {idempotency_key} was used for {outcome.operation}, not {operation}")
+        return outcome
+    
+    def _record_outcome(self, idempotency_key, operation, result, charges=()):
+        """
+        Store a request's outcome with its claimed key, in the current transaction
+        
+        Args:
+            idempotency_key: Key of the request, or None
+            operation: Operation the key was claimed for
+            result: What the method returns
+            charges: Charges of the rentals a return closed
+            
+        Returns:
+            Outcome: The outcome, for _remember_outcome once committed (None without a key)
+        """
+        if idempotency_key is None:
+            return None
+        outcome = idempotency.Outcome(operation, result, tuple(charges))
+        self.cursor.execute("""
+            UPDATE IdempotencyKeys SET OUTCOME = :outcome
+            WHERE IDEMPOTENCY_KEY = :idempotency_key
+        """, {'outcome': idempotency.encode_outcome(outcome), 'idempotency_key': idempotency_key})
+        return outcome
+    
+    def _remember_outcome(self, idempotency_key, outcome):
+        """Cache a committed outcome, so repeats from this process need no round trip"""
+        if idempotency_key is not None:
+            self.outcomes.put('outcome', idempotency_key, outcome)
+    
+    # ============ Helpers ============
+    
+    def _customer_exists(self, customer_id):
+        """
+        Check that a Customer row exists, from the identity map when it is held there
+        
+        Args:
+            customer_id: Customer ID (CUST_ID)
+            
+        Returns:
+            bool: True if the customer exists
+        """
+        if self.entities.get('customer', customer_id) is not None:
+            return True
+        query = f"SELECT {Customer.COLUMNS} FROM Customer WHERE CUST_ID = :customer_id"
+        self.main_cursor.execute(query, {'customer_id': customer_id})
+        customers = self._fetch_records(self.main_cursor, Customer)
+        if not customers:
+            return False
+        self._remember_customer(customers[0])
+        return True
+    
+    def _with_customer_names(self, rows, name_index):
+        """
+        Fill in customer names the query could not join to, from the main database
+        
+        Args:
+            rows: Rows whose CUSTOMERID is column 1
+            name_index: Column of the (NULL) customer name
+            
+        Yields:
+            tuple: Row with the name filled in
+        """
+        names = {}
+        for row in rows:
+            customer_id = row[1]
+            if customer_id not in names:
+                customer = self.entities.get('customer', customer_id)
+                if customer is None:
+                    self.main_cursor.execute(f"SELECT {Customer.COLUMNS} FROM Customer WHERE CUST_ID = :customer_id",
+                                             {'customer_id': customer_id})
+                    customer = self.main_cursor.fetchone()
+                    if customer is not None:
+                        customer = Customer._make(customer)
+                        self._remember_customer(customer)
+                names[customer_id] = customer.name if customer is not None else None
+            yield row[:name_index] + (names[customer_id],) + row[name_index + 1:]
+    
+    def _remember_customer(self, customer):
+        """Hold a customer in the identity map under its ID and its name"""
+        self.entities.put('customer', customer.customer_id, customer)
+        self.entities.put('customer_name', customer.name, customer)
+    
+    def _audit(self, action, car_id=None, details=None):
+        """
+        Queue an audit event for a committed change
+        
+        Events are written in batches by the shared audit writer, so this
+        adds no round trip or commit to the operation itself.
+        
+        Args:
+            action: One of 'ADD', 'UPDATE', 'DELETE', 'TARIFF', 'RENT', 'RETURN'
+            car_id: Car the action applied to, if any
+            details: Optional free text
+        """
+        if self.audit is not None:
+            self.audit.record(action, car_id, actor=self.actor, details=details)
+    
+    @staticmethod
+    def _in_clause(values, prefix='id'):
+        """
+        Build bind placeholders for an IN (...) list
+        
+        Args:
+            values: Iterable of values to bind
+            prefix: Bind name prefix
+            
+        Returns:
+            tuple: (placeholder string, bind dictionary)
+        """
+        binds = {f'{prefix}{i}': value for i, value in enumerate(values)}
+        placeholders = ", ".join(f":{name}" for name in binds)
+        return placeholders, binds
+    
+    @classmethod
+    def _in_clauses(cls, values, prefix='id'):
+        """
+        Build bind placeholders for IN (...) lists of at most IN_LIST_LIMIT values
+        
+        Args:
+            values: Iterable of values to bind
+            prefix: Bind name prefix
+            
+        Yields:
+            tuple: (placeholder string, bind dictionary) per chunk; nothing
+            when there are no values
+        """
+        values = iter(values)
+        while True:
+            chunk = list(islice(values, cls.IN_LIST_LIMIT))
+            if not chunk:
+                return
+            yield cls._in_clause(chunk, prefix)
@@ -0,0 +1,362 @@
+"""
+Fault-injecting database stand-in for Car Rental System
+Wraps the local SQLite backend and makes every round trip behave like a
+slow or unreliable WAN link to Oracle: fixed latency plus jitter, call
+timeouts and dropped connections, all counted per kind of call
+
+Select it with DB_BACKEND = "fake" in config.py (it uses LOCAL_DB_PATH)
+and tune it with the FAKE_DB_* settings, or call configure() directly.
+
+Round trips follow oracledb: execute and executemany are one trip each and
+bring back the first `prefetchrows` rows; after that every `arraysize`
+rows fetched is another trip. commit, rollback and ping are one trip.
+
+Beyond random faults, drop_connections() ends every open session at once
+(an idle timeout or failover) and outage() also refuses new connections
+for a while (a network blip), for testing reconnects.
+"""
+
+import random
+import sqlite3
+import threading
+import time
+import weakref
+from collections import Counter
+import config
+from . import local_backend
+
+
+class InjectedFault(sqlite3.OperationalError):
+    """Failure injected by the fake driver; caught like any database error"""
+
+
+class CallTimeout(InjectedFault):
+    """The call took longer than the configured call timeout"""
+
+
+class Disconnected(InjectedFault):
+    """The connection was dropped and cannot be used again"""
+
+
+class FakeDriver:
+    """
+    Latency and fault settings shared by every fake connection, plus round trip statistics
+    """
+
+    def __init__(self, latency_ms=0, jitter_ms=0, call_timeout_ms=None,
+                 timeout_rate=0.0, disconnect_rate=0.0, seed=None):
+        """
+        Args:
+            latency_ms: Delay added to every round trip
+            jitter_ms: Extra random delay of up to this much per round trip
+            call_timeout_ms: Calls whose delay would exceed this fail with CallTimeout (None: no limit)
+            timeout_rate: Probability that a round trip times out regardless of its delay
+            disconnect_rate: Probability that a round trip drops the connection
+            seed: Random seed, for repeatable fault sequences
+        """
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.call_timeout_ms = call_timeout_ms
+        self.timeout_rate = timeout_rate
+        self.disconnect_rate = disconnect_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._connections = weakref.WeakSet()
+        self._down_until = 0.0
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Zero the round trip and fault counters"""
+        with self._lock:
+            self.round_trips = Counter()
+            self.faults = Counter()
+            self.wait_seconds = 0.0
+
+    def stats(self):
+        """
+        Snapshot of the counters
+
+        Returns:
+            dict: round_trips (total), by_kind (Counter), faults (Counter), wait_seconds
+        """
+        with self._lock:
+            return {
+                'round_trips': sum(self.round_trips.values()),
+                'by_kind': Counter(self.round_trips),
+                'faults': Counter(self.faults),
+                'wait_seconds': self.wait_seconds,
+            }
+
+    def connect(self, path):
+        """
+        Open a fake connection to a local database
+
+        Args:
+            path: Path of the SQLite file
+
+        Returns:
+            FakeConnection: Connection usable in place of an oracledb connection
+        """
+        connection = FakeConnection(self)
+        connection.round_trip('connect')
+        connection.local = local_backend.connect(path)
+        with self._lock:
+            self._connections.add(connection)
+        return connection
+
+    def drop_connections(self):
+        """
+        Drop every open connection, as a server idle timeout or failover would
+
+        Returns:
+            int: Connections dropped
+        """
+        with self._lock:
+            connections = [connection for connection in self._connections if not connection.dropped]
+            self.faults['disconnect'] += len(connections)
+        for connection in connections:
+            connection.drop()
+        return len(connections)
+
+    def outage(self, seconds):
+        """
+        Drop every open connection and refuse new ones for a while
+
+        Args:
+            seconds: How long the database stays unreachable
+        """
+        with self._lock:
+            self._down_until = time.monotonic() + seconds
+        self.drop_connections()
+
+    def round_trip(self, connection, kind):
+        """
+        Spend one round trip: wait out the link delay, then maybe fail
+
+        Args:
+            connection: FakeConnection making the call
+            kind: Call type for the statistics ('execute', 'fetch', 'commit', ...)
+
+        Raises:
+            Disconnected: If the connection is (or is now) dropped
+            CallTimeout: If the call timed out
+        """
+        if connection.dropped:
+            with self._lock:
+                self.faults['closed'] += 1
+            raise Disconnected("DPI-1080: connection was closed by the database or network")
+        if time.monotonic() < self._down_until:
+            connection.drop()
+            with self._lock:
+                self.faults['unreachable'] += 1
+            raise Disconnected("DPY-6005: cannot connect to database (network unreachable)")
+
+        with self._lock:
+            delay_ms = self.latency_ms + self._random.uniform(0, self.jitter_ms)
+            timed_out = (
+                self._random.random() < self.timeout_rate
+                or (self.call_timeout_ms is not None and delay_ms > self.call_timeout_ms)
+            )
+            dropped = not timed_out and self._random.random() < self.disconnect_rate
+            if timed_out and self.call_timeout_ms is not None:
+                delay_ms = min(delay_ms, self.call_timeout_ms)
+            self.round_trips[kind] += 1
+            self.wait_seconds += delay_ms / 1000
+            if timed_out:
+                self.faults['timeout'] += 1
+            if dropped:
+                self.faults['disconnect'] += 1
+
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000)
+        if timed_out:
+            raise CallTimeout(f"DPI-1067: call timeout of {self.call_timeout_ms or delay_ms:.0f} ms exceeded")
+        if dropped:
+            connection.drop()
+            raise Disconnected("DPI-4011: the database or network closed the connection")
+
+
+class FakeCursor:
+    """
+    Cursor that charges round trips the way an oracledb cursor would
+    """
+
+    def __init__(self, connection):
+        self._connection = connection
+        self._cursor = connection.local.cursor()
+        self._buffer = []
+        self._exhausted = True
+        self.arraysize = 100
+        self.prefetchrows = 2
+        self.rowfactory = None
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def execute(self, sql, params=None):
+        """Execute a statement, prefetching the first rows in the same trip"""
+        self._connection.round_trip('execute')
+        self.rowfactory = None
+        self._cursor.execute(sql, params)
+        self._buffer = []
+        self._exhausted = self._cursor.description is None
+        if not self._exhausted and self.prefetchrows:
+            self._fill(self.prefetchrows)
+        return self
+
+    def var(self, typ):
+        """Create a bind variable for RETURNING ... INTO (no round trip)"""
+        return self._cursor.var(typ)
+
+    def executemany(self, sql, seq_of_params):
+        """Execute a statement for a batch of parameter sets in one trip"""
+        self._connection.round_trip('execute')
+        self._cursor.executemany(sql, seq_of_params)
+        self._buffer = []
+        self._exhausted = True
+
+    def _fill(self, size):
+        """Move up to size rows from the local cursor into the buffer"""
+        rows = self._cursor.fetchmany(size)
+        self._buffer.extend(rows)
+        if len(rows) < size:
+            self._exhausted = True
+
+    def _fetch_trip(self):
+        """Fetch the next batch of arraysize rows in one trip"""
+        self._connection.round_trip('fetch')
+        self._fill(self.arraysize)
+
+    def _rows(self, rows):
+        """Apply the rowfactory (set after execute, as with oracledb) to fetched rows"""
+        factory = self.rowfactory
+        return rows if factory is None else [factory(*row) for row in rows]
+
+    def fetchone(self):
+        if not self._buffer and not self._exhausted:
+            self._fetch_trip()
+        return self._rows([self._buffer.pop(0)])[0] if self._buffer else None
+
+    def fetchmany(self, size=None):
+        size = size or self.arraysize
+        while len(self._buffer) < size and not self._exhausted:
+            self._fetch_trip()
+        rows, self._buffer = self._buffer[:size], self._buffer[size:]
+        return self._rows(rows)
+
+    def fetchall(self):
+        while not self._exhausted:
+            self._fetch_trip()
+        rows, self._buffer = self._buffer, []
+        return self._rows(rows)
+
+    def close(self):
+        self._cursor.close()
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+
+class FakeConnection:
+    """
+    Connection whose calls go through FakeDriver.round_trip
+    """
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.local = None
+        self.dropped = False
+
+    def round_trip(self, kind):
+        """Charge one round trip to this connection"""
+        self.driver.round_trip(self, kind)
+
+    def drop(self):
+        """Lose the session; like the server, roll back its open transaction"""
+        self.dropped = True
+        if self.local is not None:
+            try:
+                self.local.rollback()
+            except sqlite3.Error:
+                pass
+
+    def cursor(self):
+        if self.dropped:
+            self.driver.round_trip(self, 'cursor')
+        return FakeCursor(self)
+
+    def commit(self):
+        self.round_trip('commit')
+        self.local.commit()
+
+    def rollback(self):
+        self.round_trip('rollback')
+        self.local.rollback()
+
+    def ping(self):
+        self.round_trip('ping')
+
+    def is_healthy(self):
+        # Like oracledb: no round trip, only what the driver already knows
+        return not self.dropped
+
+    def close(self):
+        if self.local is not None:
+            self.local.close()
+        self.dropped = True
+
+
+_driver = None
+
+
+def configure(**settings):
+    """
+    Replace the shared driver (see FakeDriver for the settings)
+
+    Returns:
+        FakeDriver: The new driver
+    """
+    global _driver
+    _driver = FakeDriver(**settings)
+    return _driver
+
+
+def get_driver():
+    """
+    The shared driver, created from the FAKE_DB_* settings on first use
+
+    Returns:
+        FakeDriver: Driver used by connect()
+    """
+    if _driver is None:
+        configure(
+            latency_ms=getattr(config, 'FAKE_DB_LATENCY_MS', 0),
+            jitter_ms=getattr(config, 'FAKE_DB_JITTER_MS', 0),
+            call_timeout_ms=getattr(config, 'FAKE_DB_CALL_TIMEOUT_MS', None),
+            timeout_rate=getattr(config, 'FAKE_DB_TIMEOUT_RATE', 0.0),
+            disconnect_rate=getattr(config, 'FAKE_DB_DISCONNECT_RATE', 0.0),
+            seed=getattr(config, 'FAKE_DB_SEED', None)
+        )
+    return _driver
+
+
+def connect(path):
+    """
+    Open a fake connection through the shared driver
+
+    Args:
+        path: Path of the SQLite file
+
+    Returns:
+        FakeConnection: Connection usable in place of an oracledb connection
+    """
+    return get_driver().connect(path)
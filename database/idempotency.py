@@ -0,0 +1,154 @@
+"""
+Idempotency module for Car Rental System
+Remembers the outcome of rent, return, add-car and update-car requests
+under a key chosen by the caller, so a request sent again (Rent clicked a
+second time after a timeout, a retry after a dropped session) gets the
+first outcome back instead of doing the work a second time
+
+DatabaseOperations claims the key in IdempotencyKeys in the same
+transaction as the request's own changes and stores the outcome before
+committing, so key and work are committed or rolled back together. A
+request that finds its key already claimed waits for the first one (the
+primary key does the locking) and returns its outcome. A bounded
+in-memory cache per database answers repeats made in this process
+without a round trip.
+
+Callers make one key per request with new_key() and send the same key
+with every attempt of that request. Keys older than
+IDEMPOTENCY_KEY_DAYS are purged by the scheduler.
+"""
+
+import json
+import sqlite3
+import threading
+import uuid
+from collections import namedtuple
+from datetime import datetime
+import oracledb
+import config
+from .billing import Charge
+from .identity_map import IdentityMap
+
+# Errors raised when the key is already in IdempotencyKeys
+DUPLICATE_KEY_ERRORS = (oracledb.IntegrityError, sqlite3.IntegrityError)
+
+# Charge fields stored as ISO-8601 text
+_CHARGE_DATES = ('start', 'agreed_end', 'returned_at')
+
+_caches = {}
+_cache_lock = threading.Lock()
+
+
+class OutcomeMissing(sqlite3.DatabaseError):
+    """
+    A key is claimed in IdempotencyKeys but has no outcome to return
+
+    A database error, so the methods that claim keys handle it like any
+    other failed request.
+    """
+
+
+class Outcome(namedtuple('Outcome', ['operation', 'result', 'charges'])):
+    """Result of a request, with the charges of the rentals a return closed"""
+
+    __slots__ = ()
+
+
+def new_key():
+    """
+    Make a key for one request
+
+    Returns:
+        str: 32 random hex digits
+    """
+    return uuid.uuid4().hex
+
+
+def get_cache(shard=None):
+    """
+    Get the process-wide outcome cache of a database
+
+    Args:
+        shard: Shard name (see sharding.py), or None for the main database;
+            each database records the keys of its own requests
+
+    Returns:
+        IdentityMap: Outcomes keyed by ('outcome', key), bounded by
+        IDEMPOTENCY_CACHE_SIZE in config
+    """
+    with _cache_lock:
+        cache = _caches.get(shard)
+        if cache is None:
+            cache = _caches[shard] = IdentityMap(getattr(config, 'IDEMPOTENCY_CACHE_SIZE', 1000))
+        return cache
+
+
+def encode_outcome(outcome):
+    """
+    Serialize an outcome for the OUTCOME column
+
+    Args:
+        outcome: Outcome
+
+    Returns:
+        str: JSON text
+    """
+    return json.dumps({
+        'result': outcome.result,
+        'charges': [
+            [value.isoformat(sep=' ') if name in _CHARGE_DATES and value else value
+             for name, value in zip(Charge._fields, charge)]
+            for charge in outcome.charges
+        ]
+    })
+
+
+def decode_outcome(operation, text):
+    """
+    Rebuild an outcome stored by encode_outcome
+
+    Args:
+        operation: OPERATION column
+        text: OUTCOME column
+
+    Returns:
+        Outcome: The outcome (results that were tuples come back as tuples)
+    """
+    stored = json.loads(text)
+    result = stored['result']
+    charges = tuple(
+        Charge(*(datetime.fromisoformat(value) if name in _CHARGE_DATES and value else value
+                 for name, value in zip(Charge._fields, charge)))
+        for charge in stored['charges']
+    )
+    return Outcome(operation, tuple(result) if isinstance(result, list) else result, charges)
+
+
+class PendingKeys:
+    """
+    Idempotency keys of the requests a view has sent but not yet seen succeed
+
+    A request sent again with the same arguments (Rent clicked a second
+    time after a timeout or an error) gets the same key, so it cannot take
+    effect twice; once it succeeds its key is dropped and a later request
+    with the same arguments counts as a new one.
+    """
+
+    def __init__(self):
+        self._keys = {}
+
+    def key_for(self, *request):
+        """
+        Key for a request
+
+        Args:
+            *request: Operation name and the arguments that identify the request
+
+        Returns:
+            str: The key this request was first sent with, or a new one
+        """
+        return self._keys.setdefault(request, new_key())
+
+    def succeeded(self, *request):
+        """Forget the key of a request that has gone through"""
+        self._keys.pop(request, None)
@@ -0,0 +1,177 @@
+"""
+Identity map module for Car Rental System
+Process-wide, size-bounded LRU cache of Car and Customer entities keyed by
+ID, so existence checks and detail lookups repeated within a session are
+served from memory. DatabaseOperations writes its own committed changes
+through it. Processes that poll the change feed (agent views, replica
+syncs) also drop the cars other processes changed; the others, such as
+customer terminals, do not see those changes until the entry expires
+after IDENTITY_MAP_TTL_SECONDS. Anything that charges or decides from a
+car's state reads it fresh from the primary instead.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+import config
+
+_maps = {}
+_map_lock = threading.Lock()
+
+
+def get_map(shard=None):
+    """
+    Get the process-wide identity map of a database
+
+    Args:
+        shard: Shard name (see sharding.py), or None for the main database;
+            each shard's cars are held apart so a lookup on one shard never
+            finds a car held by another
+
+    Returns:
+        IdentityMap: Shared map, bounded by IDENTITY_MAP_SIZE in config,
+        whose entries expire after IDENTITY_MAP_TTL_SECONDS
+    """
+    with _map_lock:
+        entity_map = _maps.get(shard)
+        if entity_map is None:
+            entity_map = _maps[shard] = IdentityMap(
+                getattr(config, 'IDENTITY_MAP_SIZE', 5000),
+                ttl_seconds=getattr(config, 'IDENTITY_MAP_TTL_SECONDS', 30)
+            )
+        return entity_map
+
+
+class IdentityMap:
+    """
+    LRU map of entities keyed by (kind, ID)
+
+    Each lookup counts as a hit or a miss; when more than max_size entries
+    are held the least recently used one is evicted. A max_size of 0
+    disables caching (every lookup misses). With a ttl_seconds an entity
+    is forgotten that long after it was stored, so a change nobody wrote
+    through is picked up by the next lookup after that.
+    """
+
+    def __init__(self, max_size=5000, ttl_seconds=None):
+        """
+        Args:
+            max_size: Maximum number of entities held
+            ttl_seconds: Seconds an entity is held after it was stored,
+                or None to hold it until it is evicted
+        """
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        # (kind, key) -> (entity, monotonic expiry time or None)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, kind, key):
+        """
+        Look up an entity, marking it most recently used
+
+        Args:
+            kind: 'car', 'customer' or 'customer_name'
+            key: Entity ID (customer name for 'customer_name')
+
+        Returns:
+            Entity, or None if it is not held
+        """
+        with self._lock:
+            entry = self._entries.get((kind, key))
+            if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+                del self._entries[(kind, key)]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((kind, key))
+            self.hits += 1
+            return entry[0]
+
+    def put(self, kind, key, entity):
+        """
+        Store an entity, evicting the least recently used ones beyond max_size
+
+        Args:
+            kind: 'car', 'customer' or 'customer_name'
+            key: Entity ID (customer name for 'customer_name')
+            entity: Car or Customer
+        """
+        if self.max_size <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds is not None else None
+        with self._lock:
+            self._entries[(kind, key)] = (entity, expires_at)
+            self._entries.move_to_end((kind, key))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def update(self, kind, key, **changes):
+        """
+        Change fields of a held entity (no-op if it is not held)
+
+        The entity keeps the expiry it was stored with, since the fields
+        not changed here are no fresher than before.
+
+        Args:
+            kind: 'car' or 'customer'
+            key: Entity ID
+            **changes: Field values to replace
+        """
+        with self._lock:
+            entry = self._entries.get((kind, key))
+            if entry is not None:
+                self._entries[(kind, key)] = (entry[0]._replace(**changes), entry[1])
+
+    def discard(self, kind, key):
+        """Forget an entity, if held"""
+        with self._lock:
+            self._entries.pop((kind, key), None)
+
+    def discard_where(self, kind, predicate):
+        """
+        Forget every held entity of a kind that matches a predicate
+
+        Args:
+            kind: 'car' or 'customer'
+            predicate: Callable taking the entity
+        """
+        with self._lock:
+            stale = [key for key, (entity, _) in self._entries.items() if key[0] == kind and predicate(entity)]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self):
+        """Forget every entity (statistics are kept)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Hit, eviction and expiry statistics
+
+        Returns:
+            dict: size, max_size, hits, misses, hit_ratio (None before any
+            lookup), evictions, expirations
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else None,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
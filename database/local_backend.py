@@ -0,0 +1,251 @@
+"""
+Local SQLite backend for Car Rental System
+Runs the same SQL as the Oracle backend against a local database file,
+for development, tests and benchmarks without an Oracle server
+
+Select it with DB_BACKEND = "sqlite" and LOCAL_DB_PATH in config.py.
+"""
+
+import re
+import sqlite3
+from datetime import datetime
+from functools import lru_cache
+from .schema import LOCAL_SCHEMA, LOCAL_MIGRATIONS, LOCAL_BACKFILLS, LOCAL_POST_MIGRATION
+
+# Declared DATE/TIMESTAMP columns are returned as datetimes, like Oracle
+DETECT_TYPES = sqlite3.PARSE_DECLTYPES
+
+
+def _adapt_datetime(value):
+    """Store datetimes as ISO-8601 text"""
+    return value.isoformat(sep=' ')
+
+
+def _convert_timestamp(value):
+    """Read DATE/TIMESTAMP columns back as datetimes"""
+    return datetime.fromisoformat(value.decode())
+
+
+sqlite3.register_adapter(datetime, _adapt_datetime)
+sqlite3.register_converter("TIMESTAMP", _convert_timestamp)
+sqlite3.register_converter("DATE", _convert_timestamp)
+
+# Oracle TO_DATE format elements used by DatabaseOperations
+_DATE_FORMATS = {
+    'YYYY-MM-DD HH24:MI:SS': '%Y-%m-%d %H:%M:%S',
+    'YYYY-MM-DD': '%Y-%m-%d',
+}
+
+_TRANSLATIONS = (
+    # Sequences: the matching local column is an INTEGER PRIMARY KEY,
+    # which SQLite fills with the next rowid when given NULL
+    (re.compile(r'\b\w+\.NEXTVAL\b', re.IGNORECASE), 'NULL'),
+    (re.compile(r'\bSYSTIMESTAMP\b', re.IGNORECASE), 'SYSTIMESTAMP()'),
+    (re.compile(r'\bFETCH\s+FIRST\s+(:\w+|\d+)\s+ROWS\s+ONLY\b', re.IGNORECASE), r'LIMIT \1'),
+    (re.compile(r'\bFOR\s+UPDATE(\s+SKIP\s+LOCKED)?\b', re.IGNORECASE), ''),
+    # The returned value is filled in by LocalCursor.execute instead
+    (re.compile(r'\bRETURNING\s+\w+\s+INTO\s+:\w+', re.IGNORECASE), ''),
+)
+
+_RETURNING_INTO = re.compile(r'\bRETURNING\s+\w+\s+INTO\s+:(\w+)', re.IGNORECASE)
+
+
+@lru_cache(maxsize=512)
+def translate(sql):
+    """
+    Rewrite the Oracle-specific parts of a statement for SQLite
+
+    Args:
+        sql: Statement as written for Oracle
+
+    Returns:
+        str: Equivalent SQLite statement
+    """
+    for pattern, replacement in _TRANSLATIONS:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+def _to_date(value, fmt):
+    """SQLite implementation of Oracle TO_DATE"""
+    if value is None:
+        return None
+    parsed = datetime.strptime(value, _DATE_FORMATS.get(fmt, fmt))
+    return parsed.isoformat(sep=' ')
+
+
+def _systimestamp():
+    """SQLite implementation of Oracle SYSTIMESTAMP (local time)"""
+    return datetime.now().isoformat(sep=' ')
+
+
+def _nvl(value, default):
+    """SQLite implementation of Oracle NVL"""
+    return default if value is None else value
+
+
+def _greatest(*values):
+    """SQLite implementation of Oracle GREATEST"""
+    return None if None in values else max(values)
+
+
+class LocalVar:
+    """
+    Bind variable receiving a DML RETURNING value, like an oracledb Var
+
+    As with oracledb, getvalue() returns a list holding the value of each
+    row the statement touched.
+    """
+
+    def __init__(self, typ=None):
+        self.type = typ
+        self._value = None
+
+    def getvalue(self, pos=0):
+        return self._value
+
+    def setvalue(self, pos, value):
+        self._value = value
+
+
+class LocalCursor:
+    """
+    Cursor with the subset of the oracledb cursor API the app uses
+
+    As with oracledb, rowfactory is called with each fetched row's values
+    and is cleared by every execute(), so set it after executing.
+    """
+
+    def __init__(self, connection):
+        self._connection = connection
+        self._cursor = connection.raw.cursor()
+        self.arraysize = 100
+        self.prefetchrows = 2
+        self.rowfactory = None
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def execute(self, sql, params=None):
+        """Execute a statement written for Oracle"""
+        if re.search(r'\bFOR\s+UPDATE\b', sql, re.IGNORECASE) and not self._connection.raw.in_transaction:
+            # SQLite has no row locks; taking the write lock up front is the
+            # equivalent of SELECT ... FOR UPDATE and avoids lock-upgrade
+            # deadlocks between concurrent claimers
+            self._cursor.execute("BEGIN IMMEDIATE")
+        self.rowfactory = None
+        self._cursor.execute(translate(sql), params or {})
+        returning = _RETURNING_INTO.search(sql)
+        if returning:
+            # Only INSERT ... RETURNING of an INTEGER PRIMARY KEY (the
+            # stand-in for a sequence) is used, and that column is the rowid
+            params[returning.group(1)].setvalue(0, [self._cursor.lastrowid])
+        return self
+
+    def var(self, typ):
+        """Create a bind variable for RETURNING ... INTO"""
+        return LocalVar(typ)
+
+    def executemany(self, sql, seq_of_params):
+        """Execute a statement written for Oracle once per parameter set"""
+        self._cursor.executemany(translate(sql), seq_of_params)
+
+    def _rows(self, rows):
+        """Apply the rowfactory to fetched rows"""
+        factory = self.rowfactory
+        return rows if factory is None else [factory(*row) for row in rows]
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        return row if row is None or self.rowfactory is None else self.rowfactory(*row)
+
+    def fetchmany(self, size=None):
+        return self._rows(self._cursor.fetchmany(size or self.arraysize))
+
+    def fetchall(self):
+        return self._rows(self._cursor.fetchall())
+
+    def close(self):
+        self._cursor.close()
+
+    def __iter__(self):
+        if self.rowfactory is None:
+            return iter(self._cursor)
+        return (self.rowfactory(*row) for row in self._cursor)
+
+
+class LocalConnection:
+    """
+    Connection with the subset of the oracledb connection API the app uses
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.closed = False
+        # Like an oracledb connection, usable from any one thread at a time
+        # (the login window connects on a worker thread)
+        self.raw = sqlite3.connect(path, timeout=10, detect_types=DETECT_TYPES, check_same_thread=False)
+        self.raw.create_function('TO_DATE', 2, _to_date, deterministic=True)
+        self.raw.create_function('SYSTIMESTAMP', 0, _systimestamp)
+        self.raw.create_function('NVL', 2, _nvl, deterministic=True)
+        self.raw.create_function('GREATEST', -1, _greatest, deterministic=True)
+
+    def cursor(self):
+        return LocalCursor(self)
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def ping(self):
+        self.raw.execute("SELECT 1")
+
+    def is_healthy(self):
+        # A local file does not drop the session; only close() ends it
+        return not self.closed
+
+    def close(self):
+        self.closed = True
+        self.raw.close()
+
+
+def connect(path):
+    """
+    Open a local database, creating the schema if it does not exist yet
+
+    Args:
+        path: Path of the SQLite file (":memory:" for a throwaway database)
+
+    Returns:
+        LocalConnection: Connection usable in place of an oracledb connection
+    """
+    connection = LocalConnection(path)
+    connection.raw.executescript(LOCAL_SCHEMA)
+    migrate(connection.raw)
+    return connection
+
+
+def migrate(raw):
+    """
+    Add columns from LOCAL_MIGRATIONS that an older database is missing
+
+    Args:
+        raw: sqlite3 connection
+    """
+    for table, column in LOCAL_MIGRATIONS:
+        name = column.split()[0]
+        existing = {row[1].upper() for row in raw.execute(f"PRAGMA table_info({table})")}
+        if name.upper() not in existing:
+            raw.execute(f"ALTER TABLE {table} ADD COLUMN {column}")
+            backfill = LOCAL_BACKFILLS.get((table, name))
+            if backfill:
+                raw.execute(backfill)
+                raw.commit()
+    raw.executescript(LOCAL_POST_MIGRATION)
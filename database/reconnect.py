@@ -0,0 +1,272 @@
+"""
+Reconnect module for Car Rental System
+Tells a dropped session apart from other database errors, paces reconnect
+attempts with exponential backoff and counts reconnects and retries
+
+DatabaseOperations marks its methods with the decorators here:
+
+    @retrying      Read-only or idempotent: after a dropped session the
+                   call reconnects and runs again
+    @reconnecting  Everything else: a dead or long-idle connection is
+                   checked (and replaced) before the call, but the call
+                   itself is never repeated
+    @retrying_if_keyed
+                   Writes that accept an idempotency key (see
+                   idempotency.py): retried like @retrying when called
+                   with idempotency_key=..., else like @reconnecting
+
+Methods that return a generator (the iter_* streaming reads) are guarded
+while the rows are fetched, not only while the generator is built. They
+are retried only before the first row is handed out, so a consumer never
+sees a row twice.
+
+Settings (config.py): RECONNECT_ATTEMPTS, RECONNECT_BASE_DELAY_MS,
+RECONNECT_MAX_DELAY_MS, RETRY_ATTEMPTS and HEALTH_CHECK_IDLE_SECONDS.
+"""
+
+import functools
+import inspect
+import random
+import sqlite3
+import threading
+from collections import Counter, namedtuple
+import config
+from .db_connection import DB_ERRORS
+from .fake_driver import InjectedFault
+
+# oracledb error codes meaning the session is gone (the connection cannot
+# be used again, but a new one may well work)
+DISCONNECT_CODES = frozenset({
+    'DPI-1010',   # not connected
+    'DPI-1067',   # call timeout exceeded (the connection is closed)
+    'DPI-1080',   # connection was closed by ORA-%d
+    'DPY-1001',   # not connected to database
+    'DPY-4011',   # the database or network closed the connection
+    'DPY-4024',   # call timeout exceeded
+    'ORA-00028',  # your session has been killed
+    'ORA-01012',  # not logged on
+    'ORA-02396',  # exceeded maximum idle time
+    'ORA-03113',  # end-of-file on communication channel
+    'ORA-03114',  # not connected to ORACLE
+    'ORA-03135',  # connection lost contact
+    'ORA-12170',  # connect timeout
+    'ORA-12537',  # connection closed
+    'ORA-12541',  # no listener
+    'ORA-25408',  # can not safely replay call
+})
+
+RetryPolicy = namedtuple('RetryPolicy', ['attempts', 'base_delay', 'max_delay', 'retries'])
+
+
+def get_policy():
+    """
+    Reconnect policy from config
+
+    Returns:
+        RetryPolicy: RECONNECT_ATTEMPTS, the backoff delays (in seconds) and
+            RETRY_ATTEMPTS, how often one call may be run again
+    """
+    return RetryPolicy(
+        attempts=getattr(config, 'RECONNECT_ATTEMPTS', 5),
+        base_delay=getattr(config, 'RECONNECT_BASE_DELAY_MS', 50) / 1000,
+        max_delay=getattr(config, 'RECONNECT_MAX_DELAY_MS', 2000) / 1000,
+        retries=getattr(config, 'RETRY_ATTEMPTS', 2)
+    )
+
+
+def backoff_delays(policy):
+    """
+    Delays to wait before each reconnect attempt
+
+    The first attempt is immediate; after that the delay doubles from
+    base_delay up to max_delay, each drawn between half and all of its
+    nominal value so terminals dropped together do not return together.
+    With the defaults five attempts span about three quarters of a second.
+
+    Args:
+        policy: RetryPolicy
+
+    Yields:
+        float: Seconds to sleep before the attempt
+    """
+    for attempt in range(policy.attempts):
+        if attempt == 0:
+            yield 0.0
+        else:
+            delay = min(policy.max_delay, policy.base_delay * 2 ** (attempt - 1))
+            yield delay * random.uniform(0.5, 1.0)
+
+
+def is_disconnect(error):
+    """
+    Decide whether a database error means the session was lost
+
+    Args:
+        error: Exception raised by either backend
+
+    Returns:
+        bool: True for a dropped, killed, closed or timed-out connection
+    """
+    if isinstance(error, InjectedFault):
+        return True
+    if isinstance(error, sqlite3.ProgrammingError):
+        return 'closed' in str(error)
+    detail = error.args[0] if error.args else None
+    code = getattr(detail, 'full_code', None)
+    if code:
+        return code in DISCONNECT_CODES or bool(getattr(detail, 'isrecoverable', False))
+    message = str(error)
+    return any(code in message for code in DISCONNECT_CODES)
+
+
+class ConnectionMetrics:
+    """
+    Process-wide counts of health checks, reconnects and retried calls
+
+    Counters:
+        health_checks       Pings of a connection idle for too long
+        dead_connections    Connections found unusable (failed ping, dropped
+                            session or a call that failed on a lost session)
+        reconnects          Successful reconnects
+        reconnect_failures  Failed connect attempts
+        retries             Calls run again after a reconnect
+        retries_exhausted   Retried calls that still failed after the last attempt
+        calls_failed        Calls that must not be retried and failed on a lost session
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Zero the counters"""
+        with self._lock:
+            self.counts = Counter()
+            self.outage_seconds = 0.0
+
+    def count(self, name, amount=1):
+        """Add to a counter"""
+        with self._lock:
+            self.counts[name] += amount
+
+    def add_outage(self, seconds):
+        """Record how long a reconnect took, from the failure to the new connection"""
+        with self._lock:
+            self.outage_seconds += seconds
+
+    def stats(self):
+        """
+        Snapshot of the counters
+
+        Returns:
+            dict: The counters above plus outage_seconds (time spent reconnecting)
+        """
+        with self._lock:
+            return dict(self.counts, outage_seconds=self.outage_seconds)
+
+
+_metrics = ConnectionMetrics()
+
+
+def get_metrics():
+    """
+    Get the process-wide connection metrics
+
+    Returns:
+        ConnectionMetrics: Shared metrics
+    """
+    return _metrics
+
+
+def _guarded(func, retry):
+    """Wrap a DatabaseOperations method with the connection checks (see the module docstring)"""
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        if self._guard_depth:
+            # Called from another guarded method, which looks after the connection
+            return func(self, *args, **kwargs)
+        retry_call = retry(kwargs) if callable(retry) else retry
+        retries = self.retry_policy.retries if retry_call else 0
+        self._guard_depth += 1
+        try:
+            while True:
+                self._ensure_connected()
+                try:
+                    result = func(self, *args, **kwargs)
+                except DB_ERRORS as e:
+                    if not is_disconnect(e):
+                        raise
+                    self._connection_lost()
+                    if not retries:
+                        _metrics.count('retries_exhausted' if retry_call else 'calls_failed')
+                        raise
+                else:
+                    # Methods that print and return False/None on error leave a
+                    # dead connection behind rather than raising
+                    if inspect.isgenerator(result):
+                        return _guarded_rows(self, func, args, kwargs, result, retry_call, retries)
+                    if (result is not None and result is not False) or self._connection_alive():
+                        return result
+                    self._connection_lost()
+                    if not retries:
+                        _metrics.count('retries_exhausted' if retry_call else 'calls_failed')
+                        return result
+                retries -= 1
+                _metrics.count('retries')
+        finally:
+            self._guard_depth -= 1
+    return wrapper
+
+
+def _guarded_rows(self, func, args, kwargs, rows, retry_call, retries):
+    """
+    Iterate a guarded method's generator with the connection checks
+
+    A dropped session before the first row runs the method again (if it
+    may be retried); after that the error is passed on to the consumer.
+    The guard is held only while a row is being fetched, so calls the
+    consumer makes between rows are guarded on their own.
+    """
+    started = False
+    try:
+        while True:
+            self._guard_depth += 1
+            try:
+                row = next(rows)
+            except StopIteration:
+                return
+            except DB_ERRORS as e:
+                if not is_disconnect(e):
+                    raise
+                self._connection_lost()
+                if started or not retries:
+                    _metrics.count('retries_exhausted' if retry_call else 'calls_failed')
+                    raise
+                retries -= 1
+                _metrics.count('retries')
+                self._ensure_connected()
+                rows = func(self, *args, **kwargs)
+                continue
+            finally:
+                self._guard_depth -= 1
+            started = True
+            yield row
+    finally:
+        # Closes the cursor if the consumer stops early
+        if inspect.isgenerator(rows):
+            rows.close()
+
+
+def retrying(func):
+    """Decorator for read-only and idempotent DatabaseOperations methods"""
+    return _guarded(func, retry=True)
+
+
+def reconnecting(func):
+    """Decorator for DatabaseOperations methods that must not run twice"""
+    return _guarded(func, retry=False)
+
+
+def retrying_if_keyed(func):
+    """Decorator for DatabaseOperations writes that are safe to run again under an idempotency key"""
+    return _guarded(func, retry=lambda kwargs: kwargs.get('idempotency_key') is not None)
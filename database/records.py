@@ -0,0 +1,174 @@
+"""
+Row records for Car Rental System
+Typed records for the rows DatabaseOperations returns, each with the
+explicit column list its queries select
+
+Records are namedtuples with empty __slots__: fields are read by name
+(car.model rather than car[2]), an instance is no bigger than the plain
+tuple the driver would have returned, and positional access and
+unpacking keep working for code that writes rows out as they are. Set a
+record type as a cursor's rowfactory to have rows built straight into it.
+
+For whole-fleet loads CarColumns holds cars column by column in typed
+arrays, with the repeated strings (model, terms, status) stored once.
+"""
+
+from array import array
+from collections import namedtuple
+from itertools import islice
+
+# Sentinels for NULL in the integer and string-index arrays
+NULL_INT = -(2 ** 63)
+NULL_STRING = 0xFFFFFFFF
+
+
+class Car(namedtuple('Car', [
+    'car_id', 'agent_id', 'model', 'tariff', 'odamount', 'year', 'terms', 'status', 'branch_id'
+])):
+    """Every column of a car"""
+
+    __slots__ = ()
+
+    COLUMNS = "CARID, AGENTID, CARMODEL, TARIFF, ODAMOUNT, YEAR, TERMS, AVAILABILITYSTATUS, BRANCH_ID"
+
+
+class CarSummary(namedtuple('CarSummary', ['car_id', 'model', 'tariff', 'year', 'status'])):
+    """The columns of a car shown in the agent's fleet table"""
+
+    __slots__ = ()
+
+    COLUMNS = "CARID, CARMODEL, TARIFF, YEAR, AVAILABILITYSTATUS"
+
+
+class Customer(namedtuple('Customer', ['customer_id', 'name'])):
+    """A customer"""
+
+    __slots__ = ()
+
+    COLUMNS = "CUST_ID, CUST_NAME"
+
+
+class Rental(namedtuple('Rental', [
+    'transaction_id', 'customer_id', 'car_id', 'start_date', 'end_date', 'total_cost'
+])):
+    """A rental transaction; end_date is the agreed end while it is pending"""
+
+    __slots__ = ()
+
+    COLUMNS = "TRANSACTIONID, CUSTOMERID, CARID, RENTALSTARTDATE, RENTALENDDATE, TOTALCOST"
+
+
+class RentedCar(namedtuple('RentedCar', ['car_id', 'model', 'year', 'end_date'])):
+    """A car a customer has out, with the end date of the rental"""
+
+    __slots__ = ()
+
+
+class CarColumns:
+    """
+    Cars stored column-wise in typed arrays
+
+    Integer columns are array('q') (NULL as NULL_INT); model, terms and
+    status are array('I') indexes into one shared string table (NULL as
+    NULL_STRING). A car costs about 60 bytes here, against 400 or more
+    as a tuple or record holding its own int and str objects, and the
+    arrays can be written out as they are (see snapshot.py). Indexing or
+    iterating gives Car records.
+    """
+
+    INT_FIELDS = ('car_id', 'agent_id', 'tariff', 'odamount', 'year', 'branch_id')
+    STRING_FIELDS = ('model', 'terms', 'status')
+    # Rows that extend() transposes into columns in one go
+    CHUNK_SIZE = 1000
+
+    def __init__(self):
+        self.columns = {name: array('q') for name in self.INT_FIELDS}
+        self.columns.update((name, array('I')) for name in self.STRING_FIELDS)
+        self.strings = []
+        self._string_index = {}
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Build from Car records or rows in the same column order
+
+        Args:
+            rows: Any iterable of rows, read once (e.g. iter_all_car_details())
+
+        Returns:
+            CarColumns: The cars
+        """
+        fleet = cls()
+        fleet.extend(rows)
+        return fleet
+
+    def _intern(self, value):
+        """String-table index of a value"""
+        if value is None:
+            return NULL_STRING
+        index = self._string_index.get(value)
+        if index is None:
+            index = self._string_index[value] = len(self.strings)
+            self.strings.append(value)
+        return index
+
+    def extend(self, rows):
+        """
+        Append cars
+
+        Args:
+            rows: Iterable of Car records or rows in the same column order
+        """
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, self.CHUNK_SIZE))
+            if not chunk:
+                return
+            for name, values in zip(Car._fields, zip(*chunk)):
+                if name in self.STRING_FIELDS:
+                    self.columns[name].extend(map(self._intern, values))
+                elif None in values:
+                    self.columns[name].extend(NULL_INT if value is None else int(value) for value in values)
+                else:
+                    self.columns[name].extend(map(int, values))
+
+    def append(self, car):
+        """Append one car"""
+        self.extend((car,))
+
+    def __len__(self):
+        return len(self.columns['car_id'])
+
+    def _decode(self, name, value):
+        """Turn a stored value back into a column value"""
+        if name in self.INT_FIELDS:
+            return None if value == NULL_INT else value
+        return None if value == NULL_STRING else self.strings[value]
+
+    def __getitem__(self, index):
+        return Car(*(self._decode(name, self.columns[name][index]) for name in Car._fields))
+
+    def column(self, name):
+        """
+        Decode one column into a list
+
+        Args:
+            name: Car field name, e.g. 'model'
+
+        Returns:
+            list: The column's values, None for NULL
+        """
+        values = self.columns[name]
+        if name in self.INT_FIELDS:
+            values = values.tolist()
+            return [None if value == NULL_INT else value for value in values] if NULL_INT in values else values
+        table = self.strings + [None]
+        return [table[-1 if index == NULL_STRING else index] for index in values]
+
+    def __iter__(self):
+        return map(Car, *(self.column(name) for name in Car._fields))
+
+    @property
+    def nbytes(self):
+        """Bytes held by the column arrays (the string table not included)"""
+        return sum(values.itemsize * len(values) for values in self.columns.values())
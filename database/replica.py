@@ -0,0 +1,336 @@
+"""
+Local read replica module for Car Rental System
+Keeps an on-disk SQLite copy of Cars and open rentals so branch terminals
+can browse without a WAN round trip to the central database
+"""
+
+import sqlite3
+import time
+import config
+from .change_feed import ChangeFeedPoller
+from .local_backend import DETECT_TYPES
+from .records import Car, CarSummary, Rental
+from .snapshot import FleetSnapshot, find_latest_snapshot, shard_directory
+
+
+def open_replica(shard=None):
+    """
+    Open the local replica configured for this terminal
+
+    Args:
+        shard: Shard the terminal works on (None for the main database),
+            whose snapshots a new replica is warmed from
+
+    Returns:
+        LocalReplica: Replica instance, or None if REPLICA_PATH is not set
+    """
+    path = getattr(config, 'REPLICA_PATH', None)
+    if not path:
+        return None
+    replica = LocalReplica(path)
+
+    # A brand-new replica starts from the newest fleet snapshot, if any,
+    # and then only replays the change log written after it
+    snapshot_dir = getattr(config, 'SNAPSHOT_DIR', None)
+    if replica.last_sync_at is None and snapshot_dir:
+        snapshot_path = find_latest_snapshot(shard_directory(snapshot_dir, shard))
+        if snapshot_path:
+            try:
+                with FleetSnapshot(snapshot_path) as snapshot:
+                    replica.warm_from_snapshot(snapshot)
+            except (OSError, ValueError) as e:
+                print(f"Could not warm replica from {snapshot_path}: {e}")
+    return replica
+
+
+class LocalReplica:
+    """
+    SQLite replica of the fleet, synced incrementally from CarChangeLog
+
+    Reads are served locally; all writes still go to the primary through
+    DatabaseOperations and arrive here on the next sync.
+    """
+
+    # Bumped whenever SCHEMA changes; an older replica is rebuilt from scratch
+    SCHEMA_VERSION = 2
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS Cars (
+            CARID INTEGER PRIMARY KEY,
+            AGENTID INTEGER,
+            CARMODEL TEXT,
+            TARIFF INTEGER,
+            ODAMOUNT INTEGER,
+            YEAR INTEGER,
+            TERMS TEXT,
+            AVAILABILITYSTATUS TEXT,
+            BRANCH_ID INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS idx_cars_status ON Cars (AVAILABILITYSTATUS);
+        CREATE INDEX IF NOT EXISTS idx_cars_branch ON Cars (BRANCH_ID, AVAILABILITYSTATUS);
+        CREATE TABLE IF NOT EXISTS OpenRentals (
+            TRANSACTIONID INTEGER PRIMARY KEY,
+            CUSTOMERID INTEGER,
+            CARID INTEGER,
+            RENTALSTARTDATE TIMESTAMP,
+            RENTALENDDATE TIMESTAMP,
+            TOTALCOST REAL
+        );
+        CREATE INDEX IF NOT EXISTS idx_open_rentals_car ON OpenRentals (CARID);
+        CREATE TABLE IF NOT EXISTS ReplicaState (
+            KEY TEXT PRIMARY KEY,
+            VALUE TEXT
+        );
+    """
+
+    def __init__(self, path):
+        """
+        Open (and create if needed) the replica database
+
+        Args:
+            path: Path of the SQLite file
+        """
+        self.path = path
+        self.connection = sqlite3.connect(path, detect_types=DETECT_TYPES)
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version != self.SCHEMA_VERSION:
+            self.connection.executescript("""
+                DROP TABLE IF EXISTS Cars;
+                DROP TABLE IF EXISTS OpenRentals;
+                DROP TABLE IF EXISTS ReplicaState;
+            """)
+            self.connection.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+        self.connection.executescript(self.SCHEMA)
+        self._feed = None
+
+        last_sync = self._get_state('last_sync')
+        self.last_sync_at = float(last_sync) if last_sync else None
+
+    def close(self):
+        """Close the replica database"""
+        if self.connection:
+            self.connection.close()
+            self.connection = None
+
+    # ============ Sync ============
+
+    def sync(self, db):
+        """
+        Bring the replica up to date with the primary
+
+        The first sync (or one after the change log was lost) copies the
+        whole fleet; afterwards only cars named in new change-log rows are
+        re-read from the primary.
+
+        Args:
+            db: Connected DatabaseOperations instance for the primary
+
+        Returns:
+            tuple: (changed_ids, deleted_ids) applied by this sync
+        """
+        if self._feed is None or self._feed.db is not db:
+            hwm = self._get_state('change_id')
+            if hwm is None:
+                return self.full_refresh(db), set()
+            self._feed = ChangeFeedPoller(db, last_change_id=int(hwm))
+
+        changed_ids, deleted_ids = self._feed.poll()
+        cars = db.get_car_details_by_ids(changed_ids)
+        rentals = db.get_open_rentals(changed_ids | deleted_ids)
+
+        with self.connection:
+            self._delete_cars(changed_ids | deleted_ids)
+            self._insert(cars, rentals)
+            self._mark_synced(self._feed.last_change_id)
+        return changed_ids, deleted_ids
+
+    def full_refresh(self, db):
+        """
+        Replace the replica contents with a full copy of the primary
+
+        Args:
+            db: Connected DatabaseOperations instance for the primary
+
+        Returns:
+            set: IDs of all cars now in the replica
+        """
+        # Read the high-water mark first so changes made during the copy
+        # are picked up again by the next incremental sync
+        self._feed = ChangeFeedPoller(db)
+        cars = db.get_all_car_details()
+        rentals = db.get_open_rentals()
+
+        with self.connection:
+            self.connection.execute("DELETE FROM Cars")
+            self.connection.execute("DELETE FROM OpenRentals")
+            self._insert(cars, rentals)
+            self._mark_synced(self._feed.last_change_id)
+        return {car.car_id for car in cars}
+
+    def warm_from_snapshot(self, snapshot):
+        """
+        Replace the replica contents with a fleet snapshot
+
+        The next sync() continues from the snapshot's change ID.
+
+        Args:
+            snapshot: Open FleetSnapshot
+        """
+        self._feed = None
+        # Bulk load: skip fsyncs and build the car indexes once at the end
+        self.connection.execute("PRAGMA synchronous = OFF")
+        try:
+            with self.connection:
+                self.connection.execute("DROP INDEX IF EXISTS idx_cars_status")
+                self.connection.execute("DROP INDEX IF EXISTS idx_cars_branch")
+                self.connection.execute("DELETE FROM Cars")
+                self.connection.execute("DELETE FROM OpenRentals")
+                self._insert(snapshot.iter_cars(), snapshot.iter_rentals())
+                self.connection.execute(
+                    "CREATE INDEX idx_cars_status ON Cars (AVAILABILITYSTATUS)"
+                )
+                self.connection.execute(
+                    "CREATE INDEX idx_cars_branch ON Cars (BRANCH_ID, AVAILABILITYSTATUS)"
+                )
+                self._set_state('change_id', snapshot.change_id)
+                self._set_state('last_sync', snapshot.created_at)
+        finally:
+            self.connection.execute("PRAGMA synchronous = FULL")
+        self.last_sync_at = snapshot.created_at
+
+    def lag_seconds(self):
+        """
+        Seconds since the replica was last confirmed current
+
+        Returns:
+            float: Lag in seconds, or None if never synced
+        """
+        if self.last_sync_at is None:
+            return None
+        return max(0.0, time.time() - self.last_sync_at)
+
+    def _delete_cars(self, car_ids):
+        """Remove cars and their open rentals from the replica"""
+        rows = [(car_id,) for car_id in car_ids]
+        self.connection.executemany("DELETE FROM Cars WHERE CARID = ?", rows)
+        self.connection.executemany("DELETE FROM OpenRentals WHERE CARID = ?", rows)
+
+    def _insert(self, cars, rentals):
+        """Insert or overwrite car and open rental rows"""
+        self.connection.executemany(
+            f"INSERT OR REPLACE INTO Cars ({Car.COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", cars
+        )
+        self.connection.executemany(
+            f"INSERT OR REPLACE INTO OpenRentals ({Rental.COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)", rentals
+        )
+
+    def _mark_synced(self, change_id):
+        """Record the high-water mark and time of a successful sync"""
+        self.last_sync_at = time.time()
+        self._set_state('change_id', change_id)
+        self._set_state('last_sync', self.last_sync_at)
+
+    def _get_state(self, key):
+        """Read a value from the ReplicaState table"""
+        row = self.connection.execute(
+            "SELECT VALUE FROM ReplicaState WHERE KEY = ?", (key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, key, value):
+        """Write a value to the ReplicaState table"""
+        self.connection.execute(
+            "INSERT OR REPLACE INTO ReplicaState (KEY, VALUE) VALUES (?, ?)", (key, str(value))
+        )
+
+    # ============ Reads ============
+
+    def get_available_cars(self):
+        """
+        Get all available cars (same shape as DatabaseOperations.get_available_cars)
+
+        Returns:
+            list: Car records
+        """
+        return list(self.iter_available_cars())
+
+    def iter_available_cars(self):
+        """
+        Stream available cars (same shape as DatabaseOperations.iter_available_cars)
+
+        Yields:
+            Car: Available car
+        """
+        query = f"SELECT {Car.COLUMNS} FROM Cars WHERE AVAILABILITYSTATUS = 'Available'"
+        # sqlite3 cursors step through the result lazily
+        return map(Car._make, self.connection.execute(query))
+
+    def get_available_cars_at_branches(self, branch_ids):
+        """
+        Get available cars at specific branches
+        (same shape as DatabaseOperations.get_available_cars_at_branches)
+
+        Args:
+            branch_ids: Iterable of branch IDs
+
+        Returns:
+            list: Car records
+        """
+        branch_ids = list(branch_ids)
+        if not branch_ids:
+            return []
+        placeholders = ", ".join("?" for _ in branch_ids)
+        query = f"""
+            SELECT {Car.COLUMNS} FROM Cars
+            WHERE AVAILABILITYSTATUS = 'Available' AND BRANCH_ID IN ({placeholders})
+        """
+        return list(map(Car._make, self.connection.execute(query, branch_ids)))
+
+    def get_all_cars(self):
+        """
+        Get all cars (same shape as DatabaseOperations.get_all_cars)
+
+        Returns:
+            list: CarSummary records
+        """
+        return list(self.iter_all_cars())
+
+    def iter_all_cars(self):
+        """
+        Stream all cars (same shape as DatabaseOperations.iter_all_cars)
+
+        Yields:
+            CarSummary: (car_id, model, tariff, year, status)
+        """
+        query = f"SELECT {CarSummary.COLUMNS} FROM Cars"
+        return map(CarSummary._make, self.connection.execute(query))
+
+    def get_cars_by_ids(self, car_ids):
+        """
+        Get specific cars (same shape as DatabaseOperations.get_cars_by_ids)
+
+        Args:
+            car_ids: Iterable of car IDs
+
+        Returns:
+            list: CarSummary records for the IDs present in the replica
+        """
+        car_ids = list(car_ids)
+        if not car_ids:
+            return []
+        placeholders = ", ".join("?" for _ in car_ids)
+        query = f"""
+            SELECT {CarSummary.COLUMNS} FROM Cars
+            WHERE CARID IN ({placeholders})
+        """
+        return list(map(CarSummary._make, self.connection.execute(query, car_ids)))
+
+    def get_open_rentals(self):
+        """
+        Get pending rentals (same shape as DatabaseOperations.get_open_rentals)
+
+        Returns:
+            list: Rental records
+        """
+        query = f"SELECT {Rental.COLUMNS} FROM OpenRentals"
+        return list(map(Rental._make, self.connection.execute(query)))
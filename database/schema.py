@@ -0,0 +1,303 @@
+"""
+Schema definitions for Car Rental System
+Holds the DDL for tables added on top of the original
+Customers, Agent, Cars and RentalTransactions schema
+"""
+
+# ============ Oracle DDL ============
+
+ORACLE_DDL = [
+    # Append-only log of every change made to Cars or RentalTransactions.
+    # One row per affected car; consumers poll by CHANGE_ID.
+    """
+    CREATE TABLE CarChangeLog (
+        CHANGE_ID NUMBER PRIMARY KEY,
+        CARID NUMBER NOT NULL,
+        OPERATION VARCHAR2(10) NOT NULL,
+        CHANGED_AT TIMESTAMP DEFAULT SYSTIMESTAMP NOT NULL
+    )
+    """,
+    "CREATE SEQUENCE change_log_seq START WITH 1 INCREMENT BY 1 NOCACHE",
+    # Incrementally maintained fleet totals (see database/counters.py).
+    # Keys: status.<status>, model.<model>.<status>, rentals.overdue,
+    # revenue.<YYYY-MM-DD>
+    """
+    CREATE TABLE FleetCounters (
+        COUNTER_KEY VARCHAR2(200) PRIMARY KEY,
+        COUNTER_VALUE NUMBER DEFAULT 0 NOT NULL
+    )
+    """,
+    # Who did what to which car; written in batches by database/audit.py
+    """
+    CREATE TABLE AuditLog (
+        AUDIT_ID NUMBER PRIMARY KEY,
+        ACTOR VARCHAR2(100) NOT NULL,
+        ACTION VARCHAR2(20) NOT NULL,
+        CARID NUMBER,
+        DETAILS VARCHAR2(400),
+        CREATED_AT TIMESTAMP NOT NULL
+    )
+    """,
+    "CREATE SEQUENCE audit_seq START WITH 1 INCREMENT BY 1 CACHE 100",
+    "CREATE INDEX idx_audit_car ON AuditLog (CARID, CREATED_AT)",
+    # Branch locations; cars and agents belong to a branch
+    """
+    CREATE TABLE Branches (
+        BRANCH_ID NUMBER PRIMARY KEY,
+        BRANCH_NAME VARCHAR2(100) NOT NULL,
+        LATITUDE NUMBER(9, 6) NOT NULL,
+        LONGITUDE NUMBER(9, 6) NOT NULL
+    )
+    """,
+    "ALTER TABLE Cars ADD (BRANCH_ID NUMBER REFERENCES Branches (BRANCH_ID))",
+    "ALTER TABLE Agent ADD (BRANCH_ID NUMBER REFERENCES Branches (BRANCH_ID))",
+    "CREATE INDEX idx_cars_branch ON Cars (BRANCH_ID, AVAILABILITYSTATUS, CARMODEL)",
+    # Indexes on the original tables, checked by benchmarks/query_plans.py
+    "CREATE INDEX idx_customer_name ON Customer (CUST_NAME)",
+    "CREATE INDEX idx_cars_status ON Cars (AVAILABILITYSTATUS, CARMODEL)",
+    "CREATE INDEX idx_rentals_customer ON RentalTransactions (CUSTOMERID)",
+    "CREATE INDEX idx_rentals_car ON RentalTransactions (CARID, RENTALSTATUS)",
+    "CREATE INDEX idx_rentals_status ON RentalTransactions (RENTALSTATUS, RENTALENDDATE)",
+    "CREATE INDEX idx_rentals_start ON RentalTransactions (RENTALSTARTDATE)",
+    # Passwords are stored as PBKDF2 hashes (database/credentials.py), which
+    # do not fit the original CHAR(8); logins look users up by name only
+    "ALTER TABLE Users MODIFY (PASSWORD VARCHAR2(128))",
+    "ALTER TABLE Agent MODIFY (A_PASSWORD VARCHAR2(128))",
+    "CREATE INDEX idx_agent_name ON Agent (AGENTNAME)",
+    # Skip if USERNAME already has a unique constraint
+    "CREATE UNIQUE INDEX idx_users_username ON Users (USERNAME)",
+    # Customers waiting for a car (see database/waitlist.py). STATUS is
+    # Waiting, Offered (CARID is held for them as 'Reserved'), Fulfilled,
+    # Cancelled or Expired
+    """
+    CREATE TABLE Waitlist (
+        WAITLIST_ID NUMBER PRIMARY KEY,
+        CUSTOMERID NUMBER NOT NULL REFERENCES Customer (CUST_ID),
+        CARMODEL VARCHAR2(50),
+        MIN_YEAR NUMBER,
+        MAX_YEAR NUMBER,
+        MAX_TARIFF NUMBER,
+        TIER NUMBER DEFAULT 0 NOT NULL,
+        REQUESTED_AT TIMESTAMP NOT NULL,
+        STATUS VARCHAR2(10) NOT NULL,
+        CARID NUMBER,
+        OFFERED_AT TIMESTAMP
+    )
+    """,
+    "CREATE INDEX idx_waitlist_status ON Waitlist (STATUS, WAITLIST_ID)",
+    "CREATE INDEX idx_waitlist_customer ON Waitlist (CUSTOMERID, STATUS)",
+    # Waitlist IDs (see WaitlistQueue.refresh). On a Waitlist that already
+    # has rows, start the sequence above MAX(WAITLIST_ID).
+    "CREATE SEQUENCE waitlist_seq START WITH 1 INCREMENT BY 1 NOCACHE",
+    # Billing (see database/billing.py): RENTALENDDATE becomes the actual
+    # return time, so the agreed end date is kept separately (NULL on rentals
+    # made before this column existed, where RENTALENDDATE is still the agreed end)
+    "ALTER TABLE RentalTransactions ADD (AGREED_ENDDATE TIMESTAMP, LATEFEE NUMBER, FINALCOST NUMBER)",
+    # One invoice per returned rental, written by the batch invoice run
+    """
+    CREATE TABLE Invoices (
+        INVOICE_ID NUMBER PRIMARY KEY,
+        TRANSACTIONID NUMBER NOT NULL UNIQUE,
+        CUSTOMERID NUMBER NOT NULL,
+        CARID NUMBER NOT NULL,
+        RENTALSTARTDATE TIMESTAMP NOT NULL,
+        AGREED_ENDDATE TIMESTAMP NOT NULL,
+        RETURNED_AT TIMESTAMP NOT NULL,
+        BILLED_DAYS NUMBER NOT NULL,
+        LATE_DAYS NUMBER NOT NULL,
+        BASECOST NUMBER NOT NULL,
+        LATEFEE NUMBER NOT NULL,
+        TOTAL NUMBER NOT NULL,
+        CREATED_AT TIMESTAMP NOT NULL
+    )
+    """,
+    "CREATE SEQUENCE invoice_seq START WITH 1 INCREMENT BY 1 CACHE 100",
+    "CREATE INDEX idx_invoices_returned ON Invoices (RETURNED_AT)",
+    # Shard key (see database/sharding.py): a rental belongs to the branch
+    # its car was rented from
+    "ALTER TABLE RentalTransactions ADD (BRANCH_ID NUMBER)",
+    """
+    UPDATE RentalTransactions RT
+    SET BRANCH_ID = (SELECT C.BRANCH_ID FROM Cars C WHERE C.CARID = RT.CARID)
+    WHERE BRANCH_ID IS NULL
+    """,
+    "CREATE INDEX idx_rentals_branch ON RentalTransactions (BRANCH_ID, RENTALSTATUS, RENTALENDDATE)",
+    # Outcome of each rent, return and add-car request sent with an
+    # idempotency key (see database/idempotency.py), written in the same
+    # transaction as the request's own changes
+    """
+    CREATE TABLE IdempotencyKeys (
+        IDEMPOTENCY_KEY VARCHAR2(64) PRIMARY KEY,
+        OPERATION VARCHAR2(10) NOT NULL,
+        OUTCOME VARCHAR2(4000),
+        CREATED_AT TIMESTAMP NOT NULL
+    )
+    """,
+    "CREATE INDEX idx_idempotency_created ON IdempotencyKeys (CREATED_AT)",
+]
+
+# Optional (needs the Partitioning option): list-partition the branch-owned
+# tables by BRANCH_ID in place, so branch-filtered queries read only their
+# branches' partitions. A partition is added automatically for each new branch.
+ORACLE_PARTITIONING = [
+    """
+    ALTER TABLE Cars MODIFY
+    PARTITION BY LIST (BRANCH_ID) AUTOMATIC (PARTITION p_no_branch VALUES (NULL))
+    ONLINE
+    """,
+    """
+    ALTER TABLE RentalTransactions MODIFY
+    PARTITION BY LIST (BRANCH_ID) AUTOMATIC (PARTITION p_no_branch VALUES (NULL))
+    ONLINE
+    """,
+]
+
+# Tables a shard database holds for its branches. Shards are created with
+# the full schema, but on Oracle without the foreign keys to the tables
+# that stay in the main database (Users, Customer, Agent, Branches).
+SHARDED_TABLES = ('Cars', 'RentalTransactions', 'Invoices', 'CarChangeLog', 'FleetCounters', 'Waitlist',
+                  'IdempotencyKeys')
+
+
+# ============ Local (SQLite) DDL ============
+
+# Full schema for the local backend, including the original tables.
+# INTEGER PRIMARY KEY columns stand in for Oracle sequences.
+LOCAL_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS Branches (
+        BRANCH_ID INTEGER PRIMARY KEY,
+        BRANCH_NAME TEXT NOT NULL,
+        LATITUDE REAL NOT NULL,
+        LONGITUDE REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS Users (
+        USER_ID INTEGER PRIMARY KEY,
+        USERNAME TEXT NOT NULL UNIQUE,
+        PASSWORD TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS Customer (
+        CUST_ID INTEGER PRIMARY KEY,
+        CUST_NAME TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS Agent (
+        AGENTID INTEGER PRIMARY KEY,
+        AGENTNAME TEXT NOT NULL,
+        A_PASSWORD TEXT NOT NULL,
+        CARHANDLING INTEGER DEFAULT 0,
+        CONTACT TEXT,
+        BRANCH_ID INTEGER REFERENCES Branches (BRANCH_ID)
+    );
+    CREATE TABLE IF NOT EXISTS Cars (
+        CARID INTEGER PRIMARY KEY,
+        AGENTID INTEGER,
+        CARMODEL TEXT,
+        TARIFF INTEGER,
+        ODAMOUNT INTEGER,
+        YEAR INTEGER,
+        TERMS TEXT,
+        AVAILABILITYSTATUS TEXT,
+        BRANCH_ID INTEGER REFERENCES Branches (BRANCH_ID)
+    );
+    CREATE TABLE IF NOT EXISTS RentalTransactions (
+        TRANSACTIONID INTEGER PRIMARY KEY,
+        CUSTOMERID INTEGER REFERENCES Customer (CUST_ID),
+        CARID INTEGER,
+        RENTALSTARTDATE TIMESTAMP,
+        RENTALENDDATE TIMESTAMP,
+        TOTALCOST REAL,
+        RENTALSTATUS TEXT,
+        AGREED_ENDDATE TIMESTAMP,
+        LATEFEE REAL,
+        FINALCOST REAL,
+        BRANCH_ID INTEGER
+    );
+    CREATE TABLE IF NOT EXISTS CarChangeLog (
+        CHANGE_ID INTEGER PRIMARY KEY,
+        CARID INTEGER NOT NULL,
+        OPERATION TEXT NOT NULL,
+        CHANGED_AT TIMESTAMP NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS FleetCounters (
+        COUNTER_KEY TEXT PRIMARY KEY,
+        COUNTER_VALUE NUMERIC NOT NULL DEFAULT 0
+    );
+    CREATE TABLE IF NOT EXISTS AuditLog (
+        AUDIT_ID INTEGER PRIMARY KEY,
+        ACTOR TEXT NOT NULL,
+        ACTION TEXT NOT NULL,
+        CARID INTEGER,
+        DETAILS TEXT,
+        CREATED_AT TIMESTAMP NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS Waitlist (
+        WAITLIST_ID INTEGER PRIMARY KEY,
+        CUSTOMERID INTEGER NOT NULL REFERENCES Customer (CUST_ID),
+        CARMODEL TEXT,
+        MIN_YEAR INTEGER,
+        MAX_YEAR INTEGER,
+        MAX_TARIFF INTEGER,
+        TIER INTEGER NOT NULL DEFAULT 0,
+        REQUESTED_AT TIMESTAMP NOT NULL,
+        STATUS TEXT NOT NULL,
+        CARID INTEGER,
+        OFFERED_AT TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS idx_waitlist_status ON Waitlist (STATUS, WAITLIST_ID);
+    CREATE INDEX IF NOT EXISTS idx_waitlist_customer ON Waitlist (CUSTOMERID, STATUS);
+    CREATE TABLE IF NOT EXISTS Invoices (
+        INVOICE_ID INTEGER PRIMARY KEY,
+        TRANSACTIONID INTEGER NOT NULL UNIQUE,
+        CUSTOMERID INTEGER NOT NULL,
+        CARID INTEGER NOT NULL,
+        RENTALSTARTDATE TIMESTAMP NOT NULL,
+        AGREED_ENDDATE TIMESTAMP NOT NULL,
+        RETURNED_AT TIMESTAMP NOT NULL,
+        BILLED_DAYS INTEGER NOT NULL,
+        LATE_DAYS INTEGER NOT NULL,
+        BASECOST REAL NOT NULL,
+        LATEFEE REAL NOT NULL,
+        TOTAL REAL NOT NULL,
+        CREATED_AT TIMESTAMP NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_invoices_returned ON Invoices (RETURNED_AT);
+    CREATE TABLE IF NOT EXISTS IdempotencyKeys (
+        IDEMPOTENCY_KEY TEXT PRIMARY KEY,
+        OPERATION TEXT NOT NULL,
+        OUTCOME TEXT,
+        CREATED_AT TIMESTAMP NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_idempotency_created ON IdempotencyKeys (CREATED_AT);
+    CREATE INDEX IF NOT EXISTS idx_audit_car ON AuditLog (CARID, CREATED_AT);
+    CREATE INDEX IF NOT EXISTS idx_customer_name ON Customer (CUST_NAME);
+    CREATE INDEX IF NOT EXISTS idx_cars_status ON Cars (AVAILABILITYSTATUS, CARMODEL);
+    CREATE INDEX IF NOT EXISTS idx_rentals_customer ON RentalTransactions (CUSTOMERID);
+    CREATE INDEX IF NOT EXISTS idx_rentals_car ON RentalTransactions (CARID, RENTALSTATUS);
+    CREATE INDEX IF NOT EXISTS idx_rentals_status ON RentalTransactions (RENTALSTATUS, RENTALENDDATE);
+    CREATE INDEX IF NOT EXISTS idx_rentals_start ON RentalTransactions (RENTALSTARTDATE);
+    CREATE INDEX IF NOT EXISTS idx_agent_name ON Agent (AGENTNAME);
+"""
+
+# Columns added to local tables after they were first created, applied by
+# local_backend.connect to databases that predate them: (table, column DDL)
+LOCAL_MIGRATIONS = [
+    ('Cars', 'BRANCH_ID INTEGER REFERENCES Branches (BRANCH_ID)'),
+    ('Agent', 'BRANCH_ID INTEGER REFERENCES Branches (BRANCH_ID)'),
+    ('RentalTransactions', 'AGREED_ENDDATE TIMESTAMP'),
+    ('RentalTransactions', 'LATEFEE REAL'),
+    ('RentalTransactions', 'FINALCOST REAL'),
+    ('RentalTransactions', 'BRANCH_ID INTEGER'),
+]
+
+# Statements filling a migrated column in, run once when it is added
+LOCAL_BACKFILLS = {
+    ('RentalTransactions', 'BRANCH_ID'): """
+        UPDATE RentalTransactions
+        SET BRANCH_ID = (SELECT C.BRANCH_ID FROM Cars C WHERE C.CARID = RentalTransactions.CARID)
+    """,
+}
+
+# Indexes over migrated columns, created once the columns exist
+LOCAL_POST_MIGRATION = """
+    CREATE INDEX IF NOT EXISTS idx_cars_branch ON Cars (BRANCH_ID, AVAILABILITYSTATUS, CARMODEL);
+    CREATE INDEX IF NOT EXISTS idx_rentals_branch ON RentalTransactions (BRANCH_ID, RENTALSTATUS, RENTALENDDATE);
+"""
@@ -0,0 +1,522 @@
+"""
+Sharding module for Car Rental System
+Splits the branch-owned data across databases by branch and routes each
+operation to the database that holds it
+
+Cars and RentalTransactions, with the invoices, change log, fleet
+counters and waitlist that hang off them, live in the shard of their
+branch (BRANCH_ID is the shard key); users, customers, agents, branches
+and the audit trail stay in the main database, together with the
+branches no shard lists. Shards are configured with SHARDS in config.py:
+
+    SHARDS = {
+        "north": {"branches": [1, 2], "dsn": "north-db:1521/XE", "path": "north.db"},
+        "south": {"branches": [3, 4], "dsn": "south-db:1521/XE", "path": "south.db"},
+    }
+
+A branch terminal (TERMINAL_BRANCH_ID) works on a DatabaseOperations
+bound to its branch's shard, so its queries only touch that slice.
+Head-office views, reports and jobs use ShardedOperations, which fans
+reads out to every shard and merges the results, and sends each write to
+the shard of the car or branch it concerns.
+"""
+
+import heapq
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+import config
+from .change_feed import ChangeFeedPoller
+from .db_operations import DatabaseOperations
+from .records import CarColumns
+
+# Shard name of the main database
+MAIN = None
+
+
+class ShardMap:
+    """
+    Which shard holds each branch
+    """
+
+    def __init__(self, shards=None):
+        """
+        Args:
+            shards: {name: {"branches": [...], ...}} as in config.SHARDS, or None
+        """
+        self.shards = {name: tuple(spec.get('branches', ())) for name, spec in (shards or {}).items()}
+        self._by_branch = {
+            branch_id: name for name, branches in self.shards.items() for branch_id in branches
+        }
+
+    def __bool__(self):
+        return bool(self.shards)
+
+    def shard_for(self, branch_id):
+        """
+        Shard holding a branch
+
+        Args:
+            branch_id: Branch ID (None for cars without a branch)
+
+        Returns:
+            str: Shard name, or MAIN for branches no shard lists
+        """
+        return self._by_branch.get(branch_id, MAIN)
+
+    def names(self):
+        """
+        Every database, main first
+
+        Returns:
+            list: MAIN followed by the shard names
+        """
+        return [MAIN] + list(self.shards)
+
+
+def get_shard_map():
+    """
+    Shard map from config
+
+    Returns:
+        ShardMap: Built from SHARDS (empty when it is not set)
+    """
+    return ShardMap(getattr(config, 'SHARDS', None))
+
+
+def create_operations(branch_id=None):
+    """
+    Create the database operations for a terminal or job (not connected yet)
+
+    Args:
+        branch_id: Branch the terminal serves (e.g. TERMINAL_BRANCH_ID),
+            or None for every branch
+
+    Returns:
+        DatabaseOperations: Bound to the branch's shard, or a
+        ShardedOperations across all of them when shards are configured
+        and no branch is given
+    """
+    shard_map = get_shard_map()
+    if not shard_map:
+        return DatabaseOperations()
+    if branch_id is not None:
+        return DatabaseOperations(shard=shard_map.shard_for(branch_id))
+    return ShardedOperations(shard_map)
+
+
+def each_database(db):
+    """
+    The single-database operations behind a DatabaseOperations or ShardedOperations
+
+    Args:
+        db: Connected DatabaseOperations or ShardedOperations
+
+    Returns:
+        dict: DatabaseOperations per shard name (MAIN for the main database)
+    """
+    return db.shards if isinstance(db, ShardedOperations) else {db.shard: db}
+
+
+class ShardedOperations:
+    """
+    DatabaseOperations across every shard, with the same methods
+
+    Reads fan out to every shard at once (one DatabaseOperations and
+    connection per shard) and their results are merged: concatenated,
+    merged in order where the single-database result is ordered, or
+    summed. Writes go to the shard of their car (found through the
+    identity map, or by asking every shard) or of their branch. Users,
+    customers, agents, branches and the waitlist are served by the main
+    database; waitlists are per database, so a head-office session's
+    waitlist is the main database's.
+    """
+
+    # Operations on what the main database holds, run there as they are
+    MAIN_OPERATIONS = frozenset({
+        'register_customer', 'get_customer_id', 'register_agent',
+        'get_branches', 'add_branch', 'set_agent_branch', 'get_agent_branch',
+        'join_waitlist', 'cancel_waitlist', 'rent_waitlist_offer', 'get_customer_waitlist',
+        'get_waiting_entries', 'waitlist', 'metrics',
+    })
+
+    def __init__(self, shard_map=None):
+        """
+        Args:
+            shard_map: ShardMap (default get_shard_map())
+        """
+        self.shard_map = shard_map or get_shard_map()
+        self.shards = {name: DatabaseOperations(shard=name) for name in self.shard_map.names()}
+        self.main = self.shards[MAIN]
+        self.last_charges = {}
+        self._pool = None
+
+    def __getattr__(self, name):
+        if name in self.MAIN_OPERATIONS:
+            return getattr(self.main, name)
+        raise AttributeError(f"{name} is not available across shards; use a DatabaseOperations bound to one")
+
+    # ============ Sessions ============
+
+    @property
+    def actor(self):
+        return self.main.actor
+
+    @actor.setter
+    def actor(self, actor):
+        for db in self.shards.values():
+            db.actor = actor
+
+    @property
+    def session_token(self):
+        return self.main.session_token
+
+    @property
+    def session(self):
+        return self.main.session
+
+    def connect(self):
+        """Connect to every shard"""
+        try:
+            self._fan_out(DatabaseOperations.connect)
+        except Exception:
+            self.disconnect()
+            raise
+
+    def disconnect(self):
+        """Disconnect from every shard"""
+        for db in self.shards.values():
+            if db.connection is not None:
+                db.disconnect()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+    def login_customer(self, username, password):
+        """Log a customer in on the main database and share the session (see DatabaseOperations)"""
+        return self._share_session(self.main.login_customer(username, password))
+
+    def login_agent(self, username, password):
+        """Log an agent in on the main database and share the session (see DatabaseOperations)"""
+        return self._share_session(self.main.login_agent(username, password))
+
+    def resume_session(self, token):
+        """Adopt a session token on every shard (see DatabaseOperations)"""
+        return self._fan_out(lambda db: db.resume_session(token))[MAIN]
+
+    def _share_session(self, result):
+        """Hand the main database's new session to the other shards"""
+        if result is not None and self.main.session_token is not None:
+            for name, db in self.shards.items():
+                if name is not MAIN:
+                    db.resume_session(self.main.session_token)
+        return result
+
+    # ============ Routing ============
+
+    def _fan_out(self, call, names=None):
+        """
+        Run a call on several shards at once
+
+        Args:
+            call: Callable taking a DatabaseOperations
+            names: Shards to run it on (default every shard)
+
+        Returns:
+            dict: Result per shard name, in shard order
+
+        Raises:
+            Exception: The first error raised on any shard
+        """
+        names = list(self.shards) if names is None else list(names)
+        if len(names) == 1:
+            return {names[0]: call(self.shards[names[0]])}
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=len(self.shards), thread_name_prefix='shard')
+        futures = {name: self._pool.submit(call, self.shards[name]) for name in names}
+        return {name: future.result() for name, future in futures.items()}
+
+    def _locate(self, car_ids):
+        """
+        Group cars by the shard that holds them
+
+        Cars held in a shard's identity map are placed there; the rest
+        are looked up on every shard at once. Cars found nowhere are
+        put with the main database, which reports them as missing as usual.
+
+        Args:
+            car_ids: Iterable of car IDs
+
+        Returns:
+            dict: {shard name: [car IDs]}
+        """
+        located = defaultdict(list)
+        unknown = []
+        for car_id in car_ids:
+            holders = [name for name, db in self.shards.items() if db.entities.get('car', car_id)]
+            if holders:
+                located[holders[0]].append(car_id)
+            else:
+                unknown.append(car_id)
+        if unknown:
+            found = {}
+            for name, cars in self._fan_out(lambda db: db.get_car_details_by_ids(unknown)).items():
+                for car in cars:
+                    found[car.car_id] = name
+            for car_id in unknown:
+                located[found.get(car_id, MAIN)].append(car_id)
+        return located
+
+    def _on_car(self, car_id):
+        """DatabaseOperations of the shard holding a car"""
+        name, = self._locate([car_id])
+        return self.shards[name]
+
+    def _names_for_branches(self, branch_ids):
+        """Shards holding any of some branches, in order of first appearance"""
+        return list(dict.fromkeys(self.shard_map.shard_for(branch_id) for branch_id in branch_ids))
+
+    def _concat(self, method, *args):
+        """Run a list-returning method on every shard and concatenate the lists"""
+        return list(chain.from_iterable(self._fan_out(lambda db: getattr(db, method)(*args)).values()))
+
+    def _chain(self, method, *args):
+        """Chain a streaming method's rows from every shard, one shard after another"""
+        return chain.from_iterable(getattr(db, method)(*args) for db in self.shards.values())
+
+    @staticmethod
+    def _total(results):
+        """Sum counts from every shard, or None if any shard failed"""
+        results = list(results)
+        return None if None in results else sum(results)
+
+    # ============ Car Operations ============
+
+    def get_available_cars(self):
+        return self._concat('get_available_cars')
+
+    def iter_available_cars(self, batch_size=None):
+        return self._chain('iter_available_cars', batch_size)
+
+    def get_all_cars(self):
+        return self._concat('get_all_cars')
+
+    def iter_all_cars(self, batch_size=None):
+        return self._chain('iter_all_cars', batch_size)
+
+    def get_all_car_details(self):
+        return self._concat('get_all_car_details')
+
+    def iter_all_car_details(self, batch_size=None):
+        return self._chain('iter_all_car_details', batch_size)
+
+    def load_car_columns(self, batch_size=None):
+        return CarColumns.from_rows(self.iter_all_car_details(batch_size))
+
+    def get_cars_by_ids(self, car_ids):
+        car_ids = list(car_ids)
+        return self._concat('get_cars_by_ids', car_ids)
+
+    def get_car_details_by_ids(self, car_ids):
+        car_ids = list(car_ids)
+        return self._concat('get_car_details_by_ids', car_ids)
+
+    def get_car(self, car_id, fresh=False):
+        return self._on_car(car_id).get_car(car_id, fresh)
+
+    def add_car(self, car_id, agent_id, car_model, tariff, year, terms, branch_id=None, *,
+                idempotency_key=None):
+        if branch_id is None:
+            branch_id = self.main.get_agent_branch(agent_id)
+        db = self.shards[self.shard_map.shard_for(branch_id)]
+        return db.add_car(car_id, agent_id, car_model, tariff, year, terms, branch_id,
+                          idempotency_key=idempotency_key)
+
+    def update_car(self, car_id, field, value, *, idempotency_key=None):
+        return self._on_car(car_id).update_car(car_id, field, value, idempotency_key=idempotency_key)
+
+    def delete_car(self, car_id):
+        return self._on_car(car_id).delete_car(car_id)
+
+    def adjust_tariffs(self, percent=None, amount=None, car_model=None, year=None,
+                       agent_id=None, car_ids=None):
+        def adjust(db, ids=None):
+            return db.adjust_tariffs(percent, amount, car_model, year, agent_id, ids)
+        if car_ids is None:
+            return self._total(self._fan_out(adjust).values())
+        located = self._locate(car_ids)
+        return self._total(self._fan_out(lambda db: adjust(db, located[db.shard]), located).values())
+
+    def get_available_cars_at_branches(self, branch_ids):
+        branch_ids = list(branch_ids)
+        results = self._fan_out(lambda db: db.get_available_cars_at_branches(branch_ids),
+                                self._names_for_branches(branch_ids))
+        return list(chain.from_iterable(results.values()))
+
+    def get_branches_with_available(self, car_model=None):
+        return set().union(*self._fan_out(lambda db: db.get_branches_with_available(car_model)).values())
+
+    def get_customer_rented_cars(self, username):
+        return self._concat('get_customer_rented_cars', username)
+
+    def iter_customer_rented_cars(self, username, batch_size=None):
+        return self._chain('iter_customer_rented_cars', username, batch_size)
+
+    def get_overdue_cars(self, username):
+        return self._concat('get_overdue_cars', username)
+
+    def iter_overdue_cars(self, username, batch_size=None):
+        return self._chain('iter_overdue_cars', username, batch_size)
+
+    # ============ Rental Operations ============
+
+    def create_rental(self, customer_id, car_id, rental_start_date, rental_end_date, total_cost, *,
+                      idempotency_key=None):
+        return self._on_car(car_id).create_rental(customer_id, car_id, rental_start_date, rental_end_date,
+                                                  total_cost, idempotency_key=idempotency_key)
+
+    def rent_by_criteria(self, customer_id, rental_start_date, rental_end_date,
+                         car_model=None, min_year=None, max_year=None, max_tariff=None,
+                         branch_ids=None, *, idempotency_key=None):
+        names = self._names_for_branches(branch_ids) if branch_ids else list(self.shards)
+        if idempotency_key is not None:
+            # A repeat must not rent on another shard than the first attempt did
+            for outcome in self._fan_out(lambda db: db.get_outcome(idempotency_key), names).values():
+                if outcome is not None and outcome.operation == 'RENT':
+                    return outcome.result
+        # Shard by shard, in the order of the preferred branches, until one has a car
+        for name in names:
+            rented = self.shards[name].rent_by_criteria(customer_id, rental_start_date, rental_end_date,
+                                                        car_model, min_year, max_year, max_tariff, branch_ids,
+                                                        idempotency_key=idempotency_key)
+            if rented is not None:
+                return rented
+        return None
+
+    def return_car(self, car_id, *, idempotency_key=None):
+        return self.return_cars([car_id], idempotency_key=idempotency_key)
+
+    def return_cars(self, car_ids, *, idempotency_key=None):
+        # Each shard records the key with its own part of the return
+        located = self._locate(car_ids)
+        results = self._fan_out(lambda db: db.return_cars(located[db.shard], idempotency_key=idempotency_key),
+                                located)
+        self.last_charges = {}
+        for name in located:
+            self.last_charges.update(self.shards[name].last_charges)
+        return all(results.values())
+
+    def update_car_availability(self, car_id, status):
+        return self._on_car(car_id).update_car_availability(car_id, status)
+
+    def set_cars_availability(self, car_ids, status):
+        located = self._locate(car_ids)
+        return all(self._fan_out(lambda db: db.set_cars_availability(located[db.shard], status), located).values())
+
+    def get_open_rentals(self, car_ids=None):
+        if car_ids is None:
+            return self._concat('get_open_rentals')
+        located = self._locate(car_ids)
+        results = self._fan_out(lambda db: db.get_open_rentals(located[db.shard]), located)
+        return list(chain.from_iterable(results.values()))
+
+    def get_overdue_rentals(self):
+        return list(self.iter_overdue_rentals())
+
+    def iter_overdue_rentals(self, batch_size=None):
+        # Each shard's rows come oldest end date (column 5) first
+        return heapq.merge(*(db.iter_overdue_rentals(batch_size) for db in self.shards.values()),
+                           key=lambda row: row[5])
+
+    # ============ Billing Operations ============
+
+    def generate_invoices(self, period_start, period_end, batch_size=None):
+        results = self._fan_out(lambda db: db.generate_invoices(period_start, period_end, batch_size))
+        if None in results.values():
+            return None
+        summary = Counter()
+        for result in results.values():
+            summary.update(result)
+        return {key: round(value, 2) for key, value in summary.items()}
+
+    def get_invoices(self, period_start, period_end):
+        return list(self.iter_invoices(period_start, period_end))
+
+    def iter_invoices(self, period_start, period_end, batch_size=None):
+        # Each shard's rows come in RETURNED_AT (column 4) order
+        return heapq.merge(*(db.iter_invoices(period_start, period_end, batch_size) for db in self.shards.values()),
+                           key=lambda row: row[4])
+
+    # ============ Waitlist and Counter Operations ============
+
+    def expire_waitlist_offers(self, hold_minutes=None):
+        return self._total(self._fan_out(lambda db: db.expire_waitlist_offers(hold_minutes)).values())
+
+    def get_counters(self):
+        totals = Counter()
+        for counters in self._fan_out(DatabaseOperations.get_counters).values():
+            for key, value in counters:
+                totals[key] += value
+        return list(totals.items())
+
+    def reconcile_counters(self):
+        return all(self._fan_out(DatabaseOperations.reconcile_counters).values())
+
+    # ============ Idempotency Operations ============
+
+    def purge_idempotency_keys(self, max_age_days=None):
+        return self._total(self._fan_out(lambda db: db.purge_idempotency_keys(max_age_days)).values())
+
+
+class ShardedChangeFeed:
+    """
+    ChangeFeedPoller over every shard of a ShardedOperations
+
+    Change IDs are per database, so each shard keeps its own poller and
+    high-water mark; a poll reports the cars changed on any of them.
+    """
+
+    def __init__(self, db):
+        """
+        Args:
+            db: Connected ShardedOperations
+        """
+        self.pollers = [ChangeFeedPoller(shard_db) for shard_db in db.shards.values()]
+
+    def prime(self):
+        """Skip everything already in every shard's log"""
+        for poller in self.pollers:
+            poller.prime()
+
+    def poll(self):
+        """
+        Poll every shard
+
+        Returns:
+            tuple: (changed_ids, deleted_ids) as sets of car IDs
+        """
+        return self._merge(poller.poll() for poller in self.pollers)
+
+    def poll_if_notified(self):
+        """Poll the shards a change notification arrived for (see ChangeFeedPoller)"""
+        return self._merge(poller.poll_if_notified() for poller in self.pollers)
+
+    def subscribe(self):
+        """Subscribe to change notifications on every shard"""
+        return all([poller.subscribe() for poller in self.pollers])
+
+    def unsubscribe(self):
+        """Drop every shard's subscription"""
+        for poller in self.pollers:
+            poller.unsubscribe()
+
+    @staticmethod
+    def _merge(results):
+        """Union the (changed_ids, deleted_ids) of several polls"""
+        changed_ids = set()
+        deleted_ids = set()
+        for changed, deleted in results:
+            changed_ids |= changed
+            deleted_ids |= deleted
+        # A car deleted on one shard and added on another has moved
+        return changed_ids, deleted_ids - changed_ids
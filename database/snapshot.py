@@ -0,0 +1,323 @@
+"""
+Fleet snapshot module for Car Rental System
+Writes Cars and open rentals to a compact columnar binary file that
+terminals memory-map to warm their local caches without querying the
+central database
+
+File layout (little-endian, every section 8-byte aligned):
+    header    magic, version, car/rental/string counts, change ID, created at
+    cars      CARID q, AGENTID q, TARIFF q, ODAMOUNT q, YEAR q, BRANCH_ID q,
+              CARMODEL I, TERMS I, AVAILABILITYSTATUS I   (I = string index)
+    rentals   TRANSACTIONID q, CUSTOMERID q, CARID q,
+              RENTALSTARTDATE q, RENTALENDDATE q (epoch seconds), TOTALCOST d
+    strings   offsets I[count + 1], UTF-8 blob
+"""
+
+import glob
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from datetime import datetime
+from .records import NULL_INT, NULL_STRING, Car, CarColumns, Rental
+
+MAGIC = b'CRFLEET1'
+VERSION = 2
+HEADER = struct.Struct('<8sIIIIqd')
+
+CAR_COLUMNS = (
+    ('CARID', 'q'), ('AGENTID', 'q'), ('TARIFF', 'q'), ('ODAMOUNT', 'q'), ('YEAR', 'q'),
+    ('BRANCH_ID', 'q'), ('CARMODEL', 'I'), ('TERMS', 'I'), ('AVAILABILITYSTATUS', 'I'),
+)
+RENTAL_COLUMNS = (
+    ('TRANSACTIONID', 'q'), ('CUSTOMERID', 'q'), ('CARID', 'q'),
+    ('RENTALSTARTDATE', 'q'), ('RENTALENDDATE', 'q'), ('TOTALCOST', 'd'),
+)
+
+# CarColumns field holding each snapshot column
+_CAR_FIELD = {'CARID': 'car_id', 'AGENTID': 'agent_id', 'CARMODEL': 'model', 'TARIFF': 'tariff',
+              'ODAMOUNT': 'odamount', 'YEAR': 'year', 'TERMS': 'terms', 'AVAILABILITYSTATUS': 'status',
+              'BRANCH_ID': 'branch_id'}
+
+
+def _padded(size):
+    """Round a byte size up to the next multiple of 8"""
+    return (size + 7) & ~7
+
+
+def _write_array(f, values):
+    """Write an array in little-endian order, padded to 8 bytes"""
+    if sys.byteorder != 'little':
+        values = array(values.typecode, values)
+        values.byteswap()
+    data = values.tobytes()
+    f.write(data)
+    f.write(b'\0' * (_padded(len(data)) - len(data)))
+
+
+def write_snapshot(path, cars, rentals, change_id):
+    """
+    Write a fleet snapshot file
+
+    The file is written next to its final name and renamed into place, so
+    readers never see a partial snapshot.
+
+    Args:
+        path: Output file path
+        cars: CarColumns, or Car records (any iterable, read once)
+        rentals: Rental records, as from DatabaseOperations.get_open_rentals
+        change_id: CarChangeLog high-water mark the rows are current as of
+    """
+    def as_int(value):
+        return NULL_INT if value is None else int(value)
+
+    def as_epoch(value):
+        return NULL_INT if value is None else int(value.timestamp())
+
+    # The CarColumns arrays are already the file's car section
+    fleet = cars if isinstance(cars, CarColumns) else CarColumns.from_rows(cars)
+    car_columns = {name: fleet.columns[_CAR_FIELD[name]] for name, _ in CAR_COLUMNS}
+
+    rental_columns = {name: array(code) for name, code in RENTAL_COLUMNS}
+    for rental in rentals:
+        txid, customer_id, car_id, start, end, cost = rental
+        rental_columns['TRANSACTIONID'].append(as_int(txid))
+        rental_columns['CUSTOMERID'].append(as_int(customer_id))
+        rental_columns['CARID'].append(as_int(car_id))
+        rental_columns['RENTALSTARTDATE'].append(as_epoch(start))
+        rental_columns['RENTALENDDATE'].append(as_epoch(end))
+        rental_columns['TOTALCOST'].append(float(cost or 0))
+
+    blob = bytearray()
+    offsets = array('I', [0])
+    for value in fleet.strings:
+        blob += value.encode('utf-8')
+        offsets.append(len(blob))
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(
+            MAGIC, VERSION, len(car_columns['CARID']), len(rental_columns['CARID']),
+            len(fleet.strings), change_id, time.time()
+        ))
+        f.write(b'\0' * (_padded(HEADER.size) - HEADER.size))
+        for name, _ in CAR_COLUMNS:
+            _write_array(f, car_columns[name])
+        for name, _ in RENTAL_COLUMNS:
+            _write_array(f, rental_columns[name])
+        _write_array(f, offsets)
+        f.write(blob)
+    os.replace(tmp_path, path)
+
+
+def export_snapshot(db, directory):
+    """
+    Export the current fleet from the database to a new snapshot file
+
+    Args:
+        db: Connected DatabaseOperations instance
+        directory: Directory to write the snapshot into
+
+    Returns:
+        str: Path of the written snapshot
+    """
+    # Take the high-water mark before reading so nothing is skipped when
+    # the log is replayed on top of the snapshot
+    change_id = db.get_latest_change_id()
+    rentals = db.get_open_rentals()
+    # Streamed straight into the column arrays, one fetch batch at a time
+    cars = db.load_car_columns()
+
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"fleet-{change_id:012d}.snap")
+    write_snapshot(path, cars, rentals, change_id)
+    return path
+
+
+def shard_directory(directory, shard):
+    """
+    Directory holding the snapshots of one shard
+
+    Each shard numbers its change log separately, so its snapshots are
+    kept in a subdirectory of their own.
+
+    Args:
+        directory: Snapshot directory (SNAPSHOT_DIR)
+        shard: Shard name, or None for the main database
+
+    Returns:
+        str: The directory itself for the main database, else its shard subdirectory
+    """
+    return directory if shard is None else os.path.join(directory, shard)
+
+
+def find_latest_snapshot(directory):
+    """
+    Find the newest snapshot in a directory
+
+    Args:
+        directory: Directory written by export_snapshot
+
+    Returns:
+        str: Path of the snapshot with the highest change ID, or None
+    """
+    paths = sorted(glob.glob(os.path.join(directory, "fleet-*.snap")))
+    return paths[-1] if paths else None
+
+
+class FleetSnapshot:
+    """
+    Read-only, memory-mapped view of a snapshot file
+
+    Numeric columns are memoryviews straight over the mapped file, so
+    opening a snapshot costs the same for ten cars or a million; pages are
+    only read when a column is touched.
+    """
+
+    def __init__(self, path):
+        """
+        Map a snapshot file
+
+        Args:
+            path: Snapshot file path
+
+        Raises:
+            ValueError: If the file is not a snapshot of a supported version
+        """
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        self._columns = []
+
+        magic, version, car_count, rental_count, string_count, change_id, created_at = \
+            HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} fleet snapshot")
+
+        self.car_count = car_count
+        self.rental_count = rental_count
+        self.change_id = change_id
+        self.created_at = created_at
+
+        offset = _padded(HEADER.size)
+        self.cars = {}
+        for name, code in CAR_COLUMNS:
+            self.cars[name], offset = self._column(offset, code, car_count)
+        self.rentals = {}
+        for name, code in RENTAL_COLUMNS:
+            self.rentals[name], offset = self._column(offset, code, rental_count)
+        self._string_offsets, offset = self._column(offset, 'I', string_count + 1)
+        self._blob_start = offset
+        self._strings = [None] * string_count
+
+    def _column(self, offset, code, count):
+        """
+        Get a typed view of one column
+
+        Returns:
+            tuple: (column view, offset of the next section)
+        """
+        size = array(code).itemsize * count
+        raw = self._view[offset:offset + size]
+        if sys.byteorder == 'little':
+            column = raw.cast(code)
+            self._columns.extend((raw, column))
+        else:
+            column = array(code, raw.tobytes())
+            column.byteswap()
+            raw.release()
+        return column, offset + _padded(size)
+
+    def string(self, index):
+        """
+        Decode an entry of the string table (cached after first use)
+
+        Args:
+            index: String index from a CARMODEL/TERMS/AVAILABILITYSTATUS column
+
+        Returns:
+            str: The string, or None for a NULL value
+        """
+        if index == NULL_STRING:
+            return None
+        value = self._strings[index]
+        if value is None:
+            start = self._blob_start + self._string_offsets[index]
+            end = self._blob_start + self._string_offsets[index + 1]
+            value = self._strings[index] = bytes(self._view[start:end]).decode('utf-8')
+        return value
+
+    def _string_column(self, column):
+        """Decode a string-index column into a list of strings"""
+        table = {index: self.string(index) for index in range(len(self._strings))}
+        table[NULL_STRING] = None
+        return list(map(table.__getitem__, column))
+
+    @staticmethod
+    def _int_column(column):
+        """Copy an integer column into a list, mapping the NULL sentinel to None"""
+        values = column.tolist()
+        if NULL_INT in values:
+            values = [_nullable_int(value) for value in values]
+        return values
+
+    def iter_cars(self):
+        """
+        Iterate cars as DatabaseOperations.get_all_car_details returns them
+
+        Yields:
+            Car: One car
+        """
+        c = self.cars
+        return map(
+            Car,
+            c['CARID'].tolist(), self._int_column(c['AGENTID']),
+            self._string_column(c['CARMODEL']), self._int_column(c['TARIFF']),
+            self._int_column(c['ODAMOUNT']), self._int_column(c['YEAR']),
+            self._string_column(c['TERMS']), self._string_column(c['AVAILABILITYSTATUS']),
+            self._int_column(c['BRANCH_ID']),
+        )
+
+    def iter_rentals(self):
+        """
+        Iterate open rentals as DatabaseOperations.get_open_rentals returns them
+
+        Yields:
+            Rental: One open rental
+        """
+        r = self.rentals
+        return map(
+            Rental,
+            r['TRANSACTIONID'].tolist(), self._int_column(r['CUSTOMERID']), r['CARID'].tolist(),
+            map(_from_epoch, r['RENTALSTARTDATE']), map(_from_epoch, r['RENTALENDDATE']),
+            r['TOTALCOST'].tolist(),
+        )
+
+    def close(self):
+        """Release the column views and unmap the file"""
+        for view in reversed(self._columns):
+            view.release()
+        self._columns = []
+        self._view.release()
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _nullable_int(value):
+    """Map the NULL sentinel back to None"""
+    return None if value == NULL_INT else value
+
+
+def _from_epoch(value):
+    """Convert stored epoch seconds back to a datetime"""
+    return None if value == NULL_INT else datetime.fromtimestamp(value)
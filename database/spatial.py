@@ -0,0 +1,138 @@
+"""
+Spatial index module for Car Rental System
+Keeps branch coordinates in an in-memory grid so "branches within R km"
+and "K nearest branches" lookups only measure distances to branches in
+nearby cells instead of to every branch
+"""
+
+import math
+from collections import defaultdict, namedtuple
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+Branch = namedtuple('Branch', ['branch_id', 'name', 'latitude', 'longitude'])
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """
+    Great-circle distance between two points
+
+    Args:
+        lat1, lon1: First point in degrees
+        lat2, lon2: Second point in degrees
+
+    Returns:
+        float: Distance in kilometres
+    """
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class BranchIndex:
+    """
+    Uniform latitude/longitude grid over branch locations
+
+    Cells are cell_km tall; a radius query visits only the cells that can
+    hold a point within the radius and then checks exact distances.
+    """
+
+    def __init__(self, branches, cell_km=25):
+        """
+        Build the index
+
+        Args:
+            branches: Iterable of Branch, or (BRANCH_ID, BRANCH_NAME, LATITUDE, LONGITUDE) rows
+            cell_km: Grid cell size in kilometres
+        """
+        self.cell_degrees = cell_km / KM_PER_DEGREE
+        self.branches = {}
+        self._cells = defaultdict(list)
+        for row in branches:
+            branch = Branch(*row)
+            self.branches[branch.branch_id] = branch
+            self._cells[self._cell(branch.latitude, branch.longitude)].append(branch)
+
+    @classmethod
+    def load(cls, db, cell_km=25):
+        """
+        Build the index from the Branches table
+
+        Args:
+            db: Connected DatabaseOperations instance
+            cell_km: Grid cell size in kilometres
+
+        Returns:
+            BranchIndex: Index over every branch
+        """
+        return cls(db.get_branches(), cell_km)
+
+    def __len__(self):
+        return len(self.branches)
+
+    def _cell(self, latitude, longitude):
+        """Grid cell holding a point"""
+        return (math.floor(latitude / self.cell_degrees), math.floor(longitude / self.cell_degrees))
+
+    def within(self, latitude, longitude, radius_km):
+        """
+        Branches within a radius of a point
+
+        Args:
+            latitude, longitude: Centre in degrees
+            radius_km: Radius in kilometres
+
+        Returns:
+            list: (distance_km, Branch) pairs, nearest first
+        """
+        dlat = radius_km / KM_PER_DEGREE
+        # Degrees of longitude shrink towards the poles; widen the search to match
+        cos_lat = math.cos(math.radians(min(89.9, abs(latitude) + dlat)))
+        dlon = min(180.0, dlat / max(cos_lat, 1e-6))
+
+        min_row, min_col = self._cell(latitude - dlat, longitude - dlon)
+        max_row, max_col = self._cell(latitude + dlat, longitude + dlon)
+
+        found = []
+        if (max_row - min_row + 1) * (max_col - min_col + 1) > len(self._cells):
+            candidates = (branch for cell in self._cells.values() for branch in cell)
+        else:
+            candidates = (
+                branch
+                for row in range(min_row, max_row + 1)
+                for col in range(min_col, max_col + 1)
+                for branch in self._cells.get((row, col), ())
+            )
+        for branch in candidates:
+            distance = haversine_km(latitude, longitude, branch.latitude, branch.longitude)
+            if distance <= radius_km:
+                found.append((distance, branch))
+        found.sort(key=lambda pair: pair[0])
+        return found
+
+    def nearest(self, latitude, longitude, k=1, predicate=None):
+        """
+        The k nearest branches to a point, optionally only those matching a predicate
+
+        Searches a growing radius, so only the neighbourhood of the point
+        is examined when matching branches are close.
+
+        Args:
+            latitude, longitude: Point in degrees
+            k: Number of branches wanted
+            predicate: Optional callable taking a Branch; others are skipped
+
+        Returns:
+            list: Up to k (distance_km, Branch) pairs, nearest first
+        """
+        radius = self.cell_degrees * KM_PER_DEGREE
+        while True:
+            found = self.within(latitude, longitude, radius)
+            if predicate is not None:
+                found = [pair for pair in found if predicate(pair[1])]
+            if len(found) >= k or radius >= math.pi * EARTH_RADIUS_KM:
+                return found[:k]
+            radius *= 2
@@ -0,0 +1,232 @@
+"""
+Waitlist module for Car Rental System
+In-memory priority queue of customers waiting for a car, backed by the
+Waitlist table. When a car is returned, DatabaseOperations takes the
+highest-priority matching entry from here and offers it the car.
+
+Priority is loyalty tier first (more completed rentals, higher tier),
+then arrival time. Entries are kept in one heap per requested model plus
+one for "any model", so finding the head of the queue for a returned car
+only looks at two heaps.
+"""
+
+import heapq
+import threading
+import time
+from collections import namedtuple
+import config
+
+_Entry = namedtuple('WaitlistEntry', [
+    'waitlist_id', 'customer_id', 'car_model', 'min_year', 'max_year', 'max_tariff', 'tier', 'requested_at'
+])
+
+_queues = {}
+_queue_lock = threading.Lock()
+
+
+class WaitlistEntry(_Entry):
+    """A waiting customer and what they will accept"""
+
+    __slots__ = ()
+
+    @property
+    def priority(self):
+        """Sort key: highest tier first, then first come, first served"""
+        return (-self.tier, self.requested_at, self.waitlist_id)
+
+    def accepts(self, model, year, tariff):
+        """
+        Check whether a car satisfies this entry
+
+        Args:
+            model: Car model
+            year: Car year
+            tariff: Car tariff
+
+        Returns:
+            bool: True if the car matches every criterion given
+        """
+        return (
+            (self.car_model is None or self.car_model == model)
+            and (self.min_year is None or (year is not None and year >= self.min_year))
+            and (self.max_year is None or (year is not None and year <= self.max_year))
+            and (self.max_tariff is None or (tariff is not None and tariff <= self.max_tariff))
+        )
+
+
+def loyalty_tier(completed_rentals):
+    """
+    Loyalty tier for a number of completed rentals
+
+    Args:
+        completed_rentals: Rentals the customer has returned
+
+    Returns:
+        int: 0 for new customers, plus one per LOYALTY_TIER_RENTALS threshold reached
+    """
+    thresholds = getattr(config, 'LOYALTY_TIER_RENTALS', (5, 20))
+    return sum(1 for threshold in thresholds if completed_rentals >= threshold)
+
+
+def get_queue(shard=None):
+    """
+    Get the process-wide waitlist queue of a database
+
+    Args:
+        shard: Shard name (see sharding.py), or None for the main database;
+            each shard keeps its own Waitlist table
+
+    Returns:
+        WaitlistQueue: Shared queue, loaded from the Waitlist table on first refresh
+    """
+    with _queue_lock:
+        queue = _queues.get(shard)
+        if queue is None:
+            queue = _queues[shard] = WaitlistQueue(getattr(config, 'WAITLIST_REFRESH_SECONDS', 5))
+        return queue
+
+
+class WaitlistQueue:
+    """
+    Waiting entries indexed by ID and ordered by priority per model
+
+    Removal is lazy: remove() drops the entry from the index in O(1) and
+    its heap slot is skipped when it reaches the top. The Waitlist table
+    stays the source of truth, so an entry another terminal has already
+    cancelled or served is simply rejected by the conditional UPDATE that
+    claims it.
+    """
+
+    # Sequence values are handed out before commit, so an entry with a lower
+    # WAITLIST_ID can become visible after a higher one. Gaps below the
+    # newest ID loaded are re-read for this many seconds before being
+    # treated as rolled back (or no longer waiting).
+    GAP_TIMEOUT_SECONDS = 10
+
+    def __init__(self, refresh_seconds=5):
+        """
+        Args:
+            refresh_seconds: How long entries loaded from the table are trusted
+                before refresh() looks for ones added by other terminals
+        """
+        self.refresh_seconds = refresh_seconds
+        self._heaps = {}
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.last_loaded_id = 0
+        self.loaded_at = None
+        self._gaps = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def push(self, entry):
+        """
+        Add (or re-add) a waiting entry
+
+        Args:
+            entry: WaitlistEntry
+        """
+        with self._lock:
+            self._entries[entry.waitlist_id] = entry
+            heapq.heappush(self._heaps.setdefault(entry.car_model, []), (entry.priority, entry.waitlist_id))
+
+    def remove(self, waitlist_id):
+        """Forget an entry, if held"""
+        with self._lock:
+            self._entries.pop(waitlist_id, None)
+
+    def _head(self, heap):
+        """Top live entry of a heap, discarding removed or replaced ones (lock held)"""
+        while heap:
+            priority, waitlist_id = heap[0]
+            entry = self._entries.get(waitlist_id)
+            if entry is not None and entry.priority == priority:
+                return entry
+            heapq.heappop(heap)
+        return None
+
+    def pop_match(self, model, year, tariff):
+        """
+        Take the highest-priority entry that accepts a car
+
+        Only the heaps for the car's model and for "any model" are
+        searched. When their heads accept the car this costs O(log n);
+        entries skipped because of their year or tariff limits are put
+        back afterwards.
+
+        Args:
+            model: Car model
+            year: Car year
+            tariff: Car tariff
+
+        Returns:
+            WaitlistEntry: Entry removed from the queue, or None if nobody is waiting for this car
+        """
+        with self._lock:
+            heaps = [self._heaps[key] for key in {model, None} if self._heaps.get(key)]
+            skipped = []
+            match = None
+            while match is None:
+                heads = [(entry.priority, i, entry) for i, entry in
+                         ((i, self._head(heap)) for i, heap in enumerate(heaps)) if entry is not None]
+                if not heads:
+                    break
+                _, i, entry = min(heads)
+                heapq.heappop(heaps[i])
+                if entry.accepts(model, year, tariff):
+                    match = entry
+                    del self._entries[entry.waitlist_id]
+                else:
+                    skipped.append(entry)
+            for entry in skipped:
+                heapq.heappush(self._heaps[entry.car_model], (entry.priority, entry.waitlist_id))
+            return match
+
+    def reset(self):
+        """Forget every entry, so the next refresh reloads the whole queue"""
+        with self._lock:
+            self._heaps.clear()
+            self._entries.clear()
+            self.last_loaded_id = 0
+            self.loaded_at = None
+            self._gaps.clear()
+
+    def refresh(self, db, force=False):
+        """
+        Load entries added since the last refresh, including ones that
+        committed late with a lower ID than entries already loaded
+
+        Args:
+            db: Connected DatabaseOperations instance
+            force: Reload even if the last refresh is recent
+        """
+        now = time.monotonic()
+        if not force and self.loaded_at is not None and now - self.loaded_at < self.refresh_seconds:
+            return
+        for waitlist_id, first_seen in list(self._gaps.items()):
+            if now - first_seen > self.GAP_TIMEOUT_SECONDS:
+                del self._gaps[waitlist_id]
+
+        # The first load takes every waiting entry; IDs missing from it are
+        # long finished, not late
+        track_gaps = self.loaded_at is not None
+        since = min(self._gaps) - 1 if self._gaps else self.last_loaded_id
+        expected = since + 1
+        for row in db.get_waiting_entries(since):
+            entry = WaitlistEntry(*row)
+            if entry.waitlist_id <= self.last_loaded_id and entry.waitlist_id not in self._gaps:
+                expected = entry.waitlist_id + 1
+                continue  # loaded on an earlier refresh
+
+            if track_gaps:
+                for missing in range(max(expected, self.last_loaded_id + 1), entry.waitlist_id):
+                    self._gaps.setdefault(missing, now)
+            self._gaps.pop(entry.waitlist_id, None)
+            expected = entry.waitlist_id + 1
+
+            # Entries this process added itself are already queued
+            if entry.waitlist_id not in self._entries:
+                self.push(entry)
+            self.last_loaded_id = max(self.last_loaded_id, entry.waitlist_id)
+        self.loaded_at = now
@@ -3,13 +3,17 @@ Main entry point for Car Rental System
 A Python + Tkinter application for managing car rentals with Oracle Database
 """
 
+from ui import startup_timer
 import tkinter as tk
 from ui.login_window import LoginWindow
-from ui.registration_window import RegistrationWindow
-from ui.customer_window import CustomerWindow
-from ui.agent_window import AgentWindow
+from ui.window_manager import WindowManager
+from ui import profiling
 import config
 
+# Registration, customer and agent windows (and the database driver they
+# pull in) are imported on demand so the login form appears immediately
+startup_timer.mark('imports')
+
 
 class CarRentalApp:
     """
@@ -21,43 +25,76 @@ class CarRentalApp:
         self.root = tk.Tk()
         self.root.title(config.APP_TITLE)
         self.root.geometry(config.APP_GEOMETRY)
+        startup_timer.mark('tk_init')
+        
+        # Opt-in event-loop profiling (CARRENTAL_PROFILE / UI_PROFILE)
+        self.profiler = profiling.install_from_config(self.root)
+        
+        # Every view lives inside this one root; logging in or out swaps
+        # the view instead of starting another Tk interpreter
+        self.windows = WindowManager(self.root)
+        
+        # Maintenance jobs on a background thread (off by default; usually
+        # run once per site with `python -m carrental scheduler`)
+        self.scheduler = None
+        if getattr(config, 'SCHEDULER_IN_APP', False):
+            self.root.after_idle(self._start_scheduler)
         
         # Start with login window
         self.show_login()
+        self.root.after_idle(self._on_first_paint)
+    
+    def _on_first_paint(self):
+        """Record when the login form has been drawn"""
+        self.root.update_idletasks()
+        startup_timer.mark('first_paint')
+    
+    def _start_scheduler(self):
+        """Start the maintenance job scheduler once the login form is up"""
+        from carrental.jobs import build_scheduler
+        self.scheduler = build_scheduler(in_app=True)
+        self.scheduler.start()
     
     def show_login(self):
         """Display login window"""
-        login_window = LoginWindow(
-            self.root,
+        self.windows.show(lambda frame: LoginWindow(
+            frame,
             on_customer_login=self.on_customer_login,
             on_agent_login=self.on_agent_login,
             on_register_click=self.show_registration
-        )
+        ))
     
     def show_registration(self):
         """Display registration window"""
+        from ui.registration_window import RegistrationWindow
         registration_window = RegistrationWindow(
-            self.root,
+            self.windows.current_frame,
             on_registration_success=self.show_login
         )
     
-    def on_customer_login(self, username):
-        """Handle successful customer login"""
-        # Create new root window for customer
-        customer_root = tk.Tk()
-        customer_app = CustomerWindow(customer_root, username)
-        customer_root.mainloop()
+    def on_customer_login(self, username, db=None):
+        """Handle successful customer login (db: the login's connected session)"""
+        from ui.customer_window import CustomerWindow
+        self.windows.show(
+            lambda frame: CustomerWindow(frame, username, db=db),
+            on_logout=self.show_login
+        )
     
-    def on_agent_login(self, agent_id):
-        """Handle successful agent login"""
-        # Create new root window for agent
-        agent_root = tk.Tk()
-        agent_app = AgentWindow(agent_root, agent_id)
-        agent_root.mainloop()
+    def on_agent_login(self, agent_id, db=None):
+        """Handle successful agent login (db: the login's connected session)"""
+        from ui.agent_window import AgentWindow
+        self.windows.show(
+            lambda frame: AgentWindow(frame, agent_id, db=db),
+            on_logout=self.show_login
+        )
     
     def run(self):
         """Start the application main loop"""
-        self.root.mainloop()
+        try:
+            self.root.mainloop()
+        finally:
+            if self.scheduler is not None:
+                self.scheduler.stop()
 
 
 def main():
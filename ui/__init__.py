@@ -2,10 +2,22 @@
 UI package for Car Rental System
 """
 
-from .login_window import LoginWindow
-from .registration_window import RegistrationWindow
-from .customer_window import CustomerWindow
-from .agent_window import AgentWindow
+import importlib
+
+# Windows are imported on first access so that showing the login screen
+# does not pay for the customer/agent windows or the database driver
+_WINDOW_MODULES = {
+    'LoginWindow': '.login_window',
+    'RegistrationWindow': '.registration_window',
+    'CustomerWindow': '.customer_window',
+    'AgentWindow': '.agent_window',
+}
 
 __all__ = ['LoginWindow', 'RegistrationWindow', 'CustomerWindow', 'AgentWindow']
 
+
+def __getattr__(name):
+    if name in _WINDOW_MODULES:
+        module = importlib.import_module(_WINDOW_MODULES[name], __name__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
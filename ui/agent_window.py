@@ -6,7 +6,12 @@ Handles agent interface for managing cars
 import tkinter as tk
 from tkinter import messagebox, ttk, StringVar, Entry, Frame, Label, Button, Toplevel
 from tkinter import END, TOP, X
-from database.db_operations import DatabaseOperations
+from database.change_feed import ChangeFeedPoller
+from database.idempotency import PendingKeys
+from database.replica import open_replica
+from database.sharding import ShardedChangeFeed, ShardedOperations, create_operations
+from database.counters import FleetCounters
+import config
 
 
 class AgentWindow:
@@ -14,24 +19,58 @@ class AgentWindow:
     Agent home window for managing car inventory
     """
     
-    def __init__(self, root, agent_id):
+    def __init__(self, root, agent_id, db=None):
         """
         Initialize agent window
         
         Args:
-            root: Tkinter root window
+            root: Container frame provided by the window manager
             agent_id: Agent ID
+            db: Optional connected DatabaseOperations to use instead of opening one
         """
         self.root = root
         self.agent_id = agent_id
-        self.root.title("Agent Car Rental Management System")
-        self.root.geometry("800x600")
-        
-        self.db = DatabaseOperations()
-        self.db.connect()
+        self.root.winfo_toplevel().title("Agent Car Rental Management System")
+        self.root.winfo_toplevel().geometry("800x600")
+        
+        if db is None:
+            db = create_operations(getattr(config, 'TERMINAL_BRANCH_ID', None))
+            db.connect()
+        self.db = db
+        self.db.actor = f"agent:{agent_id}"
+        # Add, update and return requests repeated after a failure reuse their key
+        self.pending = PendingKeys()
+        
+        self.poll_interval_ms = getattr(config, 'CHANGE_FEED_POLL_MS', 3000)
+        self._poll_job = None
+        self.counters_refresh_ms = getattr(config, 'COUNTERS_REFRESH_MS', 60000)
+        self._counters_job = None
+        self.counters = FleetCounters()
+        
+        # With a local replica the table is read from it and kept current
+        # by replica syncs; otherwise the change feed is polled directly.
+        # A replica follows one database, so a head-office view across
+        # shards polls every shard's feed instead
+        sharded = isinstance(self.db, ShardedOperations)
+        self.replica = None if sharded else open_replica(self.db.shard)
+        self.change_feed = None
+        if self.replica:
+            try:
+                self.replica.sync(self.db)
+            except Exception as e:
+                print(f"Error syncing replica: {e}")
+        else:
+            # Prime the feed before the full load so nothing slips in between
+            self.change_feed = ShardedChangeFeed(self.db) if sharded else ChangeFeedPoller(self.db)
         
         self._create_widgets()
         self._display_all_cars()
+        self._update_replica_status()
+        self._refresh_counters()
+        
+        if self.change_feed and getattr(config, 'CHANGE_FEED_USE_CQN', False):
+            self.change_feed.subscribe()
+        self._schedule_poll()
     
     def _create_widgets(self):
         """Create and place UI widgets"""
@@ -151,6 +190,72 @@ class AgentWindow:
         )
         btnClear.grid(row=0, column=3, padx=10)
         
+        # Bulk actions on the rows selected in the table
+        btnReturn = Button(
+            btn_frame, 
+            command=self.return_selected, 
+            text="Return Selected", 
+            width=15, 
+            font=("Calibri", 16, "bold"), 
+            fg="white",
+            bg="#8e44ad",
+            bd=0
+        )
+        btnReturn.grid(row=1, column=0, pady=10)
+        
+        btnAvailability = Button(
+            btn_frame, 
+            command=self.set_selected_availability, 
+            text="Set Availability", 
+            width=15, 
+            font=("Calibri", 16, "bold"), 
+            fg="white",
+            bg="#27ae60",
+            bd=0
+        )
+        btnAvailability.grid(row=1, column=1, padx=10, pady=10)
+        
+        btnTariffs = Button(
+            btn_frame, 
+            command=self.adjust_tariffs, 
+            text="Adjust Tariffs", 
+            width=15, 
+            font=("Calibri", 16, "bold"), 
+            fg="white",
+            bg="#d35400",
+            bd=0
+        )
+        btnTariffs.grid(row=1, column=2, padx=10, pady=10)
+        
+        self.replica_status = Label(entries_frame, text="", font=("Calibri", 12), bg="#535c68", fg="white")
+        self.replica_status.grid(row=0, column=3, padx=10, sticky="e")
+        
+        # Dashboard Frame (fleet counters, read from the in-memory cache)
+        dashboard_frame = Frame(self.root, bg="#2c3e50")
+        dashboard_frame.pack(side=TOP, fill=X)
+        
+        self.dashboard_labels = {}
+        for column, (key, text) in enumerate([
+            ('available', "Available"),
+            ('rented', "Rented"),
+            ('overdue', "Overdue"),
+            ('revenue_today', "Revenue today"),
+        ]):
+            label = Label(dashboard_frame, text=f"{text}: -", font=("Calibri", 14, "bold"), bg="#2c3e50", fg="white")
+            label.grid(row=0, column=column, padx=15, pady=5, sticky="w")
+            self.dashboard_labels[key] = (label, text)
+        
+        self.model_breakdown = Label(
+            dashboard_frame, 
+            text="", 
+            font=("Calibri", 12), 
+            bg="#2c3e50", 
+            fg="#bdc3c7", 
+            justify="left", 
+            wraplength=760
+        )
+        self.model_breakdown.grid(row=1, column=0, columnspan=4, padx=15, pady=(0, 5), sticky="w")
+        
         # Table Frame
         self.tree_frame = Frame(self.root, bg="#ecf0f1")
         self.tree_frame.pack(fill=tk.BOTH, expand=True)
@@ -175,15 +280,107 @@ class AgentWindow:
         self.tv.heading("5", text="Availability")
         self.tv.column("5", width=150)
         self.tv['show'] = 'headings'
+        self.tv['selectmode'] = 'extended'
         self.tv.pack(fill=tk.BOTH, expand=True)
     
     def _display_all_cars(self):
         """Display all cars in the table"""
         self.tv.delete(*self.tv.get_children())
-        cars = self.db.get_all_cars()
+        # Rows are inserted as each fetch batch arrives
+        cars = (self.replica or self.db).iter_all_cars()
         
-        for row in cars:
-            self.tv.insert("", END, values=row)
+        for car in cars:
+            self.tv.insert("", END, iid=str(car.car_id), values=car)
+    
+    def _schedule_poll(self):
+        """Schedule the next change feed poll"""
+        self._poll_job = self.root.after(self.poll_interval_ms, self._on_poll_timer)
+    
+    def _on_poll_timer(self):
+        """Periodic change feed tick"""
+        try:
+            if self.replica:
+                self._apply_changes(*self.replica.sync(self.db))
+            else:
+                self._apply_changes(*self.change_feed.poll_if_notified())
+        except Exception as e:
+            print(f"Error polling car changes: {e}")
+        self._update_replica_status()
+        self._schedule_poll()
+    
+    def _refresh_changes(self):
+        """Apply pending changes immediately (after this agent's own edits)"""
+        try:
+            if self.replica:
+                self._apply_changes(*self.replica.sync(self.db))
+            else:
+                self._apply_changes(*self.change_feed.poll())
+        except Exception as e:
+            print(f"Error polling car changes: {e}")
+        self._update_replica_status()
+    
+    def _update_replica_status(self):
+        """Show how far behind the local replica is"""
+        if not self.replica:
+            return
+        lag = self.replica.lag_seconds()
+        lag_text = "never synced" if lag is None else f"{lag:.0f}s"
+        self.replica_status.config(text=f"Replica lag: {lag_text}")
+    
+    def _apply_changes(self, changed_ids, deleted_ids):
+        """
+        Apply car deltas to the table without reloading it
+        
+        Args:
+            changed_ids: Car IDs that were added or modified
+            deleted_ids: Car IDs that were removed
+        """
+        if not changed_ids and not deleted_ids:
+            return
+        
+        for car_id in deleted_ids:
+            if self.tv.exists(str(car_id)):
+                self.tv.delete(str(car_id))
+        
+        for car in (self.replica or self.db).get_cars_by_ids(changed_ids):
+            iid = str(car.car_id)
+            if self.tv.exists(iid):
+                self.tv.item(iid, values=car)
+            else:
+                self.tv.insert("", END, iid=iid, values=car)
+        
+        # Something changed, so the counters did too
+        self._load_counters()
+    
+    def _load_counters(self):
+        """Refresh the counter cache from the summary table and redraw the dashboard"""
+        try:
+            self.counters.load(self.db)
+        except Exception as e:
+            print(f"Error loading fleet counters: {e}")
+        self._update_dashboard()
+    
+    def _refresh_counters(self):
+        """
+        Periodically reload the counters
+        
+        Only the scheduler's reconcile-counters job rebuilds them from the
+        base tables (see carrental/jobs.py); terminals just read the result,
+        so the overdue count and any drift correction show up here too.
+        """
+        self._load_counters()
+        self._counters_job = self.root.after(self.counters_refresh_ms, self._refresh_counters)
+    
+    def _update_dashboard(self):
+        """Redraw the dashboard panel from the counter cache"""
+        for key, (label, text) in self.dashboard_labels.items():
+            label.config(text=f"{text}: {getattr(self.counters, key)}")
+        
+        breakdown = [
+            f"{model}: " + ", ".join(f"{count} {status.lower()}" for status, count in sorted(statuses.items()))
+            for model, statuses in sorted(self.counters.per_model().items())
+        ]
+        self.model_breakdown.config(text="   ".join(breakdown))
     
     def add_car(self):
         """Add a new car to the system"""
@@ -205,12 +402,15 @@ class AgentWindow:
             year = int(self.email.get())
             terms = self.contact.get()
             
-            success = self.db.add_car(car_number, self.agent_id, car_model, tariff, year, terms)
+            request = ('add', car_number, car_model, tariff, year, terms)
+            success = self.db.add_car(car_number, self.agent_id, car_model, tariff, year, terms,
+                                      idempotency_key=self.pending.key_for(*request))
             
             if success:
+                self.pending.succeeded(*request)
                 messagebox.showinfo("Success", "Record Inserted")
                 self.clear_all()
-                self._display_all_cars()
+                self._refresh_changes()
             else:
                 messagebox.showerror("Error", "Failed to add car. Please try again.")
         except ValueError:
@@ -266,12 +466,15 @@ class AgentWindow:
             value = val_entry.get()
             
             if cn and field and value:
-                success = self.db.update_car(int(cn), field, value)
+                request = ('update', int(cn), field, value)
+                success = self.db.update_car(int(cn), field, value,
+                                             idempotency_key=self.pending.key_for(*request))
                 if success:
+                    self.pending.succeeded(*request)
                     messagebox.showinfo(title="Success", message="Successfully updated")
                     update_window.destroy()
                     self.clear_all()
-                    self._display_all_cars()
+                    self._refresh_changes()
                 else:
                     messagebox.showerror(title="Error", message="Failed to update. Please check your inputs.")
             else:
@@ -313,7 +516,7 @@ class AgentWindow:
                     if success:
                         messagebox.showinfo(title="Success", message="Successfully deleted")
                         delete_window.destroy()
-                        self._display_all_cars()
+                        self._refresh_changes()
                     else:
                         messagebox.showerror(title="Error", message="Failed to delete car.")
                 except ValueError:
@@ -333,6 +536,112 @@ class AgentWindow:
         )
         delete_button.grid(row=2, column=0, columnspan=2, pady=10)
     
+    def _selected_car_ids(self):
+        """
+        Get the car IDs of the rows selected in the table
+        
+        Returns:
+            list: Selected car IDs
+        """
+        return [int(iid) for iid in self.tv.selection()]
+    
+    def return_selected(self):
+        """Check in every selected car in one batch"""
+        car_ids = self._selected_car_ids()
+        if not car_ids:
+            messagebox.showerror("Error", "Select one or more cars in the table first.")
+            return
+        
+        request = ('return', *sorted(car_ids))
+        if self.db.return_cars(car_ids, idempotency_key=self.pending.key_for(*request)):
+            self.pending.succeeded(*request)
+            messagebox.showinfo("Success", f"Returned {len(car_ids)} car(s)")
+            self._refresh_changes()
+        else:
+            messagebox.showerror("Error", "Failed to return the selected cars.")
+    
+    def set_selected_availability(self):
+        """Set the Availability chosen in the form on every selected car"""
+        car_ids = self._selected_car_ids()
+        status = self.gender.get()
+        if not car_ids or not status:
+            messagebox.showerror("Error", "Select cars in the table and choose an Availability value.")
+            return
+        
+        if self.db.set_cars_availability(car_ids, status):
+            messagebox.showinfo("Success", f"Set {len(car_ids)} car(s) to {status}")
+            self._refresh_changes()
+        else:
+            messagebox.showerror("Error", "Failed to update availability.")
+    
+    def adjust_tariffs(self):
+        """Open the bulk tariff change dialog"""
+        car_ids = self._selected_car_ids()
+        
+        tariff_window = Toplevel(self.root)
+        tariff_window.title("Adjust Tariffs")
+        tariff_window.configure(bg='#333333')
+        
+        scope = (
+            f"Applies to the {len(car_ids)} selected car(s)" if car_ids
+            else "Applies to every car matching the filters (blank = any)"
+        )
+        Label(tariff_window, text=scope, bg='#333333', fg="#FFFFFF", font=("Arial", 14)).grid(
+            row=0, column=0, columnspan=2, padx=10, pady=10
+        )
+        
+        entries = {}
+        fields = [("change", "Change (e.g. 10% or -500)")]
+        if not car_ids:
+            fields += [("model", "Model"), ("year", "Year"), ("agent", "Agent ID")]
+        for row, (key, text) in enumerate(fields, start=1):
+            Label(tariff_window, text=text, bg='#333333', fg="#FFFFFF", font=("Arial", 16)).grid(
+                row=row, column=0, padx=10, pady=10
+            )
+            entries[key] = Entry(tariff_window, font=("Arial", 16))
+            entries[key].grid(row=row, column=1, pady=10, padx=10)
+        
+        def perform_adjust():
+            change = entries['change'].get().strip()
+            try:
+                if change.endswith('%'):
+                    percent, amount = float(change[:-1]), None
+                else:
+                    percent, amount = None, int(change)
+            except ValueError:
+                messagebox.showerror(title="Error", message="Enter a change like 10%, -5% or 500.")
+                return
+            
+            filters = {key: entries[key].get().strip() or None for key in ('model', 'year', 'agent') if key in entries}
+            try:
+                updated = self.db.adjust_tariffs(
+                    percent=percent,
+                    amount=amount,
+                    car_model=filters.get('model'),
+                    year=filters.get('year'),
+                    agent_id=filters.get('agent'),
+                    car_ids=car_ids or None
+                )
+            except ValueError:
+                messagebox.showerror(title="Error", message="Year and Agent ID must be numbers.")
+                return
+            
+            if updated is None:
+                messagebox.showerror(title="Error", message="Failed to adjust tariffs.")
+            else:
+                messagebox.showinfo(title="Success", message=f"Updated tariff of {updated} car(s)")
+                tariff_window.destroy()
+                self._refresh_changes()
+        
+        Button(
+            tariff_window, 
+            text="APPLY", 
+            bg="#FF3399", 
+            fg="#FFFFFF", 
+            font=("Arial", 16),
+            command=perform_adjust
+        ).grid(row=len(fields) + 1, column=0, columnspan=2, pady=10)
+    
     def clear_all(self):
         """Clear all form fields"""
         self.name.set("")
@@ -344,6 +653,18 @@ class AgentWindow:
     
     def cleanup(self):
         """Clean up resources"""
+        if self._poll_job is not None:
+            self.root.after_cancel(self._poll_job)
+            self._poll_job = None
+        if self._counters_job is not None:
+            self.root.after_cancel(self._counters_job)
+            self._counters_job = None
+        if self.change_feed:
+            self.change_feed.unsubscribe()
+        if self.replica:
+            self.replica.close()
+            self.replica = None
         if self.db:
             self.db.disconnect()
+            self.db = None
 
@@ -6,7 +6,12 @@ Handles customer interface for viewing and managing rentals
 import tkinter as tk
 from tkinter import messagebox
 from datetime import datetime
-from database.db_operations import DatabaseOperations
+from itertools import chain
+from database.idempotency import PendingKeys
+from database.replica import open_replica
+from database.sharding import ShardedOperations, create_operations
+from database.spatial import BranchIndex
+import config
 
 
 class CustomerWindow:
@@ -14,23 +19,87 @@ class CustomerWindow:
     Customer home window for viewing rented cars and renting new ones
     """
     
-    def __init__(self, root, username):
+    def __init__(self, root, username, db=None):
         """
         Initialize customer window
         
         Args:
-            root: Tkinter root window
+            root: Container frame provided by the window manager
             username: Customer username
+            db: Optional connected DatabaseOperations to use instead of opening one
         """
         self.root = root
         self.username = username
-        self.root.title(f"Welcome, {username}")
+        self.root.winfo_toplevel().title(f"Welcome, {username}")
+        self.root.winfo_toplevel().geometry("")  # size to fit the content
         
-        self.db = DatabaseOperations()
-        self.db.connect()
+        if db is None:
+            db = create_operations(getattr(config, 'TERMINAL_BRANCH_ID', None))
+            db.connect()
+        self.db = db
+        self.db.actor = f"customer:{username}"
+        # Rent and return requests repeated after a failure reuse their key
+        self.pending = PendingKeys()
+        
+        # Browsing reads come from the local replica when one is configured
+        # (a replica follows one database, so not across shards)
+        self.replica = None if isinstance(self.db, ShardedOperations) else open_replica(self.db.shard)
+        self._sync_job = None
+        if self.replica:
+            self._sync_replica()
+        
+        # Only stock near this terminal is listed when its location is configured
+        latitude = getattr(config, 'TERMINAL_LATITUDE', None)
+        longitude = getattr(config, 'TERMINAL_LONGITUDE', None)
+        self.location = (latitude, longitude) if latitude is not None and longitude is not None else None
+        self.radius_km = getattr(config, 'LOCAL_STOCK_RADIUS_KM', 25)
+        self._branch_index = None
+        
+        # While the customer is on the waitlist, their entries are checked for offers
+        self._waitlist_job = None
+        self._known_offers = set()
         
         self._display_home()
     
+    def _sync_replica(self):
+        """Pull fleet changes into the local replica and show its lag"""
+        try:
+            self.replica.sync(self.db)
+        except Exception as e:
+            print(f"Error syncing replica: {e}")
+        
+        lag = self.replica.lag_seconds()
+        lag_text = "never synced" if lag is None else f"{lag:.0f}s"
+        self.root.winfo_toplevel().title(f"Welcome, {self.username} (replica lag: {lag_text})")
+        
+        if self._sync_job is not None:
+            self.root.after_cancel(self._sync_job)
+        self._sync_job = self.root.after(getattr(config, 'REPLICA_SYNC_MS', 5000), self._sync_replica)
+    
+    def _nearby_branches(self):
+        """
+        Branches within LOCAL_STOCK_RADIUS_KM of this terminal
+        
+        Returns:
+            dict: Branch ID -> (distance_km, Branch), or None when no location is configured
+        """
+        if self.location is None:
+            return None
+        if self._branch_index is None:
+            self._branch_index = BranchIndex.load(self.db)
+        return {
+            branch.branch_id: (distance, branch)
+            for distance, branch in self._branch_index.within(*self.location, self.radius_km)
+        }
+    
+    def _nearest_with_stock(self, car_model=None, k=3):
+        """Describe the k nearest branches that have a matching available car"""
+        with_stock = self.db.get_branches_with_available(car_model)
+        nearest = self._branch_index.nearest(
+            *self.location, k=k, predicate=lambda branch: branch.branch_id in with_stock
+        )
+        return ", ".join(f"{branch.name} ({distance:.0f} km)" for distance, branch in nearest)
+    
     def _display_home(self):
         """Display customer home page with rented cars"""
         # Check for overdue cars first
@@ -53,11 +122,11 @@ class CustomerWindow:
         overdue_info_label.grid(row=0, column=0, columnspan=3)
         
         for i, car in enumerate(overdue_cars):
-            formatted_date = car[2].strftime('%Y-%m-%d') if car[2] else "N/A"
+            formatted_date = car.end_date.strftime('%Y-%m-%d') if car.end_date else "N/A"
             
             overdue_car_label = tk.Label(
                 self.root,
-                text=f"CarID: {car[0]}, Model: {car[1]}, Due Date: {formatted_date}",
+                text=f"CarID: {car.car_id}, Model: {car.model}, Year: {car.year}, Due Date: {formatted_date}",
                 font=('Calibri', 14),
                 pady=5
             )
@@ -66,7 +135,7 @@ class CustomerWindow:
             btn_return_car = tk.Button(
                 self.root,
                 text="Return Car (Overdue)",
-                command=lambda car_id=car[0]: self.return_car(car_id),
+                command=lambda car_id=car.car_id: self.return_car(car_id),
                 font=('Calibri', 16, 'bold'),
                 width=20,
                 fg='white',
@@ -92,11 +161,11 @@ class CustomerWindow:
         
         if rented_cars:
             for i, car in enumerate(rented_cars):
-                formatted_end_date = car[3].strftime('%Y-%m-%d') if car[3] else "N/A"
+                formatted_end_date = car.end_date.strftime('%Y-%m-%d') if car.end_date else "N/A"
                 
                 car_info_label = tk.Label(
                     self.root,
-                    text=f"CarID: {car[0]}, Model: {car[1]}, Year: {car[2]}, End Date: {formatted_end_date}",
+                    text=f"CarID: {car.car_id}, Model: {car.model}, Year: {car.year}, End Date: {formatted_end_date}",
                     font=('Calibri', 14),
                     pady=5
                 )
@@ -105,7 +174,7 @@ class CustomerWindow:
                 btn_return_car = tk.Button(
                     self.root,
                     text="Return Car",
-                    command=lambda car_id=car[0]: self.return_car(car_id),
+                    command=lambda car_id=car.car_id: self.return_car(car_id),
                     font=('Calibri', 16, 'bold'),
                     width=15,
                     fg='white',
@@ -123,6 +192,8 @@ class CustomerWindow:
                 bg='#3498db'
             )
             btn_rent_car.grid(row=len(rented_cars), column=0, pady=5)
+            self._add_rent_any_button(row=len(rented_cars), column=2)
+            self._display_waitlist(row=len(rented_cars) + 1)
         else:
             label_no_cars = tk.Label(
                 self.root,
@@ -142,13 +213,176 @@ class CustomerWindow:
                 bg='#3498db'
             )
             btn_rent_car.grid(row=1, column=0, pady=5)
+            self._add_rent_any_button(row=2, column=0)
+            self._display_waitlist(row=3)
+    
+    def _display_waitlist(self, row):
+        """Show the customer's waitlist entries: cars held for them and what they wait for"""
+        customer_id = self.db.get_customer_id(self.username)
+        entries = self.db.get_customer_waitlist(customer_id) if customer_id else []
+        self._known_offers = {entry[0] for entry in entries if entry[2] == 'Offered'}
+        
+        for i, (waitlist_id, car_model, status, car_id, _) in enumerate(entries):
+            if status == 'Offered':
+                text = f"Held for you: CarID {car_id}" + (f" ({car_model})" if car_model else "")
+                button_text, command, color = "Rent", lambda w=waitlist_id: self.rent_offer(w), '#27ae60'
+            else:
+                text = f"On the waitlist for: {car_model or 'any car'}"
+                button_text, command, color = "Leave", lambda w=waitlist_id: self.leave_waitlist(w), '#95a5a6'
+            
+            entry_label = tk.Label(self.root, text=text, font=('Calibri', 14), pady=5)
+            entry_label.grid(row=row + i, column=0, pady=5)
+            entry_button = tk.Button(
+                self.root,
+                text=button_text,
+                command=command,
+                font=('Calibri', 16, 'bold'),
+                width=15,
+                fg='white',
+                bg=color
+            )
+            entry_button.grid(row=row + i, column=2, pady=5)
+        
+        if any(entry[2] == 'Waiting' for entry in entries):
+            self._schedule_waitlist_check()
+    
+    def _schedule_waitlist_check(self):
+        """Check for waitlist offers again after WAITLIST_CHECK_MS"""
+        if self._waitlist_job is not None:
+            self.root.after_cancel(self._waitlist_job)
+        self._waitlist_job = self.root.after(getattr(config, 'WAITLIST_CHECK_MS', 15000), self._check_waitlist)
+    
+    def _check_waitlist(self):
+        """Refresh the home view when a car has been offered to this customer"""
+        self._waitlist_job = None
+        customer_id = self.db.get_customer_id(self.username)
+        entries = self.db.get_customer_waitlist(customer_id) if customer_id else []
+        offers = {entry[0] for entry in entries if entry[2] == 'Offered'}
+        if offers - self._known_offers:
+            for widget in self.root.winfo_children():
+                widget.destroy()
+            self._display_home()
+            messagebox.showinfo("Car Available", "A car from your waitlist is now held for you.")
+        elif any(entry[2] == 'Waiting' for entry in entries):
+            self._schedule_waitlist_check()
+    
+    def join_waitlist(self, car_model=None, min_year=None, max_year=None, max_tariff=None):
+        """Offer to queue the customer for the next matching car"""
+        wanted = car_model or "any car"
+        if not messagebox.askyesno(
+            "Join Waitlist",
+            f"Join the waitlist for {wanted}? The next matching car returned will be held for you."
+        ):
+            return
+        
+        customer_id = self.db.get_customer_id(self.username)
+        if not customer_id:
+            messagebox.showerror("Error", "Could not find customer ID.")
+            return
+        
+        entry = self.db.join_waitlist(customer_id, car_model, min_year, max_year, max_tariff)
+        if entry is None:
+            messagebox.showerror("Error", "Failed to join the waitlist. Please try again.")
+            return
+        
+        # Refresh the view
+        for widget in self.root.winfo_children():
+            widget.destroy()
+        self._display_home()
+    
+    def leave_waitlist(self, waitlist_id):
+        """Handle leaving the waitlist"""
+        customer_id = self.db.get_customer_id(self.username)
+        if customer_id and self.db.cancel_waitlist(waitlist_id, customer_id):
+            # Refresh the view
+            for widget in self.root.winfo_children():
+                widget.destroy()
+            self._display_home()
+        else:
+            messagebox.showerror("Error", "Failed to leave the waitlist. Please try again.")
+    
+    def rent_offer(self, waitlist_id):
+        """Open the rental form for the car held for a waitlist entry"""
+        rental_window = tk.Toplevel(self.root)
+        rental_window.title("Rent Held Car")
+        
+        end_date_label = tk.Label(rental_window, text="Enter End Date (DD-MM-YYYY):", font=('Calibri', 16))
+        end_date_label.grid(row=0, column=0, pady=10)
+        
+        end_date_entry = tk.Entry(rental_window, font=('Calibri', 16), width=30)
+        end_date_entry.grid(row=0, column=1, pady=10)
+        
+        rent_button = tk.Button(
+            rental_window,
+            text="Rent",
+            command=lambda: self.finalize_offer_rental(waitlist_id, end_date_entry.get(), rental_window),
+            font=('Calibri', 16, 'bold'),
+            width=15,
+            fg='white',
+            bg='#3498db'
+        )
+        rent_button.grid(row=1, column=0, columnspan=2, pady=10)
+    
+    def finalize_offer_rental(self, waitlist_id, end_date, rental_window):
+        """Rent the car held for a waitlist entry"""
+        if not end_date or not self.is_valid_date(end_date):
+            messagebox.showerror("Error", "Invalid date format. Please enter a valid date (DD-MM-YYYY).")
+            return
+        
+        customer_id = self.db.get_customer_id(self.username)
+        if not customer_id:
+            messagebox.showerror("Error", "Could not find customer ID.")
+            return
+        
+        today_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        end_date_formatted = datetime.strptime(end_date, '%d-%m-%Y').strftime('%Y-%m-%d')
+        rented = self.db.rent_waitlist_offer(waitlist_id, customer_id, today_date, end_date_formatted)
+        
+        if rented:
+            car_id, car_model, tariff = rented
+            messagebox.showinfo("Rental Success", f"You got car {car_id} ({car_model}), tariff {tariff}.")
+        else:
+            messagebox.showerror("Offer Expired", "Sorry, this car is no longer held for you.")
+        rental_window.destroy()
+        if self.replica:
+            self._sync_replica()
+        
+        # Refresh the view
+        for widget in self.root.winfo_children():
+            widget.destroy()
+        self._display_home()
+    
+    def _add_rent_any_button(self, row, column):
+        """Place the "rent any matching car" button"""
+        btn_rent_any = tk.Button(
+            self.root,
+            text="Rent Any Car...",
+            command=self.rent_any_car,
+            font=('Calibri', 16, 'bold'),
+            width=15,
+            fg='white',
+            bg='#16a085'
+        )
+        btn_rent_any.grid(row=row, column=column, pady=5)
     
     def return_car(self, car_id):
         """Handle car return"""
-        success = self.db.return_car(car_id)
+        success = self.db.return_car(car_id, idempotency_key=self.pending.key_for('return', car_id))
         
         if success:
-            messagebox.showinfo("Car Returned", "Car returned successfully!")
+            self.pending.succeeded('return', car_id)
+            charge = self.db.last_charges.get(car_id)
+            if charge and charge.late_fee:
+                message = (f"Car returned {charge.late_days} day(s) late.\n"
+                           f"Rental: {charge.base_cost:.2f}, late fee: {charge.late_fee:.2f}, "
+                           f"total: {charge.total:.2f}")
+            elif charge:
+                message = f"Car returned successfully!\nTotal: {charge.total:.2f}"
+            else:
+                message = "Car returned successfully!"
+            messagebox.showinfo("Car Returned", message)
+            if self.replica:
+                self._sync_replica()
             # Refresh the view
             for widget in self.root.winfo_children():
                 widget.destroy()
@@ -158,10 +392,30 @@ class CustomerWindow:
     
     def rent_car(self):
         """Display available cars for rent"""
-        available_cars = self.db.get_available_cars()
+        source = self.replica or self.db
+        nearby = self._nearby_branches()
+        if nearby is None:
+            # Streamed: the first row is peeked to tell an empty fleet apart
+            available_cars = source.iter_available_cars()
+            first_car = next(available_cars, None)
+            if first_car is not None:
+                available_cars = chain([first_car], available_cars)
+        else:
+            available_cars = source.get_available_cars_at_branches(nearby)
+            available_cars.sort(key=lambda car: nearby[car.branch_id][0])
+            first_car = available_cars[0] if available_cars else None
         
-        if not available_cars:
-            messagebox.showinfo("No Available Cars", "Sorry, there are no available cars at the moment.")
+        if first_car is None:
+            if nearby is None:
+                messagebox.showinfo("No Available Cars", "Sorry, there are no available cars at the moment.")
+                self.join_waitlist()
+            else:
+                elsewhere = self._nearest_with_stock()
+                messagebox.showinfo(
+                    "No Available Cars",
+                    f"Sorry, there are no available cars within {self.radius_km} km."
+                    + (f"\nNearest branches with cars: {elsewhere}" if elsewhere else "")
+                )
             return
         
         # Create new window for available cars
@@ -170,9 +424,13 @@ class CustomerWindow:
         available_window.configure(bg='#ecf0f1')
         
         for i, car in enumerate(available_cars):
+            car_text = f"CarID: {car.car_id}, Model: {car.model}, Year: {car.year}, Tariff: {car.tariff}"
+            if nearby is not None:
+                distance, branch = nearby[car.branch_id]
+                car_text += f", {branch.name} ({distance:.1f} km)"
             car_info_label = tk.Label(
                 available_window,
-                text=f"CarID: {car[0]}, Model: {car[2]}, Year: {car[5]}, Tariff: {car[3]}",
+                text=car_text,
                 font=('Calibri', 14),
                 pady=5,
                 bg='#ecf0f1'
@@ -182,7 +440,7 @@ class CustomerWindow:
             rent_button = tk.Button(
                 available_window,
                 text="Rent",
-                command=lambda car_id=car[0], price=car[3]: self.initiate_rental(car_id, price, available_window),
+                command=lambda car_id=car.car_id: self.initiate_rental(car_id, available_window),
                 font=('Calibri', 16, 'bold'),
                 width=15,
                 fg='white',
@@ -190,7 +448,7 @@ class CustomerWindow:
             )
             rent_button.grid(row=i, column=1, pady=5)
     
-    def initiate_rental(self, car_id, price, parent_window):
+    def initiate_rental(self, car_id, parent_window):
         """Open rental form for a specific car"""
         rental_window = tk.Toplevel(self.root)
         rental_window.title("Rent a Car")
@@ -204,7 +462,7 @@ class CustomerWindow:
         rent_button = tk.Button(
             rental_window,
             text="Rent",
-            command=lambda: self.finalize_rental(car_id, price, end_date_entry.get(), rental_window, parent_window),
+            command=lambda: self.finalize_rental(car_id, end_date_entry.get(), rental_window, parent_window),
             font=('Calibri', 16, 'bold'),
             width=15,
             fg='white',
@@ -212,6 +470,101 @@ class CustomerWindow:
         )
         rent_button.grid(row=1, column=0, columnspan=2, pady=10)
     
+    def rent_any_car(self):
+        """Open the form for renting any car that matches some criteria"""
+        criteria_window = tk.Toplevel(self.root)
+        criteria_window.title("Rent Any Matching Car")
+        
+        fields = [
+            ('model', "Model (blank = any):"),
+            ('min_year', "Min Year:"),
+            ('max_year', "Max Year:"),
+            ('max_tariff', "Max Tariff:"),
+            ('end_date', "Enter End Date (DD-MM-YYYY):"),
+        ]
+        entries = {}
+        for row, (key, text) in enumerate(fields):
+            label = tk.Label(criteria_window, text=text, font=('Calibri', 16))
+            label.grid(row=row, column=0, pady=10, sticky='w')
+            entries[key] = tk.Entry(criteria_window, font=('Calibri', 16), width=30)
+            entries[key].grid(row=row, column=1, pady=10)
+        
+        rent_button = tk.Button(
+            criteria_window,
+            text="Rent",
+            command=lambda: self.finalize_rent_any(
+                {key: entry.get().strip() for key, entry in entries.items()},
+                criteria_window
+            ),
+            font=('Calibri', 16, 'bold'),
+            width=15,
+            fg='white',
+            bg='#3498db'
+        )
+        rent_button.grid(row=len(fields), column=0, columnspan=2, pady=10)
+    
+    def finalize_rent_any(self, criteria, criteria_window):
+        """Claim and rent one available car matching the criteria"""
+        end_date = criteria['end_date']
+        if not end_date or not self.is_valid_date(end_date):
+            messagebox.showerror("Error", "Invalid date format. Please enter a valid date (DD-MM-YYYY).")
+            return
+        
+        try:
+            numbers = {
+                key: int(criteria[key]) if criteria[key] else None
+                for key in ('min_year', 'max_year', 'max_tariff')
+            }
+        except ValueError:
+            messagebox.showerror("Error", "Year and tariff limits must be whole numbers.")
+            return
+        
+        customer_id = self.db.get_customer_id(self.username)
+        if not customer_id:
+            messagebox.showerror("Error", "Could not find customer ID.")
+            return
+        
+        today_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        end_date_formatted = datetime.strptime(end_date, '%d-%m-%Y').strftime('%Y-%m-%d')
+        
+        # Nearest branches first; None (no location) allows any branch
+        nearby = self._nearby_branches()
+        branch_ids = None
+        if nearby is not None:
+            branch_ids = sorted(nearby, key=lambda branch_id: nearby[branch_id][0])
+        
+        request = ('rent-any', end_date_formatted, criteria['model'] or None, *numbers.values())
+        rented = self.db.rent_by_criteria(
+            customer_id, today_date, end_date_formatted,
+            car_model=criteria['model'] or None,
+            branch_ids=branch_ids,
+            idempotency_key=self.pending.key_for(*request),
+            **numbers
+        )
+        
+        if rented:
+            self.pending.succeeded(*request)
+            car_id, car_model, tariff = rented
+            messagebox.showinfo("Rental Success", f"You got car {car_id} ({car_model}), tariff {tariff}.")
+            criteria_window.destroy()
+            if self.replica:
+                self._sync_replica()
+            
+            # Refresh the view
+            for widget in self.root.winfo_children():
+                widget.destroy()
+            self._display_home()
+        elif nearby is not None:
+            elsewhere = self._nearest_with_stock(criteria['model'] or None)
+            messagebox.showinfo(
+                "No Matching Cars",
+                f"Sorry, no available car within {self.radius_km} km matches those criteria."
+                + (f"\nNearest branches with that model: {elsewhere}" if elsewhere else "")
+            )
+        else:
+            messagebox.showinfo("No Matching Cars", "Sorry, no available car matches those criteria.")
+            self.join_waitlist(criteria['model'] or None, **numbers)
+    
     def is_valid_date(self, date_string):
         """Validate date format (DD-MM-YYYY)"""
         try:
@@ -220,7 +573,7 @@ class CustomerWindow:
         except ValueError:
             return False
     
-    def finalize_rental(self, car_id, price, end_date, rental_window, parent_window):
+    def finalize_rental(self, car_id, end_date, rental_window, parent_window):
         """Complete the rental transaction"""
         if not end_date:
             messagebox.showerror("Error", "Please enter the end date.")
@@ -236,18 +589,28 @@ class CustomerWindow:
             messagebox.showerror("Error", "Could not find customer ID.")
             return
         
+        # Charge the car's current tariff, read from the primary: the identity
+        # map may still hold a tariff an agent has since changed
+        car = self.db.get_car(car_id, fresh=True)
+        if car is None:
+            messagebox.showerror("Error", "That car is no longer in the fleet.")
+            return
+        
         # Format dates
         today_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         end_date_formatted = datetime.strptime(end_date, '%d-%m-%Y').strftime('%Y-%m-%d')
         
-        # Create rental
-        success = self.db.create_rental(customer_id, car_id, today_date, end_date_formatted, price)
+        # Create rental; clicking Rent again after a failure resends the same request
+        request = ('rent', car_id, end_date_formatted)
+        success = self.db.create_rental(customer_id, car_id, today_date, end_date_formatted, car.tariff,
+                                        idempotency_key=self.pending.key_for(*request))
         
         if success:
-            # Update car availability
-            self.db.update_car_availability(car_id, 'Rented')
+            self.pending.succeeded(*request)
             
             messagebox.showinfo("Rental Success", "Car rented successfully!")
+            if self.replica:
+                self._sync_replica()
             rental_window.destroy()
             parent_window.destroy()
             
@@ -260,6 +623,16 @@ class CustomerWindow:
     
     def cleanup(self):
         """Clean up resources"""
+        if self._sync_job is not None:
+            self.root.after_cancel(self._sync_job)
+            self._sync_job = None
+        if self._waitlist_job is not None:
+            self.root.after_cancel(self._waitlist_job)
+            self._waitlist_job = None
+        if self.replica:
+            self.replica.close()
+            self.replica = None
         if self.db:
             self.db.disconnect()
+            self.db = None
 
@@ -4,8 +4,9 @@ Handles user authentication (Customer and Agent)
 """
 
 import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import messagebox, StringVar
-from database.db_operations import DatabaseOperations
+from ui import startup_timer
 
 
 class LoginWindow:
@@ -31,29 +32,53 @@ class LoginWindow:
         'width': 30,
     }
     
+    # How often a running login is checked for completion (milliseconds)
+    LOGIN_POLL_MS = 30
+    
     def __init__(self, root, on_customer_login, on_agent_login, on_register_click):
         """
         Initialize login window
         
         Args:
-            root: Tkinter root window
-            on_customer_login: Callback function for customer login
-            on_agent_login: Callback function for agent login
+            root: Container frame provided by the window manager
+            on_customer_login: Callback taking (username, db) for customer login
+            on_agent_login: Callback taking (agent_id, db) for agent login
             on_register_click: Callback function for registration button
         """
         self.root = root
-        self.root.title("Car Rental System - Login")
-        self.root.geometry("400x300")
+        self.root.winfo_toplevel().title("Car Rental System - Login")
+        self.root.winfo_toplevel().geometry("400x300")
         
         self.on_customer_login = on_customer_login
         self.on_agent_login = on_agent_login
         self.on_register_click = on_register_click
         
-        self.db = DatabaseOperations()
-        self.db.connect()
+        # Connected on the first login attempt, not before the form is drawn
+        self.db = None
+        
+        # Connecting and password hashing run here, off the Tk thread
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._login = None
+        self._login_job = None
         
         self._create_widgets()
     
+    def _get_db(self):
+        """
+        Return the database connection, opening it on first use (worker thread)
+        
+        Returns:
+            DatabaseOperations: Connected database operations instance
+        """
+        if self.db is None:
+            # Imported here so the driver is not loaded before first paint
+            import config
+            from database.sharding import create_operations
+            db = create_operations(getattr(config, 'TERMINAL_BRANCH_ID', None))
+            db.connect()
+            self.db = db
+        return self.db
+    
     def _create_widgets(self):
         """Create and place UI widgets"""
         # Username
@@ -109,37 +134,64 @@ class LoginWindow:
         if not username or not password:
             messagebox.showerror("Error", "Please enter both username and password.")
             return
+        if self._login is not None:
+            return  # already logging in
         
+        self.login_button.config(state=tk.DISABLED, text="Logging in...")
+        self._login = self._executor.submit(self._authenticate, user_type, username, password)
+        self._login_job = self.root.after(self.LOGIN_POLL_MS, self._check_login, user_type, username)
+    
+    def _authenticate(self, user_type, username, password):
+        """
+        Connect if needed and check the credentials (runs on the worker thread)
+        
+        Returns:
+            tuple: (ID, username) if the credentials match, None otherwise
+        """
+        db = self._get_db()
         if user_type == 'customer':
-            self._login_customer(username, password)
-        elif user_type == 'agent':
-            self._login_agent(username, password)
+            return db.login_customer(username, password)
+        return db.login_agent(username, password)
     
-    def _login_customer(self, username, password):
-        """Authenticate and login customer"""
-        customer = self.db.login_customer(username, password)
+    def _check_login(self, user_type, username):
+        """Finish the login on the Tk thread once the worker is done"""
+        if not self._login.done():
+            self._login_job = self.root.after(self.LOGIN_POLL_MS, self._check_login, user_type, username)
+            return
+        login, self._login, self._login_job = self._login, None, None
+        self.login_button.config(state=tk.NORMAL, text="Login")
         
-        if customer:
-            self.db.disconnect()
-            self.root.destroy()
-            self.on_customer_login(username)
-        else:
+        try:
+            account = login.result()
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not connect to the database: {e}")
+            return
+        startup_timer.mark('first_query')
+        
+        if not account:
             messagebox.showerror("Error", "Invalid username or password")
-    
-    def _login_agent(self, username, password):
-        """Authenticate and login agent"""
-        agent = self.db.login_agent(username, password)
+            return
         
-        if agent:
-            agent_id = agent[0]
-            self.db.disconnect()
-            self.root.destroy()
-            self.on_agent_login(agent_id)
+        # The connected, authenticated session moves to the next view, so
+        # it does not reconnect or log in again
+        db, self.db = self.db, None
+        if user_type == 'customer':
+            self.on_customer_login(username, db)
         else:
-            messagebox.showerror("Error", "Invalid username or password")
+            self.on_agent_login(account[0], db)
     
     def cleanup(self):
         """Clean up resources"""
+        if self._login_job is not None:
+            self.root.after_cancel(self._login_job)
+            self._login_job = None
+        # Let a login still in flight finish before disconnecting
+        self._executor.submit(self._disconnect)
+        self._executor.shutdown(wait=False)
+    
+    def _disconnect(self):
+        """Close the connection if no view took it over (worker thread)"""
         if self.db:
             self.db.disconnect()
+            self.db = None
 
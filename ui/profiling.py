@@ -0,0 +1,276 @@
+"""
+Event-loop profiling for Car Rental System
+Opt-in timing of every Tk callback and after() tick, main-thread stall
+detection, and optional cProfile/tracemalloc captures of the slowest handlers
+
+Enable with the CARRENTAL_PROFILE environment variable or UI_PROFILE in
+config.py. Values: "timing" (or "1"), "cprofile", "tracemalloc".
+"""
+
+import atexit
+import cProfile
+import os
+import time
+import tkinter as tk
+import tracemalloc
+
+MODES = ('timing', 'cprofile', 'tracemalloc')
+
+# View methods that are timed by name in addition to the raw Tk callbacks,
+# because they are usually reached through a wrapper (lambda, login, refresh)
+INSTRUMENTED_METHODS = {
+    'ui.agent_window.AgentWindow': ('_display_all_cars', '_apply_changes', 'add_car'),
+    'ui.customer_window.CustomerWindow': (
+        '_display_home', 'rent_car', 'finalize_rental', 'return_car'
+    ),
+}
+
+
+class HandlerStats:
+    """
+    Timing statistics for one callback
+    """
+
+    __slots__ = ('name', 'calls', 'total', 'max', 'samples')
+
+    MAX_SAMPLES = 1000
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = []
+
+    def add(self, duration):
+        """Record one call duration in seconds"""
+        self.calls += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+        if len(self.samples) < self.MAX_SAMPLES:
+            self.samples.append(duration)
+        else:
+            # Keep a bounded, evenly thinned sample for percentiles
+            self.samples[self.calls % self.MAX_SAMPLES] = duration
+
+    def percentile(self, fraction):
+        """Approximate percentile of recorded durations"""
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class UIProfiler:
+    """
+    Measures how long the Tk main thread is blocked
+
+    Every function Tk calls back into Python (button commands, bindings,
+    after() callbacks) goes through Misc._register, so wrapping it there
+    times all UI handlers without touching the views. A heartbeat after()
+    tick measures how late the loop was to service it, which is the stall
+    any user input would have experienced.
+    """
+
+    def __init__(self, mode='timing', slow_ms=100, heartbeat_ms=100, output_dir='profiles'):
+        """
+        Initialize profiler
+
+        Args:
+            mode: One of MODES
+            slow_ms: Handlers slower than this count as stalls and get captured
+            heartbeat_ms: Interval of the stall-detection heartbeat
+            output_dir: Directory for cProfile/tracemalloc captures
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode {mode!r}, expected one of {MODES}")
+        self.mode = mode
+        self.slow = slow_ms / 1000
+        self.heartbeat = heartbeat_ms / 1000
+        self.output_dir = output_dir
+        self.handlers = {}
+        self.stalls = HandlerStats('main-thread stall')
+        self._depth = 0
+        self._root = None
+        self._original_register = None
+        self._original_after = None
+
+    # ============ Installation ============
+
+    def install(self, root):
+        """
+        Start profiling the event loop of a Tk root
+
+        Args:
+            root: The application's Tk root window
+        """
+        profiler = self
+        self._root = root
+        self._original_register = tk.Misc._register
+        self._original_after = tk.Misc.after
+
+        def _register(widget, func, subst=None, needcleanup=1):
+            if getattr(func, '__qualname__', '') != 'Misc.after.<locals>.callit':
+                func = profiler.wrap(func)
+            return profiler._original_register(widget, func, subst, needcleanup)
+
+        def after(widget, ms, func=None, *args):
+            if func is not None:
+                func = profiler.wrap(func, prefix='after:')
+            return profiler._original_after(widget, ms, func, *args)
+
+        tk.Misc._register = _register
+        tk.Misc.after = after
+
+        for path, names in INSTRUMENTED_METHODS.items():
+            self._instrument(path, names)
+
+        if self.mode == 'tracemalloc' and not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+        if self.mode != 'timing':
+            os.makedirs(self.output_dir, exist_ok=True)
+
+        self._expected = time.perf_counter() + self.heartbeat
+        self._original_after(root, int(self.heartbeat * 1000), self._heartbeat)
+        atexit.register(self.report)
+
+    def uninstall(self):
+        """Restore the original Tk methods"""
+        if self._original_register is not None:
+            tk.Misc._register = self._original_register
+            tk.Misc.after = self._original_after
+            self._original_register = None
+
+    def _instrument(self, path, names):
+        """Wrap named methods of a view class"""
+        module_name, class_name = path.rsplit('.', 1)
+        module = __import__(module_name, fromlist=[class_name])
+        cls = getattr(module, class_name)
+        for name in names:
+            method = getattr(cls, name)
+            if not getattr(method, '_profiled', False):
+                setattr(cls, name, self.wrap(method, prefix=f'{class_name}.', name=name))
+
+    def _heartbeat(self):
+        """Measure how late this tick ran, then schedule the next one"""
+        now = time.perf_counter()
+        lateness = now - self._expected
+        if lateness >= self.slow:
+            self.stalls.add(lateness)
+        self._expected = now + self.heartbeat
+        try:
+            self._original_after(self._root, int(self.heartbeat * 1000), self._heartbeat)
+        except tk.TclError:
+            pass  # root destroyed
+
+    # ============ Timing ============
+
+    def wrap(self, func, prefix='', name=None):
+        """
+        Return a timed version of a callback
+
+        Args:
+            func: Callable to wrap
+            prefix: Label prefix (e.g. 'after:')
+            name: Label to use instead of the function's qualified name
+
+        Returns:
+            callable: Wrapped function
+        """
+        if getattr(func, '_profiled', False):
+            return func
+        label = prefix + (name or getattr(func, '__qualname__', None) or repr(func))
+        profiler = self
+
+        def timed(*args, **kwargs):
+            return profiler.call(label, func, args, kwargs)
+
+        timed._profiled = True
+        timed.__name__ = getattr(func, '__name__', 'callback')
+        timed.__qualname__ = getattr(func, '__qualname__', timed.__name__)
+        return timed
+
+    def call(self, label, func, args, kwargs):
+        """Run a callback, recording its duration and capturing it if slow"""
+        outermost = self._depth == 0
+        self._depth += 1
+        profile = cProfile.Profile() if outermost and self.mode == 'cprofile' else None
+        start = time.perf_counter()
+        try:
+            if profile is not None:
+                return profile.runcall(func, *args, **kwargs)
+            return func(*args, **kwargs)
+        finally:
+            duration = time.perf_counter() - start
+            self._depth -= 1
+            stats = self.handlers.get(label)
+            if stats is None:
+                stats = self.handlers[label] = HandlerStats(label)
+            is_slowest = duration > stats.max
+            stats.add(duration)
+            if outermost and duration >= self.slow:
+                self.stalls.add(duration)
+                if is_slowest:
+                    self._capture(label, duration, profile)
+
+    def _capture(self, label, duration, profile):
+        """Save a cProfile or tracemalloc capture for a new slowest call"""
+        safe = "".join(c if c.isalnum() or c in '._-' else '_' for c in label)
+        if profile is not None:
+            profile.dump_stats(os.path.join(self.output_dir, f'{safe}.prof'))
+        elif self.mode == 'tracemalloc':
+            snapshot = tracemalloc.take_snapshot()
+            path = os.path.join(self.output_dir, f'{safe}.tracemalloc.txt')
+            with open(path, 'w') as f:
+                f.write(f"{label}: {duration * 1000:.1f} ms\n")
+                for stat in snapshot.statistics('lineno')[:25]:
+                    f.write(f"{stat}\n")
+
+    # ============ Reporting ============
+
+    def report(self, limit=25):
+        """
+        Print the slowest handlers and the stall summary
+
+        Args:
+            limit: Number of handlers to list
+        """
+        rows = sorted(self.handlers.values(), key=lambda s: s.max, reverse=True)[:limit]
+        if not rows:
+            return
+        print(f"{'handler':<60} {'calls':>6} {'total ms':>10} {'mean':>8} {'p95':>8} {'max':>8}")
+        for stats in rows:
+            print(
+                f"{stats.name[:60]:<60} {stats.calls:>6} {stats.total * 1000:>10.1f} "
+                f"{stats.total / stats.calls * 1000:>8.1f} {stats.percentile(0.95) * 1000:>8.1f} "
+                f"{stats.max * 1000:>8.1f}"
+            )
+        print(
+            f"Main-thread stalls >= {self.slow * 1000:.0f} ms: {self.stalls.calls}, "
+            f"total {self.stalls.total * 1000:.1f} ms, worst {self.stalls.max * 1000:.1f} ms"
+        )
+
+
+def install_from_config(root):
+    """
+    Install the profiler if enabled by environment or config
+
+    Args:
+        root: The application's Tk root window
+
+    Returns:
+        UIProfiler: The installed profiler, or None if profiling is off
+    """
+    import config
+    mode = os.environ.get('CARRENTAL_PROFILE') or getattr(config, 'UI_PROFILE', None)
+    if not mode:
+        return None
+    if mode == '1':
+        mode = 'timing'
+    profiler = UIProfiler(
+        mode=mode,
+        slow_ms=getattr(config, 'UI_PROFILE_SLOW_MS', 100),
+        output_dir=getattr(config, 'UI_PROFILE_DIR', 'profiles')
+    )
+    profiler.install(root)
+    return profiler
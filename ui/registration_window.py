@@ -4,9 +4,9 @@ Handles new user registration (Customer and Agent)
 """
 
 import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import messagebox, StringVar
 import random
-from database.db_operations import DatabaseOperations
 
 
 class RegistrationWindow:
@@ -14,6 +14,9 @@ class RegistrationWindow:
     Registration window for new customer and agent signup
     """
     
+    # How often a running registration is checked for completion (milliseconds)
+    REGISTER_POLL_MS = 30
+    
     def __init__(self, parent_window, on_registration_success):
         """
         Initialize registration window
@@ -29,10 +32,48 @@ class RegistrationWindow:
         self.window.title("Registration")
         self.window.geometry("400x300")
         
-        self.db = DatabaseOperations()
-        self.db.connect()
+        # Connected when the user actually registers
+        self.db = None
+        
+        # Connecting and password hashing run here, off the Tk thread
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._registration = None
+        self._register_job = None
         
         self._create_widgets()
+        self.window.bind("<Destroy>", self._on_destroy)
+    
+    def _on_destroy(self, event):
+        """Release the connection when the dialog goes away for any reason"""
+        if event.widget is not self.window:
+            return
+        if self._register_job is not None:
+            self.window.after_cancel(self._register_job)
+            self._register_job = None
+        # Let a registration still in flight finish before disconnecting
+        self._executor.submit(self._disconnect)
+        self._executor.shutdown(wait=False)
+    
+    def _disconnect(self):
+        """Close the connection (worker thread)"""
+        if self.db:
+            self.db.disconnect()
+            self.db = None
+    
+    def _get_db(self):
+        """
+        Return the database connection, opening it on first use (worker thread)
+        
+        Returns:
+            DatabaseOperations: Connected database operations instance
+        """
+        if self.db is None:
+            import config
+            from database.sharding import create_operations
+            db = create_operations(getattr(config, 'TERMINAL_BRANCH_ID', None))
+            db.connect()
+            self.db = db
+        return self.db
     
     def _create_widgets(self):
         """Create and place UI widgets"""
@@ -77,30 +118,43 @@ class RegistrationWindow:
         if not username or not password:
             messagebox.showerror("Error", "Username and password are required.")
             return
+        if self._registration is not None:
+            return  # already registering
         
+        self.register_button.config(state=tk.DISABLED, text="Registering...")
+        self._registration = self._executor.submit(self._register, category, username, password)
+        self._register_job = self.window.after(self.REGISTER_POLL_MS, self._check_registration, category)
+    
+    def _register(self, category, username, password):
+        """
+        Connect if needed and create the account (runs on the worker thread)
+        
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        db = self._get_db()
         if category == 'customer':
-            customer_id = random.randint(100000, 999999)
-            success = self.db.register_customer(customer_id, username, password)
-            
-            if success:
-                messagebox.showinfo("Registration", "Customer registered successfully!")
-                self.db.disconnect()
-                self.window.destroy()
-                if self.on_registration_success:
-                    self.on_registration_success()
-            else:
-                messagebox.showerror("Error", "Registration failed. Please try again.")
-        
-        elif category == 'agent':
-            agent_id = random.randint(100000, 999999)
-            success = self.db.register_agent(agent_id, username, password)
-            
-            if success:
-                messagebox.showinfo("Registration", "Agent registered successfully!")
-                self.db.disconnect()
-                self.window.destroy()
-                if self.on_registration_success:
-                    self.on_registration_success()
-            else:
-                messagebox.showerror("Error", "Registration failed. Please try again.")
-
+            return db.register_customer(random.randint(100000, 999999), username, password)
+        return db.register_agent(random.randint(100000, 999999), username, password)
+    
+    def _check_registration(self, category):
+        """Finish the registration on the Tk thread once the worker is done"""
+        if not self._registration.done():
+            self._register_job = self.window.after(self.REGISTER_POLL_MS, self._check_registration, category)
+            return
+        registration, self._registration, self._register_job = self._registration, None, None
+        self.register_button.config(state=tk.NORMAL, text="Register")
+        
+        try:
+            success = registration.result()
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not connect to the database: {e}")
+            return
+        
+        if success:
+            messagebox.showinfo("Registration", f"{category.capitalize()} registered successfully!")
+            self.window.destroy()
+            if self.on_registration_success:
+                self.on_registration_success()
+        else:
+            messagebox.showerror("Error", "Registration failed. Please try again.")
@@ -0,0 +1,71 @@
+"""
+Startup timing for Car Rental System
+Records how long each cold-start phase takes so time-to-interactive can be tracked
+"""
+
+import atexit
+import os
+import time
+
+# Captured when this module is first imported, which main.py does before
+# anything else, so it marks the start of the process as seen by Python
+_START = time.perf_counter()
+
+PHASES = ('imports', 'tk_init', 'first_paint', 'first_query')
+
+_marks = {}
+_reported = False
+
+
+def is_enabled():
+    """
+    Check whether the startup report was requested
+
+    Enabled by the CARRENTAL_STARTUP_REPORT environment variable or
+    STARTUP_REPORT = True in config.py.
+
+    Returns:
+        bool: True if the report should be printed
+    """
+    if os.environ.get('CARRENTAL_STARTUP_REPORT'):
+        return True
+    try:
+        import config
+    except ImportError:
+        return False
+    return bool(getattr(config, 'STARTUP_REPORT', False))
+
+
+def mark(phase):
+    """
+    Record the end of a startup phase (only the first call per phase counts)
+
+    Args:
+        phase: One of PHASES
+    """
+    if phase in _marks:
+        return
+    _marks[phase] = time.perf_counter()
+    if phase == PHASES[-1]:
+        report()
+
+
+def report():
+    """Print the startup timing table once, if enabled"""
+    global _reported
+    if _reported or not _marks or not is_enabled():
+        return
+    _reported = True
+
+    print("Startup timing (ms since process start / phase duration):")
+    previous = _START
+    for phase in PHASES:
+        if phase not in _marks:
+            print(f"  {phase:<12} not reached")
+            continue
+        at = _marks[phase]
+        print(f"  {phase:<12} {(at - _START) * 1000:8.1f} {(at - previous) * 1000:8.1f}")
+        previous = at
+
+
+atexit.register(report)
@@ -0,0 +1,81 @@
+"""
+Window manager for Car Rental System
+Swaps views inside the single Tk root instead of creating a new Tk per login
+"""
+
+import tkinter as tk
+
+
+class WindowManager:
+    """
+    Owns the application's only Tk root and the view currently shown in it
+
+    Each view is built inside a fresh Frame. Switching views calls the old
+    view's cleanup() (closing its database connection and cancelling its
+    timers) and destroys its Frame, which also destroys any Toplevel dialogs
+    the view opened, so a long-running terminal stays at constant memory.
+    """
+
+    def __init__(self, root):
+        """
+        Initialize window manager
+
+        Args:
+            root: The application's Tk root window
+        """
+        self.root = root
+        self.current_view = None
+        self.current_frame = None
+        self.on_logout = None
+
+        self.menubar = tk.Menu(self.root)
+        self.session_menu = tk.Menu(self.menubar, tearoff=0)
+        self.session_menu.add_command(label="Logout", command=self.logout)
+        self.menubar.add_cascade(label="Session", menu=self.session_menu)
+
+        self.root.protocol("WM_DELETE_WINDOW", self.shutdown)
+
+    def show(self, view_factory, on_logout=None):
+        """
+        Replace the current view with a new one
+
+        Args:
+            view_factory: Callable taking the container Frame and returning the view
+            on_logout: Callback for the Session > Logout menu, or None to hide the menu
+
+        Returns:
+            object: The newly created view
+        """
+        self.close_current()
+
+        self.current_frame = tk.Frame(self.root)
+        self.current_frame.pack(fill=tk.BOTH, expand=True)
+        self.on_logout = on_logout
+        self.root.config(menu=self.menubar if on_logout else "")
+
+        self.current_view = view_factory(self.current_frame)
+        return self.current_view
+
+    def close_current(self):
+        """Tear down the current view and release its resources"""
+        view, frame = self.current_view, self.current_frame
+        self.current_view = None
+        self.current_frame = None
+
+        if view is not None and hasattr(view, 'cleanup'):
+            try:
+                view.cleanup()
+            except Exception as e:
+                print(f"Error cleaning up view: {e}")
+        if frame is not None:
+            frame.destroy()
+
+    def logout(self):
+        """Handle Session > Logout"""
+        if self.on_logout:
+            self.on_logout()
+
+    def shutdown(self):
+        """Close the current view and exit the main loop"""
+        self.close_current()
+        self.root.destroy()